@@ -14,6 +14,7 @@ from sqlalchemy import text
 
 from .db import get_db, init_database, execute_sql_file
 from . import models
+from .services import period_balances  # noqa: F401  注册分录过账 → 期末余额增量更新的监听器
 
 # 配置模板目录
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
@@ -40,6 +41,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按路由记录事件循环延迟（/api/metrics/event-loop）
+from .middleware.loop_lag import EventLoopLagMiddleware
+app.add_middleware(EventLoopLagMiddleware)
+
 # 导入路由模块
 from .routes import (
     bank_import,
@@ -187,6 +192,21 @@ async def shutdown_event():
     except Exception as e:
         print(f"⚠️ SFTP调度器停止失败: {e}")
     
+    # 写完队列中的审计日志
+    from .utils.audit_logger import audit_writer
+    audit_writer.close()
+    print("✅ 审计日志队列已写入")
+    
+    # 停止AI请求线程池（不等待进行中的请求）
+    from .utils import ai_client
+    if ai_client._async_ai_client is not None:
+        ai_client._async_ai_client.close()
+    
+    # 停止数据库 / CPU 线程池
+    from .utils.db_executor import cpu_executor, db_executor
+    db_executor.close(wait=False)
+    cpu_executor.close(wait=False)
+    
     print("✅ 系统已安全关闭")
 
 
@@ -0,0 +1,174 @@
+"""
+事件循环延迟监控（按路由统计）
+- 后台任务每 LOOP_LAG_INTERVAL 秒醒来一次，实际醒来时间比预期晚的部分即事件循环延迟
+  （某个协程在事件循环线程中执行了阻塞代码）
+- 每次检测到的延迟计入当时所有进行中的请求；请求结束时按 "方法 路由模板" 汇总：
+  请求数、平均耗时、期间观测到的最大 / 累计事件循环延迟
+- 阻塞的请求往往在采样任务醒来之前就已结束，因此请求开始 / 结束时也按采样任务当前的
+  超时量计算本请求期间产生的延迟
+- 阻塞事件循环的路由自身的请求上延迟最大；同时进行中的其他请求也会记录到这段延迟
+
+    app.add_middleware(EventLoopLagMiddleware)
+    loop_lag_monitor.snapshot()  # /api/metrics/event-loop
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+
+# 低于该值的延迟视为调度误差，不计入
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.005"))
+
+
+class _RouteStats:
+    __slots__ = ("requests", "total_seconds", "max_lag", "total_lag")
+
+    def __init__(self):
+        self.requests = 0
+        self.total_seconds = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+
+class LoopLagMonitor:
+    """事件循环延迟采样 + 按路由汇总"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self._expected: Optional[float] = None
+        self._ids = itertools.count()
+        self._inflight: Dict[int, list] = {}
+        self._routes: Dict[str, _RouteStats] = {}
+        self.samples = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+    def ensure_started(self):
+        """在当前事件循环中启动采样任务（每个事件循环一次）"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._loop is loop and not self._task.done():
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._sample())
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record_lag(loop.time() - self._expected)
+
+    def _overdue(self) -> float:
+        """采样任务当前已超时多久（即本次采样周期内事件循环已被阻塞的时长）"""
+        if self._expected is None or self._task is None or self._task.done():
+            return 0.0
+        return max(self._loop.time() - self._expected, 0.0)
+
+    def _observe(self, observed: list, overdue: float):
+        # observed: [最大延迟, 累计延迟, 开始时间, 本采样周期内已计入的超时量]
+        lag = overdue - observed[3]
+        if lag >= self.threshold:
+            observed[0] = max(observed[0], lag)
+            observed[1] += lag
+
+    def record_lag(self, lag: float):
+        with self._lock:
+            self.samples += 1
+            for observed in self._inflight.values():
+                self._observe(observed, lag)
+                observed[3] = 0.0
+            if lag < self.threshold:
+                return
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+
+    def begin(self) -> int:
+        token = next(self._ids)
+        overdue = self._overdue()
+        with self._lock:
+            self._inflight[token] = [0.0, 0.0, time.perf_counter(), overdue]
+        return token
+
+    def end(self, token: int, route: str):
+        overdue = self._overdue()
+        with self._lock:
+            observed = self._inflight.pop(token)
+            self._observe(observed, overdue)
+            max_lag, total_lag, started, _ = observed
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = _RouteStats()
+            stats.requests += 1
+            stats.total_seconds += time.perf_counter() - started
+            stats.max_lag = max(stats.max_lag, max_lag)
+            stats.total_lag += total_lag
+
+    def snapshot(self) -> Dict:
+        """整体与各路由的延迟统计（毫秒），按累计延迟降序"""
+        with self._lock:
+            routes = [
+                {
+                    "route": route,
+                    "requests": s.requests,
+                    "avg_ms": round(s.total_seconds / s.requests * 1000, 2),
+                    "max_loop_lag_ms": round(s.max_lag * 1000, 2),
+                    "avg_loop_lag_ms": round(s.total_lag / s.requests * 1000, 2),
+                    "total_loop_lag_ms": round(s.total_lag * 1000, 2),
+                }
+                for route, s in self._routes.items()
+            ]
+            summary = {
+                "interval_ms": round(self.interval * 1000, 2),
+                "samples": self.samples,
+                "max_loop_lag_ms": round(self.max_lag * 1000, 2),
+                "total_loop_lag_ms": round(self.total_lag * 1000, 2),
+                "inflight": len(self._inflight),
+            }
+        routes.sort(key=lambda r: r["total_loop_lag_ms"], reverse=True)
+        return {**summary, "routes": routes}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self.samples = 0
+            self.max_lag = 0.0
+            self.total_lag = 0.0
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+def _route_name(scope) -> str:
+    # 路由匹配后 scope 中有 route（路由模板，如 /api/pos-reports/{report_id}）；
+    # 未匹配的请求（404扫描等）合并为一项，避免按原始路径无限增长
+    path = getattr(scope.get("route"), "path", None) or "<unmatched>"
+    return f"{scope.get('method', '')} {path}"
+
+
+class EventLoopLagMiddleware:
+    """纯ASGI中间件：记录每个HTTP请求期间观测到的事件循环延迟"""
+
+    def __init__(self, app, monitor: LoopLagMonitor = loop_lag_monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self.monitor.ensure_started()
+        token = self.monitor.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.end(token, _route_name(scope))
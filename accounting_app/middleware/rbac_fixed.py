@@ -16,6 +16,7 @@ import psycopg2
 from ..db import get_db
 from ..models import User, Permission, AuditLog
 from ..services.auth_service import get_user_by_token, get_user_role_for_company
+from ..services.permission_cache import permission_matrix
 from ..utils.flask_session_parser import FlaskSessionParser
 
 logger = logging.getLogger(__name__)
@@ -212,7 +213,7 @@ def check_permission(
     
     权限检查逻辑：
     1. admin角色：自动通过（拥有* *权限）
-    2. 查询permissions表：role + resource + action
+    2. 查询权限矩阵缓存（permissions表一次加载）：role + resource + action
     3. 通配符支持：resource=* 或 action=*
     
     Args:
@@ -233,52 +234,22 @@ def check_permission(
         logger.info(f"admin用户 {user.username} 自动通过权限检查")
         return True
     
-    # 查询权限表
-    # 优先级1：精确匹配（role + resource + action）
-    exact_permission = db.query(Permission).filter(
-        Permission.role == user.role,
-        Permission.resource == resource,
-        Permission.action == action,
-        Permission.allowed == True
-    ).first()
+    # 查询权限矩阵（进程内缓存，按优先级：精确 > 资源通配符 > 操作通配符 > 完全通配符）
+    matched = permission_matrix.match(db, user.role, resource, action)
     
-    if exact_permission:
+    if matched == 'exact':
         logger.info(f"权限检查通过（精确匹配）：{user.username} ({user.role}) -> {resource}.{action}")
         return True
     
-    # 优先级2：资源通配符（role + resource=* + action）
-    wildcard_resource_permission = db.query(Permission).filter(
-        Permission.role == user.role,
-        Permission.resource == '*',
-        Permission.action == action,
-        Permission.allowed == True
-    ).first()
-    
-    if wildcard_resource_permission:
+    if matched == 'resource_wildcard':
         logger.info(f"权限检查通过（资源通配符）：{user.username} ({user.role}) -> *.{action}")
         return True
     
-    # 优先级3：操作通配符（role + resource + action=*）
-    wildcard_action_permission = db.query(Permission).filter(
-        Permission.role == user.role,
-        Permission.resource == resource,
-        Permission.action == '*',
-        Permission.allowed == True
-    ).first()
-    
-    if wildcard_action_permission:
+    if matched == 'action_wildcard':
         logger.info(f"权限检查通过（操作通配符）：{user.username} ({user.role}) -> {resource}.*")
         return True
     
-    # 优先级4：完全通配符（role + resource=* + action=*）
-    full_wildcard_permission = db.query(Permission).filter(
-        Permission.role == user.role,
-        Permission.resource == '*',
-        Permission.action == '*',
-        Permission.allowed == True
-    ).first()
-    
-    if full_wildcard_permission:
+    if matched == 'full_wildcard':
         logger.info(f"权限检查通过（完全通配符）：{user.username} ({user.role}) -> *.*")
         return True
     
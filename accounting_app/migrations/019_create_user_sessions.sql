@@ -0,0 +1,18 @@
+-- ============================================================
+-- 多worker共享的登录Session表
+-- 用途：替代auth_service模块级 _session_store 字典，多个uvicorn worker共享session
+-- token只存SHA-256哈希；expires_at索引用于批量清理过期session
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS user_sessions (
+    token_hash VARCHAR(64) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    company_id INTEGER,
+    username VARCHAR(100) NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_sessions_user_id ON user_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions(expires_at);
@@ -0,0 +1,25 @@
+-- ============================================================
+-- 期末科目余额物化表
+-- 用途：Management Report 的 Balance Sheet / P&L 以最近一个已月结期间的累计额
+--       + 之后未结期间的分录计算，不再每次从第一笔分录开始汇总
+-- 月结时由 period_balances.materialize_period_balances 写入，分录过账时增量更新
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS account_period_balances (
+    id SERIAL PRIMARY KEY,
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    account_id INTEGER NOT NULL REFERENCES chart_of_accounts(id) ON DELETE CASCADE,
+    period VARCHAR(7) NOT NULL,
+    period_debit NUMERIC(18,2) NOT NULL DEFAULT 0,
+    period_credit NUMERIC(18,2) NOT NULL DEFAULT 0,
+    closing_debit NUMERIC(18,2) NOT NULL DEFAULT 0,
+    closing_credit NUMERIC(18,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_account_period_balances_key
+    ON account_period_balances(company_id, period, account_id);
+
+-- 每个银行账户截至某日的最新余额
+CREATE INDEX IF NOT EXISTS idx_bank_statements_company_account_date
+    ON bank_statements(company_id, account_number, transaction_date);
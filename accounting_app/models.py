@@ -72,6 +72,8 @@ class BankStatement(Base):
     # Phase 1-10: 数据完整性约束
     __table_args__ = (
         CheckConstraint('debit_amount > 0 OR credit_amount > 0', name='one_side_positive'),
+        # 每个账户截至某日的最新余额（Management Report 银行余额）
+        Index('idx_bank_statements_company_account_date', 'company_id', 'account_number', 'transaction_date'),
     )
 
 
@@ -677,6 +679,26 @@ class Permission(Base):
     )
 
 
+class UserSession(Base):
+    """
+    登录Session表（多worker共享）
+    token只存SHA-256哈希；expires_at索引用于批量清理过期session
+    """
+    __tablename__ = "user_sessions"
+    
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    company_id = Column(Integer)
+    username = Column(String(100), nullable=False)
+    role = Column(String(20), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    
+    __table_args__ = (
+        Index('idx_user_sessions_expires_at', 'expires_at'),
+    )
+
+
 class UserCompanyRole(Base):
     """
     Phase 2-1 增强：用户-公司-角色关系表（多租户角色绑定）
@@ -830,6 +852,28 @@ class PeriodClosing(Base):
     )
 
 
+class AccountPeriodBalance(Base):
+    """
+    期末科目余额（月结时物化，分录过账时增量更新）
+    period_* 为本期借贷发生额，closing_* 为截至期末的累计借贷额
+    """
+    __tablename__ = "account_period_balances"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    account_id = Column(Integer, ForeignKey('chart_of_accounts.id', ondelete='CASCADE'), nullable=False)
+    period = Column(String(7), nullable=False)  # 2025-01
+    period_debit = Column(Numeric(18,2), nullable=False, default=0)
+    period_credit = Column(Numeric(18,2), nullable=False, default=0)
+    closing_debit = Column(Numeric(18,2), nullable=False, default=0)
+    closing_credit = Column(Numeric(18,2), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index('idx_account_period_balances_key', 'company_id', 'period', 'account_id', unique=True),
+    )
+
+
 class SystemConfigVersion(Base):
     """
     配置版本锁：追踪系统配置变更（解析规则、文件路径规则、报表生成逻辑）
@@ -9,6 +9,8 @@
 Phase 1-5: Rule Engine - 表驱动规则引擎替代硬编码
 """
 
+import re
+import time
 from typing import Optional, List, Dict, Tuple
 from datetime import datetime, date
 from decimal import Decimal
@@ -20,10 +22,92 @@ from .models import (
     ChartOfAccounts, BankStatement, PurchaseInvoice, SalesInvoice,
     RawLine
 )
-from .db import get_db_session
+from .db import get_db as get_db_session
 from .data_integrity import DataIntegrityValidator
 
 
+# 批量过账每个chunk的记录数（每个chunk一次flush + 一次commit）
+BATCH_CHUNK_SIZE = 1000
+
+
+def _split_keywords(match_keywords: Optional[str]) -> List[str]:
+    """与 _rule_matches 相同的关键词拆分规则"""
+    if not match_keywords:
+        return []
+    return [kw.strip().lower() for kw in match_keywords.split(',')]
+
+
+class CompiledRuleSet:
+    """
+    预编译规则索引（批量过账用）
+
+    - 规则只加载一次，保持 find_matching_rule 的优先级顺序
+    - 所有规则的关键词编译为一个多模式正则，一次扫描得到命中的关键词集合
+    - 匹配结果与 _rule_matches 逐条检查完全一致
+    """
+
+    def __init__(self, rules: List[AutoPostingRule]):
+        self.rules = list(rules)
+        self._rule_keywords: List[Optional[frozenset]] = []
+        self._always_keyword_match: List[bool] = []
+
+        all_keywords = set()
+        for rule in self.rules:
+            keywords = _split_keywords(rule.match_keywords)
+            # 空关键词（如 "a,,b"）在原逻辑中匹配任意文本
+            self._always_keyword_match.append('' in keywords)
+            keywords = frozenset(kw for kw in keywords if kw)
+            self._rule_keywords.append(keywords if rule.match_keywords else None)
+            all_keywords.update(keywords)
+
+        self._pattern = None
+        self._prefix_closure: Dict[str, frozenset] = {}
+        if all_keywords:
+            # 长关键词优先；零宽前瞻允许重叠命中
+            ordered = sorted(all_keywords, key=len, reverse=True)
+            self._pattern = re.compile('(?=(' + '|'.join(re.escape(kw) for kw in ordered) + '))')
+            # 同一位置只会报告最长的关键词，作为其前缀的短关键词同样命中
+            for kw in all_keywords:
+                self._prefix_closure[kw] = frozenset(k for k in all_keywords if kw.startswith(k))
+
+    def _keywords_in(self, text: str) -> set:
+        found = set()
+        if self._pattern is None:
+            return found
+        for m in self._pattern.finditer(text):
+            found |= self._prefix_closure[m.group(1)]
+        return found
+
+    def match(
+        self,
+        transaction_type: str,
+        keywords: Optional[List[str]],
+        amount: Optional[Decimal]
+    ) -> Optional[AutoPostingRule]:
+        text_hits = None
+        if keywords:
+            text_hits = self._keywords_in(' '.join(keywords).lower())
+
+        for i, rule in enumerate(self.rules):
+            if rule.transaction_type and rule.transaction_type != transaction_type:
+                continue
+
+            rule_keywords = self._rule_keywords[i]
+            if rule_keywords is not None and text_hits is not None:
+                if not self._always_keyword_match[i] and not (rule_keywords & text_hits):
+                    continue
+
+            if amount is not None:
+                if rule.min_amount is not None and amount < rule.min_amount:
+                    continue
+                if rule.max_amount is not None and amount > rule.max_amount:
+                    continue
+
+            return rule
+
+        return None
+
+
 class PostingRuleEngine:
     """自动过账规则引擎"""
     
@@ -64,6 +148,16 @@ class PostingRuleEngine:
         Returns:
             匹配的规则，如果没有则返回None
         """
+        all_rules = self._load_active_rules(company_id, source_type)
+        
+        for rule in all_rules:
+            if self._rule_matches(rule, transaction_type, keywords, amount):
+                return rule
+        
+        return None
+    
+    def _load_active_rules(self, company_id: int, source_type: str) -> List[AutoPostingRule]:
+        """加载公司级 + 全局启用规则（按优先级排序）"""
         stmt = select(AutoPostingRule).where(
             and_(
                 or_(
@@ -80,13 +174,11 @@ class PostingRuleEngine:
         )
         
         result = self.db.execute(stmt)
-        all_rules = result.scalars().all()
-        
-        for rule in all_rules:
-            if self._rule_matches(rule, transaction_type, keywords, amount):
-                return rule
-        
-        return None
+        return result.scalars().all()
+    
+    def compile_rules(self, company_id: int, source_type: str) -> CompiledRuleSet:
+        """加载一次规则并编译为多模式匹配索引"""
+        return CompiledRuleSet(self._load_active_rules(company_id, source_type))
     
     def _rule_matches(
         self,
@@ -342,51 +434,7 @@ class PostingRuleEngine:
         errors = []
         
         if source_type == 'bank_statement':
-            stmt = select(BankStatement).where(
-                and_(
-                    BankStatement.company_id == company_id,
-                    BankStatement.is_posted == False
-                )
-            )
-            if limit:
-                stmt = stmt.limit(limit)
-            
-            result = self.db.execute(stmt)
-            records = result.scalars().all()
-            
-            for record in records:
-                processed += 1
-                try:
-                    keywords = [record.description] if record.description else []
-                    amount = record.debit_amount or record.credit_amount
-                    transaction_type = 'deposit' if record.debit_amount else 'withdrawal'
-                    
-                    rule = self.find_matching_rule(
-                        company_id,
-                        source_type,
-                        transaction_type,
-                        keywords,
-                        amount
-                    )
-                    
-                    if rule:
-                        self.apply_rule_to_bank_statement(record, rule, created_by)
-                        record.is_posted = True
-                        success += 1
-                    else:
-                        errors.append({
-                            'id': record.id,
-                            'error': '未找到匹配规则 / No matching rule found'
-                        })
-                        failed += 1
-                except Exception as e:
-                    errors.append({
-                        'id': record.id,
-                        'error': str(e)
-                    })
-                    failed += 1
-            
-            self.db.commit()
+            return self.batch_apply_bank_statement_rules(company_id, created_by, limit)
         
         elif source_type == 'purchase_invoice':
             stmt = select(PurchaseInvoice).where(
@@ -485,6 +533,170 @@ class PostingRuleEngine:
             'errors': errors
         }
     
+    def batch_apply_bank_statement_rules(
+        self,
+        company_id: int,
+        created_by: str,
+        limit: Optional[int] = None,
+        chunk_size: int = BATCH_CHUNK_SIZE
+    ) -> Dict:
+        """
+        批量模式：银行对账单自动过账
+        
+        - 公司级 + 全局规则只加载一次，编译为多模式匹配索引
+        - 待过账记录按ID分chunk查询（不一次加载全部记录）
+        - 会计分录及分录行按chunk批量写入，每个chunk一次flush + 一次commit；
+          commit 时不过期已加载的对象，规则与后续记录不会逐行重新查询
+        
+        Returns:
+            batch_apply_rules 的结果，另含 elapsed_seconds / rows_per_sec
+        """
+        started = time.perf_counter()
+        processed = 0
+        success = 0
+        failed = 0
+        errors = []
+        
+        rule_set = self.compile_rules(company_id, 'bank_statement')
+        
+        expire_on_commit = self.db.expire_on_commit
+        self.db.expire_on_commit = False
+        try:
+            last_id = 0
+            while not limit or processed < limit:
+                size = min(chunk_size, limit - processed) if limit else chunk_size
+                # 按ID分页：未匹配规则的记录保持未过账，不会被重复领取
+                chunk = self.db.execute(
+                    select(BankStatement).where(
+                        and_(
+                            BankStatement.company_id == company_id,
+                            BankStatement.is_posted == False,
+                            BankStatement.id > last_id
+                        )
+                    ).order_by(BankStatement.id).limit(size)
+                ).scalars().all()
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+                
+                chunk_result = self._post_bank_statement_chunk(chunk, rule_set, created_by)
+                processed += len(chunk)
+                success += chunk_result['success']
+                failed += chunk_result['failed']
+                errors.extend(chunk_result['errors'])
+                if len(chunk) < size:
+                    break
+        finally:
+            self.db.expire_on_commit = expire_on_commit
+        
+        elapsed = time.perf_counter() - started
+        return {
+            'processed': processed,
+            'success': success,
+            'failed': failed,
+            'errors': errors,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_sec': round(processed / elapsed, 1) if elapsed > 0 else None
+        }
+    
+    def _post_bank_statement_chunk(
+        self,
+        chunk: List[BankStatement],
+        rule_set: CompiledRuleSet,
+        created_by: str
+    ) -> Dict:
+        """一个chunk的银行对账单过账：一次flush + 一次commit"""
+        success = 0
+        failed = 0
+        errors = []
+        pending = []
+        
+        for record in chunk:
+            keywords = [record.description] if record.description else []
+            transaction_type = 'deposit' if record.debit_amount else 'withdrawal'
+            is_debit = record.debit_amount and record.debit_amount > 0
+            amount = record.debit_amount if is_debit else record.credit_amount
+            
+            rule = rule_set.match(
+                transaction_type,
+                keywords,
+                record.debit_amount or record.credit_amount
+            )
+            if not rule:
+                errors.append({
+                    'id': record.id,
+                    'error': '未找到匹配规则 / No matching rule found'
+                })
+                failed += 1
+                continue
+            
+            if not amount or amount <= 0:
+                errors.append({
+                    'id': record.id,
+                    'error': '交易金额无效 / Invalid transaction amount'
+                })
+                failed += 1
+                continue
+            
+            description = record.description or rule.description_template
+            entry = JournalEntry(
+                company_id=record.company_id,
+                entry_date=record.transaction_date,
+                entry_type='automatic',
+                reference_number=f"BS-{record.id}",
+                description=description,
+                total_debit=amount,
+                total_credit=amount,
+                source_type='bank_statement',
+                source_id=record.id,
+                created_by=created_by,
+                is_posted=False
+            )
+            pending.append((record, rule, entry, amount, description))
+        
+        if not pending:
+            return {'success': success, 'failed': failed, 'errors': errors}
+        
+        try:
+            self.db.add_all([item[2] for item in pending])
+            self.db.flush()
+            
+            lines = []
+            for record, rule, entry, amount, description in pending:
+                lines.append(JournalEntryLine(
+                    journal_entry_id=entry.id,
+                    account_id=rule.debit_account_id,
+                    description=description,
+                    debit_amount=amount,
+                    credit_amount=Decimal('0'),
+                    line_number=1,
+                    raw_line_id=record.raw_line_id
+                ))
+                lines.append(JournalEntryLine(
+                    journal_entry_id=entry.id,
+                    account_id=rule.credit_account_id,
+                    description=description,
+                    debit_amount=Decimal('0'),
+                    credit_amount=amount,
+                    line_number=2,
+                    raw_line_id=record.raw_line_id
+                ))
+                record.is_posted = True
+            
+            self.db.add_all(lines)
+            self.db.commit()
+            success += len(pending)
+        except Exception as e:
+            self.db.rollback()
+            for record, *_ in pending:
+                errors.append({
+                    'id': record.id,
+                    'error': str(e)
+                })
+            failed += len(pending)
+        
+        return {'success': success, 'failed': failed, 'errors': errors}
+    
     def create_rule(
         self,
         source_type: str,
@@ -3,6 +3,7 @@ from flask import session, jsonify
 from sqlalchemy import select, and_
 from accounting_app.db import SessionLocal
 from accounting_app.models import User, Permission
+from accounting_app.services.permission_cache import invalidate_permissions
 
 
 def get_current_user():
@@ -172,6 +173,8 @@ def init_default_permissions():
                 count_added += 1
         
         db.commit()
+        if count_added:
+            invalidate_permissions()
         
         print("✅ RBAC权限系统初始化完成")
         print(f"   - 新增 {count_added} 个权限记录")
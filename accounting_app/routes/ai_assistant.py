@@ -10,11 +10,27 @@ from datetime import datetime
 import traceback
 import sqlite3
 
-# 导入统一AI客户端
-from accounting_app.utils.ai_client import get_ai_client
+# 导入统一AI客户端（异步：线程池执行 + 并发上限 + 回复缓存）
+from accounting_app.utils.ai_client import get_async_ai_client
+from accounting_app.services.system_snapshot import SNAPSHOT_DB_PATH, get_system_snapshot
+from accounting_app.utils.db_executor import run_db
 
 router = APIRouter()
 
+
+def _save_ai_log(query: str, response: str):
+    """记录到ai_logs（同步，在线程池中执行）"""
+    db = sqlite3.connect(SNAPSHOT_DB_PATH)
+    try:
+        db.execute("""
+            INSERT INTO ai_logs (query, response, created_at)
+            VALUES (?, ?, ?)
+        """, (query, response, datetime.utcnow().isoformat()))
+        db.commit()
+    finally:
+        db.close()
+
+
 @router.post("/api/ai-assistant/query")
 async def ai_assistant_query(request: Request):
     """
@@ -28,39 +44,25 @@ async def ai_assistant_query(request: Request):
         if not msg or not msg.strip():
             return {"error": "请输入问题"}
         
-        # 连接SQLite数据库
-        db = sqlite3.connect('db/smart_loan_manager.db')
-        db.row_factory = sqlite3.Row
-        cursor = db.cursor()
-        
-        # 获取储蓄账户统计数据
-        cursor.execute("""
-            SELECT 
-                COUNT(DISTINCT sa.id) as total_accounts,
-                COUNT(DISTINCT st.id) as total_transactions,
-                COALESCE(SUM(CASE WHEN st.transaction_type = 'CR' THEN st.amount ELSE 0 END), 0) as total_credits,
-                COALESCE(SUM(CASE WHEN st.transaction_type = 'DR' THEN st.amount ELSE 0 END), 0) as total_debits
-            FROM savings_accounts sa
-            LEFT JOIN savings_statements ss ON sa.id = ss.savings_account_id
-            LEFT JOIN savings_transactions st ON ss.id = st.savings_statement_id
-        """)
-        savings_data = dict(cursor.fetchone())
+        # 储蓄账户统计数据（共享系统快照）
+        snapshot = await run_db(get_system_snapshot)
+        savings_data = snapshot.savings
         
         # 构建上下文
         context = f"""
 储蓄账户概况：
-- 账户数量：{savings_data['total_accounts']}个
-- 交易记录：{savings_data['total_transactions']}笔
+- 账户数量：{savings_data['accounts']}个
+- 交易记录：{savings_data['transactions']}笔
 - 总收入（CR）：RM {savings_data['total_credits']:.2f}
 - 总支出（DR）：RM {savings_data['total_debits']:.2f}
-- 净余额：RM {(savings_data['total_credits'] - savings_data['total_debits']):.2f}
+- 净余额：RM {snapshot.savings_balance:.2f}
 
 客户提问：{msg}
 """
         
         # 调用AI（V3智能升级：自动选择Perplexity/OpenAI）
-        client = get_ai_client()
-        response = client.chat(
+        client = get_async_ai_client()
+        reply = await client.chat(
             messages=[
                 {
                     "role": "system", 
@@ -72,18 +74,12 @@ async def ai_assistant_query(request: Request):
                 }
             ],
             temperature=0.7,
-            max_tokens=500
+            max_tokens=500,
+            snapshot_version=snapshot.version
         )
         
-        reply = response  # AI客户端已返回字符串
-        
         # 记录到数据库
-        cursor.execute("""
-            INSERT INTO ai_logs (query, response, created_at)
-            VALUES (?, ?, ?)
-        """, (msg, reply, datetime.utcnow().isoformat()))
-        db.commit()
-        db.close()
+        await run_db(_save_ai_log, msg, reply)
         
         return {"reply": reply, "timestamp": datetime.utcnow().isoformat()}
         
@@ -99,57 +95,10 @@ async def analyze_system(request: Request):
     功能：分析Savings + Credit Card + Loans整体财务健康状况
     """
     try:
-        # 连接SQLite数据库
-        db = sqlite3.connect('db/smart_loan_manager.db')
-        db.row_factory = sqlite3.Row
-        cursor = db.cursor()
-        
-        # 1. 储蓄账户统计
-        cursor.execute("""
-            SELECT 
-                COUNT(DISTINCT sa.id) as accounts,
-                COALESCE(SUM(CASE WHEN st.transaction_type = 'CR' THEN st.amount ELSE 0 END), 0) as total_credits,
-                COALESCE(SUM(CASE WHEN st.transaction_type = 'DR' THEN st.amount ELSE 0 END), 0) as total_debits
-            FROM savings_accounts sa
-            LEFT JOIN savings_statements ss ON sa.id = ss.savings_account_id
-            LEFT JOIN savings_transactions st ON ss.id = st.savings_statement_id
-        """)
-        savings = dict(cursor.fetchone())
-        savings_balance = savings['total_credits'] - savings['total_debits']
-        
-        # 2. 信用卡统计（从月结单获取最新余额）
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='monthly_statements'")
-        if cursor.fetchone():
-            cursor.execute("""
-                SELECT 
-                    COUNT(DISTINCT cc.id) as cards,
-                    COALESCE(SUM(cc.credit_limit), 0) as total_limit,
-                    COALESCE(
-                        (SELECT SUM(closing_balance_total) 
-                         FROM monthly_statements 
-                         WHERE id IN (
-                             SELECT MAX(id) FROM monthly_statements GROUP BY customer_id, bank_name
-                         )), 0
-                    ) as total_balance
-                FROM credit_cards cc
-            """)
-            credit = dict(cursor.fetchone())
-        else:
-            credit = {"cards": 0, "total_limit": 0, "total_balance": 0}
-        
-        # 3. 贷款统计（如果表存在）
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='loans'")
-        if cursor.fetchone():
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as loans,
-                    COALESCE(SUM(loan_amount), 0) as total_amount,
-                    COALESCE(SUM(remaining_balance), 0) as total_remaining
-                FROM loans
-            """)
-            loans = dict(cursor.fetchone())
-        else:
-            loans = {"loans": 0, "total_amount": 0, "total_remaining": 0}
+        # 储蓄 / 信用卡 / 贷款统计（共享系统快照）
+        snapshot = await run_db(get_system_snapshot)
+        savings, credit, loans = snapshot.savings, snapshot.credit, snapshot.loans
+        savings_balance = snapshot.savings_balance
         
         # 构建综合分析上下文
         context = f"""
@@ -165,7 +114,7 @@ async def analyze_system(request: Request):
 - 卡数量：{credit['cards']}张
 - 总额度：RM {credit['total_limit']:.2f}
 - 当前欠款：RM {credit['total_balance']:.2f}
-- 使用率：{(credit['total_balance']/credit['total_limit']*100 if credit['total_limit'] > 0 else 0):.1f}%
+- 使用率：{snapshot.credit_usage:.1f}%
 
 🏦 贷款：
 - 贷款数：{loans['loans']}笔
@@ -178,9 +127,9 @@ async def analyze_system(request: Request):
 3. 优化建议
 """
         
-        # 调用AI生成报告（V3智能升级）
-        client = get_ai_client()
-        report = client.chat(
+        # 调用AI生成报告（V3智能升级）；数据未变化时直接返回缓存的报告
+        client = get_async_ai_client()
+        report = await client.chat(
             messages=[
                 {
                     "role": "system",
@@ -192,16 +141,12 @@ async def analyze_system(request: Request):
                 }
             ],
             temperature=0.7,
-            max_tokens=800
+            max_tokens=800,
+            snapshot_version=snapshot.version
         )
         
         # 记录到数据库
-        cursor.execute("""
-            INSERT INTO ai_logs (query, response, created_at)
-            VALUES (?, ?, ?)
-        """, ("系统财务分析", report, datetime.utcnow().isoformat()))
-        db.commit()
-        db.close()
+        await run_db(_save_ai_log, "系统财务分析", report)
         
         return {
             "analysis": report,
@@ -230,12 +175,12 @@ async def analyze_system(request: Request):
 
 
 @router.get("/api/ai-assistant/history")
-async def get_ai_history(limit: int = 20):
+def get_ai_history(limit: int = 20):
     """
-    获取AI对话历史
+    获取AI对话历史（同步sqlite3查询，由FastAPI在线程池中执行）
     """
     try:
-        db = sqlite3.connect('db/smart_loan_manager.db')
+        db = sqlite3.connect(SNAPSHOT_DB_PATH)
         db.row_factory = sqlite3.Row
         cursor = db.cursor()
         
@@ -256,13 +201,13 @@ async def get_ai_history(limit: int = 20):
 
 
 @router.get("/api/ai-assistant/reports")
-async def get_recent_ai_reports():
+def get_recent_ai_reports():
     """
     返回最近7天的AI日报摘要，用于Dashboard展示
-    V2企业智能版新增
+    V2企业智能版新增（同步sqlite3查询，由FastAPI在线程池中执行）
     """
     try:
-        db = sqlite3.connect('db/smart_loan_manager.db')
+        db = sqlite3.connect(SNAPSHOT_DB_PATH)
         db.row_factory = sqlite3.Row
         cursor = db.cursor()
         
@@ -109,6 +109,23 @@ async def ai_trends(customer_id: int):
     return data
 
 
+# ======================================================
+# 全部客户健康评分（一次计算）
+# GET /api/ai-assistant/health-scores
+# ======================================================
+@router.get("/api/ai-assistant/health-scores")
+def ai_health_scores():
+    """
+    一次计算所有有月结单数据的客户的健康评分（不含AI解释）
+    读取客户月度特征表，评分规则向量化计算
+    """
+    scores = HealthEngine().calculate_portfolio_health_scores()
+    return {
+        "count": len(scores),
+        "scores": [{"customer_id": customer_id, **score} for customer_id, score in scores.items()]
+    }
+
+
 # ======================================================
 # 3) 财务健康评分（轻量版）
 # GET /api/ai-assistant/health-score/{customer_id}
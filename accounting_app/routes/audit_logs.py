@@ -16,6 +16,7 @@ from ..db import get_db
 from ..models import AuditLog
 from ..schemas.audit_schemas import AuditLogResponse, AuditLogList, AuditLogFilter
 from ..utils.audit_logger import AuditLogger
+from ..utils.db_executor import run_db
 
 router = APIRouter(prefix="/api/audit-logs", tags=["Audit Logs"])
 
@@ -79,6 +80,11 @@ async def record_upload_event(
     }
     ```
     """
+    # 同步写入审计日志（需要返回audit_log_id），在数据库线程池中执行
+    return await run_db(_record_upload_event, event, db)
+
+
+def _record_upload_event(event: FlaskUploadEvent, db: Session) -> dict:
     try:
         # 使用AuditLogger记录上传事件
         audit_logger = AuditLogger(db)
@@ -128,7 +134,8 @@ async def record_upload_event(
             user_agent=event.user_agent,
             new_value=new_value,
             success=event.success,
-            error_message=event.error_message
+            error_message=event.error_message,
+            sync=True  # 响应中返回audit_log_id
         )
         
         # 关闭独立Session
@@ -3,10 +3,12 @@
 """
 from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List
 import csv
 import io
 import hashlib
+import json
 from datetime import datetime
 from decimal import Decimal
 
@@ -15,6 +17,7 @@ from ..models import BankStatement, JournalEntry, JournalEntryLine, ChartOfAccou
 from ..schemas import BankStatementResponse
 from ..schemas.validators import validate_yyyy_mm
 from ..services.bank_matcher import auto_match_transactions
+from ..services.bank_statement_import import ingest_bank_statement_csv
 from ..services.statement_analyzer import analyze_csv_content, suggest_customer_match
 from ..services.file_storage_manager import AccountingFileStorageManager
 
@@ -28,7 +31,7 @@ router = APIRouter()
     
     **数据完整性保证（1:1原件保护）：**
     - 所有上传文件都会保存到文件系统（包括验证失败的文件）
-    - 每行CSV原文保存到raw_lines表，确保100%可追溯
+    - 每行CSV原文保存到raw_lines表，确保100%可追溯（按块多行写入）
     - 验证失败时完全回滚，不插入任何业务记录（全部或无原则）
     
     **CSV格式要求：**
@@ -114,6 +117,33 @@ async def import_bank_statement(
     
     # 读取CSV文件
     content = await file.read()
+    
+    # 文件保存、逐行入库、验证与自动匹配都是阻塞操作，放到线程池执行，不占用事件循环
+    result = await run_in_threadpool(
+        _import_bank_statement_sync, db, company_id, bank_name, account_number,
+        statement_month, file.filename, content
+    )
+    
+    if result.get('validation_errors'):
+        raise HTTPException(status_code=422, detail=result['validation_errors'])
+    
+    return result
+
+
+def _import_bank_statement_sync(
+    db: Session,
+    company_id: int,
+    bank_name: str,
+    account_number: str,
+    statement_month: str,
+    filename: str,
+    content: bytes
+) -> dict:
+    """
+    保存原件、批量写入raw_lines / bank_statements 并自动匹配（在工作线程中执行）
+    
+    验证失败时返回 {'validation_errors': 422响应的detail}，raw_document + raw_lines + 异常记录已提交
+    """
     csv_content = content.decode('utf-8')
     
     # 计算文件哈希
@@ -134,7 +164,7 @@ async def import_bank_statement(
     # Step 1: 创建raw_document记录（原件追踪）
     raw_doc = RawDocument(
         company_id=company_id,
-        file_name=file.filename,
+        file_name=filename,
         file_hash=file_hash,
         file_size=len(content),
         storage_path=file_path,
@@ -146,103 +176,30 @@ async def import_bank_statement(
     db.add(raw_doc)
     db.flush()  # 获取raw_doc.id
     
-    # Step 2: 解析CSV并保存每行原文到raw_lines（暂不commit）
-    csv_reader = csv.DictReader(io.StringIO(csv_content))
-    validation_errors = []
-    raw_lines = []
-    line_no = 1  # CSV行号（不含header）
-    
-    for row in csv_reader:
-        # 将整行转为字符串保存原文
-        raw_text = str(row)
-        
-        # 创建raw_line记录
-        raw_line = RawLine(
-            raw_document_id=raw_doc.id,
-            line_no=line_no,
-            raw_text=raw_text,
-            is_parsed=False
-        )
-        db.add(raw_line)
-        db.flush()  # 获取raw_line.id
-        raw_lines.append((raw_line, row))
-        line_no += 1
-    
-    # 注意：此处不commit，等验证通过后再commit
-    
-    # Step 3: 严格验证每行数据（禁止自动补数据）
-    # 使用临时列表，验证全部通过后才批量插入（保证全部或无）
-    validated_statements = []
-    imported_count = 0
-    
-    for raw_line, row in raw_lines:
-        line_errors = []
-        
-        # 必填字段验证：Date
-        date_str = row.get('Date', '').strip()
-        if not date_str:
-            line_errors.append(f"缺失必填字段 'Date'")
-        else:
-            try:
-                transaction_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            except ValueError:
-                line_errors.append(f"Date格式错误（应为YYYY-MM-DD）: {date_str}")
-        
-        # 必填字段验证：Description
-        description = row.get('Description', '').strip()
-        if not description:
-            line_errors.append(f"缺失必填字段 'Description'")
-        
-        # 如果有验证错误，记录并跳过该行
-        if line_errors:
-            error_msg = f"第{raw_line.line_no}行验证失败: {'; '.join(line_errors)}"
-            validation_errors.append(error_msg)
-            continue
-        
-        # 验证通过，解析可选字段（不自动补0）
-        try:
-            debit_str = row.get('Debit', '').strip()
-            credit_str = row.get('Credit', '').strip()
-            balance_str = row.get('Balance', '').strip()
-            
-            debit_amount = Decimal(debit_str) if debit_str else Decimal('0')
-            credit_amount = Decimal(credit_str) if credit_str else Decimal('0')
-            balance = Decimal(balance_str) if balance_str else None
-            reference = row.get('Reference', '').strip()
-            
-            # 暂存到临时列表（不立即添加到db）
-            validated_statements.append({
-                'raw_line': raw_line,
-                'transaction_date': transaction_date,
-                'description': description,
-                'debit_amount': debit_amount,
-                'credit_amount': credit_amount,
-                'balance': balance,
-                'reference': reference
-            })
-            imported_count += 1
-            
-        except Exception as e:
-            validation_errors.append(f"第{raw_line.line_no}行解析失败: {str(e)}")
-            continue
+    # Step 2-3: 按块写入每行原文到raw_lines并严格验证（禁止自动补数据）
+    # 验证全部通过才写入bank_statements（全部或无）；此处不commit
+    ingest = ingest_bank_statement_csv(
+        db, raw_doc.id, csv_content,
+        company_id=company_id,
+        bank_name=bank_name,
+        account_number=account_number,
+        statement_month=statement_month
+    )
+    validation_errors = ingest.validation_errors
     
     # Step 4: 处理验证结果
     if validation_errors:
-        # 验证失败：直接更新已flush的raw_document和raw_lines状态（不rollback！）
-        # 这确保真正的单一事务，避免rollback+recreate的gap window
+        # 验证失败：直接更新已flush的raw_document状态（不rollback！）
+        # raw_lines已经写入，它们的is_parsed=False已经正确表示验证失败
         raw_doc.status = 'failed'
         raw_doc.validation_status = 'failed'
         raw_doc.validation_failed_at = datetime.now()
         raw_doc.validation_error_message = "\n".join(validation_errors)
-        raw_doc.total_lines = len(raw_lines)
+        raw_doc.total_lines = ingest.total_lines
         raw_doc.parsed_lines = 0
         
-        # raw_lines已经存在并flush，无需重新创建
-        # 它们的is_parsed=False已经正确表示验证失败
-        
         # 创建异常记录（直接在当前事务中）
         # exception + raw_document + raw_lines 在同一原子事务中commit
-        import json
         exception_record = ExceptionModel(
             company_id=company_id,
             exception_type='pdf_parse',  # CSV验证失败归类为文件解析错误
@@ -251,9 +208,9 @@ async def import_bank_statement(
             source_id=raw_doc.id,
             error_message=f"CSV验证失败：{len(validation_errors)}个错误",
             raw_data=json.dumps({
-                'file_name': file.filename,
-                'total_lines': len(raw_lines),
-                'imported': imported_count,
+                'file_name': filename,
+                'total_lines': ingest.total_lines,
+                'imported': ingest.imported,
                 'errors': validation_errors
             }, ensure_ascii=False),
             status='new'
@@ -261,42 +218,23 @@ async def import_bank_statement(
         db.add(exception_record)
         
         # 一次性原子commit（raw_document + raw_lines + exception）
-        # 真正的单一事务，无gap window，满足1:1原件保护的原子性要求
         db.commit()
         
-        raise HTTPException(
-            status_code=422,
-            detail={
+        return {
+            'validation_errors': {
                 "error": "数据验证失败",
-                "message": f"文件已保存但验证失败。共{len(raw_lines)}行，{len(validation_errors)}行有错误。",
+                "message": f"文件已保存但验证失败。共{ingest.total_lines}行，{len(validation_errors)}行有错误。",
                 "file_saved": file_path,
                 "validation_errors": validation_errors[:10],  # 只返回前10个错误
                 "total_errors": len(validation_errors)
             }
-        )
-    
-    # 验证成功：批量插入bank_statements（全部或无原则）
-    for stmt_data in validated_statements:
-        bank_stmt = BankStatement(
-            company_id=company_id,
-            bank_name=bank_name,
-            account_number=account_number,
-            statement_month=statement_month,
-            transaction_date=stmt_data['transaction_date'],
-            description=stmt_data['description'],
-            reference_number=stmt_data['reference'],
-            debit_amount=stmt_data['debit_amount'],
-            credit_amount=stmt_data['credit_amount'],
-            balance=stmt_data['balance'],
-            matched=False,
-            raw_line_id=stmt_data['raw_line'].id
-        )
-        db.add(bank_stmt)
-        stmt_data['raw_line'].is_parsed = True
+        }
     
-    # 更新raw_document状态
+    # 验证成功：bank_statements已批量写入，更新raw_document状态
+    imported_count = ingest.imported
     raw_doc.validation_status = 'passed'
     raw_doc.status = 'parsed'
+    raw_doc.total_lines = ingest.total_lines
     raw_doc.parsed_lines = imported_count
     db.commit()
     
@@ -17,6 +17,7 @@ from ..services.pdf_parser import PDFParser
 from ..services.income_parser import IncomeParser
 from ..services.income_standardizer import IncomeStandardizer
 from ..utils.file_hash import calculate_uploaded_file_hash
+from ..utils.db_executor import run_cpu, run_db
 from ..models import Customer
 
 router = APIRouter(prefix="/api/income-documents", tags=["Income Documents"])
@@ -110,127 +111,14 @@ async def upload_income_document(
     """
     
     try:
-        # 1. 验证客户存在
-        customer = db.query(Customer).filter(Customer.id == customer_id).first()
-        if not customer:
-            raise HTTPException(status_code=404, detail=f"客户ID {customer_id} 不存在")
-        
-        # 2. 验证document_type和document_month
-        document_type = validate_document_type(document_type)
-        year, month = validate_document_month(document_month)
-        
-        # 3. 读取文件内容
+        # 读取上传内容后，数据库操作与文件写入在数据库线程池中执行，OCR解析在CPU线程池中执行
         file_content = await file.read()
-        file_size = len(file_content)
-        
-        # 4. 计算文件hash
         await file.seek(0)
-        file_hash = calculate_uploaded_file_hash(file.file)
-        
-        # 5. 生成存储路径（收入文件专用目录）
-        sanitized_filename = AccountingFileStorageManager.sanitize_filename(file.filename)
-        
-        storage_path = os.path.join(
-            AccountingFileStorageManager.BASE_DIR,
-            str(company_id),
-            'income_documents',
-            str(customer_id),
-            year,
-            month,
-            f"{document_type}_{sanitized_filename}"
-        )
-        storage_path = storage_path.replace('\\', '/')
-        
-        # 6. 保存文件到磁盘
-        directory = os.path.dirname(storage_path)
-        AccountingFileStorageManager.ensure_directory(directory)
-        with open(storage_path, 'wb') as f:
-            f.write(file_content)
-        
-        # 7. 创建RawDocument原件记录
-        raw_doc_service = RawDocumentService(db)
-        raw_doc = raw_doc_service.create_raw_document(
-            company_id=company_id,
-            file_name=file.filename,
-            storage_path=storage_path,
-            file_hash=file_hash,
-            file_size=file_size,
-            source_engine='fastapi',
-            module='income',
-            uploaded_by=None
-        )
-        
-        # 8. OCR解析，提取收入金额
-        parser = PDFParser(enable_ocr=True, ocr_language='eng+chi_sim')
-        parse_result = parser.parse(storage_path)
-        
-        # 9. 提取收入金额（从OCR结果或文本中）
-        extracted_income = 0.0
-        confidence = parse_result.confidence
-        ocr_method = parse_result.method
-        raw_text = parse_result.text_content
-        
-        if parse_result.success:
-            extracted_income = _extract_income_amount(
-                parse_result.text_content,
-                parse_result.extracted_data,
-                document_type
-            )
-        
-        # 10. 解析结构化收入数据
-        parsed_income = IncomeParser.parse_income_from_text(raw_text)
-        
-        # 11. 标准化收入数据（统一收入模型）
-        standardized_income = IncomeStandardizer.standardize(
-            structured_income=parsed_income,
-            document_type=document_type,
-            confidence=confidence
-        )
-        
-        # 12. 注册到file_index统一索引
-        file_size_kb = int(file_size / 1024)
-        
-        file_index = UnifiedFileService.register_file(
-            db=db,
-            company_id=company_id,
-            filename=file.filename,
-            file_path=storage_path,
-            module='income',
-            from_engine='fastapi',
-            file_size_kb=file_size_kb,
-            validation_status='pending',
-            status='active',
-            period=document_month,
-            raw_document_id=raw_doc.id,
-            metadata={
-                'customer_id': customer_id,
-                'customer_name': customer.name,
-                'document_type': document_type,
-                'income_detected': extracted_income,
-                'ocr_confidence': confidence,
-                'ocr_method': ocr_method,
-                'structured_income': parsed_income,
-                'standardized_income': standardized_income
-            }
-        )
-        
-        # 13. 返回结果
-        return {
-            "status": "success",
-            "message": "收入文件上传成功",
-            "file_id": file_index.id,
-            "raw_document_id": raw_doc.id,
-            "customer_id": customer_id,
-            "customer_name": customer.name,
-            "document_type": document_type,
-            "document_month": document_month,
-            "storage_path": storage_path,
-            "income_detected": extracted_income,
-            "confidence": confidence,
-            "raw_text": raw_text,
-            "structured_income": parsed_income,
-            "standardized_income": standardized_income
-        }
+        stored = await run_db(_store_income_document, db, customer_id, document_type, document_month,
+                              file, file_content, company_id)
+        parsed = await run_cpu(_parse_income_document, stored["storage_path"], stored["document_type"])
+        return await run_db(_register_income_document, db, stored, parsed, customer_id, document_month,
+                            company_id)
         
     except HTTPException:
         raise
@@ -241,6 +129,154 @@ async def upload_income_document(
         )
 
 
+def _store_income_document(db: Session, customer_id: int, document_type: str, document_month: str,
+                           file: UploadFile, file_content: bytes, company_id: int) -> dict:
+    # 1. 验证客户存在
+    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    if not customer:
+        raise HTTPException(status_code=404, detail=f"客户ID {customer_id} 不存在")
+    customer_name = customer.name
+    
+    # 2. 验证document_type和document_month
+    document_type = validate_document_type(document_type)
+    year, month = validate_document_month(document_month)
+    
+    # 3. 文件内容（路由中已读取）
+    file_size = len(file_content)
+    
+    # 4. 计算文件hash
+    file_hash = calculate_uploaded_file_hash(file.file)
+    
+    # 5. 生成存储路径（收入文件专用目录）
+    sanitized_filename = AccountingFileStorageManager.sanitize_filename(file.filename)
+    
+    storage_path = os.path.join(
+        AccountingFileStorageManager.BASE_DIR,
+        str(company_id),
+        'income_documents',
+        str(customer_id),
+        year,
+        month,
+        f"{document_type}_{sanitized_filename}"
+    )
+    storage_path = storage_path.replace('\\', '/')
+    
+    # 6. 保存文件到磁盘
+    directory = os.path.dirname(storage_path)
+    AccountingFileStorageManager.ensure_directory(directory)
+    with open(storage_path, 'wb') as f:
+        f.write(file_content)
+    
+    # 7. 创建RawDocument原件记录
+    raw_doc_service = RawDocumentService(db)
+    raw_doc = raw_doc_service.create_raw_document(
+        company_id=company_id,
+        file_name=file.filename,
+        storage_path=storage_path,
+        file_hash=file_hash,
+        file_size=file_size,
+        source_engine='fastapi',
+        module='income',
+        uploaded_by=None
+    )
+    
+    return {
+        "raw_document_id": raw_doc.id,
+        "customer_name": customer_name,
+        "document_type": document_type,
+        "file_name": file.filename,
+        "file_size": file_size,
+        "storage_path": storage_path,
+    }
+
+
+def _parse_income_document(storage_path: str, document_type: str) -> dict:
+    """OCR解析已保存的收入文件（不访问数据库，在CPU线程池中执行）"""
+    # 8. OCR解析，提取收入金额
+    parser = PDFParser(enable_ocr=True, ocr_language='eng+chi_sim')
+    parse_result = parser.parse(storage_path)
+    
+    # 9. 提取收入金额（从OCR结果或文本中）
+    extracted_income = 0.0
+    confidence = parse_result.confidence
+    ocr_method = parse_result.method
+    raw_text = parse_result.text_content
+    
+    if parse_result.success:
+        extracted_income = _extract_income_amount(
+            parse_result.text_content,
+            parse_result.extracted_data,
+            document_type
+        )
+    
+    # 10. 解析结构化收入数据
+    parsed_income = IncomeParser.parse_income_from_text(raw_text)
+    
+    # 11. 标准化收入数据（统一收入模型）
+    standardized_income = IncomeStandardizer.standardize(
+        structured_income=parsed_income,
+        document_type=document_type,
+        confidence=confidence
+    )
+    
+    return {
+        "income_detected": extracted_income,
+        "confidence": confidence,
+        "ocr_method": ocr_method,
+        "raw_text": raw_text,
+        "structured_income": parsed_income,
+        "standardized_income": standardized_income,
+    }
+
+
+def _register_income_document(db: Session, stored: dict, parsed: dict, customer_id: int,
+                              document_month: str, company_id: int) -> dict:
+    # 12. 注册到file_index统一索引
+    file_size_kb = int(stored["file_size"] / 1024)
+    
+    file_index = UnifiedFileService.register_file(
+        db=db,
+        company_id=company_id,
+        filename=stored["file_name"],
+        file_path=stored["storage_path"],
+        module='income',
+        from_engine='fastapi',
+        file_size_kb=file_size_kb,
+        validation_status='pending',
+        status='active',
+        period=document_month,
+        raw_document_id=stored["raw_document_id"],
+        metadata={
+            'customer_id': customer_id,
+            'customer_name': stored["customer_name"],
+            'document_type': stored["document_type"],
+            'income_detected': parsed["income_detected"],
+            'ocr_confidence': parsed["confidence"],
+            'ocr_method': parsed["ocr_method"],
+            'structured_income': parsed["structured_income"],
+            'standardized_income': parsed["standardized_income"]
+        }
+    )
+    
+    # 13. 返回结果
+    return {
+        "status": "success",
+        "message": "收入文件上传成功",
+        "file_id": file_index.id,
+        "raw_document_id": stored["raw_document_id"],
+        "customer_id": customer_id,
+        "customer_name": stored["customer_name"],
+        "document_type": stored["document_type"],
+        "document_month": document_month,
+        "storage_path": stored["storage_path"],
+        "income_detected": parsed["income_detected"],
+        "confidence": parsed["confidence"],
+        "raw_text": parsed["raw_text"],
+        "structured_income": parsed["structured_income"],
+        "standardized_income": parsed["standardized_income"]
+    }
+
+
 @router.get("/customer/{customer_id}")
 async def get_customer_income_documents(
     customer_id: int,
@@ -250,6 +286,10 @@ async def get_customer_income_documents(
     """
     获取客户的所有收入文件
     """
+    return await run_db(_list_customer_income_documents, db, customer_id, company_id)
+
+
+def _list_customer_income_documents(db: Session, customer_id: int, company_id: int):
     from ..models import FileIndex
     
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
@@ -295,6 +335,10 @@ async def get_standardized_customer_income(
     获取客户的标准化收入数据（用于DSR/DSRC计算）
     聚合多个收入来源，返回最佳估算
     """
+    return await run_db(_standardized_customer_income, db, customer_id, company_id)
+
+
+def _standardized_customer_income(db: Session, customer_id: int, company_id: int):
     from ..models import FileIndex
     
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
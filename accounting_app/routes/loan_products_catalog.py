@@ -8,6 +8,8 @@ from typing import List, Dict, Optional
 import sqlite3
 import os
 
+from ..utils.db_executor import run_db
+
 router = APIRouter(prefix="/api/loan-products", tags=["Loan Products Catalog"])
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "../../db/smart_loan_manager.db")
@@ -92,6 +94,10 @@ async def get_all_products():
     GET /api/loan-products/all
     返回所有贷款产品（从数据库读取804个真实产品）
     """
+    return await run_db(_all_products)
+
+
+def _all_products():
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -121,6 +127,10 @@ async def get_product_detail(product_id: str):
     GET /api/loan-products/{product_id}
     返回单个产品详情（从数据库）
     """
+    return await run_db(_product_detail, product_id)
+
+
+def _product_detail(product_id: str):
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -155,6 +165,10 @@ async def filter_products(
     GET /api/loan-products/filter
     筛选产品（从数据库，支持多种筛选条件）
     """
+    return await run_db(_filter_products, type, min_rate, max_rate, category, min_amount, max_amount, bank)
+
+
+def _filter_products(type, min_rate, max_rate, category, min_amount, max_amount, bank):
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -225,6 +239,10 @@ async def get_banks_list():
     GET /api/loan-products/banks
     获取所有银行列表
     """
+    return await run_db(_banks_list)
+
+
+def _banks_list():
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -253,6 +271,10 @@ async def get_categories_list():
     GET /api/loan-products/categories
     获取所有产品类别
     """
+    return await run_db(_categories_list)
+
+
+def _categories_list():
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -176,3 +176,33 @@ async def get_active_alerts():
                 })
     
     return alerts
+
+
+@router.get("/audit-queue", response_model=Dict)
+async def get_audit_queue_metrics():
+    """
+    ## 🧾 审计日志写入队列
+
+    当前进程审计日志后台写入器的指标：队列深度、已写入 / 同步回退 / 失败条数、
+    批次数以及最近 / 平均 / 最大批量写入耗时（毫秒）。
+    """
+    from accounting_app.utils.audit_logger import get_audit_writer_stats
+    return get_audit_writer_stats()
+
+
+@router.get("/event-loop", response_model=Dict)
+async def get_event_loop_metrics():
+    """
+    ## ⏱️ 事件循环延迟
+
+    当前进程事件循环的采样延迟（整体与按路由汇总，按累计延迟降序），
+    以及数据库线程池与CPU线程池的使用情况（线程数 / 执行中 / 排队 / 已完成）。
+    累计延迟高的 async 路由说明其中有阻塞事件循环的同步调用，应改为 run_db。
+    """
+    from accounting_app.middleware.loop_lag import loop_lag_monitor
+    from accounting_app.utils.db_executor import cpu_executor, db_executor
+    return {
+        **loop_lag_monitor.snapshot(),
+        "db_executor": db_executor.stats(),
+        "cpu_executor": cpu_executor.stats(),
+    }
@@ -15,6 +15,7 @@ from ..services.management_report_generator import ManagementReportGenerator
 from ..services.file_storage_manager import AccountingFileStorageManager
 from ..models import Company, User, AuditLog
 from ..middleware.rbac_fixed import require_permission, extract_request_info
+from ..utils.db_executor import run_cpu, run_db
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -22,6 +23,47 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/reports/pdf", tags=["PDF Reports"])
 
 
+def _load_report_data(db: Session, company_id: int, period_str: str, include_details: bool):
+    """查询公司与月度报表数据（在数据库线程池中执行）"""
+    company = db.query(Company).filter(Company.id == company_id).first()
+    if not company:
+        raise HTTPException(status_code=404, detail="公司不存在")
+    
+    report_generator = ManagementReportGenerator(db, company_id)
+    report_data = report_generator.generate_monthly_report(period_str, include_details=include_details)
+    
+    company_info = {
+        "company_name": company.company_name,
+        "company_code": company.company_code
+    }
+    return company_info, report_data
+
+
+def _write_export_audit_log(db: Session, request: Request, current_user: User, company_id: int,
+                            period: str, report_type: str, report_label: str):
+    """记录导出审计日志（失败只记录错误，不影响导出）"""
+    try:
+        request_info = extract_request_info(request)
+        
+        audit_log = AuditLog(
+            company_id=company_id,
+            user_id=current_user.id,
+            username=current_user.username,
+            action_type='export',
+            entity_type='report',
+            description=f"导出{report_label}PDF: period={period}",
+            new_value={'period': period, 'report_type': report_type, 'format': 'pdf'},
+            ip_address=request_info['ip_address'],
+            user_agent=request_info['user_agent'],
+            success=True
+        )
+        db.add(audit_log)
+        db.commit()
+    except Exception as e:
+        logger.error(f"审计日志写入失败（导出{report_label}）：{e}")
+        db.rollback()
+
+
 @router.get("/balance-sheet")
 async def get_balance_sheet_pdf(
     request: Request,
@@ -33,63 +75,20 @@ async def get_balance_sheet_pdf(
     """
     生成资产负债表PDF
     """
+    # 报表查询与审计日志在数据库线程池中执行，PDF渲染与保存在CPU线程池中执行
     try:
         logger.info(f"生成Balance Sheet PDF: company_id={company_id}, period={period}")
         
-        company = db.query(Company).filter(Company.id == company_id).first()
-        if not company:
-            raise HTTPException(status_code=404, detail="公司不存在")
-        
-        report_generator = ManagementReportGenerator(db, company_id)
-        
-        period_str = period[:7]
-        report_data = report_generator.generate_monthly_report(period_str, include_details=False)
-        
-        pdf_generator = create_pdf_generator(
-            company_name=company.company_name,
-            company_code=company.company_code
-        )
-        
-        pdf_bytes = pdf_generator.generate_balance_sheet(
-            bs_data=report_data['balance_sheet_summary'],
-            period=period
-        )
-        
-        as_of_date = datetime.strptime(period, '%Y-%m-%d').date()
-        pdf_path = AccountingFileStorageManager.generate_balance_sheet_path(
-            company_id=company_id,
-            as_of_date=as_of_date,
-            file_extension='pdf'
-        )
-        AccountingFileStorageManager.save_file_content(pdf_path, pdf_bytes)
-        logger.info(f"Balance Sheet PDF已保存到: {pdf_path}")
-        
-        try:
-            request_info = extract_request_info(request)
-            
-            audit_log = AuditLog(
-                company_id=company_id,
-                user_id=current_user.id,
-                username=current_user.username,
-                action_type='export',
-                entity_type='report',
-                description=f"导出资产负债表PDF: period={period}",
-                new_value={'period': period, 'report_type': 'balance_sheet', 'format': 'pdf'},
-                ip_address=request_info['ip_address'],
-                user_agent=request_info['user_agent'],
-                success=True
-            )
-            db.add(audit_log)
-            db.commit()
-        except Exception as e:
-            logger.error(f"审计日志写入失败（导出资产负债表）：{e}")
-            db.rollback()
+        company_info, report_data = await run_db(_load_report_data, db, company_id, period[:7], False)
+        pdf_bytes = await run_cpu(_render_balance_sheet, company_info, report_data, company_id, period)
+        await run_db(_write_export_audit_log, db, request, current_user, company_id, period,
+                     'balance_sheet', '资产负债表')
         
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f"attachment; filename=Balance_Sheet_{company.company_code}_{period}.pdf"
+                "Content-Disposition": f"attachment; filename=Balance_Sheet_{company_info['company_code']}_{period}.pdf"
             }
         )
     
@@ -100,6 +99,25 @@ async def get_balance_sheet_pdf(
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+def _render_balance_sheet(company_info: dict, report_data: dict, company_id: int, period: str) -> bytes:
+    pdf_generator = create_pdf_generator(**company_info)
+    
+    pdf_bytes = pdf_generator.generate_balance_sheet(
+        bs_data=report_data['balance_sheet_summary'],
+        period=period
+    )
+    
+    as_of_date = datetime.strptime(period, '%Y-%m-%d').date()
+    pdf_path = AccountingFileStorageManager.generate_balance_sheet_path(
+        company_id=company_id,
+        as_of_date=as_of_date,
+        file_extension='pdf'
+    )
+    AccountingFileStorageManager.save_file_content(pdf_path, pdf_bytes)
+    logger.info(f"Balance Sheet PDF已保存到: {pdf_path}")
+    return pdf_bytes
+
+
 @router.get("/profit-loss")
 async def get_profit_loss_pdf(
     request: Request,
@@ -114,65 +132,16 @@ async def get_profit_loss_pdf(
     try:
         logger.info(f"生成P&L PDF: company_id={company_id}, period={period}")
         
-        company = db.query(Company).filter(Company.id == company_id).first()
-        if not company:
-            raise HTTPException(status_code=404, detail="公司不存在")
-        
-        report_generator = ManagementReportGenerator(db, company_id)
-        report_data = report_generator.generate_monthly_report(period, include_details=False)
-        
-        pdf_generator = create_pdf_generator(
-            company_name=company.company_name,
-            company_code=company.company_code
-        )
-        
-        pdf_bytes = pdf_generator.generate_profit_loss(
-            pnl_data=report_data['pnl_summary'],
-            period=period
-        )
-        
-        from datetime import date as date_class
-        year, month = period.split('-')
-        period_start = date_class(int(year), int(month), 1)
-        import calendar
-        last_day = calendar.monthrange(int(year), int(month))[1]
-        period_end = date_class(int(year), int(month), last_day)
-        
-        pdf_path = AccountingFileStorageManager.generate_profit_loss_path(
-            company_id=company_id,
-            period_start=period_start,
-            period_end=period_end,
-            file_extension='pdf'
-        )
-        AccountingFileStorageManager.save_file_content(pdf_path, pdf_bytes)
-        logger.info(f"P&L PDF已保存到: {pdf_path}")
-        
-        try:
-            request_info = extract_request_info(request)
-            
-            audit_log = AuditLog(
-                company_id=company_id,
-                user_id=current_user.id,
-                username=current_user.username,
-                action_type='export',
-                entity_type='report',
-                description=f"导出损益表PDF: period={period}",
-                new_value={'period': period, 'report_type': 'profit_loss', 'format': 'pdf'},
-                ip_address=request_info['ip_address'],
-                user_agent=request_info['user_agent'],
-                success=True
-            )
-            db.add(audit_log)
-            db.commit()
-        except Exception as e:
-            logger.error(f"审计日志写入失败（导出损益表）：{e}")
-            db.rollback()
+        company_info, report_data = await run_db(_load_report_data, db, company_id, period, False)
+        pdf_bytes = await run_cpu(_render_profit_loss, company_info, report_data, company_id, period)
+        await run_db(_write_export_audit_log, db, request, current_user, company_id, period,
+                     'profit_loss', '损益表')
         
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f"attachment; filename=Profit_Loss_{company.company_code}_{period}.pdf"
+                "Content-Disposition": f"attachment; filename=Profit_Loss_{company_info['company_code']}_{period}.pdf"
             }
         )
     
@@ -183,6 +152,32 @@ async def get_profit_loss_pdf(
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+def _render_profit_loss(company_info: dict, report_data: dict, company_id: int, period: str) -> bytes:
+    pdf_generator = create_pdf_generator(**company_info)
+    
+    pdf_bytes = pdf_generator.generate_profit_loss(
+        pnl_data=report_data['pnl_summary'],
+        period=period
+    )
+    
+    from datetime import date as date_class
+    year, month = period.split('-')
+    period_start = date_class(int(year), int(month), 1)
+    import calendar
+    last_day = calendar.monthrange(int(year), int(month))[1]
+    period_end = date_class(int(year), int(month), last_day)
+    
+    pdf_path = AccountingFileStorageManager.generate_profit_loss_path(
+        company_id=company_id,
+        period_start=period_start,
+        period_end=period_end,
+        file_extension='pdf'
+    )
+    AccountingFileStorageManager.save_file_content(pdf_path, pdf_bytes)
+    logger.info(f"P&L PDF已保存到: {pdf_path}")
+    return pdf_bytes
+
+
 @router.get("/bank-package")
 async def get_bank_package_pdf(
     request: Request,
@@ -197,63 +192,16 @@ async def get_bank_package_pdf(
     try:
         logger.info(f"生成Bank Package PDF: company_id={company_id}, period={period}")
         
-        company = db.query(Company).filter(Company.id == company_id).first()
-        if not company:
-            raise HTTPException(status_code=404, detail="公司不存在")
-        
-        report_generator = ManagementReportGenerator(db, company_id)
-        report_data = report_generator.generate_monthly_report(period, include_details=True)
-        
-        pdf_generator = create_pdf_generator(
-            company_name=company.company_name,
-            company_code=company.company_code
-        )
-        
-        pdf_bytes = pdf_generator.generate_bank_package(
-            report_data=report_data,
-            period=period
-        )
-        
-        from datetime import date as date_class
-        year, month = period.split('-')
-        import calendar
-        last_day = calendar.monthrange(int(year), int(month))[1]
-        package_date = date_class(int(year), int(month), last_day)
-        
-        pdf_path = AccountingFileStorageManager.generate_bank_package_path(
-            company_id=company_id,
-            package_date=package_date,
-            file_extension='pdf'
-        )
-        AccountingFileStorageManager.save_file_content(pdf_path, pdf_bytes)
-        logger.info(f"Bank Package PDF已保存到: {pdf_path}")
-        
-        try:
-            request_info = extract_request_info(request)
-            
-            audit_log = AuditLog(
-                company_id=company_id,
-                user_id=current_user.id,
-                username=current_user.username,
-                action_type='export',
-                entity_type='report',
-                description=f"导出银行贷款包PDF: period={period}",
-                new_value={'period': period, 'report_type': 'bank_package', 'format': 'pdf'},
-                ip_address=request_info['ip_address'],
-                user_agent=request_info['user_agent'],
-                success=True
-            )
-            db.add(audit_log)
-            db.commit()
-        except Exception as e:
-            logger.error(f"审计日志写入失败（导出银行贷款包）：{e}")
-            db.rollback()
+        company_info, report_data = await run_db(_load_report_data, db, company_id, period, True)
+        pdf_bytes = await run_cpu(_render_bank_package, company_info, report_data, company_id, period)
+        await run_db(_write_export_audit_log, db, request, current_user, company_id, period,
+                     'bank_package', '银行贷款包')
         
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f"attachment; filename=Bank_Package_{company.company_code}_{period}.pdf"
+                "Content-Disposition": f"attachment; filename=Bank_Package_{company_info['company_code']}_{period}.pdf"
             }
         )
     
@@ -264,6 +212,30 @@ async def get_bank_package_pdf(
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+def _render_bank_package(company_info: dict, report_data: dict, company_id: int, period: str) -> bytes:
+    pdf_generator = create_pdf_generator(**company_info)
+    
+    pdf_bytes = pdf_generator.generate_bank_package(
+        report_data=report_data,
+        period=period
+    )
+    
+    from datetime import date as date_class
+    year, month = period.split('-')
+    import calendar
+    last_day = calendar.monthrange(int(year), int(month))[1]
+    package_date = date_class(int(year), int(month), last_day)
+    
+    pdf_path = AccountingFileStorageManager.generate_bank_package_path(
+        company_id=company_id,
+        package_date=package_date,
+        file_extension='pdf'
+    )
+    AccountingFileStorageManager.save_file_content(pdf_path, pdf_bytes)
+    logger.info(f"Bank Package PDF已保存到: {pdf_path}")
+    return pdf_bytes
+
+
 @router.get("/preview/{report_type}")
 async def preview_report_structure(
     report_type: str,
@@ -276,6 +248,10 @@ async def preview_report_structure(
     - 兼容 period 为 YYYY-MM 或 YYYY-MM-DD 两种格式（会统一为 YYYY-MM）
     - 返回结构调整为测试期望的字段名（company_info, period, balance_sheet_summary / pnl_summary / full_report）
     """
+    return await run_db(_preview_report_structure, report_type, company_id, period, db)
+
+
+def _preview_report_structure(report_type: str, company_id: int, period: str, db: Session):
     try:
         company = db.query(Company).filter(Company.id == company_id).first()
         if not company:
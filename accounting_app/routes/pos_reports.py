@@ -10,6 +10,7 @@ from ..db import get_db
 # from ..middleware.multi_tenant import get_current_company
 from ..services.pos_processor import create_pos_processor
 from ..models import POSReport, POSTransaction, SalesInvoice
+from ..utils.db_executor import run_cpu, run_db
 
 logger = logging.getLogger(__name__)
 
@@ -60,11 +61,13 @@ async def upload_pos_report(
         # 读取文件内容
         file_content = await file.read()
         
-        # 处理POS文件
+        # 解析POS文件（OCR，在CPU线程池中执行），入库、生成发票在数据库线程池中执行
         processor = create_pos_processor(db)
-        result = processor.process_pos_file(
+        parsed_data = await run_cpu(processor.parse_pos_file, file_content, file.filename)
+        result = await run_db(
+            processor.record_pos_report,
             company_id=company_id,
-            file_content=file_content,
+            parsed_data=parsed_data,
             file_name=file.filename,
             auto_generate_invoices=auto_generate_invoices
         )
@@ -101,6 +104,10 @@ async def list_pos_reports(
     
     支持日期范围筛选
     """
+    return await run_db(_list_pos_reports, db, company_id, start_date, end_date, skip, limit)
+
+
+def _list_pos_reports(db, company_id, start_date, end_date, skip, limit):
     try:
         query = db.query(POSReport).filter(POSReport.company_id == company_id)
         
@@ -152,6 +159,10 @@ async def get_pos_report_detail(
     
     包含所有交易明细
     """
+    return await run_db(_pos_report_detail, db, report_id, company_id)
+
+
+def _pos_report_detail(db, report_id, company_id):
     try:
         # 查询报表
         report = db.query(POSReport).filter(
@@ -208,6 +219,10 @@ async def get_generated_invoices(
     """
     获取该POS报表生成的所有销售发票
     """
+    return await run_db(_generated_invoices, db, report_id, company_id)
+
+
+def _generated_invoices(db, report_id, company_id):
     try:
         # 验证报表存在
         report = db.query(POSReport).filter(
@@ -284,9 +299,11 @@ async def batch_upload_pos_reports(
             
             file_content = await file.read()
             
-            result = processor.process_pos_file(
+            parsed_data = await run_cpu(processor.parse_pos_file, file_content, file.filename)
+            result = await run_db(
+                processor.record_pos_report,
                 company_id=company_id,
-                file_content=file_content,
+                parsed_data=parsed_data,
                 file_name=file.filename,
                 auto_generate_invoices=auto_generate_invoices
             )
@@ -8,10 +8,11 @@ from typing import List, Optional
 from datetime import date, datetime, timedelta
 import logging
 
-from ..services.invoice_processor import process_supplier_invoice, InvoiceProcessor
+from ..services.invoice_processor import parse_supplier_invoice, record_supplier_invoice, InvoiceProcessor
 from ..middleware.multi_tenant import get_current_company_id
 from ..db import get_db
 from ..models import PurchaseInvoice, Supplier
+from ..utils.db_executor import run_cpu, run_db
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -101,12 +102,16 @@ async def upload_supplier_invoice(
         # 读取文件内容
         file_content = await file.read()
         
-        # 处理发票
-        result = process_supplier_invoice(
+        # 解析发票（PDF文本 / OCR，在CPU线程池中执行）
+        parsed_data = await run_cpu(parse_supplier_invoice, file_content, file.filename)
+        
+        # 入库、生成会计分录（在数据库线程池中执行）
+        result = await run_db(
+            record_supplier_invoice,
             db=db,
             company_id=company_id,
-            file_content=file_content,
-            filename=file.filename
+            filename=file.filename,
+            parsed_data=parsed_data
         )
         
         return result
@@ -11,12 +11,13 @@ import logging
 
 from ..models import User, UserCompanyRole, Company, AuditLog
 from ..utils.password import hash_password, verify_password
+from .permission_cache import user_token_cache, invalidate_user
+from .session_store import get_session_backend
 
 logger = logging.getLogger(__name__)
 
-# 临时Session存储（生产环境应使用Redis）
-# 格式：{token: {user_id, expires_at, company_id}}
-_session_store = {}
+# Session存储后端（session_store.get_session_backend，默认user_sessions表，多worker共享）
+# 格式：{token: {user_id, company_id, username, role, expires_at}}
 
 
 def create_user(
@@ -148,13 +149,13 @@ def create_session(user: User, expires_in_hours: int = 24) -> str:
     expires_at = datetime.now() + timedelta(hours=expires_in_hours)
     
     # 存储session
-    _session_store[token] = {
+    get_session_backend().save(token, {
         'user_id': user.id,
         'company_id': user.company_id,
         'username': user.username,
         'role': user.role,
         'expires_at': expires_at
-    }
+    })
     
     logger.info(f"Session创建成功：user={user.username}, token={token[:8]}..., expires={expires_at}")
     
@@ -174,7 +175,7 @@ def verify_session(token: str) -> Optional[dict]:
     if not token:
         return None
     
-    session = _session_store.get(token)
+    session = get_session_backend().get(token)
     
     if not session:
         logger.warning(f"Session验证失败：token不存在")
@@ -184,7 +185,7 @@ def verify_session(token: str) -> Optional[dict]:
     if session['expires_at'] < datetime.now():
         logger.warning(f"Session已过期：user={session['username']}")
         # 删除过期session
-        del _session_store[token]
+        get_session_backend().delete(token)
         return None
     
     return session
@@ -201,6 +202,14 @@ def get_user_by_token(db: Session, token: str) -> Optional[User]:
     Returns:
         User对象（成功）或None（失败）
     """
+    if not token:
+        return None
+    
+    # 短TTL缓存命中时无需读取session存储和users表（缓存条目不超过session过期时间，登出时失效）
+    user = user_token_cache.get(db, token)
+    if user:
+        return user
+    
     session = verify_session(token)
     
     if not session:
@@ -215,9 +224,10 @@ def get_user_by_token(db: Session, token: str) -> Optional[User]:
     if not user:
         logger.warning(f"Session验证失败：用户已被删除或禁用")
         # 删除无效session
-        del _session_store[token]
+        get_session_backend().delete(token)
         return None
     
+    user_token_cache.put(token, user, expires_at=session['expires_at'])
     return user
 
 
@@ -231,10 +241,11 @@ def revoke_session(token: str) -> bool:
     Returns:
         bool: 是否成功
     """
-    if token in _session_store:
-        username = _session_store[token].get('username')
-        del _session_store[token]
-        logger.info(f"Session已撤销：user={username}")
+    user_token_cache.invalidate_token(token)
+    
+    session = get_session_backend().delete(token)
+    if session:
+        logger.info(f"Session已撤销：user={session.get('username')}")
         return True
     
     return False
@@ -243,18 +254,14 @@ def revoke_session(token: str) -> bool:
 def cleanup_expired_sessions():
     """
     清理过期的sessions（定期任务）
+    按过期时间分批清理，无需全量扫描
     """
-    now = datetime.now()
-    expired_tokens = [
-        token for token, session in _session_store.items()
-        if session['expires_at'] < now
-    ]
+    removed = get_session_backend().cleanup_expired(datetime.now())
     
-    for token in expired_tokens:
-        del _session_store[token]
+    if removed:
+        logger.info(f"清理了 {removed} 个过期session")
     
-    if expired_tokens:
-        logger.info(f"清理了 {len(expired_tokens)} 个过期session")
+    return removed
 
 
 # ============================================================
@@ -398,6 +405,7 @@ def assign_user_to_company(
             'updated_at': datetime.now()
         }, synchronize_session=False)
         db.commit()
+        invalidate_user(user_id)
         
         # 重新查询获取更新后的对象
         updated_ucr = db.query(UserCompanyRole).filter(
@@ -437,6 +445,7 @@ def assign_user_to_company(
         db.add(new_ucr)
         db.commit()
         db.refresh(new_ucr)
+        invalidate_user(user_id)
         
         # 写入审计日志（防御性）
         try:
@@ -493,6 +502,7 @@ def remove_user_from_company(
         # 删除关联
         db.delete(ucr)
         db.commit()
+        invalidate_user(user_id)
         
         # 写入审计日志（防御性）
         try:
@@ -0,0 +1,160 @@
+"""
+银行月结单CSV批量入库
+- CSV按块流式解析（每块 CHUNK_SIZE 行），raw_lines 以多行INSERT ... RETURNING 一次写入一块并取回ID
+  （SQLAlchemy insertmanyvalues；PostgreSQL / SQLite 均为批量VALUES）
+- 逐行验证规则与原导入接口相同（Date必填且为YYYY-MM-DD，Description必填，金额可选）
+- 全部或无：任何一行验证失败都不写 bank_statements；验证通过后 bank_statements 按块 executemany 写入，
+  raw_lines.is_parsed 用一条UPDATE标记
+- 只在当前事务中写入（不commit），由调用方决定提交
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from ..models import BankStatement, RawLine
+
+CHUNK_SIZE = 1000
+
+_raw_lines = RawLine.__table__
+_bank_statements = BankStatement.__table__
+
+
+@dataclass
+class BankCsvIngestResult:
+    total_lines: int = 0
+    imported: int = 0
+    validation_errors: List[str] = field(default_factory=list)
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_bank_csv_row(row: Dict, line_no: int) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    验证一行CSV（禁止自动补数据）
+
+    Returns:
+        (解析后的字段, None) 或 (None, 错误信息)
+    """
+    line_errors = []
+    transaction_date = None
+
+    # 必填字段验证：Date
+    date_str = (row.get('Date') or '').strip()
+    if not date_str:
+        line_errors.append("缺失必填字段 'Date'")
+    else:
+        try:
+            transaction_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            line_errors.append(f"Date格式错误（应为YYYY-MM-DD）: {date_str}")
+
+    # 必填字段验证：Description
+    description = (row.get('Description') or '').strip()
+    if not description:
+        line_errors.append("缺失必填字段 'Description'")
+
+    if line_errors:
+        return None, f"第{line_no}行验证失败: {'; '.join(line_errors)}"
+
+    # 验证通过，解析可选字段（不自动补0）
+    try:
+        debit_str = (row.get('Debit') or '').strip()
+        credit_str = (row.get('Credit') or '').strip()
+        balance_str = (row.get('Balance') or '').strip()
+
+        return {
+            'transaction_date': transaction_date,
+            'description': description,
+            'debit_amount': Decimal(debit_str) if debit_str else Decimal('0'),
+            'credit_amount': Decimal(credit_str) if credit_str else Decimal('0'),
+            'balance': Decimal(balance_str) if balance_str else None,
+            'reference_number': (row.get('Reference') or '').strip(),
+        }, None
+    except Exception as e:
+        return None, f"第{line_no}行解析失败: {str(e)}"
+
+
+def ingest_bank_statement_csv(
+    db: Session,
+    raw_document_id: int,
+    csv_content: str,
+    company_id: int,
+    bank_name: str,
+    account_number: str,
+    statement_month: str,
+    chunk_size: int = CHUNK_SIZE
+) -> BankCsvIngestResult:
+    """
+    保存每行原文到raw_lines，验证全部通过后写入bank_statements（不commit）
+
+    Args:
+        db: 数据库会话
+        raw_document_id: 已flush的raw_documents记录ID
+        csv_content: CSV文本（首行为表头）
+        company_id / bank_name / account_number / statement_month: 写入bank_statements的固定字段
+        chunk_size: 每块行数
+
+    Returns:
+        BankCsvIngestResult：validation_errors 非空时未写入任何bank_statements
+    """
+    result = BankCsvIngestResult()
+    statements = []
+    reader = csv.DictReader(io.StringIO(csv_content))
+
+    for chunk in _chunks(enumerate(reader, start=1), chunk_size):
+        # 多行INSERT返回的顺序不保证与参数一致，按行号对应ID
+        raw_line_ids = dict(db.execute(
+            insert(_raw_lines).returning(_raw_lines.c.line_no, _raw_lines.c.id),
+            [{
+                'raw_document_id': raw_document_id,
+                'line_no': line_no,
+                'raw_text': str(row),  # 整行原文
+                'is_parsed': False,
+            } for line_no, row in chunk]
+        ).all())
+        result.total_lines += len(chunk)
+
+        for line_no, row in chunk:
+            fields, error = validate_bank_csv_row(row, line_no)
+            if error:
+                result.validation_errors.append(error)
+                continue
+            result.imported += 1
+            # 已有错误时整批不会入库，不再保留待插入的行
+            if not result.validation_errors:
+                statements.append({
+                    'company_id': company_id,
+                    'bank_name': bank_name,
+                    'account_number': account_number,
+                    'statement_month': statement_month,
+                    'matched': False,
+                    'raw_line_id': raw_line_ids[line_no],
+                    **fields,
+                })
+
+    if result.validation_errors:
+        return result
+
+    for chunk in _chunks(statements, chunk_size):
+        db.execute(insert(_bank_statements), chunk)
+    if statements:
+        db.execute(
+            update(_raw_lines)
+            .where(_raw_lines.c.raw_document_id == raw_document_id)
+            .values(is_parsed=True)
+        )
+    return result
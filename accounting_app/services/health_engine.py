@@ -4,7 +4,12 @@
 Safe for AI V3 Stable Baseline
 """
 import sqlite3
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
+
+import numpy as np
+
+from analytics import vectorized_metrics as vm
+from analytics.monthly_feature_store import load_monthly_features
 
 
 class HealthEngine:
@@ -29,142 +34,113 @@ class HealthEngine:
                 "health_status": "健康"
             }
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 1. 获取信用卡信息（额度）
-        cursor.execute("""
-            SELECT SUM(credit_limit) as total_limit
-            FROM credit_cards
-            WHERE customer_id = ?
-        """, (customer_id,))
-        
-        credit_row = cursor.fetchone()
-        total_limit = credit_row["total_limit"] or 0
-        
-        # 2. 获取最新余额
-        cursor.execute("""
-            SELECT closing_balance_total
-            FROM monthly_statements
-            WHERE customer_id = ?
-            ORDER BY statement_month DESC
-            LIMIT 1
-        """, (customer_id,))
-        
-        balance_row = cursor.fetchone()
-        current_balance = balance_row["closing_balance_total"] if balance_row else 0
-        
-        # 3. 获取最近6个月数据
-        cursor.execute("""
-            SELECT 
-                closing_balance_total,
-                owner_expenses + gz_expenses as total_expenses,
-                owner_payments + gz_payments as total_payments
-            FROM monthly_statements
-            WHERE customer_id = ?
-            ORDER BY statement_month DESC
-            LIMIT 6
-        """, (customer_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        if not rows:
-            return {
-                "error": "No data found",
-                "total_score": 0,
-                "grade": "无数据"
-            }
-        
-        # 计算各维度得分
-        score_breakdown = {}
-        
-        # 1. 信用利用率得分 (30分)
-        utilization_score = self._calc_utilization_score(current_balance, total_limit)
-        score_breakdown["utilization"] = {
-            "score": utilization_score,
-            "max": 30,
-            "description": "信用利用率",
-            "value": f"{round(current_balance / total_limit * 100, 1)}%" if total_limit > 0 else "N/A"
-        }
-        
-        # 2. 还款能力得分 (25分)
-        avg_expenses = sum(row["total_expenses"] for row in rows) / len(rows)
-        avg_payments = sum(row["total_payments"] for row in rows) / len(rows)
-        payment_score = self._calc_payment_score(avg_payments, avg_expenses)
-        score_breakdown["payment_ability"] = {
-            "score": payment_score,
-            "max": 25,
-            "description": "还款能力",
-            "value": f"{round(avg_payments / avg_expenses * 100, 1)}%" if avg_expenses > 0 else "N/A"
-        }
-        
-        # 3. 债务趋势得分 (25分)
-        first_balance = rows[-1]["closing_balance_total"]
-        last_balance = rows[0]["closing_balance_total"]
-        trend_score = self._calc_trend_score(first_balance, last_balance)
-        score_breakdown["debt_trend"] = {
-            "score": trend_score,
-            "max": 25,
-            "description": "债务趋势",
-            "value": "下降" if last_balance < first_balance else "上升"
-        }
-        
-        # 4. 数据完整性得分 (20分)
-        data_score = min(len(rows) * 3.33, 20)  # 6个月数据满分
-        score_breakdown["data_completeness"] = {
-            "score": round(data_score, 1),
-            "max": 20,
-            "description": "数据完整性",
-            "value": f"{len(rows)}个月"
+        scores = self.calculate_portfolio_health_scores([customer_id])
+        return scores.get(customer_id) or {
+            "error": "No data found",
+            "total_score": 0,
+            "grade": "无数据"
         }
+    
+    def calculate_portfolio_health_scores(self, customer_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        一次计算多个客户（None为全部有月结单的客户）的健康评分
+        两次查询：客户月度特征（最近6个月）+ 各客户信用额度合计，评分规则对所有客户向量化计算
         
-        # 总分
-        total_score = (
-            utilization_score + 
-            payment_score + 
-            trend_score + 
-            data_score
-        )
-        total_score = round(total_score, 1)
-        
-        # 评级
-        grade = self._get_grade(total_score)
-        health_status = self._get_health_status(total_score)
-        
-        return {
-            "total_score": total_score,
-            "breakdown": score_breakdown,
-            "grade": grade,
-            "health_status": health_status,
-            "current_balance": round(current_balance, 2),
-            "credit_limit": round(total_limit, 2)
-        }
+        Returns:
+            {customer_id: calculate_health_score 的结果}，没有月结单数据的客户不在结果中
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            features = load_monthly_features(conn, customer_ids, window=6)
+            limits = self._credit_limits(conn, features.customer_ids.tolist())
+        finally:
+            conn.close()
+        
+        if not len(features.customer_ids):
+            return {}
+        
+        total_limit = np.array([limits.get(int(c), 0.0) for c in features.customer_ids])
+        counts = features.counts
+        current_balance = vm.last_valid(features.closing_balance)
+        first_balance = vm.first_valid(features.closing_balance)
+        avg_expenses = vm.row_mean(features.expenses)
+        avg_payments = vm.row_mean(features.payments)
+        
+        # 各维度得分
+        utilization_score = self._utilization_scores(current_balance, total_limit)
+        payment_score = self._payment_scores(avg_payments, avg_expenses)
+        trend_score = self._trend_scores(first_balance, current_balance)
+        data_score = np.minimum(counts * 3.33, 20)  # 6个月数据满分
+        total_score = np.round(utilization_score + payment_score + trend_score + data_score, 1)
+        
+        results = {}
+        for i, customer_id in enumerate(features.customer_ids.tolist()):
+            balance, limit = float(current_balance[i]), float(total_limit[i])
+            score = float(total_score[i])
+            results[customer_id] = {
+                "total_score": score,
+                "breakdown": {
+                    "utilization": {
+                        "score": int(utilization_score[i]),
+                        "max": 30,
+                        "description": "信用利用率",
+                        "value": f"{round(balance / limit * 100, 1)}%" if limit > 0 else "N/A"
+                    },
+                    "payment_ability": {
+                        "score": int(payment_score[i]),
+                        "max": 25,
+                        "description": "还款能力",
+                        "value": f"{round(avg_payments[i] / avg_expenses[i] * 100, 1)}%" if avg_expenses[i] > 0 else "N/A"
+                    },
+                    "debt_trend": {
+                        "score": int(trend_score[i]),
+                        "max": 25,
+                        "description": "债务趋势",
+                        "value": "下降" if balance < first_balance[i] else "上升"
+                    },
+                    "data_completeness": {
+                        "score": round(float(data_score[i]), 1),
+                        "max": 20,
+                        "description": "数据完整性",
+                        "value": f"{int(counts[i])}个月"
+                    }
+                },
+                "grade": self._get_grade(score),
+                "health_status": self._get_health_status(score),
+                "current_balance": round(balance, 2),
+                "credit_limit": round(limit, 2)
+            }
+        return results
+    
+    def _credit_limits(self, conn, customer_ids) -> Dict[int, float]:
+        """各客户信用额度合计（一次 GROUP BY）"""
+        if not customer_ids:
+            return {}
+        limits = {}
+        for start in range(0, len(customer_ids), 500):
+            chunk = customer_ids[start:start + 500]
+            limits.update(conn.execute(f"""
+                SELECT customer_id, COALESCE(SUM(credit_limit), 0)
+                FROM credit_cards
+                WHERE customer_id IN ({','.join('?' * len(chunk))})
+                GROUP BY customer_id
+            """, chunk).fetchall())
+        return limits
     
-    def _calc_utilization_score(self, balance: float, limit: float) -> float:
+    def _utilization_scores(self, balance: np.ndarray, limit: np.ndarray) -> np.ndarray:
         """
         信用利用率得分
         0-30%: 30分
         30-50%: 20分
         50-70%: 10分
         70-100%: 5分
+        无信用额度: 15分（中等分）
         """
-        if limit <= 0:
-            return 15  # 无信用额度，给中等分
-        
-        utilization = balance / limit
-        
-        if utilization <= 0.3:
-            return 30
-        elif utilization <= 0.5:
-            return 20
-        elif utilization <= 0.7:
-            return 10
-        else:
-            return 5
+        utilization = np.divide(balance, limit, out=np.zeros_like(balance), where=limit > 0)
+        banded = np.select([utilization <= 0.3, utilization <= 0.5, utilization <= 0.7], [30, 20, 10], 5)
+        return np.where(limit > 0, banded, 15)
     
-    def _calc_payment_score(self, payments: float, expenses: float) -> float:
+    def _payment_scores(self, payments: np.ndarray, expenses: np.ndarray) -> np.ndarray:
         """
         还款能力得分
         还款/支出 >= 1.2: 25分
@@ -172,24 +148,13 @@ class HealthEngine:
         >= 0.8: 15分
         >= 0.5: 10分
         < 0.5: 5分
+        无支出: 15分
         """
-        if expenses <= 0:
-            return 15
-        
-        ratio = payments / expenses
-        
-        if ratio >= 1.2:
-            return 25
-        elif ratio >= 1.0:
-            return 20
-        elif ratio >= 0.8:
-            return 15
-        elif ratio >= 0.5:
-            return 10
-        else:
-            return 5
+        ratio = np.divide(payments, expenses, out=np.zeros_like(payments), where=expenses > 0)
+        banded = np.select([ratio >= 1.2, ratio >= 1.0, ratio >= 0.8, ratio >= 0.5], [25, 20, 15, 10], 5)
+        return np.where(expenses > 0, banded, 15)
     
-    def _calc_trend_score(self, first_balance: float, last_balance: float) -> float:
+    def _trend_scores(self, first_balance: np.ndarray, last_balance: np.ndarray) -> np.ndarray:
         """
         债务趋势得分
         余额下降 > 10%: 25分
@@ -197,22 +162,13 @@ class HealthEngine:
         余额稳定: 15分
         余额上升 0-10%: 10分
         余额上升 > 10%: 5分
+        期初余额不大于0: 15分
         """
-        if first_balance <= 0:
-            return 15
-        
-        change_pct = (last_balance - first_balance) / first_balance * 100
-        
-        if change_pct < -10:
-            return 25
-        elif change_pct < 0:
-            return 20
-        elif change_pct < 10:
-            return 15
-        elif change_pct < 20:
-            return 10
-        else:
-            return 5
+        positive = first_balance > 0
+        change_pct = np.divide((last_balance - first_balance) * 100, first_balance,
+                               out=np.zeros_like(first_balance), where=positive)
+        banded = np.select([change_pct < -10, change_pct < 0, change_pct < 10, change_pct < 20], [25, 20, 15, 10], 5)
+        return np.where(positive, banded, 15)
     
     def _get_grade(self, score: float) -> str:
         """评级"""
@@ -29,7 +29,7 @@ class InvoiceProcessor:
     4. 更新Aging报表状态
     """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Optional[Session] = None):
         self.db = db
         self.pdf_parser = PDFParser()
     
@@ -58,6 +58,14 @@ class InvoiceProcessor:
         # 1. 解析文件内容
         parsed_data = self._parse_invoice_content(file_content, file_type)
         
+        return self.record_invoice(company_id, parsed_data)
+    
+    def record_invoice(self, company_id: int, parsed_data: Dict) -> Dict:
+        """
+        将已解析的发票入库（查重、供应商、发票、会计分录、Aging），返回值同 process_invoice_file
+        
+        解析（OCR）不访问数据库，可在入库前单独执行
+        """
         if not parsed_data["success"]:
             return {
                 "success": False,
@@ -693,6 +701,46 @@ class InvoiceProcessor:
 
 # ========== 便捷函数 ==========
 
+def _detect_file_type(filename: str) -> Optional[str]:
+    if filename.lower().endswith('.pdf'):
+        return 'pdf'
+    if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+        return 'image'
+    if filename.lower().endswith(('.xlsx', '.xls', '.csv')):
+        return 'excel'
+    return None
+
+
+def parse_supplier_invoice(file_content: bytes, filename: str) -> Dict:
+    """
+    便捷函数：识别文件类型并解析发票内容（PDF文本 / OCR / Excel）
+    
+    不访问数据库，可在CPU线程池中执行；结果交给 record_supplier_invoice 入库
+    """
+    file_type = _detect_file_type(filename)
+    if file_type is None:
+        return {
+            "success": False,
+            "error": f"不支持的文件类型: {filename}"
+        }
+    
+    logger.info(f"开始解析发票: file={filename}, type={file_type}")
+    return InvoiceProcessor()._parse_invoice_content(file_content, file_type)
+
+
+def record_supplier_invoice(
+    db: Session,
+    company_id: int,
+    filename: str,
+    parsed_data: Dict
+) -> Dict:
+    """
+    便捷函数：将 parse_supplier_invoice 的解析结果入库并生成会计分录
+    """
+    logger.info(f"发票入库: company_id={company_id}, file={filename}")
+    return InvoiceProcessor(db).record_invoice(company_id, parsed_data)
+
+
 def process_supplier_invoice(
     db: Session,
     company_id: int,
@@ -702,20 +750,9 @@ def process_supplier_invoice(
     """
     便捷函数：处理供应商发票
     
-    自动识别文件类型并处理
+    自动识别文件类型，解析后入库
     """
-    # 识别文件类型
-    if filename.lower().endswith('.pdf'):
-        file_type = 'pdf'
-    elif filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-        file_type = 'image'
-    elif filename.lower().endswith(('.xlsx', '.xls', '.csv')):
-        file_type = 'excel'
-    else:
-        return {
-            "success": False,
-            "error": f"不支持的文件类型: {filename}"
-        }
-    
-    processor = InvoiceProcessor(db)
-    return processor.process_invoice_file(company_id, file_content, filename, file_type)
+    parsed_data = parse_supplier_invoice(file_content, filename)
+    if _detect_file_type(filename) is None:
+        return parsed_data
+    return record_supplier_invoice(db, company_id, filename, parsed_data)
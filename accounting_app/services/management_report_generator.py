@@ -16,6 +16,7 @@ from ..models import (
 )
 from .aging_calculator import AgingCalculator
 from .exception_manager import ExceptionManager
+from .period_balances import balances_as_of, period_activity
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,8 @@ class ManagementReportGenerator:
     def __init__(self, db: Session, company_id: int):
         self.db = db
         self.company_id = company_id
+        # as_of_date → 银行余额列表（Balance Sheet 与银行余额部分共用一次查询）
+        self._bank_balances_cache: Dict[date, List[Dict]] = {}
     
     def generate_monthly_report(
         self, 
@@ -127,26 +130,9 @@ class ManagementReportGenerator:
         """
         logger.info(f"汇总P&L数据: company_id={self.company_id}, period={period_start} to {period_end}")
         
-        # 查询所有已过账的journal entries（严格小于period_end，排除下月数据）
-        query = (
-            self.db.query(
-                ChartOfAccounts.account_type,
-                ChartOfAccounts.account_name,
-                func.sum(JournalEntryLine.credit_amount - JournalEntryLine.debit_amount).label('net_amount')
-            )
-            .join(JournalEntryLine, JournalEntryLine.account_id == ChartOfAccounts.id)
-            .join(JournalEntry, JournalEntry.id == JournalEntryLine.journal_entry_id)
-            .filter(
-                ChartOfAccounts.company_id == self.company_id,
-                JournalEntry.company_id == self.company_id,
-                JournalEntry.entry_date >= period_start,
-                JournalEntry.entry_date < period_end,  # 严格小于（不包含period_end）
-                JournalEntry.status == 'posted'
-            )
-            .group_by(ChartOfAccounts.account_type, ChartOfAccounts.account_name)
-        )
-        
-        results = query.all()
+        # 已过账分录的本期发生额（严格小于period_end，排除下月数据）
+        # 已月结的期间直接读取物化的本期发生额
+        activity = period_activity(self.db, self.company_id, period_start, period_end)
         
         # 分类汇总
         income_total = Decimal('0')
@@ -154,10 +140,8 @@ class ManagementReportGenerator:
         income_details = {}
         expense_details = {}
         
-        for row in results:
-            account_type = row.account_type
-            account_name = row.account_name
-            net_amount = Decimal(str(row.net_amount or 0))
+        for (account_type, account_name), debit_minus_credit in activity.items():
+            net_amount = -debit_minus_credit
             
             if account_type == 'income':
                 income_total += net_amount
@@ -209,25 +193,9 @@ class ManagementReportGenerator:
         """
         logger.info(f"汇总Balance Sheet数据: company_id={self.company_id}, as_of={as_of_date}")
         
-        # 查询所有账户的累计余额（严格小于as_of_date，截止到前一天）
-        query = (
-            self.db.query(
-                ChartOfAccounts.account_type,
-                ChartOfAccounts.account_name,
-                func.sum(JournalEntryLine.debit_amount - JournalEntryLine.credit_amount).label('balance')
-            )
-            .join(JournalEntryLine, JournalEntryLine.account_id == ChartOfAccounts.id)
-            .join(JournalEntry, JournalEntry.id == JournalEntryLine.journal_entry_id)
-            .filter(
-                ChartOfAccounts.company_id == self.company_id,
-                JournalEntry.company_id == self.company_id,
-                JournalEntry.entry_date < as_of_date,  # 严格小于（不包含as_of_date）
-                JournalEntry.status == 'posted'
-            )
-            .group_by(ChartOfAccounts.account_type, ChartOfAccounts.account_name)
-        )
-        
-        results = query.all()
+        # 所有账户的累计余额（严格小于as_of_date，截止到前一天）
+        # = 最近一个已月结期间的物化余额 + 之后未结期间的分录
+        balances = balances_as_of(self.db, self.company_id, as_of_date)
         
         # 分类汇总
         asset_total = Decimal('0')
@@ -238,11 +206,7 @@ class ManagementReportGenerator:
         liability_details = {}
         equity_details = {}
         
-        for row in results:
-            account_type = row.account_type
-            account_name = row.account_name
-            balance = Decimal(str(row.balance or 0))
-            
+        for (account_type, account_name), balance in balances.items():
             if account_type == 'asset':
                 asset_total += balance
                 asset_details[account_name] = float(balance)
@@ -359,6 +323,9 @@ class ManagementReportGenerator:
         """
         生成银行账户余额列表 - 从bank_statements获取最新余额
         """
+        if as_of_date in self._bank_balances_cache:
+            return self._bank_balances_cache[as_of_date]
+        
         logger.info(f"查询银行余额: company_id={self.company_id}, as_of={as_of_date}")
         
         # 查询所有银行账户（按account_number分组，严格小于as_of_date）
@@ -398,6 +365,7 @@ class ManagementReportGenerator:
                 "last_updated": stmt.transaction_date.isoformat()
             })
         
+        self._bank_balances_cache[as_of_date] = balances
         return balances
     
     def _generate_data_quality_metrics(
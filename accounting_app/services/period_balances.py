@@ -0,0 +1,398 @@
+"""
+期末科目余额物化（account_period_balances）
+按 公司 × 科目 × 期间 保存本期借贷发生额与截至期末的累计借贷额
+
+- 月结时 materialize_period_balances() 以上一个已物化期间的累计额 + 两期之间的分录生成本期行
+- 分录过账 / 冲销 / 删除时，Session 监听器把差额增量写入分录所在期间及之后所有已物化期间
+- 报表：余额 = 最近一个已物化期间的累计额 + 之后未结期间的少量分录；
+  已物化期间的P&L直接取本期发生额
+
+报表耗时只与未结期间的分录量有关，不再随公司账龄增长
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import and_, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from ..models import AccountPeriodBalance, ChartOfAccounts, JournalEntry, JournalEntryLine
+
+logger = logging.getLogger(__name__)
+
+_balances = AccountPeriodBalance.__table__
+_entries = JournalEntry.__table__
+_lines = JournalEntryLine.__table__
+_accounts = ChartOfAccounts.__table__
+
+
+# ========== 期间工具 ==========
+
+def period_of(day: date) -> str:
+    return day.strftime('%Y-%m')
+
+
+def period_bounds(period: str) -> Tuple[date, date]:
+    """'YYYY-MM' → (期初, 下月1日)"""
+    year, month = map(int, period.split('-'))
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def last_complete_period(as_of_date: date) -> str:
+    """as_of_date 之前（不含）最后一个完整月份"""
+    return period_of(as_of_date.replace(day=1) - timedelta(days=1))
+
+
+def _to_decimal(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+# ========== 物化（月结） ==========
+
+def latest_materialized_period(db, company_id: int, on_or_before: Optional[str] = None) -> Optional[str]:
+    query = select(func.max(_balances.c.period)).where(_balances.c.company_id == company_id)
+    if on_or_before:
+        query = query.where(_balances.c.period <= on_or_before)
+    return db.execute(query).scalar()
+
+
+def _posted_activity(db, company_id: int, start: Optional[date], end: date) -> Dict[int, Tuple[Decimal, Decimal]]:
+    """[start, end) 内已过账分录按科目汇总的借贷额（过滤条件与报表原查询一致）"""
+    conditions = [
+        _accounts.c.company_id == company_id,
+        _entries.c.company_id == company_id,
+        _entries.c.entry_date < end,
+        _entries.c.status == 'posted',
+    ]
+    if start is not None:
+        conditions.append(_entries.c.entry_date >= start)
+    rows = db.execute(
+        select(
+            _lines.c.account_id,
+            func.sum(_lines.c.debit_amount).label('debit'),
+            func.sum(_lines.c.credit_amount).label('credit'),
+        )
+        .select_from(
+            _lines.join(_entries, _entries.c.id == _lines.c.journal_entry_id)
+                  .join(_accounts, _accounts.c.id == _lines.c.account_id)
+        )
+        .where(and_(*conditions))
+        .group_by(_lines.c.account_id)
+    ).all()
+    return {row.account_id: (_to_decimal(row.debit), _to_decimal(row.credit)) for row in rows}
+
+
+def materialize_period_balances(db: Session, company_id: int, period: str) -> int:
+    """
+    生成（或重建）某期间的期末余额行
+
+    以该期间之前最近一个已物化期间为起点，只汇总两期之间的分录；
+    首次物化时从公司第一笔分录开始汇总（一次性）
+
+    Returns:
+        写入的科目行数
+    """
+    period_start, period_end = period_bounds(period)
+    previous = db.execute(
+        select(func.max(_balances.c.period)).where(
+            _balances.c.company_id == company_id,
+            _balances.c.period < period
+        )
+    ).scalar()
+
+    closing: Dict[int, List[Decimal]] = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    gap_start = None
+    if previous:
+        for row in db.execute(
+            select(_balances.c.account_id, _balances.c.closing_debit, _balances.c.closing_credit).where(
+                _balances.c.company_id == company_id,
+                _balances.c.period == previous
+            )
+        ):
+            closing[row.account_id] = [_to_decimal(row.closing_debit), _to_decimal(row.closing_credit)]
+        gap_start = period_bounds(previous)[1]
+
+    # 上一物化期间之后、本期之前的分录
+    if gap_start is None or gap_start < period_start:
+        for account_id, (debit, credit) in _posted_activity(db, company_id, gap_start, period_start).items():
+            closing[account_id][0] += debit
+            closing[account_id][1] += credit
+
+    activity = _posted_activity(db, company_id, period_start, period_end)
+    rows = []
+    for account_id in set(closing) | set(activity):
+        period_debit, period_credit = activity.get(account_id, (Decimal('0'), Decimal('0')))
+        opening_debit, opening_credit = closing[account_id]
+        rows.append({
+            'company_id': company_id,
+            'account_id': account_id,
+            'period': period,
+            'period_debit': period_debit,
+            'period_credit': period_credit,
+            'closing_debit': opening_debit + period_debit,
+            'closing_credit': opening_credit + period_credit,
+        })
+
+    db.execute(_balances.delete().where(
+        _balances.c.company_id == company_id,
+        _balances.c.period == period
+    ))
+    if rows:
+        db.execute(_balances.insert(), rows)
+    db.commit()
+
+    logger.info(f"期末余额已物化: company_id={company_id}, period={period}, accounts={len(rows)}")
+    return len(rows)
+
+
+# ========== 报表读取 ==========
+
+def _group_by_type_and_name(db, company_id: int, amounts: Dict[int, Tuple[Decimal, Decimal]]) -> Dict[Tuple[str, str], Decimal]:
+    """科目ID → (account_type, account_name) 汇总 借-贷"""
+    if not amounts:
+        return {}
+    grouped: Dict[Tuple[str, str], Decimal] = defaultdict(Decimal)
+    account_ids = list(amounts)
+    for start in range(0, len(account_ids), 500):
+        chunk = account_ids[start:start + 500]
+        for row in db.execute(
+            select(_accounts.c.id, _accounts.c.account_type, _accounts.c.account_name).where(
+                _accounts.c.company_id == company_id,
+                _accounts.c.id.in_(chunk)
+            )
+        ):
+            debit, credit = amounts[row.id]
+            grouped[(row.account_type, row.account_name)] += debit - credit
+    return dict(grouped)
+
+
+def balances_as_of(db, company_id: int, as_of_date: date) -> Dict[Tuple[str, str], Decimal]:
+    """
+    截至 as_of_date（不含）的累计余额（借-贷），按 (account_type, account_name) 汇总
+
+    = 最近一个已物化期间的期末累计额 + 之后到 as_of_date 之间的已过账分录
+    """
+    snapshot_period = latest_materialized_period(db, company_id, last_complete_period(as_of_date))
+    amounts: Dict[int, List[Decimal]] = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    delta_start = None
+
+    if snapshot_period:
+        for row in db.execute(
+            select(_balances.c.account_id, _balances.c.closing_debit, _balances.c.closing_credit).where(
+                _balances.c.company_id == company_id,
+                _balances.c.period == snapshot_period
+            )
+        ):
+            amounts[row.account_id] = [_to_decimal(row.closing_debit), _to_decimal(row.closing_credit)]
+        delta_start = period_bounds(snapshot_period)[1]
+
+    if delta_start is None or delta_start < as_of_date:
+        for account_id, (debit, credit) in _posted_activity(db, company_id, delta_start, as_of_date).items():
+            amounts[account_id][0] += debit
+            amounts[account_id][1] += credit
+
+    # 冲销后借贷累计都为0的科目视同没有已过账分录（与原查询一致）
+    return _group_by_type_and_name(db, company_id, {
+        account_id: tuple(values) for account_id, values in amounts.items() if any(values)
+    })
+
+
+def period_activity(db, company_id: int, period_start: date, period_end: date) -> Dict[Tuple[str, str], Decimal]:
+    """
+    [period_start, period_end) 的发生额（借-贷），按 (account_type, account_name) 汇总
+    完整的已物化月份直接读取本期发生额，其余情况汇总分录
+    """
+    period = period_of(period_start)
+    if period_start.day == 1 and period_bounds(period)[1] == period_end:
+        rows = db.execute(
+            select(_balances.c.account_id, _balances.c.period_debit, _balances.c.period_credit).where(
+                _balances.c.company_id == company_id,
+                _balances.c.period == period
+            )
+        ).all()
+        if rows:
+            return _group_by_type_and_name(db, company_id, {
+                row.account_id: (_to_decimal(row.period_debit), _to_decimal(row.period_credit))
+                for row in rows
+                if row.period_debit or row.period_credit
+            })
+    return _group_by_type_and_name(db, company_id, _posted_activity(db, company_id, period_start, period_end))
+
+
+# ========== 过账增量更新 ==========
+
+def apply_balance_deltas(connection, company_id: int, entry_date: date,
+                         deltas: Iterable[Tuple[int, Decimal, Decimal]]):
+    """
+    把一笔分录的借贷差额写入已物化的期间：
+    分录所在期间更新本期发生额，该期间及之后所有已物化期间更新累计额
+    """
+    entry_period = period_of(entry_date)
+    periods = [row[0] for row in connection.execute(
+        select(_balances.c.period).where(
+            _balances.c.company_id == company_id,
+            _balances.c.period >= entry_period
+        ).distinct()
+    )]
+    if not periods:
+        return
+
+    for account_id, debit, credit in deltas:
+        if not debit and not credit:
+            continue
+        existing = {row[0] for row in connection.execute(
+            select(_balances.c.period).where(
+                _balances.c.company_id == company_id,
+                _balances.c.account_id == account_id,
+                _balances.c.period >= entry_period
+            )
+        )}
+        # 该科目在这些期间还没有行：之前累计为0
+        missing = [p for p in periods if p not in existing]
+        if missing:
+            connection.execute(_balances.insert(), [{
+                'company_id': company_id,
+                'account_id': account_id,
+                'period': p,
+                'period_debit': Decimal('0'),
+                'period_credit': Decimal('0'),
+                'closing_debit': Decimal('0'),
+                'closing_credit': Decimal('0'),
+            } for p in missing])
+
+        account_rows = and_(
+            _balances.c.company_id == company_id,
+            _balances.c.account_id == account_id,
+        )
+        connection.execute(
+            _balances.update().where(account_rows, _balances.c.period >= entry_period).values(
+                closing_debit=_balances.c.closing_debit + debit,
+                closing_credit=_balances.c.closing_credit + credit,
+            )
+        )
+        connection.execute(
+            _balances.update().where(account_rows, _balances.c.period == entry_period).values(
+                period_debit=_balances.c.period_debit + debit,
+                period_credit=_balances.c.period_credit + credit,
+            )
+        )
+
+
+def _entry_lines(connection, entry_id: int) -> List[Tuple[int, Decimal, Decimal]]:
+    return [
+        (row.account_id, _to_decimal(row.debit_amount), _to_decimal(row.credit_amount))
+        for row in connection.execute(
+            select(_lines.c.account_id, _lines.c.debit_amount, _lines.c.credit_amount)
+            .where(_lines.c.journal_entry_id == entry_id)
+        )
+    ]
+
+
+def _stored_entry(connection, entry_id: int):
+    return connection.execute(
+        select(_entries.c.company_id, _entries.c.entry_date, _entries.c.status)
+        .where(_entries.c.id == entry_id)
+    ).first()
+
+
+def _negate(lines):
+    return [(account_id, -debit, -credit) for account_id, debit, credit in lines]
+
+
+def _company_has_snapshots(connection, company_id: int, cache: Dict[int, bool]) -> bool:
+    if company_id not in cache:
+        cache[company_id] = connection.execute(
+            select(_balances.c.id).where(_balances.c.company_id == company_id).limit(1)
+        ).first() is not None
+    return cache[company_id]
+
+
+def _has_changes(obj, attrs) -> bool:
+    state = obj._sa_instance_state
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+_ENTRY_ATTRS = ('status', 'entry_date', 'company_id')
+_LINE_ATTRS = ('account_id', 'debit_amount', 'credit_amount')
+
+
+@event.listens_for(Session, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    """
+    写库前：按数据库中的旧值冲减已物化余额
+    （删除的分录 / 行、状态 / 日期 / 公司变更的分录、金额变更的行）
+    """
+    changed_entries = [obj for obj in session.dirty
+                       if isinstance(obj, JournalEntry) and _has_changes(obj, _ENTRY_ATTRS)]
+    deleted_entries = [obj for obj in session.deleted if isinstance(obj, JournalEntry)]
+    changed_lines = [obj for obj in session.deleted if isinstance(obj, JournalEntryLine)]
+    changed_lines += [obj for obj in session.dirty
+                      if isinstance(obj, JournalEntryLine) and _has_changes(obj, _LINE_ATTRS)]
+    if not changed_entries and not deleted_entries and not changed_lines:
+        return
+
+    connection = session.connection()
+    cache: Dict[int, bool] = {}
+    handled_entries = set()
+    for entry in changed_entries + deleted_entries:
+        entry_id = inspect(entry).identity[0]
+        handled_entries.add(entry_id)
+        stored = _stored_entry(connection, entry_id)
+        if stored is None or stored.status != 'posted' or not _company_has_snapshots(connection, stored.company_id, cache):
+            continue
+        apply_balance_deltas(connection, stored.company_id, stored.entry_date,
+                             _negate(_entry_lines(connection, entry_id)))
+    # after_flush 按新状态重新计入这些分录的全部行
+    session.info['period_balance_entries'] = {
+        inspect(entry).identity[0] for entry in changed_entries
+    }
+
+    for line in changed_lines:
+        stored_line = connection.execute(
+            select(_lines.c.journal_entry_id, _lines.c.account_id, _lines.c.debit_amount, _lines.c.credit_amount)
+            .where(_lines.c.id == inspect(line).identity[0])
+        ).first()
+        if stored_line is None or stored_line.journal_entry_id in handled_entries:
+            continue
+        stored = _stored_entry(connection, stored_line.journal_entry_id)
+        if stored is None or stored.status != 'posted' or not _company_has_snapshots(connection, stored.company_id, cache):
+            continue
+        apply_balance_deltas(connection, stored.company_id, stored.entry_date, [
+            (stored_line.account_id, -_to_decimal(stored_line.debit_amount), -_to_decimal(stored_line.credit_amount))
+        ])
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    """写库后：按新值计入已物化余额（新增的行、变更后的分录与行）"""
+    handled_entries = session.info.pop('period_balance_entries', set())
+    new_lines = [obj for obj in session.new if isinstance(obj, JournalEntryLine)]
+    dirty_lines = [obj for obj in session.dirty
+                   if isinstance(obj, JournalEntryLine) and _has_changes(obj, _LINE_ATTRS)]
+    if not handled_entries and not new_lines and not dirty_lines:
+        return
+
+    connection = session.connection()
+    cache: Dict[int, bool] = {}
+    by_entry: Dict[int, List[Tuple[int, Decimal, Decimal]]] = defaultdict(list)
+    for entry_id in handled_entries:
+        by_entry[entry_id] = _entry_lines(connection, entry_id)
+    for line in new_lines + dirty_lines:
+        if line.journal_entry_id in handled_entries:
+            continue
+        by_entry[line.journal_entry_id].append(
+            (line.account_id, _to_decimal(line.debit_amount), _to_decimal(line.credit_amount))
+        )
+
+    entries = connection.execute(
+        select(_entries.c.id, _entries.c.company_id, _entries.c.entry_date, _entries.c.status)
+        .where(_entries.c.id.in_(list(by_entry)))
+    ).all()
+    for entry in entries:
+        if entry.status != 'posted' or not _company_has_snapshots(connection, entry.company_id, cache):
+            continue
+        apply_balance_deltas(connection, entry.company_id, entry.entry_date, by_entry[entry.id])
@@ -0,0 +1,203 @@
+"""
+权限缓存服务
+- 角色权限矩阵：一次加载 permissions 表，之后以字典查找回答 check_permission
+- Session token → 用户的短TTL缓存（LRU，条数有上限）：命中时无需读取session存储和 users 表，
+  条目不会晚于session本身的过期时间
+- 失效：ORM 修改 permissions / users / user_company_roles 的事务提交后自动失效；
+  批量 query.update() 等绕过ORM事件的写入、用户登出时显式调用失效钩子
+"""
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from ..models import User, Permission, UserCompanyRole
+
+logger = logging.getLogger(__name__)
+
+# 权限矩阵最长缓存时间（秒）：多worker部署时，其他进程的变更最迟在此时间后生效
+PERMISSION_MATRIX_MAX_AGE = int(os.getenv("PERMISSION_MATRIX_MAX_AGE", "300"))
+
+# token → 用户缓存TTL（秒）
+USER_TOKEN_CACHE_TTL = int(os.getenv("USER_TOKEN_CACHE_TTL", "30"))
+
+# token → 用户缓存最多条数，超出时淘汰最久未使用的
+USER_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("USER_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+
+class PermissionMatrix:
+    """角色权限矩阵：{role: {(resource, action), ...}}"""
+
+    def __init__(self, max_age: int = PERMISSION_MATRIX_MAX_AGE):
+        self.max_age = max_age
+        self._matrix: Optional[Dict[str, Set[Tuple[str, str]]]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session) -> Dict[str, Set[Tuple[str, str]]]:
+        matrix: Dict[str, Set[Tuple[str, str]]] = {}
+        rows = db.query(Permission.role, Permission.resource, Permission.action).filter(
+            Permission.allowed == True
+        ).all()
+        for role, resource, action in rows:
+            matrix.setdefault(role, set()).add((resource, action))
+        logger.info(f"权限矩阵已加载：{len(rows)} 条权限，{len(matrix)} 个角色")
+        return matrix
+
+    def get(self, db: Session) -> Dict[str, Set[Tuple[str, str]]]:
+        matrix = self._matrix
+        if matrix is not None and time.monotonic() - self._loaded_at < self.max_age:
+            return matrix
+
+        with self._lock:
+            if self._matrix is None or time.monotonic() - self._loaded_at >= self.max_age:
+                self._matrix = self._load(db)
+                self._loaded_at = time.monotonic()
+            return self._matrix
+
+    def match(self, db: Session, role: str, resource: str, action: str) -> Optional[str]:
+        """
+        按 check_permission 的优先级返回命中的规则类型
+
+        Returns:
+            'exact' / 'resource_wildcard' / 'action_wildcard' / 'full_wildcard' / None
+        """
+        granted = self.get(db).get(role)
+        if not granted:
+            return None
+        if (resource, action) in granted:
+            return 'exact'
+        if ('*', action) in granted:
+            return 'resource_wildcard'
+        if (resource, '*') in granted:
+            return 'action_wildcard'
+        if ('*', '*') in granted:
+            return 'full_wildcard'
+        return None
+
+    def invalidate(self):
+        with self._lock:
+            self._matrix = None
+            self._loaded_at = 0.0
+
+
+class UserTokenCache:
+    """session token → 用户的短TTL LRU缓存（缓存脱离session的User快照）"""
+
+    def __init__(self, ttl: int = USER_TOKEN_CACHE_TTL, max_entries: int = USER_TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, db: Session, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+        # load=False：绑定到当前请求的session，不产生数据库查询
+        return db.merge(user, load=False)
+
+    def put(self, token: str, user: User, expires_at: Optional[datetime] = None):
+        """expires_at：session过期时间，缓存条目不超过该时间"""
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.now()).total_seconds())
+        if ttl <= 0:
+            return
+        # 复制一份脱离session的快照，调用方仍使用原对象
+        snapshot = User(**{
+            column.key: getattr(user, column.key)
+            for column in User.__table__.columns
+        })
+        make_transient_to_detached(snapshot)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[token] = (snapshot, now + ttl)
+            self._entries.move_to_end(token)
+            if len(self._entries) > self.max_entries:
+                # 先清理已过期的，仍超出上限时淘汰最久未使用的
+                for expired in [t for t, (_, expires_at) in self._entries.items() if expires_at < now]:
+                    del self._entries[expired]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in [t for t, (u, _) in self._entries.items() if u.id == user_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+permission_matrix = PermissionMatrix()
+user_token_cache = UserTokenCache()
+
+
+def invalidate_permissions():
+    """permissions 表变更后调用"""
+    permission_matrix.invalidate()
+    logger.info("权限矩阵缓存已失效")
+
+
+def invalidate_user(user_id: int):
+    """用户信息或用户公司角色变更后调用"""
+    user_token_cache.invalidate_user(user_id)
+
+
+def invalidate_all():
+    permission_matrix.invalidate()
+    user_token_cache.clear()
+
+
+# ============================================================
+# ORM写入后自动失效（事务提交后才失效，避免并发请求在提交前重新缓存旧值）
+# ============================================================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    changed = list(session.new) + list(session.deleted) + [
+        obj for obj in session.dirty if session.is_modified(obj, include_collections=False)
+    ]
+    user_ids = session.info.setdefault('permission_cache_users', set())
+    for obj in changed:
+        if isinstance(obj, Permission):
+            session.info['permission_cache_matrix'] = True
+        elif isinstance(obj, User) and obj.id is not None:
+            user_ids.add(obj.id)
+        elif isinstance(obj, UserCompanyRole) and obj.user_id is not None:
+            user_ids.add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    if session.info.pop('permission_cache_matrix', False):
+        invalidate_permissions()
+    for user_id in session.info.pop('permission_cache_users', ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('permission_cache_matrix', None)
+    session.info.pop('permission_cache_users', None)
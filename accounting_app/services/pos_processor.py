@@ -51,13 +51,41 @@ class POSProcessor:
         7. 生成会计分录
         8. 更新AR Aging
         """
+        parsed_data = self.parse_pos_file(file_content, file_name)
+        return self.record_pos_report(company_id, parsed_data, file_name, auto_generate_invoices)
+    
+    def parse_pos_file(self, file_content: bytes, file_name: str) -> Dict:
+        """
+        解析POS文件（流程1-2）
+        
+        不访问数据库，可在CPU线程池中执行；结果交给 record_pos_report 入库
+        """
         try:
             # 1. 确定文件类型
             file_type = self._determine_file_type(file_name)
             
             # 2. 解析文件内容
-            parsed_data = self._parse_pos_content(file_content, file_type)
-            
+            return self._parse_pos_content(file_content, file_type)
+        
+        except Exception as e:
+            logger.error(f"POS文件解析失败: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "error": "POS文件解析失败",
+                "details": str(e)
+            }
+    
+    def record_pos_report(
+        self,
+        company_id: int,
+        parsed_data: Dict,
+        file_name: str,
+        auto_generate_invoices: bool = True
+    ) -> Dict:
+        """
+        将已解析的POS报表入库（流程3-8），返回值同 process_pos_file
+        """
+        try:
             if not parsed_data["success"]:
                 return {
                     "success": False,
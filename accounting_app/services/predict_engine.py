@@ -3,10 +3,14 @@ AI预测引擎服务
 基于 monthly_statements 表历史数据预测未来3个月财务趋势
 Safe for AI V3 Stable Baseline
 """
-import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 
+import numpy as np
+
+from analytics import vectorized_metrics as vm
+from analytics.monthly_feature_store import MonthlyFeatureMatrix, load_customer_features
+
 
 class PredictEngine:
     def __init__(self):
@@ -14,7 +18,7 @@ class PredictEngine:
     
     def predict_next_3_months(self, customer_id: int) -> Dict[str, Any]:
         """
-        基于历史数据预测未来3个月的财务状况
+        基于历史数据预测未来3个月的财务状况（读取客户月度特征表）
         
         Returns:
             {
@@ -24,28 +28,11 @@ class PredictEngine:
                 "summary": {...}      # 汇总信息
             }
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
         # 获取最近12个月的历史数据
-        cursor.execute("""
-            SELECT 
-                statement_month,
-                closing_balance_total,
-                owner_expenses + gz_expenses as total_expenses,
-                owner_payments + gz_payments as total_payments,
-                previous_balance_total
-            FROM monthly_statements
-            WHERE customer_id = ?
-            ORDER BY statement_month DESC
-            LIMIT 12
-        """, (customer_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        features = load_customer_features(self.db_path, [customer_id], window=12)
+        history = features.history(customer_id)
         
-        if not rows:
+        if not history:
             return {
                 "error": "No historical data found",
                 "historical": [],
@@ -53,20 +40,20 @@ class PredictEngine:
                 "confidence": 0
             }
         
-        # 转换为字典列表
-        historical = [dict(row) for row in rows]
-        historical.reverse()  # 按时间正序
+        # 按时间正序，字段名与 monthly_statements 一致
+        historical = [{
+            "statement_month": h["month"],
+            "closing_balance_total": h["closing_balance"],
+            "total_expenses": h["expenses"],
+            "total_payments": h["payments"],
+            "previous_balance_total": h["previous_balance"],
+        } for h in history]
         
-        # 计算平均值用于预测
-        avg_expenses = sum(h["total_expenses"] for h in historical) / len(historical)
-        avg_payments = sum(h["total_payments"] for h in historical) / len(historical)
-        
-        # 计算趋势斜率（简化线性回归）
-        if len(historical) >= 3:
-            recent_3_expenses = [h["total_expenses"] for h in historical[-3:]]
-            expense_trend = (recent_3_expenses[-1] - recent_3_expenses[0]) / 3
-        else:
-            expense_trend = 0
+        # 平均值与趋势斜率（最近3个月的平均每月变化）
+        avg_expenses = float(vm.row_mean(features.expenses)[0])
+        avg_payments = float(vm.row_mean(features.payments)[0])
+        expense_trend = float(vm.recent_slope(features.expenses, 3)[0])
+        confidence = float(self.confidence(features)[0])
         
         # 生成未来3个月预测
         predictions = []
@@ -89,7 +76,7 @@ class PredictEngine:
                 "predicted_expenses": round(predicted_expenses, 2),
                 "predicted_payments": round(predicted_payments, 2),
                 "predicted_balance": round(predicted_balance, 2),
-                "confidence": self._calculate_confidence(historical)
+                "confidence": confidence
             })
         
         # 汇总信息
@@ -103,7 +90,7 @@ class PredictEngine:
         return {
             "historical": historical[-6:],  # 只返回最近6个月
             "predictions": predictions,
-            "confidence": self._calculate_confidence(historical),
+            "confidence": confidence,
             "summary": summary
         }
     
@@ -123,27 +110,15 @@ class PredictEngine:
         
         return f"{year}-{month:02d}"
     
-    def _calculate_confidence(self, historical: List[Dict]) -> float:
+    def confidence(self, features: MonthlyFeatureMatrix) -> np.ndarray:
         """
-        计算预测置信度
-        基于数据完整性和稳定性
+        计算预测置信度（所有客户一次计算）
+        基于数据完整性和稳定性：满12个月时按支出方差判断稳定性
         """
-        if len(historical) < 3:
-            return 0.5
-        elif len(historical) < 6:
-            return 0.7
-        elif len(historical) < 12:
-            return 0.85
-        else:
-            # 计算方差来判断数据稳定性
-            expenses = [h["total_expenses"] for h in historical]
-            avg = sum(expenses) / len(expenses)
-            variance = sum((x - avg) ** 2 for x in expenses) / len(expenses)
-            
-            # 方差小说明数据稳定，置信度高
-            if variance < avg * 0.2:
-                return 0.95
-            elif variance < avg * 0.5:
-                return 0.85
-            else:
-                return 0.75
+        counts = features.counts
+        variance = vm.row_variance(features.expenses)
+        avg = vm.row_mean(features.expenses)
+        
+        # 方差小说明数据稳定，置信度高
+        stability = np.select([variance < avg * 0.2, variance < avg * 0.5], [0.95, 0.85], 0.75)
+        return np.select([counts < 3, counts < 6, counts < 12], [0.5, 0.7, 0.85], stability)
@@ -0,0 +1,193 @@
+"""
+登录Session存储后端
+- DatabaseSessionBackend：user_sessions 表（SQLite/PostgreSQL），多个uvicorn worker共享
+- MemorySessionBackend：进程内字典 + 按过期时间排序的堆（单进程/测试用）
+
+通过环境变量 SESSION_BACKEND 选择：database（默认）/ memory
+"""
+import hashlib
+import heapq
+from abc import ABC, abstractmethod
+import os
+import threading
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models import UserSession
+
+logger = logging.getLogger(__name__)
+
+# 每批清理的过期session数量
+SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", "500"))
+
+
+class SessionBackend(ABC):
+    """Session存储接口，session数据格式：{user_id, company_id, username, role, expires_at}"""
+
+    @abstractmethod
+    def save(self, token: str, data: Dict) -> None:
+        """保存session（同一token覆盖）"""
+
+    @abstractmethod
+    def get(self, token: str) -> Optional[Dict]:
+        """读取session（不存在时返回None）"""
+
+    @abstractmethod
+    def delete(self, token: str) -> Optional[Dict]:
+        """删除session，返回被删除的数据（不存在时返回None）"""
+
+    @abstractmethod
+    def cleanup_expired(self, now: Optional[datetime] = None, batch_size: int = SESSION_SWEEP_BATCH_SIZE) -> int:
+        """清理过期session，返回清理数量"""
+
+
+class MemorySessionBackend(SessionBackend):
+    """进程内存储；过期清理只弹出堆顶已过期的条目，无需全表扫描"""
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict] = {}
+        self._expiry_heap: List[Tuple[datetime, str]] = []
+        self._lock = threading.Lock()
+
+    def save(self, token: str, data: Dict) -> None:
+        with self._lock:
+            self._sessions[token] = dict(data)
+            heapq.heappush(self._expiry_heap, (data['expires_at'], token))
+
+    def get(self, token: str) -> Optional[Dict]:
+        with self._lock:
+            data = self._sessions.get(token)
+            return dict(data) if data else None
+
+    def delete(self, token: str) -> Optional[Dict]:
+        # 堆中的条目在清理时惰性丢弃
+        with self._lock:
+            return self._sessions.pop(token, None)
+
+    def cleanup_expired(self, now: Optional[datetime] = None, batch_size: int = SESSION_SWEEP_BATCH_SIZE) -> int:
+        now = now or datetime.now()
+        removed = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] < now:
+                expires_at, token = heapq.heappop(self._expiry_heap)
+                data = self._sessions.get(token)
+                # 只有堆条目与当前session一致时才删除（token可能已被撤销或重新写入）
+                if data is not None and data['expires_at'] == expires_at:
+                    del self._sessions[token]
+                    removed += 1
+        return removed
+
+
+class DatabaseSessionBackend(SessionBackend):
+    """user_sessions 表存储；token只保存SHA-256哈希"""
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None):
+        if session_factory is None:
+            from ..db import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+
+    @staticmethod
+    def _hash(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _to_dict(row: UserSession) -> Dict:
+        return {
+            'user_id': row.user_id,
+            'company_id': row.company_id,
+            'username': row.username,
+            'role': row.role,
+            'expires_at': row.expires_at
+        }
+
+    def save(self, token: str, data: Dict) -> None:
+        db = self._session_factory()
+        try:
+            db.merge(UserSession(
+                token_hash=self._hash(token),
+                user_id=data['user_id'],
+                company_id=data.get('company_id'),
+                username=data['username'],
+                role=data['role'],
+                expires_at=data['expires_at']
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def get(self, token: str) -> Optional[Dict]:
+        db = self._session_factory()
+        try:
+            row = db.get(UserSession, self._hash(token))
+            return self._to_dict(row) if row else None
+        finally:
+            db.close()
+
+    def delete(self, token: str) -> Optional[Dict]:
+        db = self._session_factory()
+        try:
+            row = db.get(UserSession, self._hash(token))
+            if not row:
+                return None
+            data = self._to_dict(row)
+            db.delete(row)
+            db.commit()
+            return data
+        finally:
+            db.close()
+
+    def cleanup_expired(self, now: Optional[datetime] = None, batch_size: int = SESSION_SWEEP_BATCH_SIZE) -> int:
+        """按 expires_at 索引分批删除，避免长事务锁表"""
+        now = now or datetime.now()
+        removed = 0
+        db = self._session_factory()
+        try:
+            while True:
+                batch = [
+                    row.token_hash for row in
+                    db.query(UserSession.token_hash)
+                    .filter(UserSession.expires_at < now)
+                    .limit(batch_size)
+                    .all()
+                ]
+                if not batch:
+                    break
+                db.query(UserSession).filter(
+                    UserSession.token_hash.in_(batch)
+                ).delete(synchronize_session=False)
+                db.commit()
+                removed += len(batch)
+                if len(batch) < batch_size:
+                    break
+        finally:
+            db.close()
+        return removed
+
+
+_backend: Optional[SessionBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_session_backend() -> SessionBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = os.getenv("SESSION_BACKEND", "database").lower()
+                if kind == "memory":
+                    _backend = MemorySessionBackend()
+                else:
+                    _backend = DatabaseSessionBackend()
+                logger.info(f"Session存储后端：{type(_backend).__name__}")
+    return _backend
+
+
+def set_session_backend(backend: SessionBackend) -> None:
+    """替换Session存储后端（测试或自定义部署使用）"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
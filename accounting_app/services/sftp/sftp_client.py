@@ -4,13 +4,19 @@ SFTP 客户端模块
 """
 import os
 import json
+import time
+import posixpath
+import threading
 import paramiko
 import logging
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Set, Tuple
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_PARALLEL_UPLOADS = 4
+
 
 class SFTPClient:
     """SFTP 客户端，管理与 SQL ACC ERP Edition 的连接"""
@@ -37,6 +43,9 @@ class SFTPClient:
         self.private_key_path = config.get("private_key_path", "")
         self.verify_host_key = config.get("verify_host_key", True)  # 默认启用host key验证
         self.known_hosts_path = config.get("known_hosts_path", os.path.expanduser("~/.ssh/known_hosts"))
+        # 同一会话上并发上传的 SFTP 通道数
+        self.max_parallel_uploads = max(1, int(config.get(
+            "max_parallel_uploads", os.getenv("SFTP_MAX_PARALLEL_UPLOADS", DEFAULT_MAX_PARALLEL_UPLOADS))))
         
         # 验证必需配置
         if not all([self.host, self.username]):
@@ -47,21 +56,13 @@ class SFTPClient:
         
         logger.info(f"✅ SFTP Client initialized for {self.username}@{self.host}:{self.port}")
     
-    @contextmanager
-    def get_connection(self):
+    def _open_transport(self) -> paramiko.Transport:
         """
-        获取 SFTP 连接（上下文管理器）
-        
-        使用方法:
-            with client.get_connection() as sftp:
-                sftp.put(local_path, remote_path)
-        
-        Yields:
-            paramiko.SFTPClient: SFTP连接对象
+        建立已认证的 SSH transport（握手 + host key验证 + 认证）
+
+        一个 transport 上可以打开多个 SFTP 通道，同步时每次运行只握手一次
         """
         transport = None
-        sftp = None
-        
         try:
             # 建立 SSH transport
             transport = paramiko.Transport((self.host, self.port))
@@ -150,6 +151,30 @@ class SFTPClient:
                 transport.auth_password(self.username, self.password)
                 logger.info(f"🔑 Connected using password authentication")
             
+            return transport
+        except Exception:
+            if transport:
+                transport.close()
+            raise
+
+    @contextmanager
+    def get_connection(self):
+        """
+        获取 SFTP 连接（上下文管理器）
+        
+        使用方法:
+            with client.get_connection() as sftp:
+                sftp.put(local_path, remote_path)
+        
+        Yields:
+            paramiko.SFTPClient: SFTP连接对象
+        """
+        transport = None
+        sftp = None
+        
+        try:
+            transport = self._open_transport()
+            
             # 创建 SFTP 客户端
             sftp = paramiko.SFTPClient.from_transport(transport)
             logger.info(f"✅ SFTP connection established to {self.host}")
@@ -174,9 +199,37 @@ class SFTPClient:
                 transport.close()
                 logger.debug("SSH transport closed")
     
+    @contextmanager
+    def session(self):
+        """
+        获取一次同步运行共用的 SSH 会话（上下文管理器）
+        
+        使用方法:
+            with client.session() as session:
+                results = session.upload_many([(local_path, remote_path), ...])
+        
+        Yields:
+            SFTPSession: 一个已认证的 transport，每个上传线程一个 SFTP 通道
+        """
+        try:
+            transport = self._open_transport()
+        except paramiko.AuthenticationException as e:
+            logger.error(f"❌ SFTP authentication failed: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"❌ SFTP connection error: {e}")
+            raise
+        
+        session = SFTPSession(self, transport)
+        logger.info(f"✅ SFTP session established to {self.host}")
+        try:
+            yield session
+        finally:
+            session.close()
+    
     def upload_file(self, local_path: str, remote_path: str) -> Dict[str, Any]:
         """
-        上传单个文件到远程服务器
+        上传单个文件到远程服务器（单独建立一次连接；批量上传请使用 upload_files）
         
         Args:
             local_path: 本地文件路径
@@ -189,8 +242,6 @@ class SFTPClient:
                 - file_size: int (可选)
                 - duration: float (可选)
         """
-        import time
-        
         # 验证本地文件存在
         if not os.path.exists(local_path):
             return {
@@ -198,58 +249,89 @@ class SFTPClient:
                 "message": f"Local file not found: {local_path}"
             }
         
-        # 获取文件大小
-        file_size = os.path.getsize(local_path)
-        
         try:
-            start_time = time.time()
-            
             with self.get_connection() as sftp:
-                # 确保远程目录存在
-                remote_dir = os.path.dirname(remote_path)
-                self._ensure_remote_dir(sftp, remote_dir)
-                
-                # 上传文件
-                sftp.put(local_path, remote_path)
-                
-                duration = time.time() - start_time
-                
-                logger.info(f"✅ Uploaded: {local_path} → {remote_path} ({file_size} bytes, {duration:.2f}s)")
-                
-                return {
-                    "success": True,
-                    "message": f"File uploaded successfully: {os.path.basename(local_path)}",
-                    "file_size": file_size,
-                    "duration": duration
-                }
-                
+                return self._put(sftp, local_path, remote_path)
         except Exception as e:
-            logger.error(f"❌ Upload failed: {local_path} | Error: {e}")
-            return {
-                "success": False,
-                "message": f"Upload failed: {str(e)}",
-                "error": str(e)
-            }
+            return self._failure(local_path, e)
+    
+    def upload_files(self, items: List[Tuple[str, str]],
+                     max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        在同一个 SSH 会话上批量上传，多个 SFTP 通道并发
+        
+        Args:
+            items: [(本地路径, 远程路径), ...]
+            max_workers: 并发通道数（默认 max_parallel_uploads）
+        
+        Returns:
+            与 items 顺序一致的上传结果列表（格式同 upload_file）
+        """
+        if not items:
+            return []
+        try:
+            with self.session() as session:
+                return session.upload_many(items, max_workers=max_workers)
+        except Exception as e:
+            # 连接失败：所有文件按失败返回，由重试逻辑处理
+            return [self._failure(local_path, e) for local_path, _ in items]
+    
+    def _put(self, sftp: paramiko.SFTPClient, local_path: str, remote_path: str,
+             known_dirs: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """在已建立的 SFTP 通道上上传一个文件"""
+        file_size = os.path.getsize(local_path)
+        start_time = time.time()
+        
+        # 确保远程目录存在
+        self._ensure_remote_dir(sftp, posixpath.dirname(remote_path), known_dirs)
+        
+        # 上传文件
+        sftp.put(local_path, remote_path)
+        
+        duration = time.time() - start_time
+        logger.info(f"✅ Uploaded: {local_path} → {remote_path} ({file_size} bytes, {duration:.2f}s)")
+        
+        return {
+            "success": True,
+            "message": f"File uploaded successfully: {os.path.basename(local_path)}",
+            "file_size": file_size,
+            "duration": duration
+        }
     
-    def _ensure_remote_dir(self, sftp: paramiko.SFTPClient, remote_dir: str):
+    @staticmethod
+    def _failure(local_path: str, error: Exception) -> Dict[str, Any]:
+        logger.error(f"❌ Upload failed: {local_path} | Error: {error}")
+        return {
+            "success": False,
+            "message": f"Upload failed: {str(error)}",
+            "error": str(error)
+        }
+    
+    def _ensure_remote_dir(self, sftp: paramiko.SFTPClient, remote_dir: str,
+                           known_dirs: Optional[Set[str]] = None):
         """
         确保远程目录存在，不存在则创建
         
         Args:
             sftp: SFTP客户端
             remote_dir: 远程目录路径
+            known_dirs: 本次会话已确认存在的目录（避免重复 stat）
         """
+        if known_dirs is not None and remote_dir in known_dirs:
+            return
         try:
             sftp.stat(remote_dir)
             logger.debug(f"Remote dir exists: {remote_dir}")
         except FileNotFoundError:
             # 目录不存在，递归创建
-            parent_dir = os.path.dirname(remote_dir)
+            parent_dir = posixpath.dirname(remote_dir)
             if parent_dir and parent_dir != remote_dir:
-                self._ensure_remote_dir(sftp, parent_dir)
+                self._ensure_remote_dir(sftp, parent_dir, known_dirs)
             
             sftp.mkdir(remote_dir)
             logger.info(f"📁 Created remote directory: {remote_dir}")
+        if known_dirs is not None:
+            known_dirs.add(remote_dir)
     
     def test_connection(self) -> Dict[str, Any]:
         """
@@ -308,7 +390,6 @@ class SFTPClient:
             )
         
         # 构造路径（使用posixpath确保Linux路径格式）
-        import posixpath
         remote_path = posixpath.join(self.remote_base_dir, payload_type)
         
         # 🔒 安全性：规范化路径并验证不超出base_dir
@@ -321,6 +402,76 @@ class SFTPClient:
         return normalized + "/"
 
 
+class SFTPSession:
+    """
+    一个已认证的 SSH transport + 每个线程一个 SFTP 通道
+    
+    paramiko 的 Transport 可在多个线程间共享，SFTPClient 通道不可，因此每个上传线程各开一个通道
+    """
+    
+    def __init__(self, client: SFTPClient, transport: paramiko.Transport):
+        self.client = client
+        self.transport = transport
+        self._local = threading.local()
+        self._channels: List[paramiko.SFTPClient] = []
+        self._lock = threading.Lock()
+        self._known_dirs: Set[str] = set()
+    
+    def channel(self) -> paramiko.SFTPClient:
+        """当前线程的 SFTP 通道（首次调用时在共享 transport 上打开）"""
+        sftp = getattr(self._local, 'sftp', None)
+        if sftp is None:
+            sftp = paramiko.SFTPClient.from_transport(self.transport)
+            self._local.sftp = sftp
+            with self._lock:
+                self._channels.append(sftp)
+        return sftp
+    
+    def ensure_remote_dirs(self, remote_dirs):
+        """在上传前串行创建所有目标目录（避免并发 mkdir 冲突）"""
+        sftp = self.channel()
+        for remote_dir in sorted(set(remote_dirs)):
+            self.client._ensure_remote_dir(sftp, remote_dir, self._known_dirs)
+    
+    def upload(self, local_path: str, remote_path: str) -> Dict[str, Any]:
+        if not os.path.exists(local_path):
+            return {
+                "success": False,
+                "message": f"Local file not found: {local_path}"
+            }
+        try:
+            return self.client._put(self.channel(), local_path, remote_path, self._known_dirs)
+        except Exception as e:
+            return self.client._failure(local_path, e)
+    
+    def upload_many(self, items: List[Tuple[str, str]],
+                    max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        并发上传（并发数有上限），返回与 items 顺序一致的结果
+        """
+        if not items:
+            return []
+        self.ensure_remote_dirs(posixpath.dirname(remote_path) for _, remote_path in items)
+        
+        workers = min(max_workers or self.client.max_parallel_uploads, len(items))
+        if workers <= 1:
+            return [self.upload(local_path, remote_path) for local_path, remote_path in items]
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sftp-upload") as executor:
+            return list(executor.map(lambda item: self.upload(*item), items))
+    
+    def close(self):
+        with self._lock:
+            channels, self._channels = self._channels, []
+        for sftp in channels:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+        self.transport.close()
+        logger.debug("SSH session closed")
+
+
 class SecurityError(Exception):
     """安全相关错误"""
     pass
@@ -1,12 +1,15 @@
 """
 SFTP 同步服务协调器
 负责扫描文件、管理上传任务、重试逻辑和审计日志
+
+每次同步（或重试）只建立一个已认证的SSH会话，文件通过多个SFTP通道并发上传
 """
 import os
+import json
 import hashlib
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from .sftp_client import SFTPClient
 from ...models import SFTPUploadJob
@@ -18,6 +21,9 @@ logger = logging.getLogger(__name__)
 class SFTPSyncService:
     """SFTP同步服务：文件扫描、上传管理、重试策略"""
     
+    # 批量查询已上传哈希时每批的数量
+    HASH_QUERY_CHUNK_SIZE = 500
+    
     # 允许上传的文件扩展名
     ALLOWED_EXTENSIONS = {'.csv', '.xlsx', '.xls'}
     
@@ -44,6 +50,9 @@ class SFTPSyncService:
         self.company_id = company_id
         self.sftp_client = SFTPClient()
         self.base_upload_dir = "accounting_data/uploads"
+        # 文件大小 + 修改时间 → 哈希/上传状态，未变化的文件不再重新计算哈希
+        self.manifest_path = os.path.join(self.base_upload_dir, f".sftp_manifest_{company_id}.json")
+        self._manifest: Optional[Dict[str, Dict[str, Any]]] = None
     
     def scan_and_upload_files(self, is_manual: bool = False, uploaded_by: str = "system") -> Dict[str, Any]:
         """
@@ -68,10 +77,7 @@ class SFTPSyncService:
         """
         logger.info(f"📂 Scanning upload directories: {self.base_upload_dir}")
         
-        uploaded_count = 0
-        failed_count = 0
-        skipped_count = 0
-        results = []
+        candidates = []
         
         # 确保基础目录存在
         if not os.path.exists(self.base_upload_dir):
@@ -149,7 +155,7 @@ class SFTPSyncService:
                 if files:
                     logger.info(f"📄 Found {len(files)} files in {company_folder}/{folder_name}/")
                 
-                # 上传每个文件
+                # 收集待上传文件（哈希检查与上传在扫描结束后批量进行）
                 for file_name in files:
                     local_path = os.path.join(folder_path, file_name)
                     
@@ -160,28 +166,21 @@ class SFTPSyncService:
                         logger.error(f"❌ Path traversal attempt detected: {local_path}")
                         continue
                     
-                    # 检查文件是否已成功上传过（基于内容哈希）
-                    if self._is_file_already_uploaded(local_path):
-                        logger.debug(f"⏭️  File already uploaded successfully, skipping: {file_name}")
-                        skipped_count += 1
-                        continue
-                    
-                    # 执行上传
-                    result = self._upload_single_file(
-                        local_path=local_path,
-                        file_name=file_name,
-                        payload_type=payload_type,
-                        is_manual=is_manual,
-                        uploaded_by=uploaded_by,
-                        company_folder=company_name
-                    )
-                    
-                    results.append(result)
-                    
-                    if result['success']:
-                        uploaded_count += 1
-                    else:
-                        failed_count += 1
+                    candidates.append({
+                        "local_path": local_path,
+                        "file_name": file_name,
+                        "payload_type": payload_type,
+                        "company_folder": company_name
+                    })
+        
+        # 检查文件是否已成功上传过（manifest 未变化的文件不再计算哈希，其余一次批量查询）
+        pending, skipped_count = self._filter_already_uploaded(candidates)
+        
+        # 同一个SSH会话上并发上传
+        results = self._upload_files(pending, is_manual=is_manual, uploaded_by=uploaded_by)
+        uploaded_count = sum(1 for result in results if result['success'])
+        failed_count = len(results) - uploaded_count
+        self._save_manifest()
         
         summary = {
             "success": True,
@@ -205,107 +204,113 @@ class SFTPSyncService:
         
         return summary
     
-    def _upload_single_file(self, local_path: str, file_name: str, payload_type: str,
-                           is_manual: bool, uploaded_by: str, company_folder: str = "unknown") -> Dict[str, Any]:
+    def _upload_files(self, items: List[Dict[str, Any]], is_manual: bool,
+                      uploaded_by: str) -> List[Dict[str, Any]]:
         """
-        上传单个文件并记录到数据库
+        创建上传任务记录，在同一个SSH会话上并发上传，再批量更新任务状态
         
         Args:
-            local_path: 本地文件路径
-            file_name: 文件名
-            payload_type: 数据类型
+            items: _filter_already_uploaded 返回的待上传文件（已包含 file_hash / file_size）
             is_manual: 是否手动触发
             uploaded_by: 触发用户
         
         Returns:
-            上传结果
+            与 items 顺序一致的上传结果
         """
-        try:
-            # 计算文件哈希
-            file_hash = self._calculate_file_hash(local_path)
-            file_size = os.path.getsize(local_path)
-            
-            # 获取远程路径（包含公司文件夹层级）
-            remote_base = self.sftp_client.get_payload_remote_path(payload_type)
-            remote_dir = os.path.join(remote_base, company_folder).replace('\\', '/')
-            remote_path = os.path.join(remote_dir, file_name).replace('\\', '/')
-            
-            # 生成job编号
-            job_number = self._generate_job_number()
-            
-            # 创建上传任务记录
-            job = SFTPUploadJob(
-                company_id=self.company_id,
-                job_number=job_number,
-                file_path=local_path,
-                file_name=file_name,
-                payload_type=payload_type,
-                remote_path=remote_path,
-                file_size=file_size,
-                file_hash=file_hash,
-                status='uploading',
-                attempts=1,
-                sftp_host=self.sftp_client.host,
-                sftp_username=self.sftp_client.username,
-                uploaded_by=uploaded_by,
-                is_manual=is_manual,
-                started_at=datetime.utcnow()
-            )
-            
-            self.db.add(job)
-            self.db.commit()
-            
-            logger.info(f"📤 Uploading {file_name} → {remote_path}")
-            
-            # 执行上传
-            upload_result = self.sftp_client.upload_file(local_path, remote_path)
-            
-            # 更新任务状态
+        if not items:
+            return []
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        staged = []
+        job_numbers = self._generate_job_numbers(len(items))
+        
+        for index, (item, job_number) in enumerate(zip(items, job_numbers)):
+            try:
+                # 获取远程路径（包含公司文件夹层级）
+                remote_base = self.sftp_client.get_payload_remote_path(item['payload_type'])
+                remote_dir = os.path.join(remote_base, item['company_folder']).replace('\\', '/')
+                remote_path = os.path.join(remote_dir, item['file_name']).replace('\\', '/')
+                
+                # 创建上传任务记录
+                job = SFTPUploadJob(
+                    company_id=self.company_id,
+                    job_number=job_number,
+                    file_path=item['local_path'],
+                    file_name=item['file_name'],
+                    payload_type=item['payload_type'],
+                    remote_path=remote_path,
+                    file_size=item['file_size'],
+                    file_hash=item['file_hash'],
+                    status='uploading',
+                    attempts=1,
+                    sftp_host=self.sftp_client.host,
+                    sftp_username=self.sftp_client.username,
+                    uploaded_by=uploaded_by,
+                    is_manual=is_manual,
+                    started_at=datetime.utcnow()
+                )
+                self.db.add(job)
+                staged.append((index, item, job))
+            except Exception as e:
+                logger.error(f"❌ Exception preparing {item['file_name']}: {e}")
+                results[index] = {
+                    "success": False,
+                    "file_name": item['file_name'],
+                    "payload_type": item['payload_type'],
+                    "error": str(e)
+                }
+        
+        self.db.commit()
+        
+        logger.info(f"📤 Uploading {len(staged)} files (up to {self.sftp_client.max_parallel_uploads} parallel channels)")
+        
+        # 执行上传（一次握手，多个通道）
+        upload_results = self.sftp_client.upload_files(
+            [(item['local_path'], job.remote_path) for _, item, job in staged]
+        )
+        
+        # 更新任务状态
+        for (index, item, job), upload_result in zip(staged, upload_results):
             if upload_result['success']:
                 job.status = 'success'
                 job.completed_at = datetime.utcnow()
                 job.duration_seconds = upload_result.get('duration', 0)
-                logger.info(f"✅ Upload successful: {file_name} ({job.job_number})")
+                self._mark_uploaded(item)
+                logger.info(f"✅ Upload successful: {item['file_name']} ({job.job_number})")
             else:
                 job.status = 'failed'
-                job.last_error = upload_result.get('error', 'Unknown error')
-                logger.error(f"❌ Upload failed: {file_name} | Error: {job.last_error}")
+                job.last_error = upload_result.get('error', upload_result.get('message', 'Unknown error'))
+                logger.error(f"❌ Upload failed: {item['file_name']} | Error: {job.last_error}")
             
-            self.db.commit()
-            
-            # 记录审计日志
+            results[index] = {
+                "success": upload_result['success'],
+                "job_number": job.job_number,
+                "file_name": item['file_name'],
+                "payload_type": item['payload_type'],
+                "file_size": item['file_size'],
+                "message": upload_result.get('message', '')
+            }
+        
+        self.db.commit()
+        
+        # 记录审计日志
+        for index, item, job in staged:
             log_event(
                 db=self.db,
                 action_type="SFTP_UPLOAD",
                 entity_type="sftp_upload_job",
                 entity_id=job.id,
-                description=f"File upload {'succeeded' if upload_result['success'] else 'failed'}: {file_name}",
+                description=f"File upload {'succeeded' if results[index]['success'] else 'failed'}: {item['file_name']}",
                 metadata={
-                    "file_name": file_name,
-                    "payload_type": payload_type,
-                    "file_size": file_size,
-                    "remote_path": remote_path,
-                    "success": upload_result['success']
+                    "file_name": item['file_name'],
+                    "payload_type": item['payload_type'],
+                    "file_size": item['file_size'],
+                    "remote_path": job.remote_path,
+                    "success": results[index]['success']
                 }
             )
-            
-            return {
-                "success": upload_result['success'],
-                "job_number": job_number,
-                "file_name": file_name,
-                "payload_type": payload_type,
-                "file_size": file_size,
-                "message": upload_result.get('message', '')
-            }
-            
-        except Exception as e:
-            logger.error(f"❌ Exception uploading {file_name}: {e}")
-            return {
-                "success": False,
-                "file_name": file_name,
-                "payload_type": payload_type,
-                "error": str(e)
-            }
+        
+        return results
     
     def retry_failed_uploads(self) -> Dict[str, Any]:
         """
@@ -334,11 +339,14 @@ class SFTPSyncService:
             job.attempts += 1
             job.status = 'uploading'
             job.started_at = datetime.utcnow()
-            self.db.commit()
-            
-            # 重新上传
-            upload_result = self.sftp_client.upload_file(job.file_path, job.remote_path)
-            
+        self.db.commit()
+        
+        # 重新上传（同一个SSH会话，并发通道）
+        upload_results = self.sftp_client.upload_files(
+            [(job.file_path, job.remote_path) for job in failed_jobs]
+        )
+        
+        for job, upload_result in zip(failed_jobs, upload_results):
             if upload_result['success']:
                 job.status = 'success'
                 job.completed_at = datetime.utcnow()
@@ -348,16 +356,16 @@ class SFTPSyncService:
                 logger.info(f"✅ Retry successful: {job.file_name} (attempt {job.attempts})")
             else:
                 job.status = 'failed' if job.attempts >= job.max_attempts else 'retry'
-                job.last_error = upload_result.get('error', 'Unknown error')
+                job.last_error = upload_result.get('error', upload_result.get('message', 'Unknown error'))
                 # 指数退避：2分钟、4分钟、8分钟
                 backoff_minutes = 2 ** job.attempts
                 job.next_retry_at = datetime.utcnow() + timedelta(minutes=backoff_minutes)
                 failed_count += 1
                 logger.warning(f"⚠️  Retry failed: {job.file_name} (attempt {job.attempts}/{job.max_attempts})")
-            
-            self.db.commit()
             retried_count += 1
         
+        self.db.commit()
+        
         summary = {
             "success": True,
             "retried": retried_count,
@@ -369,25 +377,110 @@ class SFTPSyncService:
         
         return summary
     
-    def _is_file_already_uploaded(self, local_path: str) -> bool:
+    def _filter_already_uploaded(self, candidates: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
         """
-        检查文件是否已成功上传
+        过滤已成功上传的文件
+        
+        1. manifest 中大小和修改时间都未变化、且已上传的文件直接跳过（不计算哈希）
+        2. 其余文件计算（或复用 manifest 中的）SHA256，一次批量查询已成功上传的哈希
+        3. 同一次扫描中内容相同的文件只上传第一个
         
         Args:
-            local_path: 本地文件路径
+            candidates: 扫描到的文件
         
         Returns:
-            是否已上传
+            (待上传文件列表, 跳过数量)
         """
-        file_hash = self._calculate_file_hash(local_path)
-        
-        existing_job = self.db.query(SFTPUploadJob).filter(
-            SFTPUploadJob.company_id == self.company_id,
-            SFTPUploadJob.file_hash == file_hash,
-            SFTPUploadJob.status == 'success'
-        ).first()
+        manifest = self._load_manifest()
+        current: Dict[str, Dict[str, Any]] = {}
+        skipped_count = 0
+        to_check = []
+        
+        for item in candidates:
+            key = os.path.abspath(item['local_path'])
+            try:
+                stat = os.stat(key)
+            except OSError as e:
+                logger.error(f"❌ Cannot stat {item['local_path']}: {e}")
+                continue
+            
+            entry = manifest.get(key)
+            if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+                current[key] = entry
+                if entry.get('uploaded'):
+                    logger.debug(f"⏭️  File unchanged since last upload, skipping: {item['file_name']}")
+                    skipped_count += 1
+                    continue
+            else:
+                current[key] = {
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'hash': self._calculate_file_hash(key),
+                    'uploaded': False
+                }
+            
+            item.update(manifest_key=key, file_hash=current[key]['hash'], file_size=stat.st_size)
+            to_check.append(item)
+        
+        # 只保留本次仍存在的文件
+        self._manifest = current
+        
+        uploaded_hashes = self._find_uploaded_hashes({item['file_hash'] for item in to_check})
+        pending = []
+        queued_hashes = set()
+        for item in to_check:
+            if item['file_hash'] in uploaded_hashes:
+                logger.debug(f"⏭️  File already uploaded successfully, skipping: {item['file_name']}")
+                self._mark_uploaded(item)
+                skipped_count += 1
+            elif item['file_hash'] in queued_hashes:
+                logger.debug(f"⏭️  Same content already queued in this run, skipping: {item['file_name']}")
+                skipped_count += 1
+            else:
+                queued_hashes.add(item['file_hash'])
+                pending.append(item)
         
-        return existing_job is not None
+        return pending, skipped_count
+    
+    def _find_uploaded_hashes(self, file_hashes) -> set:
+        """批量查询已成功上传的文件哈希"""
+        file_hashes = list(file_hashes)
+        uploaded = set()
+        for start in range(0, len(file_hashes), self.HASH_QUERY_CHUNK_SIZE):
+            chunk = file_hashes[start:start + self.HASH_QUERY_CHUNK_SIZE]
+            rows = self.db.query(SFTPUploadJob.file_hash).filter(
+                SFTPUploadJob.company_id == self.company_id,
+                SFTPUploadJob.file_hash.in_(chunk),
+                SFTPUploadJob.status == 'success'
+            ).distinct().all()
+            uploaded.update(row[0] for row in rows)
+        return uploaded
+    
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """读取 {绝对路径: {size, mtime_ns, hash, uploaded}}"""
+        if self._manifest is None:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+    
+    def _mark_uploaded(self, item: Dict[str, Any]):
+        entry = (self._manifest or {}).get(item.get('manifest_key'))
+        if entry is not None:
+            entry['uploaded'] = True
+    
+    def _save_manifest(self):
+        if self._manifest is None or not os.path.isdir(self.base_upload_dir):
+            return
+        tmp_path = f"{self.manifest_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            logger.warning(f"⚠️  Failed to save upload manifest: {e}")
     
     def _calculate_file_hash(self, file_path: str) -> str:
         """
@@ -412,17 +505,21 @@ class SFTPSyncService:
         Returns:
             Job编号格式: SFTP-YYYYMMDD-HHMMSS-XXX
         """
+        return self._generate_job_numbers(1)[0]
+    
+    def _generate_job_numbers(self, count: int) -> List[str]:
+        """
+        一次生成多个job编号（只查询一次今天已有的job数量）
+        """
         timestamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
         
         # 获取今天已有的job数量
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        count = self.db.query(SFTPUploadJob).filter(
+        existing = self.db.query(SFTPUploadJob).filter(
             SFTPUploadJob.created_at >= today_start
         ).count()
         
-        sequence = str(count + 1).zfill(3)
-        
-        return f"SFTP-{timestamp}-{sequence}"
+        return [f"SFTP-{timestamp}-{str(existing + i).zfill(3)}" for i in range(1, count + 1)]
     
     def _is_safe_folder_name(self, folder_name: str) -> bool:
         """
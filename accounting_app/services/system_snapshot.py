@@ -0,0 +1,171 @@
+"""
+系统财务快照（AI助手 / 系统分析 / AI日报共用）
+- 储蓄、信用卡、贷款汇总只查询一次，结果在进程内缓存 SYSTEM_SNAPSHOT_TTL 秒
+- 同一时刻只有一个线程重算，其余线程等待并使用同一份结果
+- version：汇总数据的内容哈希，作为AI回复缓存键的一部分（数据不变则命中缓存）
+- 同步函数（sqlite3），异步路由中通过 run_in_threadpool 调用
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+SNAPSHOT_DB_PATH = 'db/smart_loan_manager.db'
+
+# 快照最长缓存时间（秒）
+SYSTEM_SNAPSHOT_TTL = int(os.getenv("SYSTEM_SNAPSHOT_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class SystemSnapshot:
+    savings: Dict
+    credit: Dict
+    loans: Dict
+    report_date: date  # daily_savings 的统计日期（UTC昨日）
+    daily_savings: Dict
+    generated_at: datetime
+    version: str = field(default='')
+
+    @property
+    def savings_balance(self) -> float:
+        return self.savings['total_credits'] - self.savings['total_debits']
+
+    @property
+    def credit_usage(self) -> float:
+        """信用卡使用率（%）"""
+        if self.credit['total_limit'] > 0:
+            return self.credit['total_balance'] / self.credit['total_limit'] * 100
+        return 0
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return cursor.fetchone() is not None
+
+
+def compute_system_snapshot(db_path: str = SNAPSHOT_DB_PATH, report_date: Optional[date] = None) -> SystemSnapshot:
+    """查询数据库生成快照（不使用缓存）"""
+    report_date = report_date or datetime.utcnow().date() - timedelta(days=1)
+
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    try:
+        cursor = db.cursor()
+
+        # 1. 储蓄账户统计
+        cursor.execute("""
+            SELECT
+                COUNT(DISTINCT sa.id) as accounts,
+                COUNT(DISTINCT st.id) as transactions,
+                COALESCE(SUM(CASE WHEN st.transaction_type = 'CR' THEN st.amount ELSE 0 END), 0) as total_credits,
+                COALESCE(SUM(CASE WHEN st.transaction_type = 'DR' THEN st.amount ELSE 0 END), 0) as total_debits
+            FROM savings_accounts sa
+            LEFT JOIN savings_statements ss ON sa.id = ss.savings_account_id
+            LEFT JOIN savings_transactions st ON ss.id = st.savings_statement_id
+        """)
+        savings = dict(cursor.fetchone())
+
+        # 2. 储蓄账户日报日交易统计
+        cursor.execute("""
+            SELECT
+                COUNT(*) as transaction_count,
+                COALESCE(SUM(CASE WHEN transaction_type = 'CR' THEN amount ELSE 0 END), 0) as total_credits,
+                COALESCE(SUM(CASE WHEN transaction_type = 'DR' THEN amount ELSE 0 END), 0) as total_debits
+            FROM savings_transactions
+            WHERE DATE(created_at) = ?
+        """, (str(report_date),))
+        daily_savings = dict(cursor.fetchone())
+
+        # 3. 信用卡统计（从月结单获取最新余额）
+        if _table_exists(cursor, 'monthly_statements'):
+            cursor.execute("""
+                SELECT
+                    COUNT(DISTINCT cc.id) as cards,
+                    COALESCE(SUM(cc.credit_limit), 0) as total_limit,
+                    COALESCE(
+                        (SELECT SUM(closing_balance_total)
+                         FROM monthly_statements
+                         WHERE id IN (
+                             SELECT MAX(id) FROM monthly_statements GROUP BY customer_id, bank_name
+                         )), 0
+                    ) as total_balance
+                FROM credit_cards cc
+            """)
+            credit = dict(cursor.fetchone())
+        else:
+            credit = {"cards": 0, "total_limit": 0, "total_balance": 0}
+
+        # 4. 贷款统计（如果表存在）
+        if _table_exists(cursor, 'loans'):
+            cursor.execute("""
+                SELECT
+                    COUNT(*) as loans,
+                    COALESCE(SUM(loan_amount), 0) as total_amount,
+                    COALESCE(SUM(remaining_balance), 0) as total_remaining
+                FROM loans
+            """)
+            loans = dict(cursor.fetchone())
+        else:
+            loans = {"loans": 0, "total_amount": 0, "total_remaining": 0}
+    finally:
+        db.close()
+
+    payload = {
+        'savings': savings, 'credit': credit, 'loans': loans,
+        'report_date': str(report_date), 'daily_savings': daily_savings,
+    }
+    version = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return SystemSnapshot(
+        savings=savings, credit=credit, loans=loans,
+        report_date=report_date, daily_savings=daily_savings,
+        generated_at=datetime.utcnow(), version=version,
+    )
+
+
+class SystemSnapshotCache:
+    """按数据库路径缓存快照；超过TTL或跨日后重算"""
+
+    def __init__(self, ttl: int = SYSTEM_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}  # db_path -> (snapshot, computed_at)
+        self._lock = threading.Lock()
+
+    def _fresh(self, entry) -> bool:
+        if entry is None:
+            return False
+        snapshot, computed_at = entry
+        yesterday = datetime.utcnow().date() - timedelta(days=1)
+        return time.monotonic() - computed_at < self.ttl and snapshot.report_date == yesterday
+
+    def get(self, db_path: str = SNAPSHOT_DB_PATH, refresh: bool = False) -> SystemSnapshot:
+        entry = self._entries.get(db_path)
+        if not refresh and self._fresh(entry):
+            return entry[0]
+
+        with self._lock:
+            entry = self._entries.get(db_path)
+            if refresh or not self._fresh(entry):
+                entry = (compute_system_snapshot(db_path), time.monotonic())
+                self._entries[db_path] = entry
+            return entry[0]
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_snapshot_cache = SystemSnapshotCache()
+
+
+def get_system_snapshot(db_path: str = SNAPSHOT_DB_PATH, refresh: bool = False) -> SystemSnapshot:
+    """获取系统快照（进程内共享缓存）"""
+    return _snapshot_cache.get(db_path, refresh=refresh)
+
+
+def invalidate_system_snapshot():
+    _snapshot_cache.invalidate()
@@ -3,9 +3,11 @@
 生成支出、还款、余额趋势图表数据
 Safe for AI V3 Stable Baseline
 """
-import sqlite3
 from typing import Dict, List, Any
 
+from analytics import vectorized_metrics as vm
+from analytics.monthly_feature_store import MonthlyFeatureMatrix, load_customer_features
+
 
 class TrendEngine:
     def __init__(self):
@@ -13,7 +15,7 @@ class TrendEngine:
     
     def get_trends(self, customer_id: int) -> Dict[str, Any]:
         """
-        获取客户最近12个月的趋势数据
+        获取客户最近12个月的趋势数据（读取客户月度特征表，同月多家银行合计）
         
         Returns:
             {
@@ -23,27 +25,10 @@ class TrendEngine:
                 "balances": [5000, 4700, ...]
             }
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 查询最近12个月数据
-        cursor.execute("""
-            SELECT 
-                statement_month,
-                closing_balance_total,
-                owner_expenses + gz_expenses as total_expenses,
-                owner_payments + gz_payments as total_payments
-            FROM monthly_statements
-            WHERE customer_id = ?
-            ORDER BY statement_month ASC
-            LIMIT 12
-        """, (customer_id,))
+        features = load_customer_features(self.db_path, [customer_id], window=12)
+        history = features.history(customer_id)
         
-        rows = cursor.fetchall()
-        conn.close()
-        
-        if not rows:
+        if not history:
             return {
                 "labels": [],
                 "expenses": [],
@@ -53,45 +38,43 @@ class TrendEngine:
             }
         
         # 提取数据
-        labels = [row["statement_month"] for row in rows]
-        expenses = [round(row["total_expenses"], 2) for row in rows]
-        payments = [round(row["total_payments"], 2) for row in rows]
-        balances = [round(row["closing_balance_total"], 2) for row in rows]
+        labels = [h["month"] for h in history]
+        expenses = [round(h["expenses"], 2) for h in history]
+        payments = [round(h["payments"], 2) for h in history]
+        balances = [round(h["closing_balance"], 2) for h in history]
         
         # 计算趋势指标
-        trend_analysis = self._analyze_trends(expenses, payments, balances)
+        trend_analysis = self.analyze_trends(features)[0]
         
         return {
             "labels": labels,
             "expenses": expenses,
             "payments": payments,
             "balances": balances,
-            "count": len(rows),
+            "count": len(history),
             "trend_analysis": trend_analysis
         }
     
-    def _analyze_trends(self, expenses: List[float], payments: List[float], balances: List[float]) -> Dict[str, Any]:
+    def analyze_trends(self, features: MonthlyFeatureMatrix) -> List[Dict[str, Any]]:
         """
-        分析趋势特征
+        分析趋势特征（所有客户一次计算，按 features.customer_ids 顺序返回）
+        最早月份到最近月份的变化超过±5%为上升/下降；不足2个月时为空字典
         """
-        if len(expenses) < 2:
-            return {}
-        
-        # 计算月环比
-        expense_change = ((expenses[-1] - expenses[0]) / expenses[0] * 100) if expenses[0] > 0 else 0
-        payment_change = ((payments[-1] - payments[0]) / payments[0] * 100) if payments[0] > 0 else 0
-        balance_change = ((balances[-1] - balances[0]) / balances[0] * 100) if balances[0] > 0 else 0
-        
-        # 判断趋势方向
-        expense_trend = "上升" if expense_change > 5 else ("下降" if expense_change < -5 else "稳定")
-        payment_trend = "上升" if payment_change > 5 else ("下降" if payment_change < -5 else "稳定")
-        balance_trend = "上升" if balance_change > 5 else ("下降" if balance_change < -5 else "稳定")
-        
-        return {
-            "expense_change_pct": round(expense_change, 2),
-            "payment_change_pct": round(payment_change, 2),
-            "balance_change_pct": round(balance_change, 2),
-            "expense_trend": expense_trend,
-            "payment_trend": payment_trend,
-            "balance_trend": balance_trend
+        changes = {
+            "expense": vm.change_pct(features.expenses),
+            "payment": vm.change_pct(features.payments),
+            "balance": vm.change_pct(features.closing_balance),
         }
+        labels = {name: vm.trend_labels(pct) for name, pct in changes.items()}
+        counts = features.counts
+        
+        results = []
+        for i in range(len(features.customer_ids)):
+            if counts[i] < 2:
+                results.append({})
+                continue
+            results.append({
+                **{f"{name}_change_pct": round(float(changes[name][i]), 2) for name in changes},
+                **{f"{name}_trend": str(labels[name][i]) for name in labels},
+            })
+        return results
@@ -7,6 +7,7 @@ import os
 import sqlite3
 from datetime import datetime, timedelta
 from accounting_app.utils.ai_client import get_ai_client
+from accounting_app.services.system_snapshot import SNAPSHOT_DB_PATH, get_system_snapshot
 
 
 def generate_daily_report():
@@ -20,11 +21,6 @@ def generate_daily_report():
     4. 输出控制台日志
     """
     try:
-        # 连接SQLite数据库
-        db = sqlite3.connect('db/smart_loan_manager.db')
-        db.row_factory = sqlite3.Row
-        cursor = db.cursor()
-        
         # 计算日期
         today = datetime.utcnow().date()
         yesterday = today - timedelta(days=1)
@@ -33,50 +29,9 @@ def generate_daily_report():
         print(f"🤖 正在生成AI财务日报：{yesterday}")
         print(f"{'='*50}")
         
-        # 1. 储蓄账户昨日交易统计
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as transaction_count,
-                COALESCE(SUM(CASE WHEN transaction_type = 'CR' THEN amount ELSE 0 END), 0) as total_credits,
-                COALESCE(SUM(CASE WHEN transaction_type = 'DR' THEN amount ELSE 0 END), 0) as total_debits
-            FROM savings_transactions
-            WHERE DATE(created_at) = ?
-        """, (str(yesterday),))
-        savings = dict(cursor.fetchone())
-        
-        # 2. 信用卡当前状态（从月结单获取最新余额）
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='monthly_statements'")
-        if cursor.fetchone():
-            cursor.execute("""
-                SELECT 
-                    COUNT(DISTINCT cc.id) as cards,
-                    COALESCE(SUM(cc.credit_limit), 0) as total_limit,
-                    COALESCE(
-                        (SELECT SUM(closing_balance_total) 
-                         FROM monthly_statements 
-                         WHERE id IN (
-                             SELECT MAX(id) FROM monthly_statements GROUP BY customer_id, bank_name
-                         )), 0
-                    ) as total_balance
-                FROM credit_cards cc
-            """)
-            credit = dict(cursor.fetchone())
-        else:
-            credit = {"cards": 0, "total_limit": 0, "total_balance": 0}
-        
-        # 3. 贷款当前状态
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='loans'")
-        if cursor.fetchone():
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as loans,
-                    COALESCE(SUM(loan_amount), 0) as total_amount,
-                    COALESCE(SUM(remaining_balance), 0) as total_remaining
-                FROM loans
-            """)
-            loans = dict(cursor.fetchone())
-        else:
-            loans = {"loans": 0, "total_amount": 0, "total_remaining": 0}
+        # 昨日储蓄交易 + 信用卡 / 贷款当前状态（与AI助手共用的系统快照）
+        snapshot = get_system_snapshot()
+        savings, credit, loans = snapshot.daily_savings, snapshot.credit, snapshot.loans
         
         # 打印数据摘要
         print(f"\n📊 数据摘要：")
@@ -86,7 +41,7 @@ def generate_daily_report():
         
         # 构建AI提示词
         net_savings = savings['total_credits'] - savings['total_debits']
-        credit_usage = (credit['total_balance'] / credit['total_limit'] * 100) if credit['total_limit'] > 0 else 0
+        credit_usage = snapshot.credit_usage
         
         context = f"""
 日期：{yesterday}
@@ -130,6 +85,8 @@ def generate_daily_report():
         )
         
         # 存入ai_logs表
+        db = sqlite3.connect(SNAPSHOT_DB_PATH)
+        cursor = db.cursor()
         cursor.execute("""
             INSERT INTO ai_logs (query, response, created_at)
             VALUES (?, ?, ?)
@@ -12,6 +12,7 @@ from ..routes.invoices import auto_generate_invoices
 from ..schemas import AutoInvoiceGenerate
 from ..services.management_report_generator import ManagementReportGenerator
 from ..services.file_storage_manager import AccountingFileStorageManager
+from ..services.period_balances import materialize_period_balances
 import json
 import logging
 
@@ -26,6 +27,7 @@ def run_monthly_close(db: Session, company_id: int, month: str):
     1. 检查本月是否还有未匹配的银行流水
     2. 自动生成本月的试算表（Trial Balance）
     3. 根据自动发票规则生成当月发票
+    4. 物化本月期末科目余额，生成Management Report
     
     返回：月结报告
     """
@@ -57,6 +59,9 @@ def run_monthly_close(db: Session, company_id: int, month: str):
     # 4. 生成并保存Management Report（新增自动化任务）
     management_report_result = None
     try:
+        # 先物化本月期末余额，报表及之后各月的余额都从该快照累加
+        materialize_period_balances(db, company_id, month)
+        
         logger.info(f"月结任务：开始生成Management Report (company_id={company_id}, month={month})")
         
         report_generator = ManagementReportGenerator(db, company_id)
@@ -1,45 +1,61 @@
 """
 定时任务调度器
-功能：管理所有定时任务的执行
+功能：把所有定时任务注册到持久化任务队列（services.job_queue），由进程池Worker执行
 """
-import schedule
-import time
-from accounting_app.tasks.ai_daily_report import generate_daily_report
-from accounting_app.tasks.email_notifier import send_ai_report_email
+from services.job_queue import JobWorker, PeriodicJob, register_job_handler
+# ai_daily_report.* 的处理函数只在 services.scheduled_jobs 注册一处，两个调度器执行同一份代码
+import services.scheduled_jobs  # noqa: F401
 
+# accounting_app 独有的任务处理函数（"模块:函数"，子进程按路径导入）
+register_job_handler('sessions.cleanup', 'accounting_app.services.auth_service:cleanup_expired_sessions')
 
-def run_scheduler():
+ACCOUNTING_JOB_TYPES = ['ai_daily_report.generate', 'ai_daily_report.email', 'sessions.cleanup']
+
+# 幂等键与 Flask 端 services/scheduled_jobs 相同，两边同时运行也只执行一次
+PERIODIC_JOBS = [
+    PeriodicJob('ai_daily_report.generate', 'ai_daily_report.generate', at='08:00'),
+    PeriodicJob('ai_daily_report.email', 'ai_daily_report.email', at='08:10'),
+    PeriodicJob('sessions.cleanup', 'sessions.cleanup', every_hours=1),
+]
+
+
+def run_scheduler(block: bool = True):
     """
     启动定时任务调度器
-    
+
     定时任务：
     - AI日报生成：每天早上08:00自动生成
     - AI日报邮件推送：每天早上08:10自动发送（V2企业智能版）
+    - 过期登录Session清理：每小时
     """
-    # 注册AI日报定时任务（每天08:00）
-    schedule.every().day.at("08:00").do(generate_daily_report)
-    
-    # 注册AI日报邮件推送任务（每天08:10）- V2企业智能版新增
-    schedule.every().day.at("08:10").do(send_ai_report_email)
-    
+    worker = JobWorker(job_types=ACCOUNTING_JOB_TYPES, periodic_jobs=PERIODIC_JOBS)
+    worker.start()
+
     print("\n" + "="*60)
     print("⏰ AI日报计划任务已启动")
     print("="*60)
     print("📅 08:00 - 生成AI财务日报")
     print("📧 08:10 - 发送邮件到管理员邮箱")
     print("💾 存储位置：ai_logs表")
+    print("🗂️ 任务队列：db/job_queue.db（重启后自动恢复未完成任务）")
     print("="*60 + "\n")
-    
-    # 持续运行调度器
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # 每分钟检查一次
+
+    if not block:
+        return worker
+
+    try:
+        worker.join()
+    except KeyboardInterrupt:
+        worker.stop()
+    return worker
 
 
 # 支持直接运行测试
 if __name__ == "__main__":
+    from accounting_app.tasks.ai_daily_report import generate_daily_report
+
     print("🧪 测试模式：立即执行一次AI日报生成...")
     generate_daily_report()
-    
+
     print("\n⏰ 启动调度器（Ctrl+C 退出）...")
     run_scheduler()
@@ -0,0 +1,138 @@
+"""
+AI助手异步客户端与系统快照单元测试（使用本地 stub 提供商，不访问网络）
+回复缓存按消息 + 快照版本命中、TTL/LRU淘汰、并发上限与超时、慢速请求不阻塞事件循环
+"""
+import asyncio
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from accounting_app.services.system_snapshot import SystemSnapshotCache, compute_system_snapshot
+from accounting_app.utils.ai_client import AsyncAIClient, CompletionCache, StubChatProvider
+
+
+def stub_client(delay=0.0, **kwargs):
+    client = AsyncAIClient(provider='stub', **kwargs)
+    client._get_client().client = StubChatProvider(delay=delay)
+    return client
+
+
+def ask(text):
+    return [{"role": "user", "content": text}]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'snapshot.db')
+    yesterday = str(datetime.utcnow().date() - timedelta(days=1))
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE savings_accounts (id INTEGER PRIMARY KEY);
+        CREATE TABLE savings_statements (id INTEGER PRIMARY KEY, savings_account_id INTEGER);
+        CREATE TABLE savings_transactions (
+            id INTEGER PRIMARY KEY, savings_statement_id INTEGER, transaction_type TEXT, amount REAL, created_at TEXT
+        );
+        CREATE TABLE credit_cards (id INTEGER PRIMARY KEY, credit_limit REAL);
+        INSERT INTO savings_accounts VALUES (1), (2);
+        INSERT INTO savings_statements VALUES (10, 1);
+        INSERT INTO savings_transactions VALUES
+            (1, 10, 'CR', 500, '{yesterday} 09:00:00'),
+            (2, 10, 'DR', 120, '{yesterday} 10:00:00'),
+            (3, 10, 'CR', 80, '2020-01-01 10:00:00');
+        INSERT INTO credit_cards VALUES (1, 5000);
+    """)
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.mark.unit
+class TestSystemSnapshot:
+    """共享系统快照"""
+
+    def test_aggregates_and_version(self, db_path):
+        snapshot = compute_system_snapshot(db_path)
+        assert snapshot.savings == {'accounts': 2, 'transactions': 3, 'total_credits': 580, 'total_debits': 120}
+        assert snapshot.daily_savings == {'transaction_count': 2, 'total_credits': 500, 'total_debits': 120}
+        assert snapshot.credit == {'cards': 0, 'total_limit': 0, 'total_balance': 0}
+        assert snapshot.loans == {'loans': 0, 'total_amount': 0, 'total_remaining': 0}
+        assert snapshot.savings_balance == 460
+        # 数据不变则版本不变
+        assert compute_system_snapshot(db_path).version == snapshot.version
+
+    def test_cache_reuses_until_refresh(self, db_path):
+        cache = SystemSnapshotCache(ttl=300)
+        first = cache.get(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO savings_accounts VALUES (3)")
+        conn.commit()
+        conn.close()
+
+        assert cache.get(db_path) is first
+        refreshed = cache.get(db_path, refresh=True)
+        assert refreshed.savings['accounts'] == 3 and refreshed.version != first.version
+
+
+@pytest.mark.unit
+class TestAsyncAIClient:
+    """异步AI客户端"""
+
+    def test_cache_keyed_by_prompt_and_snapshot(self):
+        client = stub_client()
+        provider = client._get_client().client
+
+        async def run():
+            first = await client.chat(ask('余额多少？'), snapshot_version='v1')
+            again = await client.chat(ask('余额多少？'), snapshot_version='v1')
+            other = await client.chat(ask('余额多少？'), snapshot_version='v2')
+            return first, again, other
+
+        first, again, other = asyncio.run(run())
+        assert first == again == other == '[stub] 余额多少？'
+        assert len(provider.calls) == 2
+        assert client.cache.stats()['hits'] == 1
+
+    def test_completion_cache_ttl_and_lru(self):
+        cache = CompletionCache(ttl=60, max_entries=2)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        assert cache.get('a') == 'A'  # a 成为最近使用
+        cache.set('c', 'C')
+        assert cache.get('b') is None and cache.get('a') == 'A' and cache.get('c') == 'C'
+
+        expired = CompletionCache(ttl=0)
+        expired.set('a', 'A')
+        assert expired.get('a') is None
+
+    def test_slow_completion_does_not_block_event_loop(self):
+        client = stub_client(delay=0.3, max_concurrency=1)
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            started = time.monotonic()
+            await asyncio.gather(client.chat(ask('一')), client.chat(ask('二')))
+            elapsed = time.monotonic() - started
+            task.cancel()
+            return ticks, elapsed
+
+        ticks, elapsed = asyncio.run(run())
+        assert ticks > 20
+        # 并发上限为1：两个请求依次执行
+        assert elapsed >= 0.55
+
+    def test_timeout(self):
+        client = stub_client(delay=0.5)
+
+        with pytest.raises(TimeoutError):
+            asyncio.run(client.chat(ask('慢'), timeout=0.1))
+        assert client.cache.stats()['entries'] == 0
@@ -0,0 +1,83 @@
+"""
+银行月结单CSV批量入库单元测试
+raw_lines 按块多行写入并取回ID；任何一行验证失败都不写 bank_statements（全部或无）
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from accounting_app.models import BankStatement, Base, Company, RawDocument, RawLine
+from accounting_app.services.bank_statement_import import ingest_bank_statement_csv
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bank_import.db'}")
+    Base.metadata.create_all(bind=engine, tables=[
+        Company.__table__, RawDocument.__table__, RawLine.__table__, BankStatement.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    session.add(Company(id=1, company_code='C1', company_name='Test Sdn Bhd'))
+    session.add(RawDocument(id=1, company_id=1, file_name='statement.csv', file_hash='x', file_size=1,
+                            storage_path='/tmp/statement.csv', source_engine='fastapi', module='bank'))
+    session.commit()
+    yield session
+    session.close()
+
+
+def csv_text(rows):
+    return 'Date,Description,Debit,Credit,Balance,Reference\n' + ''.join(f'{row}\n' for row in rows)
+
+
+def ingest(db, content, chunk_size=4):
+    return ingest_bank_statement_csv(db, 1, content, company_id=1, bank_name='Maybank',
+                                     account_number='123', statement_month='2025-01', chunk_size=chunk_size)
+
+
+@pytest.mark.unit
+class TestBankStatementImport:
+    """CSV批量入库"""
+
+    def test_valid_file_is_inserted_in_chunks(self, db):
+        """10行分3块写入：raw_lines 与 bank_statements 一一对应"""
+        rows = [f'2025-01-{day:02d},TXN {day},{day}.50,,{1000 + day},R{day}' for day in range(1, 11)]
+
+        inserts = []
+        event.listen(db.get_bind(), 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: inserts.append(statement)
+                     if statement.startswith('INSERT INTO raw_lines') else None)
+        result = ingest(db, csv_text(rows))
+        db.commit()
+
+        assert (result.total_lines, result.imported, result.validation_errors) == (10, 10, [])
+        assert len(inserts) == 3
+
+        statements = db.query(BankStatement).order_by(BankStatement.id).all()
+        lines = {line.id: line for line in db.query(RawLine).all()}
+        assert len(statements) == 10
+        assert all(lines[s.raw_line_id].line_no == i for i, s in enumerate(statements, start=1))
+        assert all(line.is_parsed for line in lines.values())
+        first = statements[0]
+        assert first.transaction_date == date(2025, 1, 1)
+        assert first.debit_amount == Decimal('1.50') and first.credit_amount == Decimal('0')
+        assert first.reference_number == 'R1' and first.matched is False
+
+    def test_any_invalid_line_blocks_all_statements(self, db):
+        """验证失败：原文全部保留，bank_statements 一行不写"""
+        rows = ['2025-01-01,OK,1,,,', ',NO DATE,1,,,', '2025-01-03,OK,1,,,', '01/04/2025,BAD DATE,1,,,',
+                '2025-01-05,,1,,,', '2025-01-06,OK,abc,,,']
+        result = ingest(db, csv_text(rows), chunk_size=2)
+        db.commit()
+
+        assert result.total_lines == 6 and result.imported == 2
+        assert result.validation_errors == [
+            "第2行验证失败: 缺失必填字段 'Date'",
+            "第4行验证失败: Date格式错误（应为YYYY-MM-DD）: 01/04/2025",
+            "第5行验证失败: 缺失必填字段 'Description'",
+            "第6行解析失败: [<class 'decimal.ConversionSyntax'>]",
+        ]
+        assert db.query(BankStatement).count() == 0
+        assert db.query(RawLine).filter(RawLine.is_parsed.is_(False)).count() == 6
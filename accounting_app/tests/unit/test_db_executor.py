@@ -0,0 +1,177 @@
+"""
+数据库线程池与事件循环延迟监控单元测试（直接调用ASGI应用，不启动服务器）
+阻塞的 async 路由与 run_db 路由的事件循环延迟对比、线程池并发上限、异常与 contextvars 传递、
+OCR / PDF渲染在CPU线程池中执行不占用数据库线程、按路由模板汇总
+"""
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+
+from accounting_app.middleware.loop_lag import EventLoopLagMiddleware, LoopLagMonitor
+from accounting_app.utils.db_executor import DBExecutor
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def blocking_query(seconds=0.2):
+    time.sleep(seconds)
+    return {"rows": 1}
+
+
+def lag_app(executor):
+    app = FastAPI()
+
+    @app.get("/blocking/{item_id}")
+    async def blocking(item_id: int):
+        return blocking_query()
+
+    @app.get("/offloaded/{item_id}")
+    async def offloaded(item_id: int):
+        return await executor.run(blocking_query)
+
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.005)
+    return EventLoopLagMiddleware(app, monitor=monitor), monitor
+
+
+async def call(app, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [], "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+@pytest.mark.unit
+class TestDBExecutor:
+    """数据库线程池"""
+
+    def test_bounded_concurrency(self):
+        executor = DBExecutor(max_workers=2)
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        async def run():
+            await asyncio.gather(*(executor.run(work) for _ in range(6)))
+
+        asyncio.run(run())
+        assert peak[0] == 2
+        assert executor.stats() == {"max_workers": 2, "active": 0, "waiting": 0, "completed": 6}
+        executor.close()
+
+    def test_exception_and_contextvars(self):
+        executor = DBExecutor(max_workers=1)
+
+        def fail():
+            raise ValueError("数据库错误")
+
+        async def run():
+            request_id.set("req-1")
+            seen = await executor.run(request_id.get)
+            with pytest.raises(ValueError, match="数据库错误"):
+                await executor.run(fail)
+            return seen
+
+        assert asyncio.run(run()) == "req-1"
+        assert executor.stats()["completed"] == 2
+        executor.close()
+
+    def test_cpu_work_does_not_starve_db_calls(self):
+        db_pool = DBExecutor(max_workers=2)
+        cpu_pool = DBExecutor(max_workers=2, thread_name_prefix="cpu")
+        threads = set()
+
+        def ocr():
+            threads.add(threading.current_thread().name)
+            time.sleep(0.3)
+
+        async def run():
+            ocr_jobs = [asyncio.ensure_future(cpu_pool.run(ocr)) for _ in range(4)]
+            await asyncio.sleep(0.05)
+            # CPU线程池已占满，数据库调用仍立即执行
+            started = time.monotonic()
+            rows = await db_pool.run(blocking_query, 0.01)
+            db_elapsed = time.monotonic() - started
+            waiting = cpu_pool.stats()["waiting"]
+            await asyncio.gather(*ocr_jobs)
+            return rows, db_elapsed, waiting
+
+        rows, db_elapsed, waiting = asyncio.run(run())
+        assert rows == {"rows": 1}
+        assert db_elapsed < 0.2
+        assert waiting == 2
+        assert all(name.startswith("cpu") for name in threads)
+        assert db_pool.stats()["completed"] == 1 and cpu_pool.stats()["completed"] == 4
+        db_pool.close()
+        cpu_pool.close()
+
+
+@pytest.mark.unit
+class TestLoopLagMonitor:
+    """事件循环延迟监控"""
+
+    def test_blocking_route_reports_loop_lag(self):
+        executor = DBExecutor(max_workers=4)
+        app, monitor = lag_app(executor)
+
+        async def run():
+            # 先让采样任务启动，再并发发起请求
+            await call(app, "/offloaded/0")
+            await asyncio.sleep(0.03)
+            monitor.reset()
+            statuses = await asyncio.gather(*(call(app, f"/offloaded/{i}") for i in range(4)))
+            await asyncio.sleep(0.03)
+            offloaded = monitor.snapshot()
+            monitor.reset()
+            statuses += await asyncio.gather(*(call(app, f"/blocking/{i}") for i in range(2)))
+            await asyncio.sleep(0.03)
+            return statuses, offloaded, monitor.snapshot()
+
+        started = time.monotonic()
+        statuses, offloaded, blocking = asyncio.run(run())
+        elapsed = time.monotonic() - started
+        executor.close()
+
+        assert statuses == [200] * 6
+        # 按路由模板汇总，而不是具体路径
+        assert [r["route"] for r in offloaded["routes"]] == ["GET /offloaded/{item_id}"]
+        assert offloaded["routes"][0]["requests"] == 4
+        assert offloaded["max_loop_lag_ms"] < 100
+        # 阻塞路由在事件循环线程中串行执行，两次 0.2s 的阻塞都被采样到
+        route = blocking["routes"][0]
+        assert route["route"] == "GET /blocking/{item_id}" and route["requests"] == 2
+        assert route["max_loop_lag_ms"] >= 150
+        assert blocking["total_loop_lag_ms"] >= 300
+        # 4个 run_db 请求并发执行（约0.2s），2个阻塞请求串行（约0.4s）
+        assert elapsed < 1.0
+
+    def test_unmatched_paths_share_one_bucket(self):
+        executor = DBExecutor(max_workers=1)
+        app, monitor = lag_app(executor)
+
+        assert asyncio.run(call(app, "/missing")) == 404
+        assert asyncio.run(call(app, "/missing/2")) == 404
+        routes = monitor.snapshot()["routes"]
+        assert [(r["route"], r["requests"]) for r in routes] == [("GET <unmatched>", 2)]
+        assert monitor.snapshot()["inflight"] == 0
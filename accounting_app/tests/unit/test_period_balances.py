@@ -0,0 +1,127 @@
+"""
+期末科目余额物化（account_period_balances）单元测试
+快照 + 未结期间增量 必须与从头汇总的结果一致
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from accounting_app.models import (
+    AccountPeriodBalance, Base, ChartOfAccounts, Company, JournalEntry, JournalEntryLine,
+)
+from accounting_app.services.period_balances import (
+    _group_by_type_and_name, _posted_activity, balances_as_of, materialize_period_balances, period_activity,
+)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'balances.db'}")
+    Base.metadata.create_all(bind=engine, tables=[
+        Company.__table__, ChartOfAccounts.__table__, JournalEntry.__table__,
+        JournalEntryLine.__table__, AccountPeriodBalance.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    session.add(Company(id=1, company_code='C1', company_name='Test Sdn Bhd'))
+    session.add_all([
+        ChartOfAccounts(id=1, company_id=1, account_code='1000', account_name='Bank', account_type='asset'),
+        ChartOfAccounts(id=2, company_id=1, account_code='4000', account_name='Sales', account_type='income'),
+        ChartOfAccounts(id=3, company_id=1, account_code='5000', account_name='Rent', account_type='expense'),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+_entry_seq = iter(range(1, 1000))
+
+
+def post(db, entry_date, debit_account, credit_account, amount, status='posted'):
+    entry = JournalEntry(company_id=1, entry_number=f'JE-{next(_entry_seq)}', entry_date=entry_date,
+                         description='test', status=status)
+    db.add(entry)
+    db.flush()
+    db.add_all([
+        JournalEntryLine(journal_entry_id=entry.id, account_id=debit_account,
+                         debit_amount=Decimal(amount), credit_amount=Decimal('0'), line_number=1),
+        JournalEntryLine(journal_entry_id=entry.id, account_id=credit_account,
+                         debit_amount=Decimal('0'), credit_amount=Decimal(amount), line_number=2),
+    ])
+    db.commit()
+    return entry
+
+
+def full_scan(db, as_of_date):
+    return _group_by_type_and_name(db, 1, _posted_activity(db, 1, None, as_of_date))
+
+
+@pytest.mark.unit
+class TestPeriodBalances:
+    """期末余额物化与增量更新"""
+
+    def test_snapshot_plus_delta_matches_full_scan(self, db):
+        """已物化期间 + 未结期间分录 = 从头汇总"""
+        post(db, date(2025, 8, 3), 1, 2, '1000')
+        post(db, date(2025, 9, 10), 3, 1, '300')
+        post(db, date(2025, 9, 20), 1, 2, '50', status='draft')
+        post(db, date(2025, 10, 5), 1, 2, '200')
+
+        materialize_period_balances(db, 1, '2025-08')
+        materialize_period_balances(db, 1, '2025-09')
+
+        as_of = date(2025, 10, 15)
+        assert balances_as_of(db, 1, as_of) == full_scan(db, as_of)
+        assert balances_as_of(db, 1, as_of)[('asset', 'Bank')] == Decimal('900')
+        assert period_activity(db, 1, date(2025, 9, 1), date(2025, 10, 1)) == {
+            ('asset', 'Bank'): Decimal('-300'), ('expense', 'Rent'): Decimal('300'),
+        }
+
+    def test_rematerialize_is_idempotent(self, db):
+        """重跑月结不会重复累加"""
+        post(db, date(2025, 9, 10), 1, 2, '100')
+        materialize_period_balances(db, 1, '2025-09')
+        materialize_period_balances(db, 1, '2025-09')
+        assert db.query(func.count(AccountPeriodBalance.id)).scalar() == 2
+
+    def test_posting_into_closed_period_updates_snapshots(self, db):
+        """补录到已月结期间的分录：该期发生额及之后所有期末累计额同步更新"""
+        post(db, date(2025, 8, 3), 1, 2, '1000')
+        materialize_period_balances(db, 1, '2025-08')
+        materialize_period_balances(db, 1, '2025-09')
+
+        post(db, date(2025, 8, 20), 3, 1, '120')
+
+        rows = {(r.period, r.account_id): r for r in db.query(AccountPeriodBalance).all()}
+        assert rows[('2025-08', 3)].period_debit == Decimal('120')
+        assert rows[('2025-09', 3)].period_debit == Decimal('0')
+        assert rows[('2025-09', 3)].closing_debit == Decimal('120')
+        assert rows[('2025-09', 1)].closing_credit == Decimal('120')
+
+        as_of = date(2025, 10, 1)
+        assert balances_as_of(db, 1, as_of) == full_scan(db, as_of)
+        assert period_activity(db, 1, date(2025, 8, 1), date(2025, 9, 1)) == \
+            _group_by_type_and_name(db, 1, _posted_activity(db, 1, date(2025, 8, 1), date(2025, 9, 1)))
+
+    def test_status_change_and_delete_reverse_snapshots(self, db):
+        """冲销 / 删除已过账分录时冲减快照；草稿过账时计入快照"""
+        kept = post(db, date(2025, 8, 3), 1, 2, '1000')
+        reversed_entry = post(db, date(2025, 8, 10), 3, 1, '400')
+        draft = post(db, date(2025, 8, 12), 1, 2, '70', status='draft')
+        deleted = post(db, date(2025, 8, 15), 3, 1, '30')
+        materialize_period_balances(db, 1, '2025-08')
+
+        reversed_entry.status = 'reversed'
+        draft.status = 'posted'
+        db.commit()
+        for line in db.query(JournalEntryLine).filter(JournalEntryLine.journal_entry_id == deleted.id):
+            db.delete(line)
+        db.delete(deleted)
+        db.commit()
+
+        as_of = date(2025, 9, 1)
+        assert balances_as_of(db, 1, as_of) == full_scan(db, as_of)
+        assert balances_as_of(db, 1, as_of)[('asset', 'Bank')] == Decimal('1070')
+        assert kept.status == 'posted'
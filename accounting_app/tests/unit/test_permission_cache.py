@@ -0,0 +1,126 @@
+"""
+权限缓存单元测试
+权限矩阵的优先级匹配与失效、token → 用户缓存的LRU上限与过期清理、
+ORM 修改权限 / 用户 / 用户公司角色后在事务提交时自动失效（回滚时不失效）
+"""
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from accounting_app.models import Base, Company, Permission, User, UserCompanyRole
+from accounting_app.services import permission_cache
+from accounting_app.services.permission_cache import PermissionMatrix, UserTokenCache
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'permissions.db'}")
+    Base.metadata.create_all(bind=engine, tables=[
+        Company.__table__, User.__table__, Permission.__table__, UserCompanyRole.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    session.add(Company(id=1, company_code='C1', company_name='Test Sdn Bhd'))
+    session.add_all([
+        User(id=1, company_id=1, username='alice', email='alice@example.com', password_hash='x', role='admin'),
+        User(id=2, company_id=1, username='bob', email='bob@example.com', password_hash='x', role='viewer'),
+        Permission(role='admin', resource='*', action='*'),
+        Permission(role='viewer', resource='reports', action='view'),
+    ])
+    session.commit()
+    permission_cache.invalidate_all()
+    yield session
+    session.close()
+    permission_cache.invalidate_all()
+
+
+def cache_user(db, token, user_id):
+    permission_cache.user_token_cache.put(token, db.get(User, user_id))
+
+
+@pytest.mark.unit
+class TestPermissionMatrix:
+    """角色权限矩阵"""
+
+    def test_match_priority_and_reload_after_invalidate(self, db):
+        matrix = PermissionMatrix(max_age=300)
+        assert matrix.match(db, 'viewer', 'reports', 'view') == 'exact'
+        assert matrix.match(db, 'admin', 'reports', 'delete') == 'full_wildcard'
+        assert matrix.match(db, 'viewer', 'reports', 'export') is None
+
+        db.add(Permission(role='viewer', resource='reports', action='*'))
+        db.commit()
+        # 独立的矩阵实例不受全局失效影响，直到显式失效
+        assert matrix.match(db, 'viewer', 'reports', 'export') is None
+        matrix.invalidate()
+        assert matrix.match(db, 'viewer', 'reports', 'export') == 'action_wildcard'
+
+    def test_permission_changes_invalidate_on_commit_only(self, db):
+        matrix = permission_cache.permission_matrix
+        assert matrix.match(db, 'viewer', 'invoices', 'view') is None
+
+        db.add(Permission(role='viewer', resource='invoices', action='view'))
+        db.flush()
+        db.rollback()
+        assert matrix._matrix is not None
+
+        db.add(Permission(role='viewer', resource='invoices', action='view'))
+        db.commit()
+        assert matrix.match(db, 'viewer', 'invoices', 'view') == 'exact'
+
+
+@pytest.mark.unit
+class TestUserTokenCache:
+    """token → 用户缓存"""
+
+    def test_lru_bound_evicts_least_recently_used(self, db):
+        cache = UserTokenCache(ttl=60, max_entries=2)
+        alice, bob = db.get(User, 1), db.get(User, 2)
+        cache.put('t1', alice)
+        cache.put('t2', bob)
+        assert cache.get(db, 't1').id == 1
+
+        cache.put('t3', bob)
+        assert len(cache) == 2
+        assert cache.get(db, 't2') is None
+        assert cache.get(db, 't1').id == 1 and cache.get(db, 't3').id == 2
+
+    def test_expired_entries_are_swept_before_evicting(self, db, monkeypatch):
+        cache = UserTokenCache(ttl=30, max_entries=2)
+        cache.put('old', db.get(User, 1))
+        cache.put('fresh', db.get(User, 2))
+
+        now = time.monotonic()
+        monkeypatch.setattr(permission_cache.time, 'monotonic', lambda: now + 20)
+        cache.put('refreshed', db.get(User, 2))
+        monkeypatch.setattr(permission_cache.time, 'monotonic', lambda: now + 40)
+        cache.put('new', db.get(User, 1))
+
+        assert set(cache._entries) == {'refreshed', 'new'}
+
+    def test_deactivating_user_drops_cached_tokens_after_commit(self, db):
+        cache_user(db, 'alice-1', 1)
+        cache_user(db, 'alice-2', 1)
+        cache_user(db, 'bob-1', 2)
+
+        db.get(User, 1).is_active = False
+        db.flush()
+        assert permission_cache.user_token_cache.get(db, 'alice-1') is not None
+
+        db.commit()
+        assert permission_cache.user_token_cache.get(db, 'alice-1') is None
+        assert permission_cache.user_token_cache.get(db, 'alice-2') is None
+        assert permission_cache.user_token_cache.get(db, 'bob-1').id == 2
+
+    def test_role_binding_changes_and_rollback(self, db):
+        cache_user(db, 'bob-1', 2)
+
+        db.add(UserCompanyRole(user_id=2, company_id=1, role='accountant'))
+        db.flush()
+        db.rollback()
+        assert permission_cache.user_token_cache.get(db, 'bob-1').id == 2
+
+        db.add(UserCompanyRole(user_id=2, company_id=1, role='accountant'))
+        db.commit()
+        assert permission_cache.user_token_cache.get(db, 'bob-1') is None
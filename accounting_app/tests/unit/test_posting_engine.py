@@ -0,0 +1,171 @@
+"""
+PostingRuleEngine 预编译规则索引与银行对账单批量过账单元测试
+"""
+import pytest
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from sqlalchemy import Boolean, Column, Date, Integer, Numeric, String, Text, create_engine, event
+from sqlalchemy.orm import declarative_base, sessionmaker
+from accounting_app import posting_engine
+from accounting_app.posting_engine import CompiledRuleSet, PostingRuleEngine
+
+# 批量过账使用的字段（is_posted / source_type 等）的最小模型
+TestBase = declarative_base()
+
+
+class StatementRow(TestBase):
+    __tablename__ = "bank_statements"
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    transaction_date = Column(Date, nullable=False)
+    description = Column(Text)
+    debit_amount = Column(Numeric(15, 2))
+    credit_amount = Column(Numeric(15, 2))
+    raw_line_id = Column(Integer)
+    is_posted = Column(Boolean, default=False)
+
+
+class EntryRow(TestBase):
+    __tablename__ = "journal_entries"
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer)
+    entry_date = Column(Date)
+    entry_type = Column(String(50))
+    reference_number = Column(String(100))
+    description = Column(Text)
+    total_debit = Column(Numeric(15, 2))
+    total_credit = Column(Numeric(15, 2))
+    source_type = Column(String(50))
+    source_id = Column(Integer)
+    created_by = Column(String(100))
+    is_posted = Column(Boolean)
+
+
+class EntryLineRow(TestBase):
+    __tablename__ = "journal_entry_lines"
+    id = Column(Integer, primary_key=True)
+    journal_entry_id = Column(Integer)
+    account_id = Column(Integer)
+    description = Column(Text)
+    debit_amount = Column(Numeric(15, 2))
+    credit_amount = Column(Numeric(15, 2))
+    line_number = Column(Integer)
+    raw_line_id = Column(Integer)
+
+
+def make_rule(rule_id, match_keywords=None, transaction_type=None, min_amount=None, max_amount=None):
+    return SimpleNamespace(
+        id=rule_id,
+        match_keywords=match_keywords,
+        transaction_type=transaction_type,
+        min_amount=min_amount,
+        max_amount=max_amount
+    )
+
+
+def first_match_linear(rules, transaction_type, keywords, amount):
+    """逐条检查（find_matching_rule 的原始逻辑）"""
+    engine = PostingRuleEngine.__new__(PostingRuleEngine)
+    for rule in rules:
+        if engine._rule_matches(rule, transaction_type, keywords, amount):
+            return rule
+    return None
+
+
+@pytest.mark.unit
+class TestCompiledRuleSet:
+    """预编译规则索引与逐条匹配结果一致"""
+
+    def setup_method(self):
+        self.rules = [
+            make_rule(1, 'payment, salary', 'withdrawal', min_amount=Decimal('1000')),
+            make_rule(2, 'pay', 'withdrawal'),
+            make_rule(3, 'tnb,syabas', None, max_amount=Decimal('500')),
+            make_rule(4, 'interest', 'deposit'),
+            make_rule(5, None, 'deposit'),
+            make_rule(6, None, None),
+        ]
+        self.rule_set = CompiledRuleSet(self.rules)
+
+    @pytest.mark.parametrize("transaction_type,description,amount", [
+        ('withdrawal', 'SALARY PAYMENT NOV', Decimal('5000')),
+        ('withdrawal', 'SALARY PAYMENT NOV', Decimal('50')),
+        ('withdrawal', 'DUITNOW PAYMENT', Decimal('50')),
+        ('withdrawal', 'TNB BILL', Decimal('120')),
+        ('withdrawal', 'TNB BILL', Decimal('900')),
+        ('deposit', 'INTEREST CREDIT', Decimal('3.20')),
+        ('deposit', 'CASH DEPOSIT', None),
+        ('withdrawal', None, Decimal('10')),
+    ])
+    def test_matches_linear_scan(self, transaction_type, description, amount):
+        keywords = [description] if description else []
+        expected = first_match_linear(self.rules, transaction_type, keywords, amount)
+        actual = self.rule_set.match(transaction_type, keywords, amount)
+        assert actual is expected
+
+    def test_overlapping_keywords(self):
+        """'payment' 命中时其前缀关键词 'pay' 同样命中"""
+        rules = [make_rule(1, 'pay'), make_rule(2, 'payment')]
+        assert CompiledRuleSet(rules).match('withdrawal', ['PAYMENT'], None).id == 1
+
+    def test_empty_keyword_matches_any_text(self):
+        rules = [make_rule(1, 'foo,'), make_rule(2, None)]
+        assert CompiledRuleSet(rules).match('withdrawal', ['anything'], None).id == 1
+
+
+@pytest.fixture
+def batch_db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'posting.db'}")
+    TestBase.metadata.create_all(bind=engine)
+    monkeypatch.setattr(posting_engine, 'BankStatement', StatementRow)
+    monkeypatch.setattr(posting_engine, 'JournalEntry', EntryRow)
+    monkeypatch.setattr(posting_engine, 'JournalEntryLine', EntryLineRow)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        StatementRow(id=i, company_id=1, transaction_date=date(2025, 1, i),
+                     description='SALARY' if i != 5 else 'UNKNOWN', debit_amount=Decimal('100'),
+                     credit_amount=Decimal('0'), raw_line_id=i, is_posted=False)
+        for i in range(1, 11)
+    ])
+    session.commit()
+    yield engine, session
+    session.close()
+
+
+@pytest.mark.unit
+class TestBatchBankStatementPosting:
+    """银行对账单批量过账：按chunk查询与提交，不逐行重新加载"""
+
+    def test_chunks_without_per_row_refresh(self, batch_db, monkeypatch):
+        engine, session = batch_db
+        rule = SimpleNamespace(id=1, match_keywords='salary', transaction_type='deposit', min_amount=None,
+                               max_amount=None, debit_account_id=10, credit_account_id=20,
+                               description_template='Salary')
+        post = PostingRuleEngine(session)
+        monkeypatch.setattr(post, '_load_active_rules', lambda company_id, source_type: [rule])
+
+        selects = []
+        event.listen(engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: selects.append(statement)
+                     if statement.lstrip().startswith('SELECT') else None)
+        result = post.batch_apply_bank_statement_rules(1, 'tester', chunk_size=3)
+
+        assert (result['processed'], result['success'], result['failed']) == (10, 9, 1)
+        assert [e['id'] for e in result['errors']] == [5]
+        # 每个chunk一次查询（3+3+3+1），commit 后没有逐行的刷新查询
+        assert len(selects) == 4
+        assert session.expire_on_commit is True
+
+        session.expire_all()
+        assert session.query(EntryRow).count() == 9
+        assert session.query(EntryLineRow).count() == 18
+        assert [r.id for r in session.query(StatementRow).filter_by(is_posted=False)] == [5]
+
+    def test_limit_stops_after_limit_rows(self, batch_db, monkeypatch):
+        _, session = batch_db
+        post = PostingRuleEngine(session)
+        monkeypatch.setattr(post, '_load_active_rules', lambda company_id, source_type: [])
+
+        result = post.batch_apply_bank_statement_rules(1, 'tester', limit=4, chunk_size=3)
+        assert (result['processed'], result['failed']) == (4, 4)
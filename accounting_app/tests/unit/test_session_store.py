@@ -0,0 +1,189 @@
+"""
+Session存储后端单元测试
+内存后端与数据库后端（user_sessions 表）的保存 / 读取 / 覆盖 / 删除、
+过期清理（分批、只清理过期条目、重新写入后不误删）、后端选择与 verify_session 过期处理，
+以及 get_user_by_token 在token缓存命中时不读取session存储
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from accounting_app.models import Base, Company, User, UserSession
+from accounting_app.services import auth_service, permission_cache, session_store
+from accounting_app.services.session_store import DatabaseSessionBackend, MemorySessionBackend, SessionBackend
+
+NOW = datetime(2025, 11, 30, 12, 0, 0)
+
+
+class FrozenDatetime:
+    """替换模块中的 datetime，只固定 now()"""
+
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+
+def session_data(user_id=1, expires_at=NOW + timedelta(hours=1), **overrides):
+    data = {
+        'user_id': user_id,
+        'company_id': 1,
+        'username': f'user{user_id}',
+        'role': 'accountant',
+        'expires_at': expires_at,
+    }
+    data.update(overrides)
+    return data
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sessions.db'}")
+    Base.metadata.create_all(bind=engine, tables=[
+        Company.__table__, User.__table__, UserSession.__table__,
+    ])
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture(params=['memory', 'database'])
+def backend(request, session_factory):
+    if request.param == 'memory':
+        return MemorySessionBackend()
+    return DatabaseSessionBackend(session_factory)
+
+
+class CountingBackend(MemorySessionBackend):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get(self, token):
+        self.reads += 1
+        return super().get(token)
+
+
+@pytest.mark.unit
+class TestSessionBackend:
+    """两种后端的通用行为"""
+
+    def test_interface_is_abstract(self):
+        with pytest.raises(TypeError):
+            SessionBackend()
+
+    def test_save_get_and_overwrite(self, backend):
+        assert backend.get('missing') is None
+
+        backend.save('t1', session_data())
+        assert backend.get('t1') == session_data()
+
+        backend.save('t1', session_data(role='viewer', expires_at=NOW + timedelta(hours=2)))
+        assert backend.get('t1') == session_data(role='viewer', expires_at=NOW + timedelta(hours=2))
+
+    def test_returned_data_is_a_copy(self, backend):
+        backend.save('t1', session_data())
+        backend.get('t1')['role'] = 'admin'
+        assert backend.get('t1')['role'] == 'accountant'
+
+    def test_delete_returns_removed_session(self, backend):
+        backend.save('t1', session_data())
+        assert backend.delete('t1') == session_data()
+        assert backend.get('t1') is None
+        assert backend.delete('t1') is None
+
+    def test_cleanup_removes_only_expired_in_batches(self, backend):
+        for i in range(5):
+            backend.save(f'old{i}', session_data(user_id=i + 1, expires_at=NOW - timedelta(minutes=i + 1)))
+        backend.save('fresh', session_data(user_id=9))
+
+        assert backend.cleanup_expired(NOW, batch_size=2) == 5
+        assert backend.get('fresh') == session_data(user_id=9)
+        assert all(backend.get(f'old{i}') is None for i in range(5))
+        assert backend.cleanup_expired(NOW, batch_size=2) == 0
+
+    def test_cleanup_keeps_renewed_and_skips_revoked(self, backend):
+        backend.save('renewed', session_data(expires_at=NOW - timedelta(minutes=5)))
+        backend.save('renewed', session_data(expires_at=NOW + timedelta(hours=8)))
+        backend.save('revoked', session_data(user_id=2, expires_at=NOW - timedelta(minutes=5)))
+        backend.delete('revoked')
+
+        assert backend.cleanup_expired(NOW) == 0
+        assert backend.get('renewed')['expires_at'] == NOW + timedelta(hours=8)
+
+
+@pytest.mark.unit
+class TestDatabaseSessionBackend:
+    """user_sessions 表存储"""
+
+    def test_only_token_hash_is_stored_and_shared(self, session_factory):
+        DatabaseSessionBackend(session_factory).save('secret-token', session_data())
+
+        db = session_factory()
+        try:
+            hashes = [row.token_hash for row in db.query(UserSession).all()]
+        finally:
+            db.close()
+        assert hashes == [DatabaseSessionBackend._hash('secret-token')]
+        assert 'secret-token' not in hashes[0]
+        # 另一个后端实例（另一个worker）读取同一张表
+        assert DatabaseSessionBackend(session_factory).get('secret-token') == session_data()
+
+
+@pytest.mark.unit
+class TestBackendSelection:
+    """后端选择与 auth_service 集成"""
+
+    @pytest.fixture(autouse=True)
+    def reset_backend(self):
+        session_store.set_session_backend(None)
+        yield
+        session_store.set_session_backend(None)
+
+    def test_env_selects_backend(self, monkeypatch):
+        monkeypatch.setenv('SESSION_BACKEND', 'memory')
+        backend = session_store.get_session_backend()
+        assert isinstance(backend, MemorySessionBackend)
+        assert session_store.get_session_backend() is backend
+
+    def test_verify_session_drops_expired_session(self):
+        backend = MemorySessionBackend()
+        session_store.set_session_backend(backend)
+        backend.save('live', session_data(expires_at=datetime.now() + timedelta(hours=1)))
+        backend.save('stale', session_data(user_id=2, expires_at=datetime.now() - timedelta(seconds=1)))
+
+        assert auth_service.verify_session('live')['user_id'] == 1
+        assert auth_service.verify_session('stale') is None
+        assert backend.get('stale') is None
+
+    def test_token_cache_hit_skips_session_store(self, session_factory, monkeypatch):
+        backend = CountingBackend()
+        session_store.set_session_backend(backend)
+        permission_cache.invalidate_all()
+        db = session_factory()
+        db.add(Company(id=1, company_code='C1', company_name='Test Sdn Bhd'))
+        db.add(User(id=1, company_id=1, username='alice', email='alice@example.com', password_hash='x', role='admin'))
+        db.commit()
+        try:
+            token = auth_service.create_session(db.get(User, 1))
+            assert auth_service.get_user_by_token(db, token).id == 1
+            assert auth_service.get_user_by_token(db, token).id == 1
+            assert backend.reads == 1
+
+            # 缓存条目不超过session过期时间
+            backend.save('short', session_data(expires_at=datetime.now() + timedelta(seconds=5)))
+            assert auth_service.get_user_by_token(db, 'short').id == 1
+            now = permission_cache.time.monotonic()
+            monkeypatch.setattr(permission_cache.time, 'monotonic', lambda: now + 10)
+            monkeypatch.setattr(auth_service, 'datetime', FrozenDatetime(datetime.now() + timedelta(seconds=10)))
+            assert auth_service.get_user_by_token(db, 'short') is None
+            assert backend.get('short') is None
+
+            # 登出后立即失效
+            assert auth_service.revoke_session(token)
+            assert auth_service.get_user_by_token(db, token) is None
+        finally:
+            db.close()
+            permission_cache.invalidate_all()
@@ -0,0 +1,168 @@
+"""
+SFTPSyncService 会话复用 / manifest / 批量哈希检查单元测试
+"""
+import json
+import os
+import shutil
+import threading
+
+import paramiko
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from accounting_app.models import SFTPUploadJob
+from accounting_app.services.sftp import sync_service as sync_module
+from accounting_app.services.sftp.sftp_client import SFTPClient
+from accounting_app.services.sftp.sync_service import SFTPSyncService
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSFTP:
+    """把远程路径映射到本地目录的 SFTP 通道"""
+
+    lock = threading.Lock()
+    channels = []
+    put_threads = set()
+
+    def __init__(self, remote_root):
+        self.remote_root = remote_root
+
+    def _local(self, remote_path):
+        return os.path.join(self.remote_root, remote_path.lstrip('/'))
+
+    def stat(self, remote_path):
+        if not os.path.exists(self._local(remote_path)):
+            raise FileNotFoundError(remote_path)
+
+    def mkdir(self, remote_path):
+        os.mkdir(self._local(remote_path))
+
+    def put(self, local_path, remote_path):
+        with self.lock:
+            self.put_threads.add(threading.get_ident())
+        shutil.copyfile(local_path, self._local(remote_path))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    remote_root = tmp_path / 'remote'
+    remote_root.mkdir()
+    handshakes = []
+
+    def open_transport(self):
+        transport = FakeTransport()
+        handshakes.append(transport)
+        return transport
+
+    def from_transport(transport):
+        sftp = FakeSFTP(str(remote_root))
+        with FakeSFTP.lock:
+            FakeSFTP.channels.append(sftp)
+        return sftp
+
+    FakeSFTP.channels = []
+    FakeSFTP.put_threads = set()
+    monkeypatch.setattr(SFTPClient, '_open_transport', open_transport)
+    monkeypatch.setattr(paramiko.SFTPClient, 'from_transport', staticmethod(from_transport))
+    return remote_root, handshakes
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch, remote):
+    monkeypatch.setenv('SFTP_CONFIG', json.dumps({
+        'host': 'erp.example.com', 'username': 'erp', 'password': 'secret',
+        'remote_dir': '/imports', 'max_parallel_uploads': 3,
+    }))
+    engine = create_engine(f"sqlite:///{tmp_path / 'sftp.db'}")
+    SFTPUploadJob.__table__.create(bind=engine)
+    db = sessionmaker(bind=engine)()
+    monkeypatch.setattr(sync_module, 'log_event', lambda **kwargs: None)
+
+    svc = SFTPSyncService(db_session=db, company_id=1)
+    svc.base_upload_dir = str(tmp_path / 'uploads')
+    svc.manifest_path = os.path.join(svc.base_upload_dir, '.sftp_manifest_1.json')
+    yield svc
+    db.close()
+
+
+def write_file(service, company, folder, name, content):
+    path = os.path.join(service.base_upload_dir, company, folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+
+@pytest.mark.unit
+class TestSFTPSync:
+
+    def test_one_session_and_parallel_channels(self, service, remote):
+        remote_root, handshakes = remote
+        for i in range(8):
+            write_file(service, 'company_1', 'sales', f'sales_{i}.csv', f'row,{i}\n')
+        write_file(service, 'company_2', 'bank', 'bank.xlsx', 'bank')
+
+        result = service.scan_and_upload_files()
+
+        assert result['uploaded'] == 9 and result['failed'] == 0
+        assert len(handshakes) == 1 and handshakes[0].closed
+        # 主线程建目录 + 最多3个上传通道
+        assert 2 <= len(FakeSFTP.channels) <= 4
+        assert len(FakeSFTP.put_threads) <= 3
+        assert (remote_root / 'imports' / 'sales' / 'company_1' / 'sales_7.csv').read_text() == 'row,7\n'
+        assert (remote_root / 'imports' / 'bank' / 'company_2' / 'bank.xlsx').exists()
+        job_numbers = [job.job_number for job in service.db.query(SFTPUploadJob).all()]
+        assert len(set(job_numbers)) == 9
+
+    def test_manifest_skips_unchanged_without_hashing(self, service, remote, monkeypatch):
+        write_file(service, 'company_1', 'sales', 'a.csv', 'a')
+        service.scan_and_upload_files()
+
+        rescan = SFTPSyncService(db_session=service.db, company_id=1)
+        rescan.base_upload_dir = service.base_upload_dir
+        rescan.manifest_path = service.manifest_path
+        monkeypatch.setattr(rescan, '_calculate_file_hash',
+                            lambda path: pytest.fail('unchanged file was re-hashed'))
+        result = rescan.scan_and_upload_files()
+        assert (result['uploaded'], result['skipped']) == (0, 1)
+
+    def test_bulk_hash_check_and_duplicate_content(self, service, remote):
+        write_file(service, 'company_1', 'sales', 'a.csv', 'same')
+        service.scan_and_upload_files()
+        os.remove(service.manifest_path)
+
+        # 内容相同的新文件：已上传的哈希跳过；本次扫描内重复的内容只上传一个
+        write_file(service, 'company_1', 'payments', 'copy.csv', 'same')
+        write_file(service, 'company_1', 'suppliers', 'x.csv', 'new')
+        write_file(service, 'company_1', 'customers', 'y.csv', 'new')
+        result = service.scan_and_upload_files()
+        assert (result['uploaded'], result['skipped']) == (1, 3)
+
+    def test_connection_failure_marks_jobs_failed(self, service, remote, monkeypatch):
+        def refuse(self):
+            raise paramiko.SSHException('handshake failed')
+        monkeypatch.setattr(SFTPClient, '_open_transport', refuse)
+        write_file(service, 'company_1', 'sales', 'a.csv', 'a')
+
+        result = service.scan_and_upload_files()
+        assert result['failed'] == 1
+        job = service.db.query(SFTPUploadJob).one()
+        assert job.status == 'failed' and 'handshake failed' in job.last_error
+
+        # 重试同样在一个会话上完成
+        _, handshakes = remote
+        monkeypatch.setattr(SFTPClient, '_open_transport',
+                            lambda self: handshakes.append(FakeTransport()) or handshakes[-1])
+        retry = service.retry_failed_uploads()
+        assert retry['succeeded'] == 1 and len(handshakes) == 1
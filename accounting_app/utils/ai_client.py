@@ -1,10 +1,34 @@
 """
 智能AI客户端工厂
-支持多种AI提供商：OpenAI、Perplexity
+支持多种AI提供商：OpenAI、Perplexity、stub（本地测试桩，不访问网络）
 根据环境变量自动切换
+
+异步路由使用 AsyncAIClient：
+- 阻塞的 chat 调用放到线程池执行，不占用事件循环
+- 并发上限 AI_MAX_CONCURRENCY，单次请求超时 AI_REQUEST_TIMEOUT 秒
+- 回复按（提供商、模型、消息、参数、数据快照版本）的内容哈希缓存，TTL + LRU淘汰
 """
+import asyncio
+import hashlib
+import json
 import os
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+# 同时进行的AI请求上限（每个进程）
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+
+# 单次AI请求超时（秒）
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "60"))
+
+# AI回复缓存
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "256"))
 
 
 class AIClient:
@@ -29,6 +53,8 @@ class AIClient:
             self._init_perplexity()
         elif self.provider == "openai":
             self._init_openai()
+        elif self.provider == "stub":
+            self._init_stub()
         else:
             raise ValueError(f"不支持的AI提供商: {self.provider}")
     
@@ -78,7 +104,13 @@ class AIClient:
         
         print(f"✅ 使用OpenAI（模型: {self.model}）")
     
-    def chat(self, messages: list, temperature: float = 0.7, max_tokens: int = 800) -> str:
+    def _init_stub(self):
+        """初始化本地测试桩（开发/测试环境，不访问网络）"""
+        self.client = StubChatProvider()
+        self.model = "stub"
+    
+    def chat(self, messages: list, temperature: float = 0.7, max_tokens: int = 800,
+             timeout: Optional[float] = None) -> str:
         """
         发送聊天请求
         
@@ -86,16 +118,19 @@ class AIClient:
             messages: OpenAI格式的消息列表
             temperature: 温度参数（0-1）
             max_tokens: 最大返回token数
+            timeout: 可选，本次请求超时（秒）
         
         返回:
             AI生成的文本内容
         """
         try:
+            options = {"timeout": timeout} if timeout is not None else {}
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **options
             )
             
             content = response.choices[0].message.content
@@ -121,6 +156,145 @@ class AIClient:
         return self.chat(messages, **kwargs)
 
 
+class StubChatProvider:
+    """
+    本地测试桩：实现 chat.completions.create 接口
+    回复为 AI_STUB_RESPONSE（未设置时回显最后一条消息的开头），可设置 delay 模拟慢速请求
+    """
+    
+    def __init__(self, response: Optional[str] = None, delay: float = 0.0):
+        self.response = response
+        self.delay = delay
+        self.calls = []
+        self.chat = SimpleNamespace(completions=self)
+    
+    def create(self, model: str, messages: list, **kwargs):
+        self.calls.append({"model": model, "messages": messages, **kwargs})
+        if self.delay:
+            time.sleep(self.delay)
+        content = self.response or os.getenv("AI_STUB_RESPONSE") or f"[stub] {messages[-1]['content'].strip()[:200]}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class CompletionCache:
+    """AI回复缓存：键为请求内容的SHA-256，TTL过期 + 超出容量时淘汰最久未使用的条目"""
+    
+    def __init__(self, ttl: int = AI_CACHE_TTL, max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (reply, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(provider: str, model: str, messages: list, snapshot_version: Optional[str] = None,
+                 **params) -> str:
+        payload = {
+            "provider": provider,
+            "model": model,
+            "messages": messages,
+            "snapshot": snapshot_version,
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, key: str, reply: str):
+        with self._lock:
+            self._entries[key] = (reply, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class AsyncAIClient:
+    """
+    异步AI客户端（供 async def 路由使用）
+    请求在专用线程池（max_concurrency 个线程）中执行：超出上限的请求排队等待，
+    不占用事件循环，也不占用 FastAPI 同步路由使用的线程池
+    """
+    
+    def __init__(self, provider: Optional[str] = None, cache: Optional[CompletionCache] = None,
+                 max_concurrency: int = AI_MAX_CONCURRENCY, timeout: float = AI_REQUEST_TIMEOUT):
+        self.provider = provider
+        self.cache = cache if cache is not None else CompletionCache()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client: Optional[AIClient] = None
+        self._client_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ai-client")
+    
+    def _get_client(self) -> AIClient:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = AIClient(self.provider)
+        return self._client
+    
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+    
+    async def chat(self, messages: list, temperature: float = 0.7, max_tokens: int = 800,
+                   snapshot_version: Optional[str] = None, use_cache: bool = True,
+                   timeout: Optional[float] = None) -> str:
+        """
+        发送聊天请求（不阻塞事件循环）
+        
+        参数:
+            snapshot_version: 提示词所依据的数据快照版本；相同消息 + 相同版本直接返回缓存的回复
+            use_cache: False 时总是请求AI（结果仍写入缓存）
+            timeout: 本次请求超时（秒，含排队时间），默认 AI_REQUEST_TIMEOUT
+        """
+        timeout = timeout or self.timeout
+        client = self._client or await self._run(self._get_client)
+        key = CompletionCache.make_key(client.provider, client.model, messages, snapshot_version,
+                                       temperature=temperature, max_tokens=max_tokens)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        try:
+            reply = await asyncio.wait_for(
+                self._run(client.chat, messages, temperature=temperature, max_tokens=max_tokens, timeout=timeout),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"AI请求超时（{timeout:.0f}秒）")
+        self.cache.set(key, reply)
+        return reply
+    
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
 # 便捷函数
 def get_ai_client(provider: Optional[str] = None) -> AIClient:
     """
@@ -135,6 +309,17 @@ def get_ai_client(provider: Optional[str] = None) -> AIClient:
     return AIClient(provider)
 
 
+_async_ai_client: Optional[AsyncAIClient] = None
+
+
+def get_async_ai_client() -> AsyncAIClient:
+    """获取进程内共享的异步AI客户端（共享并发上限与回复缓存）"""
+    global _async_ai_client
+    if _async_ai_client is None:
+        _async_ai_client = AsyncAIClient()
+    return _async_ai_client
+
+
 # 支持直接调用
 if __name__ == "__main__":
     print("🧪 测试AI客户端...")
@@ -3,21 +3,47 @@ Phase 1-4: 审计日志装饰器和工具函数
 用于追踪所有敏感操作，确保合规性
 """
 from functools import wraps
-from typing import Optional, Dict, Any, Callable
+from typing import Optional, Dict, Any, Callable, List
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from fastapi import Request
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 
+from services.batch_writer import BatchWriter
 from ..models import AuditLog
 
 
+def _write_audit_batch(rows: List[Dict[str, Any]]):
+    """后台线程：一批审计日志一个事务写入"""
+    from ..db import SessionLocal
+    session = SessionLocal()
+    try:
+        session.execute(insert(AuditLog.__table__), rows)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+# 审计日志写入离开请求的关键路径：有界队列 + 后台批量提交（队列满时同步写入）
+audit_writer = BatchWriter('audit_logs', _write_audit_batch)
+
+
+def get_audit_writer_stats() -> Dict[str, Any]:
+    """审计日志队列深度与批量写入耗时"""
+    return audit_writer.stats()
+
+
 class AuditLogger:
     """
     审计日志记录器
     负责记录所有敏感操作到audit_logs表
     
     Phase 1-4修复：使用独立Session，避免破坏业务事务
+    默认交给 audit_writer 后台批量写入；需要立即取得ID时传 sync=True
     """
     
     def __init__(self, db: Session):
@@ -57,7 +83,8 @@ class AuditLogger:
         request_method: Optional[str] = None,
         request_path: Optional[str] = None,
         success: bool = True,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        sync: bool = False
     ) -> AuditLog:
         """
         记录审计日志
@@ -79,6 +106,7 @@ class AuditLogger:
             request_path: API路径
             success: 操作是否成功
             error_message: 错误信息
+            sync: 同步提交（返回的对象带ID）；默认入队后台批量写入，返回的对象未持久化
         
         Returns:
             AuditLog对象
@@ -90,11 +118,7 @@ class AuditLogger:
                 "这是审计合规的强制要求。"
             )
         
-        # Phase 1-4修复：使用独立Session写入审计日志，避免破坏业务事务
-        independent_db = self._get_independent_session()
-        
-        # 创建审计日志记录
-        audit_log = AuditLog(
+        values = dict(
             company_id=company_id,
             user_id=user_id,
             username=username,
@@ -110,9 +134,21 @@ class AuditLogger:
             old_value=old_value,
             new_value=new_value,
             success=success,
-            error_message=error_message
+            error_message=error_message,
+            # 记录操作发生的时间，而不是批量写入的时间
+            created_at=datetime.now(timezone.utc)
         )
         
+        # 创建审计日志记录
+        audit_log = AuditLog(**values)
+        
+        if not sync:
+            audit_writer.submit(values)
+            return audit_log
+        
+        # Phase 1-4修复：使用独立Session写入审计日志，避免破坏业务事务
+        independent_db = self._get_independent_session()
+        
         try:
             # 使用独立Session提交审计日志
             independent_db.add(audit_log)
@@ -0,0 +1,107 @@
+"""
+同步数据库操作 / CPU 密集操作的专用线程池（async 路由使用）
+- async def 路由中直接调用 sqlite3 / psycopg2 / 同步 SQLAlchemy Session 会阻塞事件循环，
+  并发请求被串行执行；改为 await run_db(func, *args) 在本线程池中执行
+- 线程数 DB_EXECUTOR_WORKERS（默认与 SQLAlchemy 连接池 pool_size 相同），
+  超出的调用在队列中等待，不会占满连接池，也不占用 FastAPI / AI客户端的线程池
+- Session 由 Depends(get_db) 提供；同一请求内对同一 Session 的多次 run_db 调用依次执行，不会并发使用
+- OCR、PDF 解析与 PDF 报表渲染等耗时的非数据库操作用 await run_cpu(func, *args)，
+  在单独的线程池（CPU_EXECUTOR_WORKERS，默认2）中执行，不占用 run_db 的线程，
+  避免几份大文件的 OCR 把普通数据库调用挤在队列里；run_cpu 中的函数不应访问 Session
+
+用法：
+    @router.get("/items")
+    async def list_items(db: Session = Depends(get_db)):
+        return await run_db(_list_items, db)
+
+    @router.post("/upload")
+    async def upload(file: UploadFile, db: Session = Depends(get_db)):
+        content = await file.read()
+        parsed = await run_cpu(_parse_pdf, content)
+        return await run_db(_save_parsed, db, parsed)
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, TypeVar
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "10"))
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", "2"))
+
+T = TypeVar("T")
+
+
+class DBExecutor:
+    """有界线程池（首次使用时按进程创建）"""
+
+    def __init__(self, max_workers: int = DB_EXECUTOR_WORKERS, thread_name_prefix: str = "db"):
+        self.max_workers = max(1, max_workers)
+        self.thread_name_prefix = thread_name_prefix
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self.completed = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    # fork 之后父进程的线程不存在，子进程重新创建线程池
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.thread_name_prefix)
+                    self._pid = pid
+        return self._executor
+
+    def _call(self, func: Callable[..., T]) -> T:
+        with self._lock:
+            self._waiting -= 1
+            self._active += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在线程池中执行同步函数（保留调用方的 contextvars），异常原样抛出"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        call = partial(context.run, partial(func, *args, **kwargs))
+        with self._lock:
+            self._waiting += 1
+        return await loop.run_in_executor(self._get_executor(), self._call, call)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "waiting": max(self._waiting, 0),
+                "completed": self.completed,
+            }
+
+    def close(self, wait: bool = True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+        self._executor = None
+
+
+db_executor = DBExecutor()
+cpu_executor = DBExecutor(CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """在数据库线程池中执行同步数据库操作"""
+    return await db_executor.run(func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    """在CPU线程池中执行OCR / PDF解析 / 报表渲染等不访问数据库的耗时操作"""
+    return await cpu_executor.run(func, *args, **kwargs)
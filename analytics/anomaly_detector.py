@@ -14,6 +14,8 @@ from db.database import get_db
 from datetime import datetime, timedelta
 import json
 
+from analytics.monthly_feature_store import load_monthly_features, month_key
+
 class AnomalyDetector:
     
     def detect_anomalies(self, customer_id):
@@ -123,36 +125,17 @@ class AnomalyDetector:
     
     def _detect_unusual_spending(self, cursor, customer_id):
         """检测异常消费模式"""
-        # 获取过去6个月平均消费
-        cursor.execute('''
-            SELECT AVG(monthly_total) as avg_monthly
-            FROM (
-                SELECT strftime('%Y-%m', transaction_date) as month,
-                       SUM(amount) as monthly_total
-                FROM transactions
-                WHERE customer_id = ?
-                AND transaction_date >= date('now', '-6 months')
-                AND transaction_date < date('now', '-1 month')
-                GROUP BY strftime('%Y-%m', transaction_date)
-            )
-        ''', (customer_id,))
-        
-        avg_data = cursor.fetchone()
-        if not avg_data or not avg_data['avg_monthly']:
+        # 过去6个月（不含本月）平均消费与本月消费（客户月度特征表）
+        features = load_monthly_features(cursor.connection, [customer_id], window=7,
+                                         require='card_spend', since_month=month_key(6))
+        history = features.history(customer_id)
+        current = month_key(0)
+        previous = [h['card_spend'] for h in history if h['month'] < current]
+        if not previous or not sum(previous):
             return []
         
-        avg_monthly = avg_data['avg_monthly']
-        
-        # 获取本月消费
-        cursor.execute('''
-            SELECT SUM(amount) as current_month_total
-            FROM transactions
-            WHERE customer_id = ?
-            AND strftime('%Y-%m', transaction_date) = strftime('%Y-%m', 'now')
-        ''', (customer_id,))
-        
-        current_data = cursor.fetchone()
-        current_month = current_data['current_month_total'] if current_data and current_data['current_month_total'] else 0
+        avg_monthly = sum(previous) / len(previous)
+        current_month = sum(h['card_spend'] for h in history if h['month'] == current)
         
         # 如果本月消费超过平均值50%以上
         if current_month > avg_monthly * 1.5:
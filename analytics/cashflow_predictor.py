@@ -12,6 +12,8 @@ from db.database import get_db
 from datetime import datetime, timedelta
 import json
 
+from analytics.monthly_feature_store import load_monthly_features, month_key
+
 class CashflowPredictor:
     
     def predict_cashflow(self, customer_id, months=12):
@@ -99,17 +101,10 @@ class CashflowPredictor:
     
     def _get_historical_spending(self, cursor, customer_id):
         """获取历史消费数据"""
-        cursor.execute('''
-            SELECT strftime('%Y-%m', transaction_date) as month,
-                   SUM(amount) as total_spending
-            FROM transactions
-            WHERE customer_id = ?
-            AND transaction_date >= date('now', '-6 months')
-            GROUP BY strftime('%Y-%m', transaction_date)
-            ORDER BY month
-        ''', (customer_id,))
-        
-        return {row['month']: row['total_spending'] for row in cursor.fetchall()}
+        # 最近6个月的月度卡消费（客户月度特征表）
+        features = load_monthly_features(cursor.connection, [customer_id], window=7,
+                                         require='card_spend', since_month=month_key(6))
+        return {h['month']: h['card_spend'] for h in features.history(customer_id)}
     
     def _get_credit_card_payments(self, cursor, customer_id):
         """获取信用卡月还款额"""
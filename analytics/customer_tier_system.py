@@ -18,6 +18,9 @@ from db.database import get_db
 from datetime import datetime, timedelta
 import json
 
+from analytics import vectorized_metrics as vm
+from analytics.monthly_feature_store import load_monthly_features, month_key
+
 class CustomerTierSystem:
     
     TIERS = {
@@ -93,19 +96,9 @@ class CustomerTierSystem:
             months_active = 0
         
         # 获取平均月度消费
-        cursor.execute('''
-            SELECT AVG(monthly_spending) as avg_spending
-            FROM (
-                SELECT strftime('%Y-%m', transaction_date) as month,
-                       SUM(amount) as monthly_spending
-                FROM transactions
-                WHERE customer_id = ?
-                AND transaction_date >= date('now', '-6 months')
-                GROUP BY strftime('%Y-%m', transaction_date)
-            )
-        ''', (customer_id,))
-        spending_data = cursor.fetchone()
-        avg_monthly_spending = spending_data['avg_spending'] if spending_data and spending_data['avg_spending'] else 0
+        features = load_monthly_features(cursor.connection, [customer_id], window=7,
+                                         require='card_spend', since_month=month_key(6))
+        avg_monthly_spending = float(vm.row_mean(features.card_spend)[0]) if len(features.customer_ids) else 0
         
         # 判断等级
         tier = self._determine_tier(current_score, months_active, avg_monthly_spending)
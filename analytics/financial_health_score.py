@@ -14,6 +14,9 @@ from db.database import get_db
 from datetime import datetime, timedelta
 import json
 
+from analytics import vectorized_metrics as vm
+from analytics.monthly_feature_store import load_monthly_features, month_key
+
 class FinancialHealthScore:
     
     def calculate_score(self, customer_id):
@@ -207,26 +210,14 @@ class FinancialHealthScore:
     
     def _calculate_financial_stability(self, cursor, customer_id):
         """计算财务稳定性 (0-100)"""
-        cursor.execute('''
-            SELECT strftime('%Y-%m', transaction_date) as month,
-                   SUM(amount) as monthly_spending
-            FROM transactions
-            WHERE customer_id = ?
-            AND transaction_date >= date('now', '-6 months')
-            GROUP BY strftime('%Y-%m', transaction_date)
-        ''', (customer_id,))
-        
-        monthly_data = cursor.fetchall()
-        if len(monthly_data) < 3:
+        # 最近6个月的月度卡消费（客户月度特征表）
+        features = load_monthly_features(cursor.connection, [customer_id], window=7,
+                                         require='card_spend', since_month=month_key(6))
+        if not len(features.customer_ids) or features.counts[0] < 3:
             return 70
         
-        spendings = [m['monthly_spending'] for m in monthly_data]
-        avg_spending = sum(spendings) / len(spendings)
-        
         # 计算波动率（标准差 / 平均值）
-        variance = sum((s - avg_spending) ** 2 for s in spendings) / len(spendings)
-        std_dev = variance ** 0.5
-        volatility = std_dev / avg_spending if avg_spending > 0 else 0
+        volatility = float(vm.coefficient_of_variation(features.card_spend)[0])
         
         # 波动率评分
         if volatility <= 0.15:  # ≤15% 非常稳定
@@ -0,0 +1,416 @@
+"""
+客户月度特征表（customer_monthly_features）
+趋势 / 预测 / 健康评分引擎与 analytics 各模块共用的按客户、按月汇总数据
+
+每行 (customer_id, month)：
+- expenses / payments / closing_balance / previous_balance：monthly_statements 同月各银行合计
+  （owner + gz），statement_count 为该月月结单数量
+- card_spend / card_txn_count：已确认信用卡账单（statements.is_confirmed）的交易按账单月份
+  （statement_date 的 YYYY-MM）合计。transaction_date 格式不统一（'18 JUN 25'、'25/03' 等），
+  不用于分月；月份不是 YYYY-MM 格式的数据不计入
+
+增量维护：
+- monthly_statements 的新增 / 修改 / 删除、statements 的确认状态变化、已确认账单交易的变化
+  由触发器把 customer_id 写入 customer_feature_dirty
+- 读取前 refresh_dirty_features() 只重算被标记客户的全部月份；首次建表时全量计算一次
+
+load_monthly_features() 一次查询返回所有（或指定）客户最近N个月的 NumPy 矩阵，
+每个客户一行、按月份右对齐（最后一列为最近月份），不足N个月的位置为NaN
+"""
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+FEATURE_TABLE = 'customer_monthly_features'
+DIRTY_TABLE = 'customer_feature_dirty'
+
+FEATURE_COLUMNS = ('expenses', 'payments', 'closing_balance', 'previous_balance', 'card_spend')
+
+# 各数据来源需要的表和字段；缺少时该来源的特征为0，不安装对应触发器
+_SOURCES = {
+    'monthly_statements': {
+        'monthly_statements': {'customer_id', 'statement_month', 'previous_balance_total', 'closing_balance_total',
+                               'owner_expenses', 'owner_payments', 'gz_expenses', 'gz_payments'},
+    },
+    'card_transactions': {
+        'statements': {'id', 'card_id', 'is_confirmed', 'statement_date'},
+        'transactions': {'statement_id', 'amount'},
+        'credit_cards': {'id', 'customer_id'},
+    },
+}
+
+_IN_CHUNK = 500
+
+_MONTH_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]'
+
+
+def _mark_sql(customer_id: str) -> str:
+    return f'''
+        INSERT INTO {DIRTY_TABLE} (customer_id)
+        SELECT {customer_id}
+        WHERE {customer_id} IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM {DIRTY_TABLE} WHERE customer_id = {customer_id});
+    '''
+
+
+def _card_customer(card_id: str) -> str:
+    return f'(SELECT customer_id FROM credit_cards WHERE id = {card_id})'
+
+
+def _confirmed_statement_customer(statement_id: str) -> str:
+    return f'''(SELECT cc.customer_id FROM statements s JOIN credit_cards cc ON s.card_id = cc.id
+                WHERE s.id = {statement_id} AND s.is_confirmed)'''
+
+
+# 触发器中不使用唯一约束冲突处理：外层语句的 OR REPLACE / OR IGNORE 会覆盖触发器内的冲突策略
+_TRIGGERS = {
+    'monthly_statements': [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS monthly_statements_features_ai AFTER INSERT ON monthly_statements BEGIN
+            {_mark_sql('new.customer_id')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS monthly_statements_features_au
+        AFTER UPDATE OF customer_id, statement_month, previous_balance_total, closing_balance_total,
+                        owner_expenses, owner_payments, gz_expenses, gz_payments ON monthly_statements BEGIN
+            {_mark_sql('old.customer_id')}
+            {_mark_sql('new.customer_id')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS monthly_statements_features_ad AFTER DELETE ON monthly_statements BEGIN
+            {_mark_sql('old.customer_id')}
+        END
+        ''',
+    ],
+    'card_transactions': [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS statements_features_au
+        AFTER UPDATE OF card_id, is_confirmed, statement_date ON statements BEGIN
+            {_mark_sql(_card_customer('old.card_id'))}
+            {_mark_sql(_card_customer('new.card_id'))}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS statements_features_ad AFTER DELETE ON statements BEGIN
+            {_mark_sql(_card_customer('old.card_id'))}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS transactions_features_ai AFTER INSERT ON transactions BEGIN
+            {_mark_sql(_confirmed_statement_customer('new.statement_id'))}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS transactions_features_au
+        AFTER UPDATE OF statement_id, amount ON transactions BEGIN
+            {_mark_sql(_confirmed_statement_customer('old.statement_id'))}
+            {_mark_sql(_confirmed_statement_customer('new.statement_id'))}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS transactions_features_ad AFTER DELETE ON transactions BEGIN
+            {_mark_sql(_confirmed_statement_customer('old.statement_id'))}
+        END
+        ''',
+    ],
+}
+
+_ready: Dict[str, frozenset] = {}
+_lock = threading.Lock()
+
+
+def _trigger_name(trigger_sql: str) -> str:
+    return trigger_sql.split('CREATE TRIGGER IF NOT EXISTS', 1)[1].split()[0]
+
+
+def _available_sources(conn) -> frozenset:
+    sources = set()
+    for source, tables in _SOURCES.items():
+        if all(columns <= {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+               for table, columns in tables.items()):
+            sources.add(source)
+    return frozenset(sources)
+
+
+def ensure_feature_store(conn) -> frozenset:
+    """
+    创建特征表、脏标记表与触发器（每个数据库只执行一次）；特征表首次创建时全量计算
+
+    Returns:
+        可用的数据来源（为空时特征表始终为空）
+    """
+    db_key = conn.execute('PRAGMA database_list').fetchone()[2]
+    sources = _ready.get(db_key) if db_key else None
+    if sources is not None:
+        return sources
+
+    with _lock:
+        if db_key and db_key in _ready:
+            return _ready[db_key]
+        sources = _available_sources(conn)
+        created = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                               (FEATURE_TABLE,)).fetchone() is None
+        # 旧版本按 transaction_date 前7个字符分月，留下了 '30 APR' 之类的月份：全量重算一次
+        rebuild = created or conn.execute(f"SELECT 1 FROM {FEATURE_TABLE} WHERE month NOT GLOB ? LIMIT 1",
+                                          (_MONTH_GLOB,)).fetchone() is not None
+
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {FEATURE_TABLE} (
+                customer_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                expenses REAL DEFAULT 0,
+                payments REAL DEFAULT 0,
+                closing_balance REAL DEFAULT 0,
+                previous_balance REAL DEFAULT 0,
+                statement_count INTEGER DEFAULT 0,
+                card_spend REAL DEFAULT 0,
+                card_txn_count INTEGER DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (customer_id, month)
+            )
+        ''')
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_id INTEGER,
+                marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{DIRTY_TABLE}_customer ON {DIRTY_TABLE}(customer_id)')
+        for source in sources:
+            for trigger in _TRIGGERS[source]:
+                # 触发器定义可能随版本变化（监听的字段）：先删除再创建
+                conn.execute(f'DROP TRIGGER IF EXISTS {_trigger_name(trigger)}')
+                conn.execute(trigger)
+        if rebuild:
+            _recompute(conn, sources, None)
+        conn.commit()
+        if db_key:  # 内存数据库没有路径，每个连接各自检查
+            _ready[db_key] = sources
+        return sources
+
+
+def month_key(months_back: int = 0, today: Optional[date] = None) -> str:
+    """n个月前的月份（YYYY-MM）"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months_back
+    return f'{index // 12}-{index % 12 + 1:02d}'
+
+
+def _chunks(values: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(values), _IN_CHUNK):
+        yield values[start:start + _IN_CHUNK]
+
+
+def _customer_filter(column: str, customer_ids: Optional[List[int]]):
+    if customer_ids is None:
+        return [('', ())]
+    return [(f" AND {column} IN ({','.join('?' * len(chunk))})", tuple(chunk)) for chunk in _chunks(customer_ids)]
+
+
+def _recompute(conn, sources: frozenset, customer_ids: Optional[List[int]]):
+    """重算指定客户（None为全部客户）的全部月份"""
+    rows: Dict[tuple, Dict] = {}
+
+    def row_for(customer_id, month):
+        return rows.setdefault((customer_id, month), {
+            'expenses': 0.0, 'payments': 0.0, 'closing_balance': 0.0, 'previous_balance': 0.0,
+            'statement_count': 0, 'card_spend': 0.0, 'card_txn_count': 0,
+        })
+
+    if 'monthly_statements' in sources:
+        for where, params in _customer_filter('customer_id', customer_ids):
+            for customer_id, month, expenses, payments, closing, previous, count in conn.execute(f'''
+                SELECT customer_id, statement_month,
+                       SUM(COALESCE(owner_expenses, 0) + COALESCE(gz_expenses, 0)),
+                       SUM(COALESCE(owner_payments, 0) + COALESCE(gz_payments, 0)),
+                       SUM(COALESCE(closing_balance_total, 0)),
+                       SUM(COALESCE(previous_balance_total, 0)),
+                       COUNT(*)
+                FROM monthly_statements
+                WHERE customer_id IS NOT NULL AND statement_month GLOB ?{where}
+                GROUP BY customer_id, statement_month
+            ''', (_MONTH_GLOB, *params)):
+                row = row_for(customer_id, month)
+                row.update(expenses=expenses, payments=payments, closing_balance=closing,
+                           previous_balance=previous, statement_count=count)
+
+    if 'card_transactions' in sources:
+        for where, params in _customer_filter('cc.customer_id', customer_ids):
+            for customer_id, month, spend, count in conn.execute(f'''
+                SELECT cc.customer_id, substr(s.statement_date, 1, 7) AS month,
+                       SUM(COALESCE(t.amount, 0)), COUNT(*)
+                FROM transactions t
+                JOIN statements s ON t.statement_id = s.id
+                JOIN credit_cards cc ON s.card_id = cc.id
+                WHERE s.is_confirmed AND cc.customer_id IS NOT NULL AND substr(s.statement_date, 1, 7) GLOB ?{where}
+                GROUP BY cc.customer_id, month
+            ''', (_MONTH_GLOB, *params)):
+                row_for(customer_id, month).update(card_spend=spend, card_txn_count=count)
+
+    if customer_ids is None:
+        conn.execute(f'DELETE FROM {FEATURE_TABLE}')
+    else:
+        for chunk in _chunks(customer_ids):
+            conn.execute(f"DELETE FROM {FEATURE_TABLE} WHERE customer_id IN ({','.join('?' * len(chunk))})", chunk)
+    conn.executemany(f'''
+        INSERT INTO {FEATURE_TABLE}
+        (customer_id, month, expenses, payments, closing_balance, previous_balance,
+         statement_count, card_spend, card_txn_count, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', [
+        (customer_id, month, row['expenses'], row['payments'], row['closing_balance'], row['previous_balance'],
+         row['statement_count'], row['card_spend'], row['card_txn_count'])
+        for (customer_id, month), row in rows.items()
+    ])
+
+
+def refresh_dirty_features(conn) -> int:
+    """
+    重算被标记客户的特征行（没有标记时只有一次查询）
+
+    Returns:
+        重算的客户数
+    """
+    sources = ensure_feature_store(conn)
+    if conn.execute(f'SELECT 1 FROM {DIRTY_TABLE} LIMIT 1').fetchone() is None:
+        return 0
+
+    # 在调用方已开启的事务中执行时由调用方提交
+    owns_transaction = not conn.in_transaction
+    if owns_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        marked = conn.execute(f'SELECT MAX(id), COUNT(*) FROM {DIRTY_TABLE}').fetchone()
+        customer_ids = [row[0] for row in conn.execute(
+            f'SELECT DISTINCT customer_id FROM {DIRTY_TABLE} WHERE id <= ?', (marked[0],))]
+        conn.execute(f'DELETE FROM {DIRTY_TABLE} WHERE id <= ?', (marked[0],))
+        _recompute(conn, sources, customer_ids)
+        if owns_transaction:
+            conn.commit()
+    except Exception:
+        if owns_transaction:
+            conn.rollback()
+        raise
+    return len(customer_ids)
+
+
+def rebuild_feature_store(conn):
+    """全量重算所有客户（手动修复数据后使用）"""
+    sources = ensure_feature_store(conn)
+    conn.execute(f'DELETE FROM {DIRTY_TABLE}')
+    _recompute(conn, sources, None)
+    conn.commit()
+
+
+@dataclass
+class MonthlyFeatureMatrix:
+    """
+    客户 × 月份 特征矩阵（每行一个客户，按月份右对齐）
+
+    months 中空字符串与各特征中的NaN表示该客户不足 window 个月
+    """
+    customer_ids: np.ndarray
+    months: np.ndarray
+    expenses: np.ndarray
+    payments: np.ndarray
+    closing_balance: np.ndarray
+    previous_balance: np.ndarray
+    card_spend: np.ndarray
+
+    @property
+    def counts(self) -> np.ndarray:
+        """每个客户的有效月份数"""
+        return (self.months != '').sum(axis=1)
+
+    def index_of(self, customer_id: int) -> Optional[int]:
+        positions = np.flatnonzero(self.customer_ids == customer_id)
+        return int(positions[0]) if positions.size else None
+
+    def history(self, customer_id: int) -> List[Dict]:
+        """单个客户的有效月份（按时间正序）"""
+        index = self.index_of(customer_id)
+        if index is None:
+            return []
+        valid = self.months[index] != ''
+        columns = {name: getattr(self, name)[index][valid] for name in FEATURE_COLUMNS}
+        return [
+            {'month': month, **{name: float(values[i]) for name, values in columns.items()}}
+            for i, month in enumerate(self.months[index][valid])
+        ]
+
+
+def load_monthly_features(conn, customer_ids: Optional[Iterable[int]] = None, window: int = 12,
+                          require: str = 'statements', since_month: Optional[str] = None,
+                          until_month: Optional[str] = None) -> MonthlyFeatureMatrix:
+    """
+    一次查询读取客户最近 window 个月的特征
+
+    Args:
+        customer_ids: 指定客户（None为全部客户）
+        window: 每个客户最多保留的月份数（取最近的月份）
+        require: 'statements' 只取有月结单的月份；'card_spend' 只取有已确认卡交易的月份；None 取全部
+        since_month / until_month: 可选月份范围（YYYY-MM，含边界）
+    """
+    refresh_dirty_features(conn)
+
+    conditions, params = [], []
+    if require == 'statements':
+        conditions.append('statement_count > 0')
+    elif require == 'card_spend':
+        conditions.append('card_txn_count > 0')
+    if since_month:
+        conditions.append('month >= ?')
+        params.append(since_month)
+    if until_month:
+        conditions.append('month <= ?')
+        params.append(until_month)
+
+    customer_list = None if customer_ids is None else sorted(set(customer_ids))
+    rows = []
+    for where, chunk_params in _customer_filter('customer_id', customer_list):
+        rows.extend(conn.execute(f'''
+            SELECT customer_id, month, {', '.join(FEATURE_COLUMNS)}
+            FROM {FEATURE_TABLE}
+            WHERE 1 = 1{''.join(' AND ' + c for c in conditions)}{where}
+            ORDER BY customer_id, month
+        ''', (*params, *chunk_params)).fetchall())
+
+    if not rows:
+        empty = np.empty((0, window))
+        return MonthlyFeatureMatrix(np.empty(0, dtype=np.int64), np.empty((0, window), dtype=object),
+                                    *(empty.copy() for _ in FEATURE_COLUMNS))
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    customers, starts, counts = np.unique(ids, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(customers.size), counts)
+    # 每行距本组最后一行的距离；只保留最近 window 行，并右对齐到最后一列
+    from_end = np.repeat(starts + counts, counts) - 1 - np.arange(ids.size)
+    keep = from_end < window
+    rows_kept = np.flatnonzero(keep)
+    target = (group[keep], window - 1 - from_end[keep])
+
+    months = np.full((customers.size, window), '', dtype=object)
+    months[target] = np.array([rows[i][1] for i in rows_kept], dtype=object)
+    values = np.array([row[2:] for row in rows], dtype=float)[keep]
+    matrices = []
+    for column in range(len(FEATURE_COLUMNS)):
+        matrix = np.full((customers.size, window), np.nan)
+        matrix[target] = values[:, column]
+        matrices.append(matrix)
+    return MonthlyFeatureMatrix(customers, months, *matrices)
+
+
+def load_customer_features(db_path: str, customer_ids: Optional[Iterable[int]] = None, **kwargs) -> MonthlyFeatureMatrix:
+    """按数据库路径打开连接读取特征（accounting_app 各引擎使用）"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return load_monthly_features(conn, customer_ids, **kwargs)
+    finally:
+        conn.close()
@@ -0,0 +1,67 @@
+"""
+月度特征的向量化统计（NumPy）
+输入为 MonthlyFeatureMatrix 中的 客户 × 月份 矩阵（右对齐、缺失为NaN），
+每个函数对所有客户一次计算，返回每个客户一个值的一维数组
+"""
+import numpy as np
+
+
+def valid_counts(values: np.ndarray) -> np.ndarray:
+    """每行的有效月份数"""
+    return (~np.isnan(values)).sum(axis=1)
+
+
+def tail(values: np.ndarray, n: int) -> np.ndarray:
+    """最近 n 个月（右对齐矩阵的最后 n 列）"""
+    return values[:, -n:] if n < values.shape[1] else values
+
+
+def row_mean(values: np.ndarray) -> np.ndarray:
+    """每行有效值的平均数（没有有效值时为0）"""
+    counts = valid_counts(values)
+    return np.divide(np.nansum(values, axis=1), counts, out=np.zeros(values.shape[0]), where=counts > 0)
+
+
+def row_variance(values: np.ndarray) -> np.ndarray:
+    """每行有效值的总体方差（没有有效值时为0）"""
+    counts = valid_counts(values)
+    deviations = np.where(np.isnan(values), 0.0, values - row_mean(values)[:, None])
+    return np.divide((deviations ** 2).sum(axis=1), counts, out=np.zeros(values.shape[0]), where=counts > 0)
+
+
+def coefficient_of_variation(values: np.ndarray) -> np.ndarray:
+    """波动率：标准差 / 平均值（平均值不大于0时为0）"""
+    mean = row_mean(values)
+    return np.divide(np.sqrt(row_variance(values)), mean, out=np.zeros(values.shape[0]), where=mean > 0)
+
+
+def first_valid(values: np.ndarray) -> np.ndarray:
+    """每行最早的有效值（右对齐：位于 window - count 列；没有有效值时为NaN）"""
+    counts = valid_counts(values)
+    columns = np.clip(values.shape[1] - counts, 0, values.shape[1] - 1)
+    return np.where(counts > 0, values[np.arange(values.shape[0]), columns], np.nan)
+
+
+def last_valid(values: np.ndarray) -> np.ndarray:
+    """每行最近的有效值（没有有效值时为NaN）"""
+    return values[:, -1] if values.shape[1] else np.full(values.shape[0], np.nan)
+
+
+def change_pct(values: np.ndarray) -> np.ndarray:
+    """最早到最近的变化百分比（最早值不大于0时为0）"""
+    first, last = first_valid(values), last_valid(values)
+    positive = np.nan_to_num(first) > 0
+    return np.divide((last - first) * 100, first, out=np.zeros(values.shape[0]), where=positive)
+
+
+def trend_labels(pct: np.ndarray, threshold: float = 5) -> np.ndarray:
+    """变化百分比 → 上升 / 下降 / 稳定"""
+    return np.where(pct > threshold, '上升', np.where(pct < -threshold, '下降', '稳定'))
+
+
+def recent_slope(values: np.ndarray, n: int = 3) -> np.ndarray:
+    """最近 n 个月的平均每月变化 (v[-1] - v[-n]) / n；不足 n 个月时为0"""
+    if values.shape[1] < n:
+        return np.zeros(values.shape[0])
+    counts = valid_counts(values)
+    return np.where(counts >= n, (values[:, -1] - values[:, -n]) / n, 0.0)
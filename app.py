@@ -1,11 +1,10 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, send_from_directory, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, send_from_directory, session, g, Response
 from flask_cors import CORS
 import os
 from datetime import datetime, timedelta
 import json
 import threading
 import time
-import schedule
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -33,7 +32,7 @@ FEATURE_ADVANCED_ANALYTICS = os.getenv('FEATURE_ADVANCED_ANALYTICS', 'false').lo
 FEATURE_CUSTOMER_TIER = os.getenv('FEATURE_CUSTOMER_TIER', 'false').lower() == 'true'
 # ==================== END FEATURE TOGGLES ====================
 
-from db.database import get_db, log_audit, get_all_customers, get_customer, get_customer_cards, get_card_statements, get_statement_transactions
+from db.database import get_db, begin_request_scope, end_request_scope, get_pool_stats, get_audit_log_stats, log_audit, get_all_customers, get_customer, get_customer_cards, get_card_statements, get_statement_transactions
 from auth.flask_rbac_bridge import require_flask_auth, require_flask_permission, write_flask_audit_log, verify_flask_user, extract_flask_request_info
 from ingest.statement_parser import parse_statement_auto
 from validate.categorizer import categorize_transaction, validate_statement, get_spending_summary
@@ -56,6 +55,7 @@ from db.tag_service import TagService
 from services.statement_organizer import StatementOrganizer
 from services.optimization_proposal import OptimizationProposal
 from services.uniqueness_validator import UniquenessValidator
+from services.card_timeline import invalidate_card_timeline, invalidate_statement_timeline
 
 # Monthly report automation
 from services.monthly_report_scheduler import MonthlyReportScheduler
@@ -100,6 +100,9 @@ from services.dashboard_metrics import get_customer_monthly_metrics, get_all_car
 # CORS Configuration
 from cors_config import configure_cors
 
+# Flask -> FastAPI 共享keep-alive代理客户端
+from utils.proxy_client import proxy_client, get_proxy_metrics
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
@@ -675,6 +678,16 @@ def add_no_cache_headers(response):
         response.headers.pop('Last-Modified', None)
     return response
 
+# 请求级数据库连接：同一请求内的 get_db()/log_audit()/get_customer() 等共享一个连接
+@app.before_request
+def open_request_db_scope():
+    if not request.path.startswith('/static/'):
+        g.db_conn = begin_request_scope()
+
+@app.teardown_request
+def close_request_db_scope(exc=None):
+    end_request_scope(g.pop('db_conn', None))
+
 # Language support
 import json
 
@@ -711,7 +724,18 @@ def health_check():
         'service': 'CreditPilot Backend',
         'timestamp': datetime.utcnow().isoformat(),
         'version': '2.0',
-        'cors_enabled': True
+        'cors_enabled': True,
+        'db_pool': get_pool_stats(),
+        'audit_log': get_audit_log_stats()
+    }), 200
+
+@app.route('/api/proxy/stats', methods=['GET'])
+@require_admin_only
+def proxy_stats():
+    """Flask -> FastAPI 代理跳转指标（按路由：请求数、错误数、平均/最大耗时、转发字节数）"""
+    return jsonify({
+        'status': 'success',
+        'routes': get_proxy_metrics()
     }), 200
 # ==================== END API HEALTH CHECK ====================
 
@@ -804,12 +828,12 @@ def ai_assistant_proxy(subpath):
     V2企业智能版新增
     """
     try:
-        fastapi_url = f'http://localhost:8000/api/ai-assistant/{subpath}'
+        fastapi_url = f'/api/ai-assistant/{subpath}'
         
         if request.method == 'GET':
-            resp = requests.get(fastapi_url, params=request.args, timeout=30)
+            resp = proxy_client.get(fastapi_url, route='ai-assistant', params=request.args)
         else:
-            resp = requests.post(fastapi_url, json=request.json, timeout=30)
+            resp = proxy_client.post(fastapi_url, route='ai-assistant', json=request.json)
         
         return resp.json(), resp.status_code
         
@@ -1156,116 +1180,24 @@ def edit_customer(customer_id):
 @app.route('/customer/<int:customer_id>')
 @require_admin_or_accountant
 def customer_dashboard(customer_id):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM customers WHERE id = ?', (customer_id,))
-        customer_row = cursor.fetchone()
-        customer = dict(customer_row) if customer_row else None
+    from services.customer_dashboard_loader import load_customer_dashboard
+    context = load_customer_dashboard(customer_id)
     
-    if not customer:
+    if not context:
         lang = get_current_language()
         flash(translate('customer_not_found', lang), 'error')
         return redirect(url_for('index'))
     
-    cards = get_customer_cards(customer_id)
-    
-    total_spending = 0
-    all_transactions = []
-    all_statements = []
-    for card in cards:
-        statements = get_card_statements(card['id'])
-        all_statements.extend(statements)
-        for statement in statements:
-            if statement['is_confirmed']:
-                transactions = get_statement_transactions(statement['id'])
-                all_transactions.extend(transactions)
-                total_spending += sum(t['amount'] for t in transactions)
-    
+    all_transactions = context['transactions']
     spending_summary = get_spending_summary(all_transactions) if all_transactions else {}
     
-    from services.card_timeline import get_card_12month_timeline, get_month_coverage_percentage
-    cards_with_timeline = []
-    for card in cards:
-        card_dict = dict(card)
-        card_dict['timeline'] = get_card_12month_timeline(card['id'])
-        card_dict['coverage_percentage'] = get_month_coverage_percentage(card['id'])
-        cards_with_timeline.append(card_dict)
-    
-    # 获取月度账本数据（8项计算）
-    from services.monthly_ledger_engine import MonthlyLedgerEngine
-    ledger_engine = MonthlyLedgerEngine()
-    
-    # 获取最新月份的账本汇总
-    monthly_ledgers = []
-    for card in cards:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            # 获取最新月份
-            cursor.execute("""
-                SELECT month_start, statement_id
-                FROM monthly_ledger 
-                WHERE card_id = ? 
-                ORDER BY month_start DESC 
-                LIMIT 1
-            """, (card['id'],))
-            latest_month = cursor.fetchone()
-            
-            if latest_month:
-                month_start, statement_id = latest_month
-                
-                # 获取客户账本数据
-                cursor.execute("""
-                    SELECT previous_balance, customer_spend, customer_payments, rolling_balance
-                    FROM monthly_ledger
-                    WHERE card_id = ? AND month_start = ?
-                """, (card['id'], month_start))
-                customer_ledger = cursor.fetchone()
-                
-                # 获取INFINITE账本数据
-                cursor.execute("""
-                    SELECT previous_balance, infinite_spend, supplier_fee, infinite_payments, rolling_balance
-                    FROM infinite_monthly_ledger
-                    WHERE card_id = ? AND month_start = ?
-                """, (card['id'], month_start))
-                infinite_ledger = cursor.fetchone()
-                
-                # 获取转账记录（第8项）
-                cursor.execute("""
-                    SELECT SUM(amount) as total_transfers
-                    FROM savings_transactions
-                    WHERE customer_name_tag = ? AND DATE(transaction_date) LIKE ?
-                    AND (description LIKE '%转账%' OR description LIKE '%TRANSFER%')
-                """, (customer['name'], month_start[:7] + '%'))
-                transfer_result = cursor.fetchone()
-                infinite_transfers = transfer_result[0] if transfer_result and transfer_result[0] else 0
-                
-                if customer_ledger and infinite_ledger:
-                    monthly_ledgers.append({
-                        'card': card,
-                        'month': month_start[:7],  # YYYY-MM格式
-                        'customer': {
-                            'previous_balance': customer_ledger[0],
-                            'total_spend': customer_ledger[1],
-                            'total_payments': customer_ledger[2],
-                            'rolling_balance': customer_ledger[3]
-                        },
-                        'infinite': {
-                            'previous_balance': infinite_ledger[0],
-                            'total_spend': infinite_ledger[1],
-                            'supplier_fee': infinite_ledger[2],
-                            'total_payments': infinite_ledger[3],
-                            'rolling_balance': infinite_ledger[4],
-                            'transfers': infinite_transfers
-                        }
-                    })
-    
     return render_template('customer_dashboard.html', 
-                         customer=customer, 
-                         cards=cards_with_timeline,
+                         customer=context['customer'], 
+                         cards=context['cards'],
                          spending_summary=spending_summary,
-                         total_spending=total_spending,
-                         monthly_ledgers=monthly_ledgers,
-                         statements=all_statements,
+                         total_spending=context['total_spending'],
+                         monthly_ledgers=context['monthly_ledgers'],
+                         statements=context['statements'],
                          transactions=all_transactions)
 
 
@@ -1385,6 +1317,7 @@ def confirm_statement(statement_id):
         cursor = conn.cursor()
         cursor.execute('UPDATE statements SET is_confirmed = 1 WHERE id = ?', (statement_id,))
         conn.commit()
+        invalidate_statement_timeline(statement_id, conn)
         log_audit(None, 'CONFIRM_STATEMENT', 'statement', statement_id, 'Statement confirmed by user')
     
     lang = get_current_language()
@@ -1626,7 +1559,10 @@ def search_transactions(customer_id):
     }
     filters = {k: v for k, v in filters.items() if v}
     
-    results = search_service.search_transactions(customer_id, query, filters)
+    page = search_service.search_transactions_page(customer_id, query, filters,
+                                                   cursor=request.args.get('cursor'),
+                                                   page_size=request.args.get('page_size', type=int) or SearchService.DEFAULT_PAGE_SIZE)
+    results = page['results']
     suggestions = search_service.get_filter_suggestions(customer_id)
     saved_filters = search_service.get_saved_filters(customer_id)
     
@@ -1638,7 +1574,8 @@ def search_transactions(customer_id):
     
     return render_template('search.html', customer=customer, transactions=results, 
                           suggestions=suggestions, saved_filters=saved_filters, 
-                          current_query=query, current_filters=filters)
+                          current_query=query, current_filters=filters,
+                          next_cursor=page['next_cursor'])
 
 @app.route('/batch/upload/<int:customer_id>', methods=['GET', 'POST'])
 def batch_upload(customer_id):
@@ -1735,6 +1672,7 @@ def batch_upload(customer_id):
                                 ''', (card_id, statement_date, due_date, total, minimum_payment, file_path, batch_id))
                                 statement_id = cursor.lastrowid
                                 conn.commit()
+                                invalidate_card_timeline([card_id])
                                 
                                 # 记录提取质量日志
                                 logger.info(f"✅ Statement {statement_id} 字段提取: Date={statement_date}, Due={due_date}, Total=RM{total}, MinPay=RM{minimum_payment}")
@@ -2782,15 +2720,13 @@ def cognee_memory():
 @app.route('/accounting/cognee/<path:subpath>', methods=['GET', 'POST'])
 def cognee_proxy(subpath):
     """代理 Cognee API 请求到 FastAPI 后端"""
-    import requests
-    
-    fastapi_url = f'http://localhost:8000/cognee/{subpath}'
+    fastapi_url = f'/cognee/{subpath}'
     
     try:
         if request.method == 'GET':
-            resp = requests.get(fastapi_url, params=request.args, timeout=30)
+            resp = proxy_client.get(fastapi_url, route='cognee', params=request.args)
         else:
-            resp = requests.post(fastapi_url, json=request.json, timeout=30)
+            resp = proxy_client.post(fastapi_url, route='cognee', json=request.json)
         
         return jsonify(resp.json()), resp.status_code
     except Exception as e:
@@ -2965,69 +2901,21 @@ def resolve_anomaly_route(anomaly_id):
 # ==================== END ADVANCED ANALYTICS ====================
 
 def run_scheduler():
-    # 提醒任务
-    schedule.every().day.at("09:00").do(check_and_send_reminders)
-    schedule.every(6).hours.do(check_and_send_reminders)
-    
-    # ============================================================
-    # 月度报表自动化系统 - 30号生成，1号发送
-    # ============================================================
-    
-    def auto_generate_monthly_reports():
-        """每月30号：自动生成所有客户的月度报表"""
-        today = datetime.now()
-        if today.day == 30:
-            print(f"\n{'='*60}")
-            print(f"🌌 [自动化任务] 开始生成所有客户的月度报表")
-            print(f"{'='*60}\n")
-            
-            result = monthly_report_scheduler.generate_all_customer_reports()
-            
-            print(f"\n{'='*60}")
-            print(f"✨ 报表生成完成！")
-            print(f"   - 成功: {result['success']} 份")
-            print(f"   - 失败: {result['failed']} 份")
-            print(f"   - 月份: {result['year']}-{result['month']}")
-            print(f"{'='*60}\n")
-    
-    def auto_send_monthly_reports():
-        """每月1号：自动发送上月报表给所有客户"""
-        today = datetime.now()
-        if today.day == 1:
-            print(f"\n{'='*60}")
-            print(f"📧 [自动化任务] 开始发送月度报表邮件")
-            print(f"{'='*60}\n")
-            
-            result = monthly_report_scheduler.send_reports_to_all_customers()
-            
-            print(f"\n{'='*60}")
-            print(f"✅ 邮件发送完成！")
-            print(f"   - 发送成功: {result['sent']} 封")
-            print(f"   - 发送失败: {result['failed']} 封")
-            print(f"   - 月份: {result['year']}-{result['month']}")
-            print(f"{'='*60}\n")
-    
-    # 每天上午10点检查是否为30号，如果是则生成报表
-    schedule.every().day.at("10:00").do(auto_generate_monthly_reports)
-    
-    # 每天上午9点检查是否为1号，如果是则发送报表邮件
-    schedule.every().day.at("09:00").do(auto_send_monthly_reports)
-    
-    # ============================================================
-    # AI财务日报自动化系统 - 每天早上08:00生成
-    # ============================================================
-    from accounting_app.tasks.ai_daily_report import generate_daily_report
-    from accounting_app.tasks.email_notifier import send_ai_report_email
-    
-    schedule.every().day.at("08:00").do(generate_daily_report)
-    schedule.every().day.at("08:10").do(send_ai_report_email)  # V2企业智能版：邮件推送
+    """
+    启动持久化任务队列Worker（取代原来的 schedule 循环线程）
+    - 定时计划见 services/scheduled_jobs.PERIODIC_JOBS，按幂等键入队，重启后补执行当天任务
+    - 月度报表按客户拆分为独立任务，由进程池并行执行，失败自动重试
+    """
+    global job_worker
+    from services.job_queue import JobWorker
+    from services.scheduled_jobs import PERIODIC_JOBS
     
-    print("⏰ AI日报计划任务已注册：每天 08:00 自动生成")
-    print("📧 AI日报邮件推送已注册：每天 08:10 自动发送")
+    job_worker = JobWorker(periodic_jobs=PERIODIC_JOBS)
+    job_worker.start()
     
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+    print("⏰ 定时任务已注册：08:00 AI日报 / 08:10 AI日报邮件 / 09:00+每6小时 还款提醒 / 30号 报表生成 / 1号 报表发送")
+
+job_worker = None
 
 def start_scheduler():
     lock_file = '/tmp/smart_loan_scheduler.lock'
@@ -3039,9 +2927,9 @@ def start_scheduler():
             os.write(fd, str(os.getpid()).encode())
             os.close(fd)
             
-            scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-            scheduler_thread.start()
-            print(f"Reminder scheduler started in background (PID: {os.getpid()})")
+            # 锁只保证每台机器只有一个进程池；任务本身由队列原子领取，多Worker也不会重复执行
+            run_scheduler()
+            print(f"Job queue worker started in background (PID: {os.getpid()})")
             return
             
         except FileExistsError:
@@ -3933,6 +3821,42 @@ def init_consultation_table():
 init_consultation_table()
 
 
+def init_ledger_dirty_tracking():
+    """安装月度账本脏标记触发器（账单/交易的新增、修改、确认由增量重算任务处理）"""
+    from services.monthly_ledger_engine import ensure_ledger_dirty_tracking
+    with get_db() as conn:
+        ensure_ledger_dirty_tracking(conn)
+
+init_ledger_dirty_tracking()
+
+
+def init_savings_txn_dates():
+    """储蓄交易规范日期列与组合索引（回填 txn_date 为空的行）"""
+    from db.migrations_savings_txn_dates import ensure_savings_txn_dates
+    with get_db() as conn:
+        ensure_savings_txn_dates(conn)
+
+init_savings_txn_dates()
+
+
+def init_customer_feature_store():
+    """客户月度特征表与脏标记触发器（趋势 / 预测 / 健康评分共用）"""
+    from analytics.monthly_feature_store import ensure_feature_store
+    with get_db() as conn:
+        ensure_feature_store(conn)
+
+init_customer_feature_store()
+
+
+def init_transaction_search_index():
+    """交易全文索引（FTS5）与同步触发器；首次创建时回填，不在搜索请求中重建"""
+    from search.fts_index import ensure_fts_index
+    with get_db() as conn:
+        ensure_fts_index(conn)
+
+init_transaction_search_index()
+
+
 # ============================================================================
 # OWNER vs INFINITE 分类系统和月度报告路由
 # ============================================================================
@@ -4322,18 +4246,33 @@ def list_business_plans(customer_id):
 def admin_test_generate_reports():
     """
     管理员测试：手动触发批量生成所有客户的月度报表
-    模拟每月30号的自动化任务
+    模拟每月30号的自动化任务（入队 monthly_report.fan_out，由任务队列Worker按客户并行生成）；
+    手动重新触发时，上次生成失败的客户重新排队生成
     """
     print(f"\n{'='*60}")
     print(f"🧪 [管理员测试] 手动触发批量报表生成")
     print(f"{'='*60}\n")
     
-    result = monthly_report_scheduler.generate_all_customer_reports()
+    result = monthly_report_scheduler.enqueue_report_generation(requeue_failed=True)
+    if job_worker is not None:
+        job_worker.wakeup()
     
-    flash(f'✅ 报表生成完成！成功: {result["success"]} 份，失败: {result["failed"]} 份（{result["year"]}-{result["month"]}月）', 'success')
+    flash(f'✅ 报表生成任务已入队（{result["year"]}-{result["month"]}月），'
+          f'各客户状态与耗时见 /admin/monthly-report-generation', 'success')
     return redirect(url_for('index'))
 
 
+@app.route('/admin/monthly-report-generation')
+@require_admin_or_accountant
+def admin_monthly_report_generation():
+    """月度报表生成耗时报告：每个客户的状态、耗时、尝试次数与错误（默认上个月，按耗时降序）"""
+    from services.scheduled_jobs import monthly_report_generation_summary, previous_month
+    year, month = previous_month(datetime.now())
+    year = request.args.get('year', year, type=int)
+    month = request.args.get('month', month, type=int)
+    return jsonify({'status': 'success', **monthly_report_generation_summary(year, month)})
+
+
 @app.route('/admin/test-send-reports')
 @require_admin_or_accountant
 def admin_test_send_reports():
@@ -4351,6 +4290,20 @@ def admin_test_send_reports():
     return redirect(url_for('index'))
 
 
+@app.route('/admin/job-queue-status')
+@require_admin_or_accountant
+def admin_job_queue_status():
+    """任务队列状态：按任务类型统计 pending / running / succeeded / failed 数量（含发件箱）"""
+    from services.job_queue import get_job_queue_stats
+    from email_service.outbox import EmailOutbox
+    return jsonify({
+        'status': 'success',
+        'worker_running': job_worker is not None,
+        'jobs': get_job_queue_stats(),
+        'email_outbox': EmailOutbox().stats()
+    })
+
+
 @app.route('/admin/automation-status')
 @require_admin_or_accountant
 def admin_automation_status():
@@ -4529,19 +4482,22 @@ def upload_savings_statement():
                         
                         statement_id = cursor.lastrowid
                         
-                        # 保存所有交易记录
+                        # 保存所有交易记录（txn_date / txn_month 为解析器规范化后的ISO日期）
                         for trans in transactions:
                             cursor.execute('''
                                 INSERT INTO savings_transactions
-                                (savings_statement_id, transaction_date, description, amount, transaction_type, balance)
-                                VALUES (?, ?, ?, ?, ?, ?)
+                                (savings_statement_id, transaction_date, description, amount, transaction_type, balance,
+                                 txn_date, txn_month)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                             ''', (
                                 statement_id,
-                                trans.get('date', ''),
+                                trans.get('date') or trans.get('transaction_date', ''),
                                 trans.get('description', ''),
                                 trans.get('amount', 0),
                                 trans.get('type', 'debit'),
-                                trans.get('balance', None)  # 添加balance字段
+                                trans.get('balance', None),  # 添加balance字段
+                                trans.get('txn_date'),
+                                trans.get('txn_month')
                             ))
                         
                         conn.commit()
@@ -4880,7 +4836,7 @@ def savings_account_detail(account_id):
             FROM savings_transactions st
             JOIN savings_statements ss ON st.savings_statement_id = ss.id
             WHERE ss.savings_account_id = ?
-            ORDER BY st.transaction_date DESC, st.id DESC
+            ORDER BY st.txn_date DESC, st.id DESC
             LIMIT 100
         ''', (account_id,))
         
@@ -4933,7 +4889,7 @@ def savings_search():
                 JOIN savings_statements ss ON st.savings_statement_id = ss.id
                 JOIN savings_accounts sa ON ss.savings_account_id = sa.id
                 WHERE st.description LIKE ? OR st.customer_name_tag LIKE ?
-                ORDER BY st.transaction_date DESC
+                ORDER BY st.txn_date DESC
                 LIMIT 500
             ''', (f'%{search_query}%', f'%{search_query}%'))
             
@@ -4949,11 +4905,14 @@ def savings_settlement(customer_name):
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # 搜索该客户的所有转账记录
+        # 搜索该客户的所有转账记录（只统计debit转出交易）
+        # 客户标签走 (customer_name_tag, txn_date) 索引；描述模糊匹配只扫描描述索引
         cursor.execute('''
             SELECT 
                 st.id,
                 st.transaction_date,
+                st.txn_date,
+                st.txn_month,
                 st.description,
                 st.amount,
                 st.transaction_type,
@@ -4964,75 +4923,42 @@ def savings_settlement(customer_name):
             FROM savings_transactions st
             JOIN savings_statements ss ON st.savings_statement_id = ss.id
             JOIN savings_accounts sa ON ss.savings_account_id = sa.id
-            WHERE st.description LIKE ? OR st.customer_name_tag = ?
-            ORDER BY st.transaction_date ASC
-        ''', (f'%{customer_name}%', customer_name))
-        
-        transactions = [dict(row) for row in cursor.fetchall()]
+            WHERE st.id IN (
+                SELECT id FROM savings_transactions WHERE customer_name_tag = ?
+                UNION
+                SELECT id FROM savings_transactions WHERE description LIKE ?
+            )
+            AND st.transaction_type = 'debit'
+            ORDER BY st.txn_date IS NULL, st.txn_date, st.id
+        ''', (customer_name, f'%{customer_name}%'))
         
-        # 只统计debit（转出）交易
-        debit_transactions = [t for t in transactions if t['transaction_type'] == 'debit']
+        debit_transactions = [dict(row) for row in cursor.fetchall()]
         
-        # 按月分组 - 统一转换为 YYYY-MM 格式
-        from collections import defaultdict
+        # 按月分组（txn_month 为 YYYY-MM，无法识别日期的交易归入 Unknown）
         from datetime import datetime
         
-        month_map = {
-            'jan': '01', 'feb': '02', 'mar': '03', 'apr': '04',
-            'may': '05', 'jun': '06', 'jul': '07', 'aug': '08',
-            'sep': '09', 'oct': '10', 'nov': '11', 'dec': '12'
-        }
-        
-        monthly_groups = defaultdict(list)
+        month_names = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
+                       'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
         
+        monthly_groups = {}
         for trans in debit_transactions:
-            # 提取月份 (格式: DD-MM-YYYY 或 DD MMM YYYY)
-            date_str = trans['transaction_date']
-            try:
-                month_key = None
-                month_display = None
-                
-                if '-' in date_str:
-                    # DD-MM-YYYY 格式
-                    parts = date_str.split('-')
-                    if len(parts) == 3:
-                        month_num = parts[1]  # MM
-                        year = parts[2]  # YYYY
-                        month_key = f"{year}-{month_num}"  # YYYY-MM
-                        # 转换为 MMM YYYY 显示格式
-                        month_names = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                        month_display = f"{month_names[int(month_num)]} {year}"
-                elif ' ' in date_str:
-                    # DD MMM YYYY 格式
-                    parts = date_str.split()
-                    if len(parts) >= 3:
-                        month_abbr = parts[1].lower()[:3]  # 取前3个字符
-                        year = parts[2]  # YYYY
-                        month_num = month_map.get(month_abbr, '00')
-                        month_key = f"{year}-{month_num}"  # YYYY-MM
-                        month_display = f"{parts[1]} {year}"  # MMM YYYY
-                
-                if not month_key:
-                    month_key = 'Unknown'
-                    month_display = 'Unknown'
-                    
-            except:
-                month_key = 'Unknown'
-                month_display = 'Unknown'
-            
-            monthly_groups[month_key].append({
+            month_key = trans['txn_month']
+            if month_key:
+                year, month_num = month_key.split('-')
+                month_display = f"{month_names[int(month_num)]} {year}"
+            else:
+                month_key = month_display = 'Unknown'
+            monthly_groups.setdefault(month_key, []).append({
                 **trans,
                 'month_display': month_display
             })
         
-        # 计算每月总额
+        # 计算每月总额（查询结果已按日期排序）
         monthly_summary = []
-        for month_key in sorted(monthly_groups.keys()):
-            month_transactions = monthly_groups[month_key]
+        for month_key, month_transactions in monthly_groups.items():
             month_total = sum(t['amount'] for t in month_transactions)
             monthly_summary.append({
-                'month': month_transactions[0]['month_display'] if month_transactions else month_key,
+                'month': month_transactions[0]['month_display'],
                 'transaction_count': len(month_transactions),
                 'total_amount': month_total,
                 'transactions': month_transactions
@@ -5315,11 +5241,9 @@ def loan_matcher_analyze():
 @require_admin_or_accountant
 def loan_products():
     """Phase 9: 贷款产品目录 - 调用FastAPI统一产品API"""
-    import requests
-    
     try:
         # 调用FastAPI /api/loan-products/all端点
-        response = requests.get('http://localhost:8000/api/loan-products/all', timeout=10)
+        response = proxy_client.get('/api/loan-products/all', route='loans', timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -5903,6 +5827,7 @@ def credit_card_ledger():
                     ))
                 
                 conn.commit()
+                invalidate_card_timeline([card_id])
                 log_audit(None, 'UPLOAD_STATEMENT', 'statement', statement_id, 
                          f"Uploaded from CC Ledger: {file_type} statement with {len(transactions)} transactions")
                 
@@ -6474,6 +6399,7 @@ def approve_statement(statement_id):
         cursor = conn.cursor()
         cursor.execute('UPDATE statements SET is_confirmed = 1 WHERE id = ?', (statement_id,))
         conn.commit()
+        invalidate_statement_timeline(statement_id, conn)
     
     flash('Statement approved successfully!', 'success')
     return redirect(url_for('credit_card_statement_review', statement_id=statement_id))
@@ -7016,6 +6942,7 @@ def api_files_confirm(file_id):
             """, (file_id,))
             
             conn.commit()
+            invalidate_statement_timeline(file_id, conn)
             
             # 记录审计日志
             cursor.execute("""
@@ -7100,6 +7027,9 @@ def api_files_update(file_id):
                 
                 card_match = cursor.fetchone()
                 if card_match:
+                    # 原卡与新卡的时间线都需要失效
+                    invalidate_statement_timeline(file_id, conn)
+                    invalidate_card_timeline([card_match['id']])
                     # 更新statements表关联到匹配的卡
                     cursor.execute("""
                         UPDATE statements
@@ -7485,23 +7415,13 @@ def accounting_files():
 
 @app.route('/api/proxy/files/<path:subpath>', methods=['GET', 'POST', 'DELETE'])
 def proxy_files_api(subpath):
-    """代理文件管理API请求到端口8000"""
-    import requests
-    
+    """代理文件管理API请求到端口8000（共享keep-alive连接池，上传/下载流式转发）"""
     # 特殊处理smart-upload（需要转发文件）
     if subpath == 'smart-upload' and request.method == 'POST':
-        target_url = 'http://localhost:8000/api/smart-import/smart-upload'
-        
-        # 转发multipart/form-data
-        files = {}
-        if 'file' in request.files:
-            uploaded_file = request.files['file']
-            files['file'] = (uploaded_file.filename, uploaded_file.stream, uploaded_file.content_type)
-        
         try:
-            # 转发文件、表单数据和query参数
-            response = requests.post(target_url, files=files, data=request.form, params=request.args)
-            return response.content, response.status_code, {'Content-Type': response.headers.get('Content-Type', 'application/json')}
+            # 原样流式转发multipart请求体（文件、表单数据）和query参数，不在内存中缓冲整个上传
+            response = proxy_client.forward_request_body('/api/smart-import/smart-upload', route='files.smart-upload')
+            return proxy_client.stream_response(response, route='files.smart-upload')
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
@@ -7509,39 +7429,39 @@ def proxy_files_api(subpath):
     company_id = request.args.get('company_id', '1')  # 默认使用公司ID=1
     
     if subpath == 'list':
-        target_url = f'http://localhost:8000/api/files/list/{company_id}'
+        target_url = f'/api/files/list/{company_id}'
     elif subpath == 'storage-info':
-        target_url = f'http://localhost:8000/api/files/storage-stats/{company_id}'
+        target_url = f'/api/files/storage-stats/{company_id}'
     elif subpath in ['view', 'download', 'delete']:
         # 这些端点使用query参数
-        target_url = f'http://localhost:8000/api/files/{subpath}'
+        target_url = f'/api/files/{subpath}'
     else:
         # 普通请求
-        target_url = f'http://localhost:8000/api/files/{subpath}'
+        target_url = f'/api/files/{subpath}'
+    
+    route = 'files.download' if subpath in ['view', 'download'] else 'files'
     
     try:
-        # 转发请求，保留所有query参数
+        # 转发请求，保留所有query参数；响应体流式返回（大文件下载不整体缓冲）
         if request.method == 'GET':
-            response = requests.get(target_url, params=request.args)
+            response = proxy_client.get(target_url, route=route, params=request.args, stream=True)
         elif request.method == 'POST':
-            response = requests.post(target_url, json=request.get_json(), params=request.args)
+            response = proxy_client.post(target_url, route=route, json=request.get_json(), params=request.args, stream=True)
         elif request.method == 'DELETE':
-            response = requests.delete(target_url, params=request.args)
+            response = proxy_client.request('DELETE', target_url, route=route, params=request.args, stream=True)
         else:
             return jsonify({"error": "Method not supported"}), 405
         
         # 返回响应
-        return response.content, response.status_code, {'Content-Type': response.headers.get('Content-Type', 'application/json')}
+        return proxy_client.stream_response(response, route=route)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/proxy/unified-files/<path:subpath>', methods=['GET', 'POST', 'PATCH', 'DELETE'])
 def proxy_unified_files_api(subpath):
     """代理统一文件管理API请求到端口8000（带自动认证）"""
-    import requests
-    
     # 构建目标URL
-    target_url = f'http://localhost:8000/api/files/{subpath}'
+    target_url = f'/api/files/{subpath}'
     
     # 获取当前租户的company_id（支持多租户隔离）
     current_company_id = session.get('current_company_id', 1)
@@ -7561,14 +7481,14 @@ def proxy_unified_files_api(subpath):
         
         try:
             # 使用专用proxy_service账户登录（指定当前租户的company_id）
-            login_response = requests.post(
-                'http://localhost:8000/api/auth/login',
+            login_response = proxy_client.post(
+                '/api/auth/login',
+                route='auth.login',
                 json={
                     "username": "proxy_service",
                     "password": proxy_password,
                     "company_id": current_company_id
-                },
-                timeout=5
+                }
             )
             
             if login_response.status_code == 200:
@@ -7589,23 +7509,24 @@ def proxy_unified_files_api(subpath):
     try:
         # 根据HTTP方法转发请求
         if request.method == 'GET':
-            response = requests.get(target_url, params=request.args, headers=headers, cookies=cookies)
+            response = proxy_client.get(target_url, route='unified-files', params=request.args, headers=headers, cookies=cookies, stream=True)
         elif request.method == 'POST':
-            response = requests.post(target_url, json=request.get_json(), params=request.args, headers=headers, cookies=cookies)
+            response = proxy_client.post(target_url, route='unified-files', json=request.get_json(), params=request.args, headers=headers, cookies=cookies, stream=True)
         elif request.method == 'PATCH':
-            response = requests.patch(target_url, json=request.get_json() if request.get_json() else None, params=request.args, headers=headers, cookies=cookies)
+            response = proxy_client.request('PATCH', target_url, route='unified-files', json=request.get_json() if request.get_json() else None, params=request.args, headers=headers, cookies=cookies, stream=True)
         elif request.method == 'DELETE':
-            response = requests.delete(target_url, params=request.args, headers=headers, cookies=cookies)
+            response = proxy_client.request('DELETE', target_url, route='unified-files', params=request.args, headers=headers, cookies=cookies, stream=True)
         else:
             return jsonify({"success": False, "message": "Method not supported"}), 405
         
         # 如果返回401，清除对应租户的token并要求刷新
         if response.status_code == 401 and session_token:
+            response.close()
             session.pop(token_key, None)  # 删除正确的token_key
             return jsonify({"success": False, "message": "认证失败，请刷新页面"}), 401
         
-        # 返回响应（保留原始状态码）
-        return response.content, response.status_code, {'Content-Type': response.headers.get('Content-Type', 'application/json')}
+        # 返回响应（保留原始状态码，响应体流式转发）
+        return proxy_client.stream_response(response, route='unified-files')
     except Exception as e:
         return jsonify({"success": False, "message": f"代理请求失败: {str(e)}"}), 500
 
@@ -7613,8 +7534,6 @@ def proxy_unified_files_api(subpath):
 @app.route('/api/metrics/<path:subpath>', methods=['GET'])
 def proxy_parsers_metrics_api(subpath):
     """Phase 1-10: 代理parsers和metrics API到FastAPI（端口8000）"""
-    import requests
-    
     # 确定API类型
     if '/parsers/' in request.path:
         api_prefix = 'parsers'
@@ -7624,11 +7543,11 @@ def proxy_parsers_metrics_api(subpath):
         return jsonify({"error": "Invalid API path"}), 400
     
     # 构建目标URL
-    target_url = f'http://localhost:8000/api/{api_prefix}/{subpath}'
+    target_url = f'/api/{api_prefix}/{subpath}'
     
     try:
         # GET请求转发
-        response = requests.get(target_url, params=request.args, timeout=5)
+        response = proxy_client.get(target_url, route='parsers-metrics', params=request.args)
         
         # 返回响应
         return response.content, response.status_code, {'Content-Type': response.headers.get('Content-Type', 'application/json')}
@@ -8226,13 +8145,11 @@ def file_detail(file_id):
 @require_admin_or_accountant
 def quick_income_route():
     """Quick Estimate - Income Only（调用FastAPI）"""
-    import requests
-    
     income = request.json.get('income')
     payload = {'income': income}
     
     try:
-        res = requests.post('http://localhost:8000/api/loans/quick-income', json=payload, timeout=10)
+        res = proxy_client.post('/api/loans/quick-income', route='loans', json=payload, timeout=10)
         res.raise_for_status()
         return jsonify(res.json())
     except Exception as e:
@@ -8243,14 +8160,12 @@ def quick_income_route():
 @require_admin_or_accountant
 def quick_income_commit_route():
     """Quick Estimate - Income + Commitments（调用FastAPI）"""
-    import requests
-    
     income = request.json.get('income')
     commitments = request.json.get('commitments')
     payload = {'income': income, 'commitments': commitments}
     
     try:
-        res = requests.post('http://localhost:8000/api/loans/quick-income-commitment', json=payload, timeout=10)
+        res = proxy_client.post('/api/loans/quick-income-commitment', route='loans', json=payload, timeout=10)
         res.raise_for_status()
         return jsonify(res.json())
     except Exception as e:
@@ -8351,6 +8266,9 @@ from services.excel_parsers import (
     CreditCardExcelParser,
     BankDetector
 )
+from services.excel_parsers.batch_import import (
+    enqueue_excel_batch, ensure_excel_import_worker, get_excel_batch_status, iter_batch_events,
+)
 
 @app.route('/api/upload/excel/credit-card', methods=['POST'])
 @require_admin_or_accountant
@@ -8464,6 +8382,8 @@ def upload_excel_batch():
     """
     批量Excel/CSV上传API
     支持同时上传多个信用卡账单或银行流水
+    文件保存后按文件入队，由任务队列进程池并行解析；立即返回批次ID，
+    进度见 /api/upload/excel/batch/<batch_id>（轮询）或 .../events（SSE）
     """
     try:
         files = request.files.getlist('files')
@@ -8474,64 +8394,31 @@ def upload_excel_batch():
                 'message': '未选择文件'
             }), 400
         
-        results = []
-        detector = BankDetector()
+        batch_id, rejected = enqueue_excel_batch(
+            os.path.join(app.config['UPLOAD_FOLDER'], 'excel_batches'),
+            ((file.filename, file) for file in files)
+        )
+        queued = sum(1 for file in files if file.filename) - len(rejected)
         
-        for file in files:
-            if file.filename == '':
-                continue
-            
-            file_ext = os.path.splitext(file.filename)[1].lower()
-            
-            if file_ext not in {'.xlsx', '.xls', '.csv'}:
-                results.append({
-                    'filename': file.filename,
-                    'status': 'error',
-                    'message': '不支持的文件格式'
-                })
-                continue
-            
-            temp_path = os.path.join(app.config['UPLOAD_FOLDER'], 'temp', file.filename)
-            os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-            file.save(temp_path)
-            
-            try:
-                if file_ext == '.csv':
-                    df = __import__('pandas').read_csv(temp_path, nrows=20)
-                else:
-                    df = __import__('pandas').read_excel(temp_path, nrows=20)
-                
-                doc_type = detector.detect_document_type(df)
-                
-                if doc_type == 'credit_card':
-                    parser = CreditCardExcelParser()
-                else:
-                    parser = BankStatementExcelParser()
-                
-                result = parser.parse(temp_path)
-                result['filename'] = file.filename
-                results.append(result)
-                
-                os.remove(temp_path)
-            
-            except Exception as e:
-                results.append({
-                    'filename': file.filename,
-                    'status': 'error',
-                    'message': str(e)
-                })
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+        if queued and job_worker is None:
+            # gunicorn 部署中没有调度Worker：在本进程启动只处理解析任务的Worker
+            ensure_excel_import_worker()
         
-        success_count = sum(1 for r in results if r.get('status') == 'success')
+        if queued == 0:
+            return jsonify({
+                'status': 'error',
+                'message': '没有可解析的文件',
+                'results': rejected
+            }), 400
         
         return jsonify({
-            'status': 'success',
-            'total_files': len(files),
-            'success_count': success_count,
-            'failed_count': len(results) - success_count,
-            'results': results
-        }), 200
+            'status': 'accepted',
+            'batch_id': batch_id,
+            'total_files': queued,
+            'rejected': rejected,
+            'status_url': url_for('excel_batch_status', batch_id=batch_id),
+            'events_url': url_for('excel_batch_events', batch_id=batch_id)
+        }), 202
     
     except Exception as e:
         logger.error(f"Excel batch upload error: {e}")
@@ -8541,6 +8428,32 @@ def upload_excel_batch():
         }), 500
 
 
+@app.route('/api/upload/excel/batch/<batch_id>', methods=['GET'])
+@require_admin_or_accountant
+def excel_batch_status(batch_id):
+    """批量Excel/CSV导入进度（各文件状态及已完成文件的解析结果）"""
+    status = get_excel_batch_status(batch_id)
+    if status is None:
+        return jsonify({'status': 'error', 'message': '批次不存在'}), 404
+    return jsonify({'status': 'success', **status}), 200
+
+
+@app.route('/api/upload/excel/batch/<batch_id>/events', methods=['GET'])
+@require_admin_or_accountant
+def excel_batch_events(batch_id):
+    """
+    批量Excel/CSV导入进度（SSE）：每完成一个文件推送一条 file 事件，全部完成后推送 done 事件
+    超过 EXCEL_BATCH_EVENTS_TIMEOUT 未完成时推送 timeout 事件并结束（客户端可重连或改为轮询）
+    """
+    if get_excel_batch_status(batch_id) is None:
+        return jsonify({'status': 'error', 'message': '批次不存在'}), 404
+    
+    # 流式响应期间不持有请求级数据库连接：立即归还，进度轮询使用任务队列的短连接
+    end_request_scope(g.pop('db_conn', None))
+    return Response(iter_batch_events(batch_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/upload/detect-bank', methods=['POST'])
 @require_admin_or_accountant
 def detect_bank_format():
@@ -8708,7 +8621,7 @@ def upload_vba_json():
 def upload_vba_batch():
     """
     批量接收VBA处理后的JSON文件
-    支持一次上传多个JSON文件
+    支持一次上传多个JSON文件；所有有效文件在一个事务中入库
     """
     try:
         files = request.files.getlist('files')
@@ -8720,8 +8633,7 @@ def upload_vba_batch():
             }), 400
         
         results = []
-        success_count = 0
-        failed_count = 0
+        documents = []
         
         for file in files:
             if file.filename == '':
@@ -8733,11 +8645,9 @@ def upload_vba_batch():
                     'status': 'error',
                     'message': '不是JSON文件'
                 })
-                failed_count += 1
                 continue
             
             try:
-                import json
                 json_data = json.load(file)
                 
                 # 验证JSON格式
@@ -8747,29 +8657,8 @@ def upload_vba_batch():
                 if 'document_type' not in json_data:
                     raise ValueError('JSON格式错误：缺少document_type字段')
                 
-                doc_type = json_data['document_type']
-                
-                # VBA JSON数据入库处理
-                from services.vba_json_processor import VBAJSONProcessor
-                
-                processor = VBAJSONProcessor()
-                user_id = session.get('user_id') if 'user_id' in session else None
-                
-                result = processor.process_json(json_data, user_id, file.filename)
-                
-                if result.get('success'):
-                    results.append({
-                        'filename': file.filename,
-                        'status': 'success',
-                        'document_type': doc_type,
-                        'transactions': result.get('transaction_count', 0),
-                        'statement_id': result.get('statement_id'),
-                        'bank': result.get('bank'),
-                        'month': result.get('month')
-                    })
-                    success_count += 1
-                else:
-                    raise ValueError(result.get('message', '入库失败'))
+                documents.append((file.filename, json_data))
+                results.append(None)
             
             except Exception as e:
                 results.append({
@@ -8777,15 +8666,50 @@ def upload_vba_batch():
                     'status': 'error',
                     'message': str(e)
                 })
-                failed_count += 1
         
-        logger.info(f"VBA批量上传: 成功 {success_count}, 失败 {failed_count}")
+        # VBA JSON数据入库处理（一个事务）
+        from services.vba_json_processor import VBAJSONProcessor
+        
+        processor = VBAJSONProcessor()
+        user_id = session.get('user_id') if 'user_id' in session else None
+        batch = processor.process_batch(documents, user_id)
+        
+        processed = iter(zip(documents, batch['results']))
+        for i, entry in enumerate(results):
+            if entry is not None:
+                continue
+            (filename, json_data), result = next(processed)
+            if result.get('success'):
+                results[i] = {
+                    'filename': filename,
+                    'status': 'success',
+                    'document_type': json_data['document_type'],
+                    'transactions': result.get('transaction_count', 0),
+                    'statement_id': result.get('statement_id'),
+                    'bank': result.get('bank'),
+                    'month': result.get('month')
+                }
+            else:
+                results[i] = {
+                    'filename': filename,
+                    'status': 'error',
+                    'message': result.get('message', '入库失败')
+                }
+        
+        success_count = sum(1 for r in results if r['status'] == 'success')
+        failed_count = len(results) - success_count
+        
+        logger.info(f"VBA批量上传: 成功 {success_count}, 失败 {failed_count}, "
+                    f"{batch['transaction_count']}笔交易 ({batch['rows_per_second']} rows/s)")
         
         return jsonify({
             'status': 'success',
             'total_files': len(files),
             'success_count': success_count,
             'failed_count': failed_count,
+            'transaction_count': batch['transaction_count'],
+            'elapsed_seconds': batch['elapsed_seconds'],
+            'rows_per_second': batch['rows_per_second'],
             'results': results
         }), 200
     
@@ -9956,47 +9880,6 @@ def api_assign_file():
         }), 500
 
 
-@app.route('/credit-card/transaction-classifier')
-@require_admin_or_accountant
-def transaction_classifier_page():
-    """交易分类器页面 - 修复624笔未分类交易"""
-    from services.transaction_classifier import get_classifier
-    
-    classifier = get_classifier()
-    
-    # 获取分类预览
-    preview = classifier.get_classification_preview(limit=624)
-    
-    # 统计
-    stats = {
-        'total': len(preview),
-        'by_category': {}
-    }
-    
-    for txn in preview:
-        category = txn['new_category']
-        if category not in stats['by_category']:
-            stats['by_category'][category] = 0
-        stats['by_category'][category] += 1
-    
-    return render_template('credit_card/transaction_classifier.html',
-                         preview=preview,
-                         stats=stats)
-
-@app.route('/credit-card/reclassify-transactions', methods=['POST'])
-@require_admin_or_accountant
-def reclassify_transactions():
-    """执行交易重新分类"""
-    from services.transaction_classifier import get_classifier
-    
-    classifier = get_classifier()
-    result = classifier.reclassify_all_transactions()
-    
-    lang = get_current_language()
-    flash(f"✅ 成功重新分类 {result['reclassified']} 笔交易！", 'success')
-    
-    return redirect(url_for('transaction_classifier_page'))
-
 @app.route('/credit-card/optimization-proposal/<int:customer_id>')
 def optimization_proposal(customer_id):
     """客户优化方案页面 - 显示18%利息对比5%方案"""
@@ -1,30 +1,266 @@
 import sqlite3
 import os
+import threading
 from contextlib import contextmanager
 from datetime import datetime
 
+from services.batch_writer import BatchWriter
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'smart_loan_manager.db')
 
+# 连接池配置：每个 gunicorn worker 进程内最多保留的空闲连接数
+POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '8'))
+
+# 只在新建连接时执行一次的 PRAGMA
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),          # Enable WAL mode for better concurrency
+    ('busy_timeout', '30000'),
+    ('synchronous', 'NORMAL'),        # WAL 模式下 NORMAL 已足够安全
+    ('cache_size', '-20000'),         # 约 20MB page cache
+    ('mmap_size', '268435456'),       # 256MB 内存映射读取
+    ('temp_store', 'MEMORY'),
+)
+
+
+class _PooledConnection(sqlite3.Connection):
+    """close() 归还给连接池，而不是真正关闭底层连接"""
+
+    _pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def _really_close(self):
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池
+    - 同一线程内嵌套的 get_db() 共享同一个连接（嵌套 helper 不再各自开连接）
+    - 每个嵌套作用域对应一个 SAVEPOINT：作用域退出时（异常或未 commit 的正常退出）回滚到该保存点，
+      与原来每个 get_db() 独立连接、close() 丢弃未提交写入的语义一致，
+      失败 helper 的部分写入不会被后续 helper 的 commit 一并提交
+    - 最外层退出时连接归还到空闲池，PRAGMA 只在创建连接时执行一次
+    """
+
+    def __init__(self, db_path, max_idle=POOL_MAX_IDLE):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False,
+                               factory=_PooledConnection)
+        for name, value in CONNECTION_PRAGMAS:
+            conn.execute(f'PRAGMA {name}={value}')
+        conn._pool = self
+        return conn
+
+    def acquire(self):
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            local.depth += 1
+            with self._lock:
+                self.shared += 1
+            local.savepoints.append(self._begin_savepoint(conn, local.depth))
+            return conn
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if conn is None:
+            conn = self._connect()
+
+        conn.row_factory = sqlite3.Row
+        local.conn = conn
+        local.depth = 1
+        local.savepoints = []
+        return conn
+
+    @staticmethod
+    def _begin_savepoint(conn, depth):
+        # 外层没有打开的事务时先显式 BEGIN，否则 RELEASE 最外层保存点会直接提交
+        began = not conn.in_transaction
+        if began:
+            conn.execute('BEGIN')
+        name = f'get_db_{depth}'
+        conn.execute(f'SAVEPOINT {name}')
+        return name, began
+
+    @staticmethod
+    def _end_savepoint(conn, savepoint):
+        name, began = savepoint
+        try:
+            # 本作用域未提交的写入丢弃（需要保留的写入应在作用域内 commit）
+            conn.execute(f'ROLLBACK TO {name}')
+            conn.execute(f'RELEASE {name}')
+        except sqlite3.OperationalError:
+            # 作用域内已经 commit / rollback，保存点不存在：
+            # 此后未提交的写入都属于本作用域，整体回滚
+            if conn.in_transaction:
+                conn.rollback()
+            return
+        if began and conn.in_transaction:
+            # 本作用域打开的事务不保留到外层，避免长期持有 WAL 读快照
+            conn.rollback()
+
+    def release(self, conn):
+        local = self._local
+        if getattr(local, 'conn', None) is not conn:
+            # 不属于当前线程的活动连接（例如重复 close），直接忽略
+            return
+        local.depth -= 1
+        if local.depth > 0:
+            self._end_savepoint(conn, local.savepoints.pop())
+            return
+        local.conn = None
+
+        try:
+            # 与原来 close() 的语义保持一致：未提交的事务回滚
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn._really_close()
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn._really_close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn._really_close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared': self.shared,
+                'idle': len(self._idle),
+                'max_idle': self.max_idle,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# DB_PATH -> 审计日志后台批量写入器
+_audit_writers = {}
+
+
+def _get_pool():
+    # 以 DB_PATH 为键，测试或脚本中替换 DB_PATH 时自动使用新的连接池
+    pool = _pools.get(DB_PATH)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(DB_PATH, ConnectionPool(DB_PATH))
+    return pool
+
+
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DB_PATH, timeout=30.0, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    # Enable WAL mode for better concurrency
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.execute('PRAGMA busy_timeout=30000')
+    pool = _get_pool()
+    conn = pool.acquire()
     try:
         yield conn
     finally:
+        pool.release(conn)
+
+
+def begin_request_scope():
+    """在请求开始时持有一个连接，请求内所有 get_db() 调用共享该连接"""
+    return _get_pool().acquire()
+
+
+def end_request_scope(conn):
+    if conn is not None:
         conn.close()
 
+
+def get_pool_stats():
+    return _get_pool().stats()
+
+
+def close_pool():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        writers = list(_audit_writers.values())
+        _audit_writers.clear()
+    # 先写完排队的审计日志
+    for writer in writers:
+        writer.close()
+    for pool in pools:
+        pool.close_all()
+
+def month_date_range(year, month):
+    """
+    月份的日期范围 [start, end)，用于 statement_date >= ? AND statement_date < ?
+    与 strftime('%Y'/'%m', ...) 过滤结果相同，但可以使用日期列上的索引
+    """
+    start = f"{int(year):04d}-{int(month):02d}-01"
+    if int(month) == 12:
+        end = f"{int(year) + 1:04d}-01-01"
+    else:
+        end = f"{int(year):04d}-{int(month) + 1:02d}-01"
+    return start, end
+
+def _audit_batch_writer(db_path):
+    def write_batch(rows):
+        conn = sqlite3.connect(db_path, timeout=30.0)
+        try:
+            conn.executemany('''
+                INSERT INTO audit_logs (user_id, action_type, entity_type, entity_id, description, ip_address)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        finally:
+            conn.close()
+    return write_batch
+
+
+def _get_audit_writer():
+    # 与连接池一样以 DB_PATH 为键
+    writer = _audit_writers.get(DB_PATH)
+    if writer is None:
+        with _pools_lock:
+            writer = _audit_writers.get(DB_PATH)
+            if writer is None:
+                writer = BatchWriter('audit_logs', _audit_batch_writer(DB_PATH))
+                _audit_writers[DB_PATH] = writer
+    return writer
+
+
 def log_audit(user_id, action_type, entity_type=None, entity_id=None, description=None, ip_address=None):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO audit_logs (user_id, action_type, entity_type, entity_id, description, ip_address)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, action_type, entity_type, entity_id, description, ip_address))
-        conn.commit()
+    """审计日志入队，由后台线程批量写入（不占用请求的数据库提交）"""
+    _get_audit_writer().submit((user_id, action_type, entity_type, entity_id, description, ip_address))
+
+
+def flush_audit_log(timeout=None):
+    """等待已提交的审计日志全部写入"""
+    return all(writer.flush(timeout) for writer in list(_audit_writers.values()))
+
+
+def get_audit_log_stats():
+    return [writer.stats() for writer in list(_audit_writers.values())]
 
 def get_customer(customer_id):
     with get_db() as conn:
@@ -63,6 +63,8 @@ def create_savings_tracking_tables():
             customer_name_tag TEXT,
             is_prepayment INTEGER DEFAULT 0,
             notes TEXT,
+            txn_date TEXT,
+            txn_month TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (savings_statement_id) REFERENCES savings_statements(id)
         )
@@ -82,6 +84,14 @@ def create_savings_tracking_tables():
         CREATE INDEX IF NOT EXISTS idx_savings_transactions_date 
         ON savings_transactions(transaction_date)
     ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_savings_transactions_tag_txn_date
+        ON savings_transactions(customer_name_tag, txn_date)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_savings_transactions_statement_txn_date
+        ON savings_transactions(savings_statement_id, txn_date)
+    ''')
     print("✓ Created search indexes (搜索索引)")
     
     conn.commit()
@@ -0,0 +1,148 @@
+"""
+储蓄交易规范日期 - 数据库迁移
+transaction_date 保留月结单原文（DD-MM-YYYY、DD MMM YYYY 等混合格式），新增：
+- txn_date  TEXT：ISO日期（YYYY-MM-DD）
+- txn_month TEXT：年月（YYYY-MM）
+以及按客户标签 / 账单 + 日期的组合索引，结算和转账查询按 txn_date 范围扫描
+
+上传时由 ingest.savings_parser 写入；scripts/* 导入脚本直接 INSERT 不带 txn_date 时，由
+savings_transactions 上的触发器在SQL中按同样的格式规则补齐（更新 transaction_date 时重新计算）。
+本迁移创建触发器并回填已有数据（可重复执行，只处理 txn_date 为空的行）
+执行：python -m db.migrations_savings_txn_dates（Flask应用启动时也会自动执行）
+"""
+
+import sqlite3
+import os
+
+from ingest.savings_parser import normalize_savings_date
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'smart_loan_manager.db')
+
+BACKFILL_CHUNK_SIZE = 5000
+
+_INDEXES = [
+    '''CREATE INDEX IF NOT EXISTS idx_savings_transactions_tag_txn_date
+       ON savings_transactions(customer_name_tag, txn_date)''',
+    '''CREATE INDEX IF NOT EXISTS idx_savings_transactions_statement_txn_date
+       ON savings_transactions(savings_statement_id, txn_date)''',
+]
+
+# 与 normalize_savings_date 相同的规则：YYYY-MM-DD[ 时间]，或 日-月-年（分隔符为 - / 空格，
+# 月份为数字或英文月份名前3个字母，两位年份 69-99 为19xx、00-68 为20xx），非法日期为NULL
+_MONTH_NAMES = 'JANFEBMARAPRMAYJUNJULAUGSEPOCTNOVDEC'
+
+_TXN_DATE_SQL = f'''
+    SELECT CASE WHEN date(c, '+0 days') = c THEN c END FROM (
+        SELECT CASE
+            WHEN v GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+              OR v GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][-T]*' THEN substr(v, 1, 10)
+            WHEN (d GLOB '[0-9]' OR d GLOB '[0-9][0-9]') AND mm IS NOT NULL AND yy IS NOT NULL
+                THEN printf('%04d-%02d-%02d', yy, mm, CAST(d AS INTEGER))
+        END AS c FROM (
+            SELECT v, d,
+                CASE
+                    WHEN m GLOB '[0-9]' OR m GLOB '[0-9][0-9]' THEN CAST(m AS INTEGER)
+                    WHEN length(m) >= 3 AND m NOT GLOB '*[^A-Za-z]*'
+                         AND instr('{_MONTH_NAMES}', upper(substr(m, 1, 3))) % 3 = 1
+                        THEN (instr('{_MONTH_NAMES}', upper(substr(m, 1, 3))) + 2) / 3
+                END AS mm,
+                CASE
+                    WHEN y GLOB '[0-9][0-9][0-9][0-9]' THEN CAST(y AS INTEGER)
+                    WHEN y GLOB '[0-9][0-9]' THEN CAST(y AS INTEGER) + IIF(CAST(y AS INTEGER) < 69, 2000, 1900)
+                END AS yy
+            FROM (
+                SELECT v, d, substr(rest, 1, instr(rest, '-') - 1) AS m, substr(rest, instr(rest, '-') + 1) AS y
+                FROM (
+                    SELECT v, substr(v, 1, instr(v, '-') - 1) AS d, substr(v, instr(v, '-') + 1) AS rest
+                    FROM (SELECT replace(replace(replace(trim(NEW.transaction_date), '/', '-'), ' ', '-'),
+                                         '--', '-') AS v)
+                )
+            )
+        )
+    )
+'''
+
+_TRIGGERS = {
+    'trg_savings_transactions_txn_date_insert': f'''
+        CREATE TRIGGER trg_savings_transactions_txn_date_insert
+        AFTER INSERT ON savings_transactions
+        WHEN NEW.txn_date IS NULL AND NEW.transaction_date IS NOT NULL
+        BEGIN
+            UPDATE savings_transactions SET txn_date = ({_TXN_DATE_SQL}) WHERE id = NEW.id;
+            UPDATE savings_transactions SET txn_month = substr(txn_date, 1, 7) WHERE id = NEW.id;
+        END''',
+    # 只改了 transaction_date（未同时写 txn_date）时重新计算
+    'trg_savings_transactions_txn_date_update': f'''
+        CREATE TRIGGER trg_savings_transactions_txn_date_update
+        AFTER UPDATE OF transaction_date ON savings_transactions
+        WHEN NEW.transaction_date IS NOT OLD.transaction_date AND NEW.txn_date IS OLD.txn_date
+        BEGIN
+            UPDATE savings_transactions SET txn_date = ({_TXN_DATE_SQL}) WHERE id = NEW.id;
+            UPDATE savings_transactions SET txn_month = substr(txn_date, 1, 7) WHERE id = NEW.id;
+        END''',
+}
+
+
+def ensure_savings_txn_dates(conn) -> int:
+    """
+    添加 txn_date / txn_month 列、组合索引和自动填充触发器，并回填缺失的规范日期
+
+    Returns:
+        本次回填的行数（savings_transactions 表不存在时为0）
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(savings_transactions)')}
+    if not columns:
+        return 0
+
+    for column in ('txn_date', 'txn_month'):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE savings_transactions ADD COLUMN {column} TEXT')
+    for sql in _INDEXES:
+        conn.execute(sql)
+    # 每次重建，保证已有数据库使用当前的触发器定义
+    for name, sql in _TRIGGERS.items():
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute(sql)
+
+    rows = conn.execute('''
+        SELECT id, transaction_date FROM savings_transactions
+        WHERE txn_date IS NULL AND transaction_date IS NOT NULL AND transaction_date != ''
+    ''').fetchall()
+
+    updates = []
+    for txn_id, transaction_date in rows:
+        txn_date = normalize_savings_date(transaction_date)
+        if txn_date:
+            updates.append((txn_date, txn_date[:7], txn_id))
+
+    for start in range(0, len(updates), BACKFILL_CHUNK_SIZE):
+        conn.executemany('UPDATE savings_transactions SET txn_date = ?, txn_month = ? WHERE id = ?',
+                         updates[start:start + BACKFILL_CHUNK_SIZE])
+    conn.commit()
+    return len(updates)
+
+
+def migrate_savings_txn_dates():
+    """命令行执行：回填规范日期"""
+    conn = sqlite3.connect(DB_PATH)
+
+    print("=" * 80)
+    print("回填储蓄交易规范日期（txn_date / txn_month）...")
+    print("=" * 80)
+
+    updated = ensure_savings_txn_dates(conn)
+    unparsed = conn.execute('''
+        SELECT COUNT(*) FROM savings_transactions WHERE txn_date IS NULL
+    ''').fetchone()[0]
+    conn.close()
+
+    print(f"✓ 已回填 {updated} 笔交易")
+    if unparsed:
+        print(f"⚠️ {unparsed} 笔交易日期无法识别，txn_date 保持为空")
+    print("✓ Created indexes (customer_name_tag, txn_date) / (savings_statement_id, txn_date)")
+    print("✓ Created triggers filling txn_date / txn_month on insert")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    migrate_savings_txn_dates()
@@ -3,12 +3,12 @@ Email Notification Service
 Send email notifications for uploads, reminders, and alerts
 """
 
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional
 from datetime import datetime
 from db.database import get_db
+from email_service.smtp_pool import shared_smtp_session
 
 class EmailService:
     """Service for sending email notifications"""
@@ -40,10 +40,10 @@ class EmailService:
             html_part = MIMEText(body_html, 'html')
             msg.attach(html_part)
             
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            # Reuse one authenticated SMTP session per process instead of a TLS handshake per email
+            session = shared_smtp_session(self.smtp_host, self.smtp_port, self.smtp_user, self.smtp_password)
+            with session.lock:
+                session.send(msg)
             
             self._log_email(customer_id, to_email, subject, email_type, 'sent')
             return True
@@ -0,0 +1,431 @@
+"""
+持久化邮件发件箱 + 投递Worker
+- 邮件先写入 email_outbox 表（主数据库），再由 OutboxWorker 投递；进程重启后未发送的邮件继续投递
+- 状态：pending → sending → sent / failed
+- idempotency_key 唯一：同一封邮件（如某份月度报表）只会入队一次；再次入队时刷新未发送邮件的收件人与内容，
+  requeue_failed=True（显式重新发送）时已失败的邮件重置尝试次数后重新排队
+- OutboxWorker：EMAIL_OUTBOX_CONCURRENCY 个发送线程，每个线程复用一个已认证的SMTP会话
+  连续发送多封邮件（不再每封一次TLS握手 + 登录），连接断开时自动重连
+- 临时失败（4xx、连接错误）按该邮件的尝试次数指数退避重试；收件人被永久拒绝（5xx）直接标记失败
+- SMTP认证失败是配置问题，与邮件无关：邮件放回队列，不计入尝试次数
+- on_sent：发送成功后调用的 "模块路径:函数名"（参数为 ref_id），例如回写月度报表的发送状态
+
+附件以文件路径保存，投递时读取
+"""
+
+import importlib
+import json
+import logging
+import os
+import smtplib
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, Iterable, List, Optional
+
+from email_service.smtp_pool import SMTPSession, smtp_settings
+
+logger = logging.getLogger(__name__)
+
+# 并发SMTP会话数
+EMAIL_OUTBOX_CONCURRENCY = int(os.environ.get('EMAIL_OUTBOX_CONCURRENCY', '4'))
+
+# 每个发送线程一次领取的邮件数
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '20'))
+
+# 默认最大尝试次数
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', '5'))
+
+# 重试退避基数（秒）：第n次失败后等待 base * 2^(n-1)
+EMAIL_RETRY_BASE_SECONDS = int(os.environ.get('EMAIL_RETRY_BASE_SECONDS', '60'))
+
+# sending 状态超过该时间仍未完成，视为Worker已失效，邮件重新入队（秒）
+EMAIL_LOCK_TIMEOUT = int(os.environ.get('EMAIL_LOCK_TIMEOUT', '900'))
+
+EMAIL_STATUSES = ('pending', 'sending', 'sent', 'failed')
+
+_TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email TEXT NOT NULL,
+    from_email TEXT,
+    subject TEXT NOT NULL,
+    body_html TEXT NOT NULL,
+    attachments TEXT NOT NULL DEFAULT '[]',
+    customer_id INTEGER,
+    email_type TEXT NOT NULL DEFAULT 'general',
+    ref_id INTEGER,
+    on_sent TEXT,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    next_attempt_at TEXT NOT NULL,
+    locked_by TEXT,
+    locked_at TEXT,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    sent_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_status_next ON email_outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_type ON email_outbox(email_type);
+'''
+
+
+def _now() -> str:
+    return datetime.now().strftime(_TS_FORMAT)
+
+
+def _default_db_path() -> str:
+    # 与连接池一样在使用时读取 DB_PATH（测试或脚本中替换 DB_PATH 时生效）
+    from db import database
+    return database.DB_PATH
+
+
+class PermanentDeliveryError(Exception):
+    """邮件被服务器永久拒绝（5xx），不再重试"""
+
+
+# ============================================================
+# 发件箱存储
+# ============================================================
+
+class EmailOutbox:
+    """email_outbox 表；每次操作使用独立的短连接，可在多个线程 / 进程中同时使用"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or _default_db_path()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA busy_timeout=30000')
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        conn.executescript(_SCHEMA)
+                        self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, to_email: str, subject: str, body_html: str, from_email: Optional[str] = None,
+                attachments: Iterable[Dict] = (), customer_id: Optional[int] = None,
+                email_type: str = 'general', ref_id: Optional[int] = None, on_sent: Optional[str] = None,
+                idempotency_key: Optional[str] = None, max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                requeue_failed: bool = False) -> int:
+        """
+        邮件入队，返回邮件ID
+        idempotency_key 已存在时不重复入队，返回已有邮件的ID；该邮件尚未发送（pending）时
+        更新收件人、主题、正文与附件（如客户修改了邮箱）
+
+        Args:
+            attachments: [{'path': 文件路径, 'filename': 附件名, 'subtype': 'pdf'}]
+            on_sent: 发送成功后调用的 "模块路径:函数名"，参数为 ref_id
+            requeue_failed: 已失败（failed）的邮件同样更新内容，并重置尝试次数重新排队（显式重新发送）
+        """
+        now = _now()
+        attachments_json = json.dumps(list(attachments), ensure_ascii=False)
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO email_outbox
+                    (to_email, from_email, subject, body_html, attachments, customer_id, email_type,
+                     ref_id, on_sent, idempotency_key, status, max_attempts, next_attempt_at,
+                     created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)
+            ''', (to_email, from_email, subject, body_html, attachments_json,
+                  customer_id, email_type, ref_id, on_sent, idempotency_key, max_attempts, now, now, now))
+            if cursor.rowcount:
+                return cursor.lastrowid
+            # 已存在：sending / sent 的邮件保持不变
+            conn.execute('''
+                UPDATE email_outbox
+                SET to_email = ?, from_email = ?, subject = ?, body_html = ?, attachments = ?, updated_at = ?,
+                    attempts = CASE WHEN status = 'failed' THEN 0 ELSE attempts END,
+                    max_attempts = CASE WHEN status = 'failed' THEN ? ELSE max_attempts END,
+                    next_attempt_at = CASE WHEN status = 'failed' THEN ? ELSE next_attempt_at END,
+                    last_error = CASE WHEN status = 'failed' THEN NULL ELSE last_error END,
+                    status = 'pending'
+                WHERE idempotency_key = ? AND (status = 'pending' OR (status = 'failed' AND ?))
+            ''', (to_email, from_email, subject, body_html, attachments_json, now,
+                  max_attempts, now, idempotency_key, int(requeue_failed)))
+            row = conn.execute('SELECT id FROM email_outbox WHERE idempotency_key = ?',
+                               (idempotency_key,)).fetchone()
+            return row['id']
+
+    def claim(self, worker_id: str, limit: int, ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        """原子领取到期的 pending 邮件并标记为 sending（ids 指定时只领取这些邮件）"""
+        if limit <= 0:
+            return []
+        now = _now()
+        sql = "SELECT * FROM email_outbox WHERE status = 'pending' AND next_attempt_at <= ?"
+        params: list = [now]
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return []
+            sql += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        sql += ' ORDER BY next_attempt_at, id LIMIT ?'
+        params.append(limit)
+
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(sql, params).fetchall()
+                if rows:
+                    conn.executemany('''
+                        UPDATE email_outbox
+                        SET status = 'sending', attempts = attempts + 1,
+                            locked_by = ?, locked_at = ?, updated_at = ?
+                        WHERE id = ?
+                    ''', [(worker_id, now, now, row['id']) for row in rows])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        messages = []
+        for row in rows:
+            message = dict(row)
+            message['attachments'] = json.loads(message['attachments'] or '[]')
+            message['attempts'] += 1
+            message['status'] = 'sending'
+            messages.append(message)
+        return messages
+
+    def mark_sent(self, message_id: int, error: Optional[str] = None):
+        """记录发送成功（error 为部分收件人被拒绝等提示信息）"""
+        now = _now()
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE email_outbox
+                SET status = 'sent', last_error = ?, locked_by = NULL, locked_at = NULL,
+                    updated_at = ?, sent_at = ?
+                WHERE id = ?
+            ''', (error, now, now, message_id))
+
+    def mark_failed(self, message_id: int, error: str, permanent: bool = False) -> str:
+        """记录失败；临时失败且未超过最大尝试次数时按指数退避重新排队。返回新的状态"""
+        now = datetime.now()
+        with self._connect() as conn:
+            row = conn.execute('SELECT attempts, max_attempts FROM email_outbox WHERE id = ?',
+                               (message_id,)).fetchone()
+            if row is None:
+                return 'failed'
+            if not permanent and row['attempts'] < row['max_attempts']:
+                delay = EMAIL_RETRY_BASE_SECONDS * (2 ** max(row['attempts'] - 1, 0))
+                status = 'pending'
+                conn.execute('''
+                    UPDATE email_outbox
+                    SET status = 'pending', last_error = ?, next_attempt_at = ?,
+                        locked_by = NULL, locked_at = NULL, updated_at = ?
+                    WHERE id = ?
+                ''', (error, (now + timedelta(seconds=delay)).strftime(_TS_FORMAT),
+                      now.strftime(_TS_FORMAT), message_id))
+            else:
+                status = 'failed'
+                conn.execute('''
+                    UPDATE email_outbox
+                    SET status = 'failed', last_error = ?, locked_by = NULL, locked_at = NULL, updated_at = ?
+                    WHERE id = ?
+                ''', (error, now.strftime(_TS_FORMAT), message_id))
+        return status
+
+    def release(self, message_ids: Iterable[int], error: Optional[str] = None):
+        """已领取但未能投递（未尝试发送、或因配置问题失败）的邮件放回 pending（不计入尝试次数）"""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return
+        with self._connect() as conn:
+            conn.execute(f'''
+                UPDATE email_outbox
+                SET status = 'pending', attempts = attempts - 1, last_error = COALESCE(?, last_error),
+                    locked_by = NULL, locked_at = NULL, updated_at = ?
+                WHERE status = 'sending' AND id IN ({','.join('?' * len(message_ids))})
+            ''', (error, _now(), *message_ids))
+
+    def recover_stale(self, lock_timeout: int = EMAIL_LOCK_TIMEOUT) -> int:
+        """sending 状态超时的邮件重新放回 pending"""
+        now = datetime.now()
+        cutoff = (now - timedelta(seconds=lock_timeout)).strftime(_TS_FORMAT)
+        with self._connect() as conn:
+            return conn.execute('''
+                UPDATE email_outbox
+                SET status = 'pending', locked_by = NULL, locked_at = NULL, updated_at = ?
+                WHERE status = 'sending' AND locked_at < ?
+            ''', (now.strftime(_TS_FORMAT), cutoff)).rowcount
+
+    def get(self, message_id: int) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM email_outbox WHERE id = ?', (message_id,)).fetchone()
+        if row is None:
+            return None
+        message = dict(row)
+        message['attachments'] = json.loads(message['attachments'] or '[]')
+        return message
+
+    def statuses(self, message_ids: Iterable[int]) -> Dict[int, str]:
+        message_ids = list(message_ids)
+        result = {}
+        with self._connect() as conn:
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                result.update(conn.execute(
+                    f"SELECT id, status FROM email_outbox WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return result
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT email_type, status, COUNT(*) AS count
+                FROM email_outbox GROUP BY email_type, status
+            ''').fetchall()
+        result: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            result.setdefault(row['email_type'], {s: 0 for s in EMAIL_STATUSES})[row['status']] = row['count']
+        return result
+
+
+# ============================================================
+# 邮件构建
+# ============================================================
+
+def build_message(message: Dict, default_from: Optional[str] = None) -> MIMEMultipart:
+    """发件箱记录 → MIME邮件（附件文件不存在时跳过）"""
+    attachments = message.get('attachments') or []
+    msg = MIMEMultipart() if attachments else MIMEMultipart('alternative')
+    msg['From'] = message.get('from_email') or default_from or ''
+    msg['To'] = message['to_email']
+    msg['Subject'] = message['subject']
+    msg.attach(MIMEText(message['body_html'], 'html'))
+
+    for attachment in attachments:
+        path = attachment['path']
+        if not os.path.exists(path):
+            logger.warning(f"邮件 #{message.get('id')} 附件不存在，已跳过: {path}")
+            continue
+        with open(path, 'rb') as f:
+            part = MIMEApplication(f.read(), _subtype=attachment.get('subtype', 'octet-stream'))
+        part.add_header('Content-Disposition', 'attachment',
+                        filename=attachment.get('filename') or os.path.basename(path))
+        msg.attach(part)
+    return msg
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx 拒绝（收件人不存在、内容被拒绝）不再重试"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return error.smtp_code >= 500
+    return False
+
+
+def _resolve_hook(hook_path: str) -> Callable:
+    module_name, func_name = hook_path.split(':', 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+# ============================================================
+# 投递Worker
+# ============================================================
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class OutboxWorker:
+    """并发发送线程，每个线程复用一个SMTP会话连续投递领取到的邮件"""
+
+    def __init__(self, outbox: Optional[EmailOutbox] = None,
+                 session_factory: Optional[Callable[[], SMTPSession]] = None,
+                 concurrency: int = EMAIL_OUTBOX_CONCURRENCY, batch_size: int = EMAIL_OUTBOX_BATCH_SIZE):
+        self.outbox = outbox or EmailOutbox()
+        self.session_factory = session_factory or (lambda: SMTPSession(**smtp_settings()))
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+
+    def deliver(self, ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+        """
+        投递所有到期的邮件（ids 指定时只投递这些邮件），直到没有可领取的邮件
+
+        Returns:
+            {'sent': n, 'retrying': n, 'failed': n}
+        """
+        ids = None if ids is None else list(ids)
+        recovered = self.outbox.recover_stale()
+        if recovered:
+            logger.info(f"发件箱：{recovered} 封中断的邮件已重新入队")
+
+        totals = {'sent': 0, 'retrying': 0, 'failed': 0}
+        threads = self.concurrency if ids is None else max(1, min(self.concurrency, len(ids)))
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='email-outbox') as executor:
+            for counts in executor.map(lambda _: self._drain(ids), range(threads)):
+                for key, value in counts.items():
+                    totals[key] += value
+        return totals
+
+    def _drain(self, ids: Optional[List[int]]) -> Dict[str, int]:
+        counts = {'sent': 0, 'retrying': 0, 'failed': 0}
+        worker_id = _worker_id()
+        session = self.session_factory()
+        try:
+            while True:
+                messages = self.outbox.claim(worker_id, self.batch_size, ids)
+                if not messages:
+                    return counts
+                for index, message in enumerate(messages):
+                    try:
+                        result = self._send(session, message)
+                    except smtplib.SMTPAuthenticationError:
+                        # 认证失败与邮件无关：其余邮件放回队列，本线程停止（下次投递时重试）
+                        self.outbox.release(m['id'] for m in messages[index + 1:])
+                        counts['retrying'] += 1
+                        return counts
+                    counts[result] += 1
+        finally:
+            session.close()
+
+    def _send(self, session: SMTPSession, message: Dict) -> str:
+        """发送一封邮件并记录状态，返回 'sent' / 'retrying' / 'failed'"""
+        try:
+            refused = session.send(build_message(message, session.user))
+        except smtplib.SMTPAuthenticationError as e:
+            # 配置问题（账号 / 密码）：不计入该邮件的尝试次数，修正配置后仍会投递
+            self.outbox.release([message['id']], f"{type(e).__name__}: {e}")
+            logger.error(f"SMTP认证失败，邮件 #{message['id']} 已放回发件箱: {e}")
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            status = self.outbox.mark_failed(message['id'], error, permanent=_is_permanent(e))
+            logger.warning(f"邮件 #{message['id']} 发送至 {message['to_email']} 失败"
+                           f"（第{message['attempts']}次，{status}）: {error}")
+            return 'retrying' if status == 'pending' else 'failed'
+
+        self.outbox.mark_sent(message['id'], f"部分收件人被拒绝: {refused}" if refused else None)
+        if message.get('on_sent'):
+            try:
+                _resolve_hook(message['on_sent'])(message['ref_id'])
+            except Exception as e:
+                logger.error(f"邮件 #{message['id']} 已发送，回调 {message['on_sent']} 失败: {e}")
+        return 'sent'
+
+
+def deliver_outbox(ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """使用默认配置投递发件箱中到期的邮件"""
+    return OutboxWorker().deliver(ids)
@@ -0,0 +1,147 @@
+"""
+持久SMTP会话
+- SMTPSession：一次连接 + STARTTLS + 登录，之后多封邮件复用同一会话
+- 连接被服务器断开（空闲超时、421等）时自动重连并重发当前邮件一次
+- 空闲超过 EMAIL_SMTP_IDLE_SECONDS 的会话先重连再发送（服务器通常会关闭长时间空闲的连接）
+- shared_smtp_session()：进程内按 (host, port, user) 共享的会话，逐封发送的调用方（EmailService）使用
+
+环境变量：
+  SMTP_HOST / SMTP_PORT        默认 smtp.gmail.com / 587
+  SMTP_USER / SMTP_PASSWORD    默认读取 ADMIN_EMAIL / ADMIN_PASSWORD
+  SMTP_STARTTLS=0              关闭STARTTLS（本地测试服务器）
+  EMAIL_SMTP_IDLE_SECONDS      空闲重连阈值（默认 60）
+"""
+
+import os
+import smtplib
+import socket
+import threading
+import time
+from email.message import Message
+from typing import Dict, Optional, Tuple
+
+EMAIL_SMTP_IDLE_SECONDS = float(os.environ.get('EMAIL_SMTP_IDLE_SECONDS', '60'))
+
+# 发送失败后连接已不可用，需要重连
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
+# 服务器拒绝了这封邮件，但会话仍然可用
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def smtp_settings() -> Dict:
+    """从环境变量读取SMTP配置"""
+    return {
+        'host': os.environ.get('SMTP_HOST', 'smtp.gmail.com'),
+        'port': int(os.environ.get('SMTP_PORT', '587')),
+        'user': os.environ.get('SMTP_USER') or os.environ.get('ADMIN_EMAIL') or None,
+        'password': os.environ.get('SMTP_PASSWORD') or os.environ.get('ADMIN_PASSWORD') or None,
+        'starttls': os.environ.get('SMTP_STARTTLS', '1') != '0',
+    }
+
+
+class SMTPSession:
+    """持久的已认证SMTP连接（非线程安全：每个发送线程各持有一个，或在 lock 下使用）"""
+
+    def __init__(self, host: str = 'smtp.gmail.com', port: int = 587, user: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = True, timeout: float = 30.0,
+                 idle_timeout: float = EMAIL_SMTP_IDLE_SECONDS):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+        self.connections = 0
+        self.messages = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self.connections += 1
+
+    def _reset(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    def send(self, msg: Message) -> Dict[str, Tuple[int, bytes]]:
+        """
+        发送一封邮件；连接断开时重连并重发一次
+
+        Returns:
+            部分收件人被拒绝时为 {地址: (代码, 响应)}，全部成功为空字典
+        Raises:
+            smtplib.SMTPException / OSError：发送失败（收件人全部被拒绝、认证失败、重连后仍失败）
+        """
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._reset()
+
+        for attempt in (1, 2):
+            if self._server is None:
+                self._connect()
+            try:
+                refused = self._server.send_message(msg)
+                break
+            except _MESSAGE_ERRORS:
+                self._last_used = time.monotonic()
+                raise
+            except _CONNECTION_ERRORS:
+                self._reset()
+                if attempt == 2:
+                    raise
+            except Exception:
+                # 状态未知（如421后服务器关闭连接），下次发送前重连
+                self._reset()
+                raise
+
+        self._last_used = time.monotonic()
+        self.messages += 1
+        return refused
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_shared_sessions: Dict[tuple, SMTPSession] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_smtp_session(host: str, port: int, user: Optional[str], password: Optional[str],
+                        starttls: bool = True) -> SMTPSession:
+    """进程内共享的会话（使用时需持有 session.lock）；fork 后的子进程使用自己的会话"""
+    key = (os.getpid(), host, port, user, starttls)
+    session = _shared_sessions.get(key)
+    if session is None:
+        with _shared_lock:
+            session = _shared_sessions.setdefault(
+                key, SMTPSession(host, port, user, password, starttls=starttls))
+    return session
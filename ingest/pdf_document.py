@@ -0,0 +1,157 @@
+"""
+PDF文档缓存
+一次打开PDF，提取每页文本（表格按需提取一次），供银行识别、字段提取和各银行解析器共享。
+以文件内容哈希为键的LRU缓存，同一份上传文件重复解析时无需再次解码PDF。
+缓存命中的文档可能来自另一个（已删除或被覆盖的）上传路径，因此表格从缓存中保存的
+文件内容提取，而不是重新打开 file_path；表格提取后即释放文件内容。
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import pdfplumber
+
+PDF_DOCUMENT_CACHE_SIZE = int(os.environ.get('PDF_DOCUMENT_CACHE_SIZE', '32'))
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class CachedPage:
+    """与 pdfplumber Page 接口兼容的只读页面（extract_text / extract_tables）"""
+
+    def __init__(self, document: 'ParsedPDF', page_number: int, text: Optional[str], width: float, height: float):
+        self._document = document
+        self.page_number = page_number
+        self.text = text
+        self.width = width
+        self.height = height
+
+    def extract_text(self) -> Optional[str]:
+        return self.text
+
+    def extract_tables(self) -> List[list]:
+        return self._document.page_tables(self.page_number - 1)
+
+
+class ParsedPDF:
+    """
+    已解析的PDF文档
+    可以像 pdfplumber.open() 一样用于 with 语句，解析器代码无需改动页面访问方式
+    """
+
+    def __init__(self, file_path: str, content_hash: str, content: Optional[bytes] = None):
+        self.file_path = file_path
+        self.content_hash = content_hash
+        self.pages: List[CachedPage] = []
+        self._content = content
+        self._tables: Optional[List[List[list]]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, file_path: str, content_hash: str) -> 'ParsedPDF':
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        doc = cls(file_path, content_hash, content)
+        with pdfplumber.open(io.BytesIO(content)) as pdf:
+            for i, page in enumerate(pdf.pages):
+                doc.pages.append(CachedPage(doc, i + 1, page.extract_text(), page.width, page.height))
+        return doc
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def page_text(self, index: int) -> str:
+        if index >= len(self.pages):
+            return ''
+        return self.pages[index].text or ''
+
+    @property
+    def full_text(self) -> str:
+        return "\n".join(p.text for p in self.pages if p.text)
+
+    def page_tables(self, index: int) -> List[list]:
+        """表格提取开销大，首次请求时从缓存的文件内容一次性提取所有页面"""
+        if self._tables is None:
+            with self._lock:
+                if self._tables is None:
+                    with pdfplumber.open(io.BytesIO(self._content)) as pdf:
+                        self._tables = [page.extract_tables() for page in pdf.pages]
+                    self._content = None
+        if index >= len(self._tables):
+            return []
+        return self._tables[index]
+
+
+_cache: 'OrderedDict[str, ParsedPDF]' = OrderedDict()
+_hash_memo: Dict[tuple, str] = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def file_content_hash(file_path: str) -> str:
+    """SHA256内容哈希；按 (路径, 大小, mtime) 记忆，避免同一文件在一次解析中重复读取"""
+    st = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+    cached = _hash_memo.get(memo_key)
+    if cached:
+        return cached
+
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with _lock:
+        if len(_hash_memo) >= PDF_DOCUMENT_CACHE_SIZE * 4:
+            _hash_memo.clear()
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+def open_cached_pdf(file_path: str) -> ParsedPDF:
+    """
+    获取已解析的PDF文档（LRU缓存）
+    用法与 pdfplumber.open(file_path) 相同：with open_cached_pdf(path) as pdf: ...
+    """
+    content_hash = file_content_hash(file_path)
+
+    with _lock:
+        doc = _cache.get(content_hash)
+        if doc is not None:
+            _cache.move_to_end(content_hash)
+            _stats['hits'] += 1
+            return doc
+        _stats['misses'] += 1
+
+    doc = ParsedPDF.load(file_path, content_hash)
+
+    with _lock:
+        _cache[content_hash] = doc
+        _cache.move_to_end(content_hash)
+        while len(_cache) > PDF_DOCUMENT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return doc
+
+
+def clear_pdf_cache():
+    with _lock:
+        _cache.clear()
+        _hash_memo.clear()
+
+
+def get_pdf_cache_stats() -> Dict:
+    with _lock:
+        return {
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'size': len(_cache),
+            'max_size': PDF_DOCUMENT_CACHE_SIZE,
+        }
@@ -147,6 +147,43 @@ def apply_balance_change_algorithm(temp_transactions: List[Dict], prev_balance:
     
     return final_transactions
 
+# 各银行解析器输出的日期格式（DD-MM-YYYY、DD MMM YYYY、DD/MM/YYYY、YYYY-MM-DD 等）
+SAVINGS_DATE_FORMATS = (
+    '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d %b %Y', '%d-%b-%Y',
+    '%d-%m-%y', '%d/%m/%y', '%d %b %y', '%d-%b-%y',
+)
+
+def normalize_savings_date(date_str) -> Optional[str]:
+    """
+    把交易日期统一为ISO格式（YYYY-MM-DD），无法识别时返回None
+    
+    transaction_date 保留原文；txn_date / txn_month 列保存本函数的结果，用于按日期范围查询
+    """
+    if not date_str:
+        return None
+    
+    value = ' '.join(str(date_str).split())
+    # 带时间的ISO日期（YYYY-MM-DD HH:MM:SS）只取日期部分
+    if re.match(r'^\d{4}-\d{2}-\d{2}[ T]', value):
+        value = value[:10]
+    # 月份全称或非标准缩写（Sept）取前3个字母
+    value = re.sub(r'^(\d{1,2})([ -])([A-Za-z]{3})[A-Za-z]*([ -]\d{2,4})$', r'\1\2\3\4', value)
+    
+    for fmt in SAVINGS_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+def add_canonical_dates(transactions: List[Dict]) -> List[Dict]:
+    """为每笔交易补充 txn_date（YYYY-MM-DD）和 txn_month（YYYY-MM）"""
+    for txn in transactions:
+        txn_date = normalize_savings_date(txn.get('date') or txn.get('transaction_date'))
+        txn['txn_date'] = txn_date
+        txn['txn_month'] = txn_date[:7] if txn_date else None
+    return transactions
+
 def parse_savings_statement(file_path: str, bank_name: str = '') -> Tuple[Dict, List[Dict]]:
     """
     解析储蓄账户月结单
@@ -156,7 +193,7 @@ def parse_savings_statement(file_path: str, bank_name: str = '') -> Tuple[Dict,
         bank_name: 银行名称（可选，用于指定解析器）
     
     Returns:
-        (statement_info, transactions) - 账单信息和交易列表
+        (statement_info, transactions) - 账单信息和交易列表（含 txn_date / txn_month）
     """
     
     # 自动检测银行
@@ -176,7 +213,8 @@ def parse_savings_statement(file_path: str, bank_name: str = '') -> Tuple[Dict,
     }
     
     parser = bank_parsers.get(bank_name, parse_generic_savings)
-    return parser(file_path)
+    info, transactions = parser(file_path)
+    return info, add_canonical_dates(transactions)
 
 def detect_bank_from_file(file_path: str) -> str:
     """从文件名或内容自动检测银行"""
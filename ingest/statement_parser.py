@@ -9,6 +9,7 @@ import pytesseract
 from PIL import Image
 import logging
 from services.fallback_parser import parse_statement_fallback
+from ingest.pdf_document import open_cached_pdf
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -30,7 +31,7 @@ def detect_bank(file_path):
     try:
         ext = os.path.splitext(file_path.lower())[1]
         if ext == ".pdf":
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = pdf.pages[0].extract_text()
 
                 if text and len(text.strip()) > 50:
@@ -150,7 +151,7 @@ def parse_cimb_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
             # Pattern to detect CR marker
             pattern = r'(\d{1,2}/\d{1,2})\s+([A-Za-z\s]+?)\s+([\d,]+\.\d{2})\s*(CR)?'
@@ -189,7 +190,7 @@ def parse_maybank_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
 
             pattern = r"(\d{2}/\d{2})\s+\d{2}/\d{2}\s+(.+?)\s+([\d,]+\.\d{2})\s*(CR)?\s*$"
@@ -241,7 +242,7 @@ def parse_public_bank_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
 
             pattern = r"(\d{2}/\d{2}/\d{2,4})\s+(.+?)\s+([\d,]+\.\d{2})\s*(CR)?"
@@ -287,7 +288,7 @@ def parse_rhb_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
 
             pattern = r"(\d{2}/\d{2})\s+([A-Z\s\-&.,]+?)\s+([\d,]+\.\d{2})\s*(CR)?"
@@ -328,7 +329,7 @@ def parse_hong_leong_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None, "previous_balance": 0.0}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 full_text = "\n".join(p.extract_text() for p in pdf.pages)
 
                 # Extract statement date - "Statement Date\nTarikh Penyata   16 JUN 2025"
@@ -440,7 +441,7 @@ def parse_ambank_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None, "previous_balance": 0.0}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 full_text = "\n".join(p.extract_text() for p in pdf.pages)
 
                 # Extract statement date - "Statement Date / Tarikh Penyata  28 MAY 25"
@@ -533,7 +534,7 @@ def parse_alliance_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None, "due_date": None, "due_amount": None, "minimum_payment": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 full_text = "\n".join(p.extract_text() for p in pdf.pages)
 
             # Extract target card last 4 digits from file path
@@ -703,7 +704,7 @@ def parse_affin_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
 
             pattern = r"(\d{2}/\d{2})\s+(.+?)\s+([\d,]+\.\d{2})\s*(CR)?"
@@ -744,7 +745,7 @@ def parse_hsbc_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None, "previous_balance": 0.0}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 full_text = "\n".join(p.extract_text() for p in pdf.pages if p.extract_text())
 
                 # Check if PDF is scanned image (no text layer)
@@ -849,7 +850,7 @@ def parse_standard_chartered_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None, "previous_balance": 0.0}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 full_text = "\n".join(p.extract_text() for p in pdf.pages)
 
                 # Extract statement date - "Statement Date / Tarikh Penyata: 14 May 2025"
@@ -952,7 +953,7 @@ def parse_ocbc_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None, "previous_balance": 0.0}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 full_text = "\n".join(p.extract_text() for p in pdf.pages)
 
                 # Extract statement date - "Statement Date 13 May 2025"
@@ -1040,7 +1041,7 @@ def parse_uob_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": "UOB", "previous_balance": 0.0}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 full_text = "\n".join(p.extract_text() for p in pdf.pages)
 
                 # Extract card number
@@ -1191,7 +1192,7 @@ def parse_bank_islam_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
 
             pattern = r"(\d{2}/\d{2})\s+(.+?)\s+([\-]?\d{1,3}(?:,\d{3})*\.\d{2})"
@@ -1220,7 +1221,7 @@ def parse_bank_rakyat_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
 
             pattern = r"(\d{2}/\d{2})\s+(.+?)\s+([\-]?\d{1,3}(?:,\d{3})*\.\d{2})"
@@ -1249,7 +1250,7 @@ def parse_bank_muamalat_statement(file_path):
     transactions, info = [], {"statement_date": None, "total": 0.0, "card_last4": None}
     try:
         if file_path.endswith(".pdf"):
-            with pdfplumber.open(file_path) as pdf:
+            with open_cached_pdf(file_path) as pdf:
                 text = "\n".join(p.extract_text() for p in pdf.pages)
 
             pattern = r"(\d{2}/\d{2})\s+(.+?)\s+([\-]?\d{1,3}(?:,\d{3})*\.\d{2})"
@@ -1290,10 +1291,11 @@ def parse_statement_auto(file_path):
     
     if ext == '.pdf':
         # 使用新的PDF字段提取器
+        bank = None
         try:
             from pdf_field_extractor import PDFFieldExtractor
             
-            # 检测银行
+            # 检测银行（PDF只解码一次，后续步骤共享缓存的页面文本）
             bank = detect_bank(file_path)
             
             # 提取4个关键字段
@@ -1303,7 +1305,7 @@ def parse_statement_auto(file_path):
             # 提取卡号后4位（保留原有逻辑）
             card_last4 = None
             try:
-                with pdfplumber.open(file_path) as pdf:
+                with open_cached_pdf(file_path) as pdf:
                     text = pdf.pages[0].extract_text()
                     # 尝试多种模式匹配卡号
                     patterns = [
@@ -1344,7 +1346,7 @@ def parse_statement_auto(file_path):
             # ⚠️ 禁止fallback到旧解析器（可能包含计算值）
             # 返回空数据，标记为需要人工处理
             return {
-                'bank': detect_bank(file_path),
+                'bank': bank if bank is not None else detect_bank(file_path),
                 'card_last4': None,
                 'statement_date': None,
                 'due_date': None,
@@ -5,5 +5,9 @@ Credit Card Recommendations Module
 
 from .spending_analyzer import SpendingAnalyzer
 from .card_recommendation_engine import CardRecommendationEngine
+from .card_feature_index import CardFeatureIndex, get_card_feature_index
 
-__all__ = ['SpendingAnalyzer', 'CardRecommendationEngine']
+__all__ = [
+    'SpendingAnalyzer', 'CardRecommendationEngine',
+    'CardFeatureIndex', 'get_card_feature_index',
+]
@@ -6,13 +6,15 @@ Benefit Calculator for Credit Card Recommendations
 """
 
 from typing import Dict, List
-import re
 import sqlite3
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from modules.recommendations.spending_analyzer import SpendingAnalyzer
+from modules.recommendations.card_feature_index import (
+    extract_annual_fee, extract_benefit_value, extract_cashback_rates, get_card_feature_index,
+)
 
 
 class BenefitCalculator:
@@ -35,28 +37,19 @@ class BenefitCalculator:
         """
         spending_profile = self.analyzer.get_spending_profile(customer_id)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        features = get_card_feature_index(self.db_path).features_for(card_id)
+        if features is None:
+            # 未启用的产品不在特征索引中，直接解析
+            features = self._load_card_features(card_id)
+            if features is None:
+                return {'error': 'Card not found'}
         
-        cursor.execute('''
-            SELECT bank_name, card_name, benefits, usage_tips
-            FROM credit_card_products
-            WHERE id = ?
-        ''', (card_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result:
-            return {'error': 'Card not found'}
-        
-        bank, card_name, benefits, tips = result
-        
-        cashback_rates = self._extract_cashback_rates(benefits, tips)
+        bank, card_name = features['bank'], features['card_name']
+        cashback_rates = {'general': features['cashback_rate']}
         
         annual_cashback = self._calculate_annual_cashback(spending_profile, cashback_rates)
-        annual_fee = self._extract_annual_fee(benefits, card_name)
-        benefit_value = self._calculate_benefit_value(benefits, spending_profile)
+        annual_fee = features['annual_fee']
+        benefit_value = features['benefit_value']
         
         net_benefit = annual_cashback + benefit_value - annual_fee
         
@@ -108,37 +101,35 @@ class BenefitCalculator:
             'recommendation': self._get_recommendation_message(savings)
         }
     
+    def _load_card_features(self, card_id: int) -> Dict:
+        """从数据库读取单张卡并解析收益特征；卡不存在时返回None"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT bank_name, card_name, benefits, usage_tips
+            FROM credit_card_products
+            WHERE id = ?
+        ''', (card_id,))
+        
+        result = cursor.fetchone()
+        conn.close()
+        
+        if not result:
+            return None
+        
+        bank, card_name, benefits, tips = result
+        return {
+            'bank': bank,
+            'card_name': card_name,
+            'cashback_rate': self._extract_cashback_rates(benefits, tips).get('general', 0.005),
+            'annual_fee': self._extract_annual_fee(benefits, card_name),
+            'benefit_value': self._calculate_benefit_value(benefits, {}),
+        }
+    
     def _extract_cashback_rates(self, benefits: str, tips: str) -> Dict:
         """从福利描述中提取返现比率"""
-        if not benefits:
-            return {}
-        
-        text = (benefits + ' ' + (tips or '')).lower()
-        rates = {}
-        
-        cashback_patterns = [
-            (r'(\d+)%\s*返现', 'general'),
-            (r'(\d+)%\s*cashback', 'general'),
-        ]
-        
-        for pattern, category in cashback_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                rate = max([int(m) for m in matches])
-                rates[category] = rate / 100
-        
-        if '5%' in text or '10%' in text or '15%' in text:
-            rates['general'] = 0.05
-        elif '3%' in text or '8%' in text:
-            rates['general'] = 0.03
-        elif '2%' in text:
-            rates['general'] = 0.02
-        elif '1%' in text:
-            rates['general'] = 0.01
-        else:
-            rates['general'] = 0.005
-        
-        return rates
+        return extract_cashback_rates(benefits, tips)
     
     def _calculate_annual_cashback(self, spending_profile: Dict, cashback_rates: Dict) -> float:
         """计算年度返现金额"""
@@ -156,49 +147,11 @@ class BenefitCalculator:
     
     def _extract_annual_fee(self, benefits: str, card_name: str) -> float:
         """提取年费"""
-        if not benefits:
-            return 100
-        
-        text = (benefits + ' ' + card_name).lower()
-        
-        if '终身免年费' in text or 'lifetime free' in text or '免年费' in text:
-            return 0
-        
-        fee_patterns = [
-            r'rm\s*(\d+)',
-            r'年费.*?(\d+)',
-        ]
-        
-        for pattern in fee_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                return float(matches[0])
-        
-        if 'platinum' in text or 'infinite' in text:
-            return 300
-        elif 'gold' in text:
-            return 150
-        else:
-            return 100
+        return extract_annual_fee(benefits, card_name)
     
     def _calculate_benefit_value(self, benefits: str, spending_profile: Dict) -> float:
         """计算额外福利价值"""
-        if not benefits:
-            return 0
-        
-        text = benefits.lower()
-        value = 0
-        
-        if 'lounge' in text or '贵宾厅' in text:
-            value += 200
-        
-        if 'insurance' in text or '保险' in text or 'takaful' in text:
-            value += 150
-        
-        if '积分' in text or 'points' in text:
-            value += 100
-        
-        return value
+        return extract_benefit_value(benefits)
     
     def _get_cashback_breakdown(self, spending_profile: Dict, cashback_rates: Dict) -> Dict:
         """获取返现明细"""
@@ -0,0 +1,352 @@
+"""
+信用卡产品特征索引
+Card Product Feature Index
+
+把 credit_card_products 的自由文本（benefits / usage_tips / card_name）解析一次，
+得到每张卡的结构化特征：
+- 各消费类别的关键词匹配（产品 × 类别 矩阵）
+- 返现档位加分、年费得分、福利得分、资格档次
+- 返现比率、年费金额、福利价值（收益计算器使用）
+
+索引按数据库路径缓存在进程内，以产品目录版本号判断是否过期：credit_card_products 上的触发器
+在每次新增 / 修改 / 删除时递增 card_product_catalog_version（任何进程、任何写入路径都生效），
+版本变化时自动重建，写入方无需手动失效缓存。
+推荐评分因此变成对特征矩阵的向量运算，不再逐卡重复做字符串与正则匹配。
+"""
+
+from typing import Dict, List, Optional, Tuple
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+# 推荐评分使用的消费类别及关键词（与 SpendingAnalyzer.get_spending_profile 的键一致）
+CATEGORY_KEYWORDS = {
+    'dining': ['餐饮', 'dining', 'restaurant', '餐厅'],
+    'grocery': ['杂货', 'grocery', 'supermarket', '超市'],
+    'petrol': ['加油', 'petrol', 'fuel', '油站'],
+    'online': ['线上', 'online', '网购', 'ecommerce'],
+    'travel': ['旅行', 'travel', 'hotel', 'flight', '海外'],
+    'entertainment': ['娱乐', 'entertainment', 'movie', 'cinema'],
+}
+CATEGORIES = tuple(CATEGORY_KEYWORDS)
+
+BENEFIT_KEYWORDS = {
+    'lounge': ['贵宾厅', 'lounge', 'plaza premium'],
+    'insurance': ['保险', 'insurance', 'takaful'],
+    'points': ['积分', 'points', 'rewards'],
+    'miles': ['里程', 'miles', '航空'],
+    'discounts': ['折扣', 'discount', '优惠'],
+}
+
+# 资格档次 × 客户层级 → 资格得分
+ELIGIBILITY_CLASSES = ('premium', 'gold', 'basic', 'standard')
+CUSTOMER_TIERS = ('Silver', 'Gold', 'Platinum')
+ELIGIBILITY_SCORES = np.array([
+    # Silver, Gold, Platinum
+    [40, 70, 100],    # premium: platinum / infinite / world
+    [80, 100, 100],   # gold
+    [100, 100, 100],  # basic: classic / basic
+    [85, 85, 85],     # standard
+], dtype=float)
+
+
+# ============================================================
+# 单卡特征提取（文本解析只在建索引时执行）
+# ============================================================
+
+def _cashback_bonus(text: str) -> float:
+    if '5%' in text or '10%' in text or '15%' in text:
+        return 20
+    elif '3%' in text or '8%' in text:
+        return 15
+    elif '返现' in text or 'cashback' in text or '积分' in text or 'points' in text:
+        return 10
+    return 0
+
+
+def _fee_score(benefits: str, name: str) -> float:
+    """年费得分（免年费得分更高）(0-100)"""
+    if not benefits:
+        return 50
+
+    text = (benefits + ' ' + name).lower()
+
+    if '终身免年费' in text or 'lifetime free' in text:
+        return 100
+    elif '免年费' in text or 'free' in text:
+        return 90
+    elif '首年免' in text or 'first year free' in text:
+        return 70
+    elif 'rm90' in text or 'rm100' in text or 'rm150' in text:
+        return 60
+    elif 'rm200' in text or 'rm300' in text:
+        return 40
+    elif 'rm500' in text or 'rm600' in text:
+        return 20
+    else:
+        return 50
+
+
+def _benefit_score(text: str) -> float:
+    score = sum(20 for kw_list in BENEFIT_KEYWORDS.values() if any(kw in text for kw in kw_list))
+    return min(score, 100)
+
+
+def _eligibility_class(name: str, benefits: str) -> str:
+    text = (name + ' ' + (benefits or '')).lower()
+
+    if 'platinum' in text or 'infinite' in text or 'world' in text:
+        return 'premium'
+    elif 'gold' in text:
+        return 'gold'
+    elif 'classic' in text or 'basic' in text:
+        return 'basic'
+    return 'standard'
+
+
+def extract_cashback_rates(benefits: str, tips: str) -> Dict:
+    """从福利描述中提取返现比率"""
+    if not benefits:
+        return {}
+
+    text = (benefits + ' ' + (tips or '')).lower()
+    rates = {}
+
+    cashback_patterns = [
+        (r'(\d+)%\s*返现', 'general'),
+        (r'(\d+)%\s*cashback', 'general'),
+    ]
+
+    for pattern, category in cashback_patterns:
+        matches = re.findall(pattern, text)
+        if matches:
+            rate = max([int(m) for m in matches])
+            rates[category] = rate / 100
+
+    if '5%' in text or '10%' in text or '15%' in text:
+        rates['general'] = 0.05
+    elif '3%' in text or '8%' in text:
+        rates['general'] = 0.03
+    elif '2%' in text:
+        rates['general'] = 0.02
+    elif '1%' in text:
+        rates['general'] = 0.01
+    else:
+        rates['general'] = 0.005
+
+    return rates
+
+
+def extract_annual_fee(benefits: str, card_name: str) -> float:
+    """提取年费"""
+    if not benefits:
+        return 100
+
+    text = (benefits + ' ' + card_name).lower()
+
+    if '终身免年费' in text or 'lifetime free' in text or '免年费' in text:
+        return 0
+
+    fee_patterns = [
+        r'rm\s*(\d+)',
+        r'年费.*?(\d+)',
+    ]
+
+    for pattern in fee_patterns:
+        matches = re.findall(pattern, text)
+        if matches:
+            return float(matches[0])
+
+    if 'platinum' in text or 'infinite' in text:
+        return 300
+    elif 'gold' in text:
+        return 150
+    else:
+        return 100
+
+
+def extract_benefit_value(benefits: str) -> float:
+    """额外福利的年度价值"""
+    if not benefits:
+        return 0
+
+    text = benefits.lower()
+    value = 0
+
+    if 'lounge' in text or '贵宾厅' in text:
+        value += 200
+
+    if 'insurance' in text or '保险' in text or 'takaful' in text:
+        value += 150
+
+    if '积分' in text or 'points' in text:
+        value += 100
+
+    return value
+
+
+def extract_card_features(name: str, benefits: str, tips: str) -> Dict:
+    """解析一张卡的全部特征"""
+    name = name or ''
+    text = ((benefits or '') + ' ' + (tips or '')).lower()
+    return {
+        'has_benefits': bool(benefits),
+        'category_match': [any(kw in text for kw in CATEGORY_KEYWORDS[c]) for c in CATEGORIES],
+        'cashback_bonus': _cashback_bonus(text),
+        'fee_score': _fee_score(benefits, name),
+        'benefit_score': _benefit_score(text),
+        'eligibility_class': _eligibility_class(name, benefits),
+        'cashback_rate': extract_cashback_rates(benefits, tips).get('general', 0.005),
+        'annual_fee': extract_annual_fee(benefits, name),
+        'benefit_value': extract_benefit_value(benefits),
+    }
+
+
+# ============================================================
+# 索引
+# ============================================================
+
+class CardFeatureIndex:
+    """已启用信用卡产品的特征矩阵"""
+
+    def __init__(self, rows: List[Tuple], version: Optional[int] = None):
+        """
+        Args:
+            rows: (id, bank_name, card_name, benefits, usage_tips)
+            version: 构建时的产品目录版本号
+        """
+        self.version = version
+        self.card_ids = [row[0] for row in rows]
+        self.banks = [row[1] for row in rows]
+        self.names = [row[2] for row in rows]
+        self.benefits = [row[3] for row in rows]
+        self.tips = [row[4] for row in rows]
+        self.position = {card_id: i for i, card_id in enumerate(self.card_ids)}
+
+        features = [extract_card_features(row[2], row[3], row[4]) for row in rows]
+        size = len(rows)
+        self.has_benefits = np.array([f['has_benefits'] for f in features], dtype=bool)
+        self.category_match = np.array([f['category_match'] for f in features],
+                                        dtype=float).reshape(size, len(CATEGORIES))
+        self.cashback_bonus = np.array([f['cashback_bonus'] for f in features], dtype=float)
+        self.fee_score = np.array([f['fee_score'] for f in features], dtype=float)
+        self.benefit_score = np.where(self.has_benefits,
+                                      np.array([f['benefit_score'] for f in features], dtype=float), 30)
+        self.eligibility_class = np.array([ELIGIBILITY_CLASSES.index(f['eligibility_class']) for f in features],
+                                          dtype=int)
+        self.cashback_rate = np.array([f['cashback_rate'] for f in features], dtype=float)
+        self.annual_fee = np.array([f['annual_fee'] for f in features], dtype=float)
+        self.benefit_value = np.array([f['benefit_value'] for f in features], dtype=float)
+
+    def __len__(self):
+        return len(self.card_ids)
+
+    def features_for(self, card_id: int) -> Optional[Dict]:
+        """单张卡的收益相关特征；卡不在索引中（未启用）时返回None"""
+        i = self.position.get(card_id)
+        if i is None:
+            return None
+        return {
+            'bank': self.banks[i],
+            'card_name': self.names[i],
+            'cashback_rate': float(self.cashback_rate[i]),
+            'annual_fee': float(self.annual_fee[i]),
+            'benefit_value': float(self.benefit_value[i]),
+        }
+
+    def score(self, category_spending: np.ndarray, tiers: np.ndarray, weights: Dict) -> Dict[str, np.ndarray]:
+        """
+        客户 × 产品 评分矩阵
+
+        Args:
+            category_spending: 客户 × CATEGORIES 的月均消费
+            tiers: 每个客户的层级下标（CUSTOMER_TIERS）
+            weights: CardRecommendationEngine.SCORING_WEIGHTS
+
+        Returns:
+            各项得分及总分，形状均为 (客户数, 产品数)
+        """
+        customers = category_spending.shape[0]
+        active = (category_spending > 0).astype(float)
+
+        cashback = np.minimum(active @ self.category_match.T * 15 + self.cashback_bonus, 100)
+        cashback = np.where(self.has_benefits, cashback, 30)
+        fee = np.broadcast_to(self.fee_score, (customers, len(self)))
+        benefit = np.broadcast_to(self.benefit_score, (customers, len(self)))
+        eligibility = ELIGIBILITY_SCORES[self.eligibility_class][:, tiers].T
+
+        total = (
+            cashback * weights['cashback_match'] / 100 +
+            fee * weights['annual_fee'] / 100 +
+            benefit * weights['benefits'] / 100 +
+            eligibility * weights['eligibility'] / 100
+        )
+        return {
+            'total': total,
+            'cashback_match': cashback,
+            'annual_fee': fee,
+            'benefits': benefit,
+            'eligibility': eligibility,
+        }
+
+
+_VERSION_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS card_product_catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO card_product_catalog_version (id, version) VALUES (1, 1);
+CREATE TRIGGER IF NOT EXISTS credit_card_products_version_ai AFTER INSERT ON credit_card_products BEGIN
+    UPDATE card_product_catalog_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS credit_card_products_version_au AFTER UPDATE ON credit_card_products BEGIN
+    UPDATE card_product_catalog_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS credit_card_products_version_ad AFTER DELETE ON credit_card_products BEGIN
+    UPDATE card_product_catalog_version SET version = version + 1 WHERE id = 1;
+END;
+'''
+
+_indexes: Dict[str, CardFeatureIndex] = {}
+_lock = threading.Lock()
+
+
+def get_catalog_version(conn: sqlite3.Connection) -> int:
+    """产品目录版本号（首次调用时创建版本表与 credit_card_products 上的触发器）"""
+    try:
+        row = conn.execute('SELECT version FROM card_product_catalog_version WHERE id = 1').fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row is None:
+        conn.executescript(_VERSION_SCHEMA)
+        row = conn.execute('SELECT version FROM card_product_catalog_version WHERE id = 1').fetchone()
+    return row[0]
+
+
+def get_card_feature_index(db_path: str, conn: Optional[sqlite3.Connection] = None) -> CardFeatureIndex:
+    """产品特征索引（产品目录版本未变化时复用进程内缓存）"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(db_path)
+    try:
+        version = get_catalog_version(conn)
+        index = _indexes.get(db_path)
+        if index is not None and index.version == version:
+            return index
+
+        rows = conn.execute('''
+            SELECT id, bank_name, card_name, benefits, usage_tips
+            FROM credit_card_products
+            WHERE is_active = 1
+        ''').fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+
+    index = CardFeatureIndex(rows, version)
+    with _lock:
+        _indexes[db_path] = index
+    return index
+
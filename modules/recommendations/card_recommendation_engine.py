@@ -6,14 +6,20 @@ Credit Card Recommendation Engine
 使用100分制评分系统
 """
 
-from typing import Dict, List, Tuple
+from datetime import datetime
+from typing import Dict, List, Optional
+import json
 import sqlite3
-import re
 import sys
 import os
 
+import numpy as np
+
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from modules.recommendations.spending_analyzer import SpendingAnalyzer
+from modules.recommendations.card_feature_index import (
+    CATEGORIES, CUSTOMER_TIERS, CardFeatureIndex, get_card_feature_index,
+)
 
 
 class CardRecommendationEngine:
@@ -34,6 +40,9 @@ class CardRecommendationEngine:
         """
         为客户推荐信用卡
         
+        优先使用每日批量任务保存的结果（customer_card_recommendations）；没有保存结果、
+        产品目录已变化、客户的账单 / 交易已变化或保存的条数不足时实时计算
+        
         Args:
             customer_id: 客户ID
             top_n: 返回推荐数量
@@ -41,172 +50,200 @@ class CardRecommendationEngine:
         Returns:
             推荐卡列表，按评分排序
         """
+        saved = self.get_saved_recommendations(customer_id, top_n)
+        if saved is not None:
+            return saved
         spending_profile = self.analyzer.get_spending_profile(customer_id)
-        customer_tier = self.analyzer.get_customer_tier(customer_id)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, bank_name, card_name, benefits, usage_tips
-            FROM credit_card_products
-            WHERE is_active = 1
-        ''')
-        
-        all_cards = cursor.fetchall()
-        
-        cursor.execute('SELECT monthly_income FROM customers WHERE id = ?', (customer_id,))
-        result = cursor.fetchone()
-        monthly_income = result[0] if result else 0
-        
-        conn.close()
-        
-        scored_cards = []
-        
-        for card_id, bank, name, benefits, tips in all_cards:
-            score, breakdown = self._score_card(
-                card_id, bank, name, benefits, tips,
-                spending_profile, monthly_income, customer_tier
-            )
-            
-            scored_cards.append({
-                'card_id': card_id,
-                'bank': bank,
-                'card_name': name,
-                'score': score,
-                'score_breakdown': breakdown,
-                'benefits': benefits,
-                'usage_tips': tips
-            })
-        
-        scored_cards.sort(key=lambda x: x['score'], reverse=True)
-        
-        return scored_cards[:top_n]
+        return self._recommend({customer_id: spending_profile}, top_n)[customer_id]
     
-    def _score_card(self, card_id: int, bank: str, name: str, benefits: str, 
-                    tips: str, spending_profile: Dict, income: float, tier: str) -> Tuple[float, Dict]:
+    def recommend_for_customers(self, customer_ids: Optional[List[int]] = None, top_n: int = 5) -> Dict[int, List[Dict]]:
         """
-        评分单张信用卡
+        批量推荐（整个客户群一次完成）：消费档案一次分组查询，评分为 客户 × 产品 矩阵运算
+        
+        Args:
+            customer_ids: 客户ID列表；None 表示所有有信用卡消费的客户
+            top_n: 每个客户的推荐数量
         
         Returns:
-            (总分, 评分明细)
+            {customer_id: 推荐卡列表}
         """
-        cashback_score = self._score_cashback_match(benefits, tips, spending_profile)
-        fee_score = self._score_annual_fee(benefits, name)
-        benefit_score = self._score_benefits(benefits, tips)
-        eligibility_score = self._score_eligibility(name, benefits, income, tier)
-        
-        total_score = (
-            cashback_score * self.SCORING_WEIGHTS['cashback_match'] / 100 +
-            fee_score * self.SCORING_WEIGHTS['annual_fee'] / 100 +
-            benefit_score * self.SCORING_WEIGHTS['benefits'] / 100 +
-            eligibility_score * self.SCORING_WEIGHTS['eligibility'] / 100
-        )
+        profiles = self.analyzer.get_spending_profiles(customer_ids)
+        return self._recommend(profiles, top_n)
+    
+    def _recommend(self, profiles: Dict[int, Dict], top_n: int) -> Dict[int, List[Dict]]:
+        index = get_card_feature_index(self.db_path)
+        customer_ids = list(profiles)
+        if not customer_ids:
+            return {}
+        
+        spending = np.array([[profiles[c].get(category, 0) for category in CATEGORIES] for c in customer_ids],
+                            dtype=float).reshape(len(customer_ids), len(CATEGORIES))
+        tiers = np.array([
+            CUSTOMER_TIERS.index(self.analyzer.tier_for_monthly_average(profiles[c]['total_monthly']))
+            for c in customer_ids
+        ], dtype=int)
+        scores = index.score(spending, tiers, self.SCORING_WEIGHTS)
+        ranking_scores = np.round(scores['total'], 2)
         
-        breakdown = {
-            'cashback_match': round(cashback_score, 1),
-            'annual_fee': round(fee_score, 1),
-            'benefits': round(benefit_score, 1),
-            'eligibility': round(eligibility_score, 1)
+        return {
+            customer_id: self._top_cards(index, scores, ranking_scores, row, top_n)
+            for row, customer_id in enumerate(customer_ids)
         }
-        
-        return round(total_score, 2), breakdown
     
-    def _score_cashback_match(self, benefits: str, tips: str, profile: Dict) -> float:
-        """评分返现/奖励匹配度 (0-100)"""
-        if not benefits:
-            return 30
-        
-        text = (benefits + ' ' + (tips or '')).lower()
-        score = 0
-        
-        keywords = {
-            'dining': ['餐饮', 'dining', 'restaurant', '餐厅'],
-            'grocery': ['杂货', 'grocery', 'supermarket', '超市'],
-            'petrol': ['加油', 'petrol', 'fuel', '油站'],
-            'online': ['线上', 'online', '网购', 'ecommerce'],
-            'travel': ['旅行', 'travel', 'hotel', 'flight', '海外'],
-            'entertainment': ['娱乐', 'entertainment', 'movie', 'cinema'],
+    @staticmethod
+    def _card_entry(index: CardFeatureIndex, i: int, score: float, score_breakdown: Dict) -> Dict:
+        return {
+            'card_id': index.card_ids[i],
+            'bank': index.banks[i],
+            'card_name': index.names[i],
+            'score': score,
+            'score_breakdown': score_breakdown,
+            'benefits': index.benefits[i],
+            'usage_tips': index.tips[i]
         }
-        
-        for category, kw_list in keywords.items():
-            if profile.get(category, 0) > 0:
-                if any(kw in text for kw in kw_list):
-                    score += 15
-        
-        if '5%' in text or '10%' in text or '15%' in text:
-            score += 20
-        elif '3%' in text or '8%' in text:
-            score += 15
-        elif '返现' in text or 'cashback' in text or '积分' in text or 'points' in text:
-            score += 10
-        
-        return min(score, 100)
     
-    def _score_annual_fee(self, benefits: str, name: str) -> float:
-        """评分年费（免年费得分更高）(0-100)"""
-        if not benefits:
-            return 50
-        
-        text = (benefits + ' ' + name).lower()
+    def _top_cards(self, index: CardFeatureIndex, scores: Dict[str, np.ndarray],
+                   ranking_scores: np.ndarray, row: int, top_n: int) -> List[Dict]:
+        """一个客户的前 top_n 张卡（同分保持产品目录顺序）"""
+        order = np.argsort(-ranking_scores[row], kind='stable')[:top_n]
+        return [
+            self._card_entry(index, i, round(float(scores['total'][row, i]), 2), {
+                key: round(float(scores[key][row, i]), 1)
+                for key in ('cashback_match', 'annual_fee', 'benefits', 'eligibility')
+            })
+            for i in order
+        ]
+    
+    @staticmethod
+    def _ensure_saved_table(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS customer_card_recommendations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_id INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                card_product_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                score_breakdown TEXT,
+                catalog_version INTEGER,
+                data_watermark TEXT,
+                generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(customer_card_recommendations)')}
+        if 'catalog_version' not in columns:
+            conn.execute('ALTER TABLE customer_card_recommendations ADD COLUMN catalog_version INTEGER')
+        if 'data_watermark' not in columns:
+            conn.execute('ALTER TABLE customer_card_recommendations ADD COLUMN data_watermark TEXT')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_customer_card_recommendations_customer
+            ON customer_card_recommendations(customer_id, rank)
+        ''')
+    
+    @staticmethod
+    def _data_watermarks(conn, customer_ids: Optional[List[int]] = None) -> Dict[int, str]:
+        """
+        客户账单 / 交易数据的水位：最新账单ID、最新交易ID、交易笔数与金额合计
         
-        if '终身免年费' in text or 'lifetime free' in text:
-            return 100
-        elif '免年费' in text or 'free' in text:
-            return 90
-        elif '首年免' in text or 'first year free' in text:
-            return 70
-        elif 'rm90' in text or 'rm100' in text or 'rm150' in text:
-            return 60
-        elif 'rm200' in text or 'rm300' in text:
-            return 40
-        elif 'rm500' in text or 'rm600' in text:
-            return 20
+        新增、删除账单或交易以及修改金额都会改变水位，保存的推荐随之失效
+        """
+        sql = '''
+            SELECT cc.customer_id, MAX(s.id), MAX(t.id), COUNT(t.id), TOTAL(t.amount)
+            FROM credit_cards cc
+            JOIN statements s ON s.card_id = cc.id
+            LEFT JOIN transactions t ON t.statement_id = s.id
+        '''
+        if customer_ids is None:
+            batches = [(sql + ' GROUP BY cc.customer_id', [])]
         else:
-            return 50
+            batches = [
+                (sql + f" WHERE cc.customer_id IN ({','.join('?' * len(chunk))}) GROUP BY cc.customer_id", chunk)
+                for chunk in (customer_ids[i:i + 500] for i in range(0, len(customer_ids), 500))
+            ]
+        watermarks = {}
+        for batch_sql, params in batches:
+            for customer_id, statement_id, transaction_id, count, total in conn.execute(batch_sql, params):
+                watermarks[customer_id] = f'{statement_id}:{transaction_id}:{count}:{round(total, 2)}'
+        return watermarks
     
-    def _score_benefits(self, benefits: str, tips: str) -> float:
-        """评分额外福利 (0-100)"""
-        if not benefits:
-            return 30
-        
-        text = (benefits + ' ' + (tips or '')).lower()
-        score = 0
+    def refresh_saved_recommendations(self, customer_ids: Optional[List[int]] = None, top_n: int = 5) -> Dict:
+        """
+        批量生成推荐并保存到 customer_card_recommendations，记录生成时的产品目录版本与客户数据水位
         
-        benefit_keywords = {
-            'lounge': ['贵宾厅', 'lounge', 'plaza premium'],
-            'insurance': ['保险', 'insurance', 'takaful'],
-            'points': ['积分', 'points', 'rewards'],
-            'miles': ['里程', 'miles', '航空'],
-            'discounts': ['折扣', 'discount', '优惠'],
-        }
+        customer_ids 为 None 时替换整张表（不再有信用卡消费的客户的旧结果一并删除），
+        否则只替换指定客户的结果
         
-        for benefit_type, kw_list in benefit_keywords.items():
-            if any(kw in text for kw in kw_list):
-                score += 20
+        Returns:
+            {'customers': 客户数, 'recommendations': 保存的推荐条数}
+        """
+        # 先读版本号与数据水位：计算期间产品目录或客户交易若有变化，保存的结果会被视为过期而不是误用
+        version = get_card_feature_index(self.db_path).version
+        conn = sqlite3.connect(self.db_path)
+        try:
+            watermarks = self._data_watermarks(conn, customer_ids)
+        finally:
+            conn.close()
+        recommendations = self.recommend_for_customers(customer_ids, top_n)
+        generated_at = datetime.now()
+        rows = [
+            (customer_id, rank, rec['card_id'], rec['score'], json.dumps(rec['score_breakdown']),
+             version, watermarks.get(customer_id), generated_at)
+            for customer_id, recs in recommendations.items()
+            for rank, rec in enumerate(recs, 1)
+        ]
         
-        return min(score, 100)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self._ensure_saved_table(conn)
+            if customer_ids is None:
+                conn.execute('DELETE FROM customer_card_recommendations')
+            else:
+                conn.executemany('DELETE FROM customer_card_recommendations WHERE customer_id = ?',
+                                 [(customer_id,) for customer_id in customer_ids])
+            conn.executemany('''
+                INSERT INTO customer_card_recommendations
+                    (customer_id, rank, card_product_id, score, score_breakdown, catalog_version,
+                     data_watermark, generated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        finally:
+            conn.close()
+        
+        return {'customers': len(recommendations), 'recommendations': len(rows)}
     
-    def _score_eligibility(self, name: str, benefits: str, income: float, tier: str) -> float:
-        """评分资格匹配度 (0-100)"""
-        text = (name + ' ' + (benefits or '')).lower()
+    def get_saved_recommendations(self, customer_id: int, top_n: int = 5) -> Optional[List[Dict]]:
+        """
+        读取批量任务保存的推荐（格式同 recommend_cards）
         
-        if 'platinum' in text or 'infinite' in text or 'world' in text:
-            if tier == 'Platinum':
-                return 100
-            elif tier == 'Gold':
-                return 70
-            else:
-                return 40
-        elif 'gold' in text:
-            if tier in ['Platinum', 'Gold']:
-                return 100
-            else:
-                return 80
-        elif 'classic' in text or 'basic' in text:
-            return 100
-        else:
-            return 85
+        Returns:
+            推荐卡列表；没有保存结果、保存后产品目录或客户账单 / 交易已变化、条数不足 top_n 时返回None
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            try:
+                rows = conn.execute('''
+                    SELECT card_product_id, score, score_breakdown, catalog_version, data_watermark
+                    FROM customer_card_recommendations
+                    WHERE customer_id = ?
+                    ORDER BY rank
+                    LIMIT ?
+                ''', (customer_id, top_n)).fetchall()
+            except sqlite3.OperationalError:
+                # 批量任务尚未运行过（表不存在或仍是旧结构）
+                return None
+            index = get_card_feature_index(self.db_path, conn)
+            watermark = self._data_watermarks(conn, [customer_id]).get(customer_id)
+        finally:
+            conn.close()
+        
+        if not rows or len(rows) < min(top_n, len(index)):
+            return None
+        if any(row[3] != index.version or row[4] != watermark or row[0] not in index.position for row in rows):
+            return None
+        return [
+            self._card_entry(index, index.position[card_id], score, json.loads(breakdown))
+            for card_id, score, breakdown, _, _ in rows
+        ]
     
     def compare_current_vs_recommended(self, customer_id: int, current_card_ids: List[int]) -> Dict:
         """
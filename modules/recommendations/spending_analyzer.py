@@ -143,8 +143,9 @@ class SpendingAnalyzer:
             }
         """
         analysis = self.analyze_customer_spending(customer_id)
-        category_breakdown = analysis['category_breakdown']
-        
+        return self._build_profile(analysis['category_breakdown'], analysis['monthly_average'])
+    
+    def _build_profile(self, category_breakdown: Dict, monthly_average: float) -> Dict:
         profile = {
             'dining': category_breakdown.get('Food & Dining', {}).get('monthly_avg', 0),
             'grocery': category_breakdown.get('Groceries', {}).get('monthly_avg', 0),
@@ -155,27 +156,88 @@ class SpendingAnalyzer:
             'entertainment': category_breakdown.get('Entertainment', {}).get('monthly_avg', 0),
             'transport': category_breakdown.get('Transport', {}).get('monthly_avg', 0),
             'bills': category_breakdown.get('Bills & Utilities', {}).get('monthly_avg', 0),
-            'total_monthly': analysis['monthly_average']
+            'total_monthly': monthly_average
         }
         
         return profile
     
-    def get_customer_tier(self, customer_id: int) -> str:
+    def get_spending_profiles(self, customer_ids: List[int] = None, months: int = 6) -> Dict[int, Dict]:
         """
-        根据消费水平判断客户层级
+        批量获取客户消费档案（一次分组查询，结果与逐个调用 get_spending_profile 相同）
+        
+        Args:
+            customer_ids: 客户ID列表；None 表示所有有信用卡消费的客户
+            months: 分析月份数
         
         Returns:
-            'Silver', 'Gold', 或 'Platinum'
+            {customer_id: profile}；没有消费记录的客户 total_monthly 为0
         """
-        analysis = self.analyze_customer_spending(customer_id)
-        monthly_avg = analysis['monthly_average']
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cutoff_date = (datetime.now() - timedelta(days=months * 30)).strftime('%Y-%m-%d')
+        
+        sql = '''
+            SELECT 
+                cc.customer_id,
+                t.category,
+                SUM(t.amount) as total_amount
+            FROM transactions t
+            JOIN statements s ON t.statement_id = s.id
+            JOIN credit_cards cc ON s.card_id = cc.id
+            WHERE t.transaction_date >= ?
+        '''
+        if customer_ids is None:
+            batches = [(sql + ' GROUP BY cc.customer_id, t.category', [cutoff_date])]
+        else:
+            # SQLite 参数上限：客户ID按500个一组查询
+            batches = [
+                (sql + f" AND cc.customer_id IN ({','.join('?' * len(chunk))}) GROUP BY cc.customer_id, t.category",
+                 [cutoff_date, *chunk])
+                for chunk in (customer_ids[i:i + 500] for i in range(0, len(customer_ids), 500))
+            ]
+        
+        totals: Dict[int, Dict[str, float]] = defaultdict(dict)
+        for batch_sql, params in batches:
+            cursor.execute(batch_sql, params)
+            for customer_id, category, total in cursor.fetchall():
+                category = category or 'Others'
+                totals[customer_id][category] = totals[customer_id].get(category, 0) + total
+        
+        conn.close()
         
+        profiles = {}
+        for customer_id in (customer_ids if customer_ids is not None else sorted(totals)):
+            categories = totals.get(customer_id, {})
+            total_spending = sum(categories.values())
+            category_breakdown = {
+                category: {'monthly_avg': round(total / months, 2)}
+                for category, total in categories.items()
+            }
+            monthly_average = round(total_spending / months, 2) if months > 0 else 0
+            profiles[customer_id] = self._build_profile(category_breakdown, monthly_average)
+        
+        return profiles
+    
+    @staticmethod
+    def tier_for_monthly_average(monthly_avg: float) -> str:
+        """月均消费 → 客户层级"""
         if monthly_avg >= 10000:
             return 'Platinum'
         elif monthly_avg >= 5000:
             return 'Gold'
         else:
             return 'Silver'
+    
+    def get_customer_tier(self, customer_id: int) -> str:
+        """
+        根据消费水平判断客户层级
+        
+        Returns:
+            'Silver', 'Gold', 或 'Platinum'
+        """
+        analysis = self.analyze_customer_spending(customer_id)
+        return self.tier_for_monthly_average(analysis['monthly_average'])
 
 
 if __name__ == "__main__":
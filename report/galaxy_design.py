@@ -49,29 +49,36 @@ class GalaxyDesign:
         # 3. 添加若隐若现的银色光晕
         self._draw_subtle_glow(c, page_number)
     
+    # 星点位置固定（种子42），每个进程只计算一次，之后每页直接复用
+    _star_field = None
+    
+    @classmethod
+    def _get_star_field(cls, page_width, page_height):
+        """预计算星点：[(x, y, size, opacity, grey), ...]（与原 random.seed(42) 序列一致）"""
+        if cls._star_field is None:
+            rng = random.Random(42)
+            stars = []
+            # 生成不同大小的星点
+            for _ in range(150):  # 大星点
+                x = rng.uniform(0, page_width)
+                y = rng.uniform(0, page_height)
+                size = rng.uniform(0.5, 1.5)
+                opacity = rng.uniform(0.3, 0.8)
+                stars.append((x, y, size, opacity, 0.94))  # 银色星点
+            # 添加更多微小星点（银河粉末效果）
+            for _ in range(300):
+                x = rng.uniform(0, page_width)
+                y = rng.uniform(0, page_height)
+                size = rng.uniform(0.2, 0.6)
+                opacity = rng.uniform(0.2, 0.5)
+                stars.append((x, y, size, opacity, 0.88))
+            cls._star_field = stars
+        return cls._star_field
+    
     def _draw_galaxy_stars(self, c):
         """绘制银河星点（随机分布的亮银色粒子）"""
-        random.seed(42)  # 固定种子以保持一致性
-        
-        # 生成不同大小的星点
-        for _ in range(150):  # 大星点
-            x = random.uniform(0, self.page_width)
-            y = random.uniform(0, self.page_height)
-            size = random.uniform(0.5, 1.5)
-            opacity = random.uniform(0.3, 0.8)
-            
-            # 银色星点
-            c.setFillColorRGB(0.94, 0.94, 0.94, opacity)
-            c.circle(x, y, size, fill=1, stroke=0)
-        
-        # 添加更多微小星点（银河粉末效果）
-        for _ in range(300):
-            x = random.uniform(0, self.page_width)
-            y = random.uniform(0, self.page_height)
-            size = random.uniform(0.2, 0.6)
-            opacity = random.uniform(0.2, 0.5)
-            
-            c.setFillColorRGB(0.88, 0.88, 0.88, opacity)
+        for x, y, size, opacity, grey in self._get_star_field(self.page_width, self.page_height):
+            c.setFillColorRGB(grey, grey, grey, opacity)
             c.circle(x, y, size, fill=1, stroke=0)
     
     def _draw_subtle_glow(self, c, page_number):
@@ -6,7 +6,7 @@ Galaxy-Themed Monthly Report Generator
 Premium Enterprise SaaS Reports - Black/White/Silver Design
 """
 
-from db.database import get_db
+from db.database import get_db, month_date_range
 from datetime import datetime, timedelta
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch
@@ -48,11 +48,11 @@ class GalaxyMonthlyReportGenerator:
                 FROM credit_cards cc
                 JOIN statements s ON cc.id = s.card_id
                 WHERE cc.customer_id = ?
-                  AND strftime('%Y', s.statement_date) = ?
-                  AND strftime('%m', s.statement_date) = ?
+                  AND s.statement_date >= ?
+                  AND s.statement_date < ?
                   AND s.is_confirmed = 1
                 ORDER BY cc.id
-            ''', (customer_id, str(year), str(month).zfill(2)))
+            ''', (customer_id, *month_date_range(year, month)))
             
             cards = [dict(row) for row in cursor.fetchall()]
             
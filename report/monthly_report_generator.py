@@ -11,7 +11,7 @@ Monthly Report Auto-Generator (Consolidated Per Customer)
 6. 整体财务健康分析和50/50服务流程集成
 """
 
-from db.database import get_db
+from db.database import get_db, month_date_range
 from datetime import datetime, timedelta
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch
@@ -67,11 +67,11 @@ class MonthlyReportGenerator:
                 SELECT *
                 FROM statements
                 WHERE card_id = ?
-                  AND strftime('%Y', statement_date) = ?
-                  AND strftime('%m', statement_date) = ?
+                  AND statement_date >= ?
+                  AND statement_date < ?
                   AND is_confirmed = 1
                 ORDER BY statement_date
-            ''', (card_id, str(year), str(month).zfill(2)))
+            ''', (card_id, *month_date_range(year, month)))
             
             statements = [dict(row) for row in cursor.fetchall()]
             
@@ -0,0 +1,211 @@
+"""
+Transaction Full-Text Index
+SQLite FTS5 index over transaction description, notes and tags
+
+- transactions_fts: rowid = transactions.id
+- customer_key column ('c<customer_id>') lets MATCH restrict a search to one customer
+- Kept in sync by triggers on transactions / transaction_tags / tags, and on statements.card_id /
+  credit_cards.customer_id so customer_key follows a statement or card that moves
+- Created (and backfilled) by ensure_fts_index at application startup; searches only check
+  fts_index_ready and fall back to LIKE until then
+- transactions_fts_snapshots: the ranked result ids of a paginated search, so later pages follow
+  the ordering of the first page even when BM25 scores shift as the index changes
+"""
+
+import re
+import sqlite3
+import threading
+from typing import List
+
+FTS_TABLE = 'transactions_fts'
+SNAPSHOT_TABLE = 'transactions_fts_snapshots'
+
+# Paginated search snapshots older than this are purged when a new snapshot is written
+SNAPSHOT_TTL_SECONDS = 3600
+
+# bm25 column weights: customer_key, description, notes, tags
+BM25_WEIGHTS = (0.0, 10.0, 4.0, 6.0)
+
+_REQUIRED_COLUMNS = {
+    'transactions': {'id', 'statement_id', 'description', 'notes'},
+    'statements': {'id', 'card_id'},
+    'credit_cards': {'id', 'customer_id'},
+    'transaction_tags': {'transaction_id', 'tag_id'},
+    'tags': {'id', 'tag_name'},
+}
+
+_CUSTOMER_KEY_SQL = '''(SELECT 'c' || cc.customer_id FROM statements s
+                          JOIN credit_cards cc ON s.card_id = cc.id
+                          WHERE s.id = {statement_id})'''
+
+_TAGS_SQL = '''(SELECT COALESCE(GROUP_CONCAT(tg.tag_name, ' '), '') FROM transaction_tags tt
+                  JOIN tags tg ON tt.tag_id = tg.id
+                  WHERE tt.transaction_id = {transaction_id})'''
+
+_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, customer_key, description, notes, tags)
+        VALUES (new.id, {_CUSTOMER_KEY_SQL.format(statement_id='new.statement_id')},
+                new.description, COALESCE(new.notes, ''), {_TAGS_SQL.format(transaction_id='new.id')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF description, notes, statement_id ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, customer_key, description, notes, tags)
+        VALUES (new.id, {_CUSTOMER_KEY_SQL.format(statement_id='new.statement_id')},
+                new.description, COALESCE(new.notes, ''), {_TAGS_SQL.format(transaction_id='new.id')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transaction_tags_fts_ai AFTER INSERT ON transaction_tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_SQL.format(transaction_id='new.transaction_id')}
+        WHERE rowid = new.transaction_id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transaction_tags_fts_ad AFTER DELETE ON transaction_tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_SQL.format(transaction_id='old.transaction_id')}
+        WHERE rowid = old.transaction_id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS tags_fts_au AFTER UPDATE OF tag_name ON tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_SQL.format(transaction_id=f'{FTS_TABLE}.rowid')}
+        WHERE rowid IN (SELECT transaction_id FROM transaction_tags WHERE tag_id = new.id);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS statements_fts_au AFTER UPDATE OF card_id ON statements BEGIN
+        UPDATE {FTS_TABLE} SET customer_key = {_CUSTOMER_KEY_SQL.format(statement_id='new.id')}
+        WHERE rowid IN (SELECT id FROM transactions WHERE statement_id = new.id);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS credit_cards_fts_au AFTER UPDATE OF customer_id ON credit_cards BEGIN
+        UPDATE {FTS_TABLE} SET customer_key = 'c' || new.customer_id
+        WHERE rowid IN (SELECT t.id FROM transactions t
+                        JOIN statements s ON t.statement_id = s.id
+                        WHERE s.card_id = new.id);
+    END
+    ''',
+]
+
+_ready = {}
+_lock = threading.Lock()
+
+
+def _fts5_available(conn) -> bool:
+    try:
+        conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)')
+        conn.execute('DROP TABLE IF EXISTS temp._fts5_probe')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _schema_supported(conn) -> bool:
+    for table, columns in _REQUIRED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if not columns <= existing:
+            return False
+    return True
+
+
+def rebuild_fts_index(conn):
+    """Repopulate the index from the base tables"""
+    conn.execute(f'DELETE FROM {FTS_TABLE}')
+    conn.execute(f'''
+        INSERT INTO {FTS_TABLE}(rowid, customer_key, description, notes, tags)
+        SELECT t.id, 'c' || cc.customer_id, t.description, COALESCE(t.notes, ''),
+               COALESCE((SELECT GROUP_CONCAT(tg.tag_name, ' ') FROM transaction_tags tt
+                         JOIN tags tg ON tt.tag_id = tg.id
+                         WHERE tt.transaction_id = t.id), '')
+        FROM transactions t
+        JOIN statements s ON t.statement_id = s.id
+        JOIN credit_cards cc ON s.card_id = cc.id
+    ''')
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('optimize')")
+    conn.commit()
+
+
+def _db_key(conn) -> str:
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
+
+def fts_index_ready(conn) -> bool:
+    """Whether the index and snapshot table exist (never creates or rebuilds them)"""
+    db_key = _db_key(conn)
+    if _ready.get(db_key):
+        return True
+    found = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)", (FTS_TABLE, SNAPSHOT_TABLE)
+    ).fetchone()[0]
+    if found == 2 and _fts5_available(conn):
+        _ready[db_key] = True
+        return True
+    return False
+
+
+def ensure_fts_index(conn) -> bool:
+    """
+    Create the FTS5 table, sync triggers and snapshot table (backfilling existing rows when the
+    table is new). Run at startup; a full rebuild never happens inside a search request.
+    Returns False when FTS5 or the required columns are unavailable, so searches fall back to LIKE.
+    """
+    db_key = _db_key(conn)
+    with _lock:
+        if not _fts5_available(conn) or not _schema_supported(conn):
+            return False
+
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).fetchone()
+        if not exists:
+            conn.execute(f'''
+                CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                    customer_key, description, notes, tags,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            ''')
+        for trigger in _TRIGGERS:
+            conn.execute(trigger)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+                snapshot_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                transaction_id INTEGER NOT NULL,
+                score REAL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (snapshot_id, position)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{SNAPSHOT_TABLE}_created ON {SNAPSHOT_TABLE}(created_at)')
+        if not exists:
+            rebuild_fts_index(conn)
+        conn.commit()
+        _ready[db_key] = True
+        return True
+
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize_query(query: str) -> List[str]:
+    return _TOKEN_RE.findall(query or '')
+
+
+def build_match_expression(customer_id: int, query: str) -> str:
+    """
+    Every query term becomes a quoted prefix term, so user input can never inject FTS syntax:
+    customer_key:c12 AND {description notes tags}: ("grab"* AND "food"*)
+    """
+    terms = ' AND '.join('"{}"*'.format(term.replace('"', '""')) for term in tokenize_query(query))
+    return f'customer_key:c{int(customer_id)} AND {{description notes tags}}: ({terms})'
@@ -4,21 +4,91 @@ Advanced transaction search with saved filters
 """
 
 from typing import List, Dict, Optional
+from datetime import datetime, timedelta
 from db.database import get_db
+from search.fts_index import (
+    FTS_TABLE, BM25_WEIGHTS, SNAPSHOT_TABLE, SNAPSHOT_TTL_SECONDS, build_match_expression, fts_index_ready,
+    tokenize_query,
+)
+import base64
 import json
+import uuid
+
+_RESULT_COLUMNS = """t.*, s.statement_date, cc.bank_name, cc.card_number_last4,
+                     GROUP_CONCAT(tg.tag_name, ', ') as tags"""
+
+
+def _encode_cursor(sort_key, row_id) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_key, row_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sort_key, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _filter_clauses(filters: Optional[Dict]):
+    """SQL conditions (appended to a WHERE on t / cc) and parameters for the search filters"""
+    sql, params = '', []
+    if filters:
+        if filters.get('category'):
+            sql += ' AND t.category = ?'
+            params.append(filters['category'])
+        if filters.get('start_date'):
+            sql += ' AND t.transaction_date >= ?'
+            params.append(filters['start_date'])
+        if filters.get('end_date'):
+            sql += ' AND t.transaction_date <= ?'
+            params.append(filters['end_date'])
+        if filters.get('min_amount'):
+            sql += ' AND t.amount >= ?'
+            params.append(float(filters['min_amount']))
+        if filters.get('max_amount'):
+            sql += ' AND t.amount <= ?'
+            params.append(float(filters['max_amount']))
+        if filters.get('bank'):
+            sql += ' AND cc.bank_name = ?'
+            params.append(filters['bank'])
+    return sql, params
 
 class SearchService:
     """Advanced search and filtering for transactions"""
     
-    def search_transactions(self, customer_id: int, query: str = '', filters: Optional[Dict] = None) -> List[Dict]:
-        """Search transactions with full-text and filters"""
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    
+    def search_transactions(self, customer_id: int, query: str = '', filters: Optional[Dict] = None,
+                            cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+        """Search transactions with full-text and filters (one page of results)"""
+        return self.search_transactions_page(customer_id, query, filters, cursor, page_size)['results']
+    
+    def search_transactions_page(self, customer_id: int, query: str = '', filters: Optional[Dict] = None,
+                                 cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """
+        Search transactions with cursor pagination
+        
+        - With a query: FTS5 MATCH (prefix terms), ranked by BM25, then transaction id. When there is
+          more than one page, the ranked ids are snapshotted and later pages read from the snapshot
+          (BM25 scores move as the index changes, so a score-based keyset could skip or repeat rows)
+        - Without a query: newest transactions first (keyset on transaction_date, id)
+        Returns {'results': [...], 'next_cursor': str or None}; pass next_cursor back to get the next page
+        """
+        page_size = max(1, min(int(page_size or self.DEFAULT_PAGE_SIZE), self.MAX_PAGE_SIZE))
+        after = _decode_cursor(cursor)
         
         with get_db() as conn:
-            cursor = conn.cursor()
+            if tokenize_query(query) and fts_index_ready(conn):
+                if after:
+                    return self._snapshot_page(conn, customer_id, after[0], after[1], page_size)
+                return self._ranked_first_page(conn, customer_id, query, filters, page_size)
             
-            sql = '''
-                SELECT t.*, s.statement_date, cc.bank_name, cc.card_number_last4,
-                       GROUP_CONCAT(tg.tag_name, ', ') as tags
+            sql = f'''
+                SELECT {_RESULT_COLUMNS}
                 FROM transactions t
                 INNER JOIN statements s ON t.statement_id = s.id
                 INNER JOIN credit_cards cc ON s.card_id = cc.id
@@ -26,40 +96,112 @@ class SearchService:
                 LEFT JOIN tags tg ON tt.tag_id = tg.id
                 WHERE cc.customer_id = ? AND s.is_confirmed = 1
             '''
-            
             params = [customer_id]
             
-            # Full-text search
+            # Substring search when the FTS index is unavailable
             if query:
-                sql += ' AND (t.description LIKE ? OR t.notes LIKE ? OR tg.tag_name LIKE ?)'
+                sql += ''' AND (t.description LIKE ? OR t.notes LIKE ? OR EXISTS (
+                            SELECT 1 FROM transaction_tags tt2 JOIN tags tg2 ON tt2.tag_id = tg2.id
+                            WHERE tt2.transaction_id = t.id AND tg2.tag_name LIKE ?))'''
                 search_term = f'%{query}%'
                 params.extend([search_term, search_term, search_term])
             
-            # Apply filters
-            if filters:
-                if filters.get('category'):
-                    sql += ' AND t.category = ?'
-                    params.append(filters['category'])
-                if filters.get('start_date'):
-                    sql += ' AND t.transaction_date >= ?'
-                    params.append(filters['start_date'])
-                if filters.get('end_date'):
-                    sql += ' AND t.transaction_date <= ?'
-                    params.append(filters['end_date'])
-                if filters.get('min_amount'):
-                    sql += ' AND t.amount >= ?'
-                    params.append(float(filters['min_amount']))
-                if filters.get('max_amount'):
-                    sql += ' AND t.amount <= ?'
-                    params.append(float(filters['max_amount']))
-                if filters.get('bank'):
-                    sql += ' AND cc.bank_name = ?'
-                    params.append(filters['bank'])
+            filter_sql, filter_params = _filter_clauses(filters)
+            sql += filter_sql
+            params.extend(filter_params)
             
-            sql += ' GROUP BY t.id ORDER BY t.transaction_date DESC LIMIT 1000'
+            # Keyset pagination: continue after the last row of the previous page
+            if after:
+                sql += ' AND (t.transaction_date < ? OR (t.transaction_date = ? AND t.id < ?))'
+                params.extend([after[0], after[0], after[1]])
+            sql += ' GROUP BY t.id ORDER BY t.transaction_date DESC, t.id DESC LIMIT ?'
+            params.append(page_size + 1)
             
-            cursor.execute(sql, params)
-            return [dict(row) for row in cursor.fetchall()]
+            rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = _encode_cursor(rows[-1]['transaction_date'], rows[-1]['id'])
+        
+        return {'results': rows, 'next_cursor': next_cursor}
+    
+    def _ranked_first_page(self, conn, customer_id: int, query: str, filters: Optional[Dict],
+                           page_size: int) -> Dict:
+        """Rank every match once; snapshot the ordering when it spans more than one page"""
+        # MATERIALIZED: bm25() is only valid inside the FTS query itself
+        sql = f'''
+            WITH m AS MATERIALIZED (
+                SELECT rowid AS id, bm25({FTS_TABLE}, {', '.join(str(w) for w in BM25_WEIGHTS)}) AS score
+                FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH ?
+            )
+            SELECT t.id, m.score
+            FROM m
+            INNER JOIN transactions t ON t.id = m.id
+            INNER JOIN statements s ON t.statement_id = s.id
+            INNER JOIN credit_cards cc ON s.card_id = cc.id
+            WHERE cc.customer_id = ? AND s.is_confirmed = 1
+        '''
+        params = [build_match_expression(customer_id, query), customer_id]
+        filter_sql, filter_params = _filter_clauses(filters)
+        sql += filter_sql + ' ORDER BY m.score, t.id'
+        params.extend(filter_params)
+        ranked = conn.execute(sql, params).fetchall()
+        
+        next_cursor = None
+        if len(ranked) > page_size:
+            snapshot_id = uuid.uuid4().hex
+            now = datetime.now()
+            conn.execute(f'DELETE FROM {SNAPSHOT_TABLE} WHERE created_at < ?',
+                         ((now - timedelta(seconds=SNAPSHOT_TTL_SECONDS)).isoformat(),))
+            conn.executemany(
+                f'INSERT INTO {SNAPSHOT_TABLE} (snapshot_id, position, transaction_id, score, created_at) '
+                f'VALUES (?, ?, ?, ?, ?)',
+                [(snapshot_id, position, row[0], row[1], now.isoformat())
+                 for position, row in enumerate(ranked[page_size:], page_size + 1)]
+            )
+            conn.commit()
+            next_cursor = _encode_cursor(snapshot_id, page_size)
+        
+        return {'results': self._load_ranked(conn, customer_id, ranked[:page_size]), 'next_cursor': next_cursor}
+    
+    def _snapshot_page(self, conn, customer_id: int, snapshot_id, position: int, page_size: int) -> Dict:
+        """Next page of a snapshotted ranking (empty once the snapshot has expired)"""
+        ranked = conn.execute(
+            f'SELECT transaction_id, score FROM {SNAPSHOT_TABLE} '
+            f'WHERE snapshot_id = ? AND position > ? ORDER BY position LIMIT ?',
+            (str(snapshot_id), position, page_size + 1)
+        ).fetchall()
+        next_cursor = None
+        if len(ranked) > page_size:
+            ranked = ranked[:page_size]
+            next_cursor = _encode_cursor(snapshot_id, position + page_size)
+        return {'results': self._load_ranked(conn, customer_id, ranked), 'next_cursor': next_cursor}
+    
+    @staticmethod
+    def _load_ranked(conn, customer_id: int, ranked) -> List[Dict]:
+        """Result rows for (transaction_id, score) pairs, in ranked order"""
+        if not ranked:
+            return []
+        ids = [row[0] for row in ranked]
+        rows = conn.execute(f'''
+            SELECT {_RESULT_COLUMNS}
+            FROM transactions t
+            INNER JOIN statements s ON t.statement_id = s.id
+            INNER JOIN credit_cards cc ON s.card_id = cc.id
+            LEFT JOIN transaction_tags tt ON t.id = tt.transaction_id
+            LEFT JOIN tags tg ON tt.tag_id = tg.id
+            WHERE t.id IN ({','.join('?' * len(ids))}) AND cc.customer_id = ? AND s.is_confirmed = 1
+            GROUP BY t.id
+        ''', [*ids, customer_id]).fetchall()
+        by_id = {row['id']: dict(row) for row in rows}
+        results = []
+        for transaction_id, score in ranked:
+            # rows deleted since the snapshot was taken are dropped
+            if transaction_id in by_id:
+                results.append({**by_id[transaction_id], 'search_score': score})
+        return results
     
     def save_filter(self, customer_id: int, filter_name: str, filter_criteria: Dict) -> int:
         """Save a filter configuration"""
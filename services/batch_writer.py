@@ -0,0 +1,235 @@
+"""
+后台批量写入器（审计日志等只追加的记录）
+- submit() 只把记录放入有界内存队列，请求线程不再等待数据库提交
+- 后台线程按数量（batch_size）或时间（flush_interval 秒）阈值成批写入，一批一次提交
+- 队列已满时在调用线程同步写入该条记录（不丢弃）
+- 一批写入失败时逐条重试，只有本身写不进去的记录被丢弃并记录错误日志
+- 进程退出时（atexit / multiprocessing 子进程退出）先写完队列中的记录
+- stats()：队列深度、写入 / 同步回退 / 失败计数、批次耗时
+
+环境变量（各写入器共用）：
+  BATCH_WRITER_MAX_QUEUE       队列容量（默认 10000）
+  BATCH_WRITER_BATCH_SIZE      每批最多条数（默认 200）
+  BATCH_WRITER_FLUSH_INTERVAL  最长等待秒数（默认 0.5）
+  BATCH_WRITER_ASYNC=0         关闭后台写入，全部同步写入
+"""
+
+import atexit
+import logging
+import multiprocessing.util
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BATCH_WRITER_MAX_QUEUE = int(os.environ.get('BATCH_WRITER_MAX_QUEUE', '10000'))
+BATCH_WRITER_BATCH_SIZE = int(os.environ.get('BATCH_WRITER_BATCH_SIZE', '200'))
+BATCH_WRITER_FLUSH_INTERVAL = float(os.environ.get('BATCH_WRITER_FLUSH_INTERVAL', '0.5'))
+BATCH_WRITER_ASYNC = os.environ.get('BATCH_WRITER_ASYNC', '1') != '0'
+
+
+class BatchWriter:
+    """有界队列 + 后台批量写入线程（线程在第一次 submit 时按进程启动）"""
+
+    def __init__(self, name: str, write_batch: Callable[[List[Any]], None],
+                 max_queue: int = BATCH_WRITER_MAX_QUEUE,
+                 batch_size: int = BATCH_WRITER_BATCH_SIZE,
+                 flush_interval: float = BATCH_WRITER_FLUSH_INTERVAL,
+                 enabled: bool = BATCH_WRITER_ASYNC):
+        """
+        Args:
+            name: 写入器名称（日志与指标）
+            write_batch: 在一个事务中写入一批记录的函数，失败时抛出异常
+        """
+        self.name = name
+        self.write_batch = write_batch
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopping = None
+        self._exit_pid = None
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+
+        self.enqueued = 0
+        self.written = 0
+        self.sync_writes = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    # ========== 写入 ==========
+
+    def submit(self, record: Any):
+        """提交一条记录；后台写入关闭或队列已满时同步写入"""
+        if not self.enabled:
+            self._write_sync(record)
+            return
+
+        self._ensure_started()
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._done(1)
+            self._write_sync(record)
+            return
+        with self._lock:
+            self.enqueued += 1
+
+    def _write_sync(self, record: Any):
+        self._write([record])
+        with self._lock:
+            self.sync_writes += 1
+
+    def _write(self, records: List[Any]):
+        """写入一批；整批失败时逐条重试"""
+        started = time.perf_counter()
+        try:
+            self.write_batch(records)
+            written, failed = len(records), 0
+        except Exception as e:
+            if len(records) == 1:
+                logger.error(f"[{self.name}] 写入失败，记录已丢弃: {e} - {records[0]!r}")
+                written, failed = 0, 1
+            else:
+                logger.warning(f"[{self.name}] 批量写入失败，逐条重试: {e}")
+                written = failed = 0
+                for record in records:
+                    try:
+                        self.write_batch([record])
+                        written += 1
+                    except Exception as record_error:
+                        logger.error(f"[{self.name}] 写入失败，记录已丢弃: {record_error} - {record!r}")
+                        failed += 1
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.written += written
+            self.failed += failed
+            self.batches += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+    def _done(self, count: int):
+        with self._lock:
+            self._pending -= count
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    # ========== 后台线程 ==========
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None:
+                return
+            # fork 之后父进程的线程不存在，子进程重新创建队列与线程
+            self._pid = pid
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._stopping = threading.Event()
+            self._pending = 0
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+            self._thread.start()
+            register_exit = self._exit_pid != pid
+            self._exit_pid = pid
+        if register_exit:
+            atexit.register(self.close)
+            multiprocessing.util.Finalize(None, self.close, exitpriority=10)
+
+    def _run(self):
+        q = self._queue
+        while not (self._stopping.is_set() and q.empty()):
+            try:
+                first = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping.is_set():
+                    # 停止时不再等待，直接取走已排队的记录
+                    try:
+                        batch.append(q.get_nowait())
+                        continue
+                    except queue.Empty:
+                        break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            self._done(len(batch))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的记录全部写入；超时返回False"""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """写完队列后停止后台线程（可重复调用）"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"[{self.name}] 关闭超时，队列中仍有 {self._queue.qsize()} 条记录")
+            return
+        with self._lock:
+            self._thread = None
+        # 线程退出后才入队的记录同步写入
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._write(leftover)
+            self._done(len(leftover))
+
+    # ========== 指标 ==========
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'async': self.enabled,
+                'queue_depth': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+                'max_queue': self.max_queue,
+                'pending': max(self._pending, 0),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'sync_writes': self.sync_writes,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'avg_flush_ms': round(self._total_flush_ms / self.batches, 2) if self.batches else 0.0,
+                'max_flush_ms': round(self.max_flush_ms, 2),
+            }
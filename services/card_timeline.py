@@ -1,28 +1,41 @@
 """
 Card Timeline Service
 Provides 12-month timeline view for credit cards based on statement_date
+
+- Timelines for many cards are built from one grouped query
+  (statement month + transaction count via GROUP BY), mapped through a dict keyed by month
+- Built timelines are cached per card; call invalidate_card_timeline / invalidate_statement_timeline
+  when statements are inserted or confirmed (entries also expire after CARD_TIMELINE_CACHE_TTL seconds,
+  which covers writers in other processes)
 """
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import sys
 import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db.database import get_db
 
-def get_card_12month_timeline(card_id):
-    """
-    Get 12-month timeline for a credit card showing statement distribution
-    Returns list of 12 months with statement data
-    """
-    today = datetime.now()
+CARD_TIMELINE_CACHE_TTL = float(os.getenv('CARD_TIMELINE_CACHE_TTL', '300'))
+
+# SQLite 默认最多 999 个绑定参数
+_IN_CHUNK_SIZE = 500
+
+# (card_id, 当月 'YYYY-MM') -> (缓存时间, timeline)
+_cache: Dict[tuple, tuple] = {}
+_cache_lock = threading.Lock()
+
+
+def _empty_timeline(today):
+    """Current month + past 11 months, oldest first"""
     timeline = []
-    
-    # Generate 12 months (current month + past 11 months)
     for i in range(11, -1, -1):
         month_date = today - relativedelta(months=i)
         month_key = month_date.strftime("%Y-%m")
         month_display = month_date.strftime("%b %Y")
-        
+
         timeline.append({
             'month_key': month_key,
             'month_display': month_display,
@@ -35,64 +48,112 @@ def get_card_12month_timeline(card_id):
             'transaction_count': 0,
             'is_confirmed': False
         })
-    
-    # Fetch statements for this card
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, statement_date, statement_total, is_confirmed,
-                   strftime('%Y-%m', statement_date) as month_key
-            FROM statements
-            WHERE card_id = ? AND statement_date IS NOT NULL
-            ORDER BY statement_date DESC
-        ''', (card_id,))
-        
-        statements = cursor.fetchall()
-        
-        # Map statements to timeline
-        for stmt in statements:
-            stmt_month = stmt['month_key']
-            
-            # Find matching month in timeline
-            for month_data in timeline:
-                if month_data['month_key'] == stmt_month:
-                    # Get transaction count
-                    cursor.execute('''
-                        SELECT COUNT(*) as count 
-                        FROM transactions 
-                        WHERE statement_id = ?
-                    ''', (stmt['id'],))
-                    txn_count = cursor.fetchone()['count']
-                    
-                    month_data['has_statement'] = True
-                    month_data['statement_id'] = stmt['id']
-                    month_data['statement_date'] = stmt['statement_date']
-                    month_data['total_amount'] = stmt['statement_total'] or 0.0
-                    month_data['transaction_count'] = txn_count
-                    month_data['is_confirmed'] = bool(stmt['is_confirmed'])
-                    break
-    
     return timeline
 
 
+def _copy_timeline(timeline):
+    return [dict(month) for month in timeline]
+
+
+def _load_timelines(conn, card_ids: List[int], today) -> Dict[int, List[Dict]]:
+    timelines = {card_id: _empty_timeline(today) for card_id in card_ids}
+    months_by_card = {
+        card_id: {month['month_key']: month for month in timeline}
+        for card_id, timeline in timelines.items()
+    }
+    first_month = timelines[card_ids[0]][0]['month_key']
+    last_month = timelines[card_ids[0]][-1]['month_key']
+
+    cursor = conn.cursor()
+    for start in range(0, len(card_ids), _IN_CHUNK_SIZE):
+        chunk = card_ids[start:start + _IN_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'''
+            SELECT s.card_id, s.id, s.statement_date, s.statement_total, s.is_confirmed,
+                   strftime('%Y-%m', s.statement_date) as month_key,
+                   COUNT(t.id) as transaction_count
+            FROM statements s
+            LEFT JOIN transactions t ON t.statement_id = s.id
+            WHERE s.card_id IN ({placeholders}) AND s.statement_date IS NOT NULL
+            AND strftime('%Y-%m', s.statement_date) BETWEEN ? AND ?
+            GROUP BY s.id
+            ORDER BY s.card_id, s.statement_date DESC
+        ''', (*chunk, first_month, last_month))
+
+        # Statements come newest first; when a month has several, the last one processed wins
+        for stmt in cursor.fetchall():
+            month_data = months_by_card[stmt['card_id']].get(stmt['month_key'])
+            if month_data is None:
+                continue
+            month_data['has_statement'] = True
+            month_data['statement_id'] = stmt['id']
+            month_data['statement_date'] = stmt['statement_date']
+            month_data['total_amount'] = stmt['statement_total'] or 0.0
+            month_data['transaction_count'] = stmt['transaction_count']
+            month_data['is_confirmed'] = bool(stmt['is_confirmed'])
+
+    return timelines
+
+
+def get_cards_12month_timelines(card_ids: Iterable[int], conn=None, today=None) -> Dict[int, List[Dict]]:
+    """
+    Get 12-month timelines for many cards at once
+    Returns dict mapping card_id to its timeline (cached cards are not re-queried)
+    """
+    today = today or datetime.now()
+    month_anchor = today.strftime("%Y-%m")
+    now = time.monotonic()
+
+    result = {}
+    missing = []
+    for card_id in dict.fromkeys(card_ids):
+        cached = _cache.get((card_id, month_anchor))
+        if cached and now - cached[0] < CARD_TIMELINE_CACHE_TTL:
+            result[card_id] = _copy_timeline(cached[1])
+        else:
+            missing.append(card_id)
+
+    if missing:
+        if conn is None:
+            with get_db() as db_conn:
+                loaded = _load_timelines(db_conn, missing, today)
+        else:
+            loaded = _load_timelines(conn, missing, today)
+        with _cache_lock:
+            for card_id, timeline in loaded.items():
+                _cache[(card_id, month_anchor)] = (now, timeline)
+                result[card_id] = _copy_timeline(timeline)
+
+    return result
+
+
+def get_card_12month_timeline(card_id):
+    """
+    Get 12-month timeline for a credit card showing statement distribution
+    Returns list of 12 months with statement data
+    """
+    return get_cards_12month_timelines([card_id])[card_id]
+
+
 def get_customer_cards_timeline(customer_id):
     """
     Get timeline for all cards of a customer
     Returns dict mapping card_id to 12-month timeline
     """
     timelines = {}
-    
+
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT id, bank_name, card_number_last4 
-            FROM credit_cards 
+            SELECT id, bank_name, card_number_last4
+            FROM credit_cards
             WHERE customer_id = ?
             ORDER BY id DESC
         ''', (customer_id,))
-        
+
         cards = cursor.fetchall()
-        
+        card_timelines = get_cards_12month_timelines([card['id'] for card in cards], conn=conn)
+
         for card in cards:
             timelines[card['id']] = {
                 'card_info': {
@@ -100,9 +161,9 @@ def get_customer_cards_timeline(customer_id):
                     'bank_name': card['bank_name'],
                     'last4': card['card_number_last4']
                 },
-                'timeline': get_card_12month_timeline(card['id'])
+                'timeline': card_timelines[card['id']]
             }
-    
+
     return timelines
 
 
@@ -112,16 +173,46 @@ def get_missing_months(card_id, months=12):
     """
     timeline = get_card_12month_timeline(card_id)
     missing = [
-        month for month in timeline 
+        month for month in timeline
         if not month['has_statement']
     ]
     return missing
 
 
+def timeline_coverage_percentage(timeline):
+    """Percentage of the 12 timeline months that have a statement"""
+    with_statements = sum(1 for m in timeline if m['has_statement'])
+    return (with_statements / 12) * 100 if timeline else 0
+
+
 def get_month_coverage_percentage(card_id):
     """
     Calculate what percentage of the last 12 months have statements
     """
-    timeline = get_card_12month_timeline(card_id)
-    with_statements = sum(1 for m in timeline if m['has_statement'])
-    return (with_statements / 12) * 100 if timeline else 0
+    return timeline_coverage_percentage(get_card_12month_timeline(card_id))
+
+
+def invalidate_card_timeline(card_ids: Optional[Iterable[int]] = None):
+    """Drop cached timelines for the given cards (all cards when card_ids is None)"""
+    with _cache_lock:
+        if card_ids is None:
+            _cache.clear()
+            return
+        targets = set(card_ids)
+        for key in [key for key in _cache if key[0] in targets]:
+            del _cache[key]
+
+
+def invalidate_statement_timeline(statement_id, conn=None):
+    """Drop the cached timeline of the card that owns a statement"""
+    def _lookup(db_conn):
+        row = db_conn.execute('SELECT card_id FROM statements WHERE id = ?', (statement_id,)).fetchone()
+        return row['card_id'] if row else None
+
+    if conn is None:
+        with get_db() as db_conn:
+            card_id = _lookup(db_conn)
+    else:
+        card_id = _lookup(conn)
+    if card_id is not None:
+        invalidate_card_timeline([card_id])
@@ -0,0 +1,171 @@
+"""
+Customer Dashboard Loader - 客户仪表板数据加载
+==============================================
+为 /customer/<id> 页面一次性加载所有数据：
+1. 客户、信用卡、账单（按卡分组）
+2. 已确认账单的交易及消费总额
+3. 每张卡的12个月时间线与覆盖率
+4. 每张卡最新月份的客户 / INFINITE 账本及转账汇总（第8项）
+
+所有查询在同一个连接上按客户批量执行（IN / GROUP BY），查询数量固定，
+与卡片数量、账单数量无关；返回的模板上下文与原来逐卡查询的结果一致
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from db.database import get_db
+from services.card_timeline import get_cards_12month_timelines, timeline_coverage_percentage
+
+
+def load_customer_dashboard(customer_id: int, today: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    加载客户仪表板的模板上下文
+
+    Returns:
+        customer / cards（含 timeline、coverage_percentage）/ statements / transactions /
+        total_spending / monthly_ledgers；客户不存在时返回 None
+    """
+    today = today or datetime.now()
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT * FROM customers WHERE id = ?', (customer_id,))
+        customer_row = cursor.fetchone()
+        if not customer_row:
+            return None
+        customer = dict(customer_row)
+
+        cursor.execute('SELECT * FROM credit_cards WHERE customer_id = ? ORDER BY id', (customer_id,))
+        cards = [dict(row) for row in cursor.fetchall()]
+
+        # 1. 所有卡的账单（按卡ID、账单日期倒序）
+        cursor.execute('''
+            SELECT s.*, cc.bank_name
+            FROM statements s
+            JOIN credit_cards cc ON s.card_id = cc.id
+            WHERE cc.customer_id = ?
+            ORDER BY cc.id, s.statement_date DESC
+        ''', (customer_id,))
+        statements_by_card: Dict[int, List[Dict]] = {card['id']: [] for card in cards}
+        for row in cursor.fetchall():
+            statements_by_card.setdefault(row['card_id'], []).append(dict(row))
+
+        # 2. 12个月时间线（card_timeline 按卡缓存，未命中的卡一次分组查询）
+        timelines = get_cards_12month_timelines([card['id'] for card in cards], conn=conn, today=today)
+
+        # 3. 已确认账单的交易
+        cursor.execute('''
+            SELECT t.*
+            FROM transactions t
+            JOIN statements s ON t.statement_id = s.id
+            JOIN credit_cards cc ON s.card_id = cc.id
+            WHERE cc.customer_id = ? AND s.is_confirmed
+            ORDER BY t.statement_id, t.transaction_date
+        ''', (customer_id,))
+        transactions_by_statement: Dict[int, List[Dict]] = {}
+        for row in cursor.fetchall():
+            transactions_by_statement.setdefault(row['statement_id'], []).append(dict(row))
+
+        # 4. 每张卡最新月份的客户账本（同一卡的最新月份取第一行）
+        cursor.execute('''
+            SELECT ml.card_id, ml.month_start, ml.previous_balance, ml.customer_spend,
+                   ml.customer_payments, ml.rolling_balance
+            FROM monthly_ledger ml
+            JOIN (
+                SELECT card_id, MAX(month_start) AS month_start
+                FROM monthly_ledger
+                WHERE card_id IN (SELECT id FROM credit_cards WHERE customer_id = ?)
+                GROUP BY card_id
+            ) latest ON ml.card_id = latest.card_id AND ml.month_start = latest.month_start
+            ORDER BY ml.card_id, ml.id
+        ''', (customer_id,))
+        customer_ledgers: Dict[int, Any] = {}
+        for row in cursor.fetchall():
+            customer_ledgers.setdefault(row['card_id'], row)
+
+        # 5. 同月份的INFINITE账本
+        cursor.execute('''
+            SELECT il.card_id, il.previous_balance, il.infinite_spend, il.supplier_fee,
+                   il.infinite_payments, il.rolling_balance
+            FROM infinite_monthly_ledger il
+            JOIN (
+                SELECT card_id, MAX(month_start) AS month_start
+                FROM monthly_ledger
+                WHERE card_id IN (SELECT id FROM credit_cards WHERE customer_id = ?)
+                GROUP BY card_id
+            ) latest ON il.card_id = latest.card_id AND il.month_start = latest.month_start
+            ORDER BY il.card_id, il.id
+        ''', (customer_id,))
+        infinite_ledgers: Dict[int, Any] = {}
+        for row in cursor.fetchall():
+            infinite_ledgers.setdefault(row['card_id'], row)
+
+        # 6. 转账记录（第8项）：按月份汇总一次
+        transfers_by_month: Dict[str, float] = {}
+        if customer_ledgers:
+            # 只需最新账本月份：(customer_name_tag, txn_date) 索引范围扫描
+            months = sorted({ledger['month_start'][:7] for ledger in customer_ledgers.values()})
+            cursor.execute(f'''
+                SELECT txn_month AS month, SUM(amount) AS total_transfers
+                FROM savings_transactions
+                WHERE customer_name_tag = ?
+                AND txn_date >= ? AND txn_date <= ?
+                AND txn_month IN ({','.join('?' * len(months))})
+                AND (description LIKE '%转账%' OR description LIKE '%TRANSFER%')
+                GROUP BY txn_month
+            ''', (customer['name'], f'{months[0]}-01', f'{months[-1]}-31', *months))
+            transfers_by_month = {row['month']: row['total_transfers'] for row in cursor.fetchall()
+                                  if row['month']}
+
+    total_spending = 0
+    all_statements = []
+    all_transactions = []
+    cards_with_timeline = []
+    monthly_ledgers = []
+    for card in cards:
+        statements = statements_by_card.get(card['id'], [])
+        all_statements.extend(statements)
+        for statement in statements:
+            if statement['is_confirmed']:
+                transactions = transactions_by_statement.get(statement['id'], [])
+                all_transactions.extend(transactions)
+                total_spending += sum(t['amount'] for t in transactions)
+
+        card_dict = dict(card)
+        card_dict['timeline'] = timelines[card['id']]
+        card_dict['coverage_percentage'] = timeline_coverage_percentage(card_dict['timeline'])
+        cards_with_timeline.append(card_dict)
+
+        customer_ledger = customer_ledgers.get(card['id'])
+        infinite_ledger = infinite_ledgers.get(card['id'])
+        if customer_ledger and infinite_ledger:
+            month = customer_ledger['month_start'][:7]  # YYYY-MM格式
+            monthly_ledgers.append({
+                'card': card,
+                'month': month,
+                'customer': {
+                    'previous_balance': customer_ledger['previous_balance'],
+                    'total_spend': customer_ledger['customer_spend'],
+                    'total_payments': customer_ledger['customer_payments'],
+                    'rolling_balance': customer_ledger['rolling_balance']
+                },
+                'infinite': {
+                    'previous_balance': infinite_ledger['previous_balance'],
+                    'total_spend': infinite_ledger['infinite_spend'],
+                    'supplier_fee': infinite_ledger['supplier_fee'],
+                    'total_payments': infinite_ledger['infinite_payments'],
+                    'rolling_balance': infinite_ledger['rolling_balance'],
+                    'transfers': transfers_by_month.get(month) or 0
+                }
+            })
+
+    return {
+        'customer': customer,
+        'cards': cards_with_timeline,
+        'total_spending': total_spending,
+        'monthly_ledgers': monthly_ledgers,
+        'statements': all_statements,
+        'transactions': all_transactions,
+    }
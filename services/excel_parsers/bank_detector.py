@@ -105,6 +105,22 @@ class BankDetector:
             print(f"CSV读取错误: {e}")
             return None, 0.0
     
+    def detect_from_dataframe(self, df: pd.DataFrame) -> Tuple[Optional[str], float]:
+        """
+        从已读取的完整DataFrame检测银行（与 detect_from_excel / detect_from_csv 一样只看前20行）
+        
+        Args:
+            df: 整个文件读取得到的DataFrame
+            
+        Returns:
+            (银行代码, 置信度分数)
+        """
+        try:
+            return self._detect_from_dataframe(df.head(20))
+        except Exception as e:
+            print(f"银行识别错误: {e}")
+            return None, 0.0
+    
     def _detect_from_dataframe(self, df: pd.DataFrame) -> Tuple[Optional[str], float]:
         """
         从DataFrame检测银行
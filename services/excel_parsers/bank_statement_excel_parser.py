@@ -51,39 +51,40 @@ class BankStatementExcelParser:
                 'message': f'文件解析失败: {e}'
             }
     
-    def _parse_excel(self, file_path: str) -> Dict:
-        """解析Excel文件"""
-        self.bank_code, confidence = self.detector.detect_from_excel(file_path)
+    def parse_dataframe(self, df_full: pd.DataFrame) -> Dict:
+        """
+        解析已读取的银行流水DataFrame（批量导入时文件只读取一次，识别与解析共用）
         
-        if not self.bank_code:
+        Args:
+            df_full: 整个文件读取得到的DataFrame
+            
+        Returns:
+            标准JSON格式数据
+        """
+        try:
+            return self._parse_dataframe(df_full)
+        except Exception as e:
             return {
                 'status': 'error',
-                'error': 'BANK_NOT_DETECTED',
-                'message': '无法识别银行格式'
+                'error': str(e),
+                'message': f'文件解析失败: {e}'
             }
-        
-        self.template = self.detector.get_bank_template(self.bank_code)
-        self.bank_name = self.template['name']
-        
-        df_full = pd.read_excel(file_path)
-        
-        account_info = self._extract_account_info(df_full)
-        transactions = self._extract_transactions(df_full)
-        summary = self._generate_summary(transactions, account_info)
-        
-        return {
-            'status': 'success',
-            'document_type': 'bank_statement',
-            'bank_detected': self.bank_name,
-            'confidence_score': confidence,
-            'account_info': account_info,
-            'transactions': transactions,
-            'summary': summary
-        }
+    
+    def _parse_excel(self, file_path: str) -> Dict:
+        """解析Excel文件"""
+        return self._parse_dataframe(pd.read_excel(file_path))
     
     def _parse_csv(self, file_path: str) -> Dict:
         """解析CSV文件"""
-        self.bank_code, confidence = self.detector.detect_from_csv(file_path)
+        try:
+            df_full = pd.read_csv(file_path, encoding='utf-8')
+        except UnicodeDecodeError:
+            df_full = pd.read_csv(file_path, encoding='gbk')
+        
+        return self._parse_dataframe(df_full)
+    
+    def _parse_dataframe(self, df_full: pd.DataFrame) -> Dict:
+        self.bank_code, confidence = self.detector.detect_from_dataframe(df_full)
         
         if not self.bank_code:
             return {
@@ -95,11 +96,6 @@ class BankStatementExcelParser:
         self.template = self.detector.get_bank_template(self.bank_code)
         self.bank_name = self.template['name']
         
-        try:
-            df_full = pd.read_csv(file_path, encoding='utf-8')
-        except UnicodeDecodeError:
-            df_full = pd.read_csv(file_path, encoding='gbk')
-        
         account_info = self._extract_account_info(df_full)
         transactions = self._extract_transactions(df_full)
         summary = self._generate_summary(transactions, account_info)
@@ -0,0 +1,275 @@
+"""
+Excel/CSV 批量导入
+================
+- 上传请求只负责保存文件并入队，立即返回批次ID
+- 每个文件一个任务（excel_import.parse），由 services.job_queue 的进程池并行解析
+- 每个文件只读取一次：同一个DataFrame先做文档类型识别（前20行）再交给解析器
+- 进度：按批次ID汇总各文件任务的状态与结果，可轮询或以SSE流式推送
+- 进程内没有运行中的任务队列Worker时（gunicorn 部署不会调用 start_scheduler），
+  入队后按需启动一个只处理解析任务的Worker，避免批次一直停在 pending；
+  各Web进程通过文件锁选出一个进程运行该Worker（整个部署只有一个解析进程池）
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境：单进程运行，不需要选主
+    fcntl = None
+
+import pandas as pd
+
+from services.job_queue import JobWorker, job_queue, register_job_handler
+from .bank_detector import BankDetector
+from .bank_statement_excel_parser import BankStatementExcelParser
+from .credit_card_excel_parser import CreditCardExcelParser
+
+ALLOWED_EXTENSIONS = {'.xlsx', '.xls', '.csv'}
+
+JOB_TYPE = 'excel_import.parse'
+
+# 按需启动的解析Worker进程数（只在持有Worker锁的Web进程中启动）
+EXCEL_IMPORT_WORKER_PROCESSES = int(os.environ.get('EXCEL_IMPORT_WORKER_PROCESSES', '2'))
+
+# SSE 进度流最长保持时间（秒），需小于 gunicorn --timeout，超时后客户端重连或改为轮询
+EXCEL_BATCH_EVENTS_TIMEOUT = float(os.environ.get('EXCEL_BATCH_EVENTS_TIMEOUT', '60'))
+
+_import_worker: Optional[JobWorker] = None
+_import_worker_lock = threading.Lock()
+# 持有Worker锁的文件对象（进程退出时锁自动释放，由下一次上传的进程接管）
+_leader_lock_file = None
+
+
+def _batch_key_prefix(batch_id: str) -> str:
+    return f'{JOB_TYPE}:{batch_id}:'
+
+
+def read_statement_file(file_path: str) -> pd.DataFrame:
+    """完整读取一次Excel/CSV（CSV先按UTF-8，失败再按GBK）"""
+    if file_path.lower().endswith('.csv'):
+        try:
+            return pd.read_csv(file_path, encoding='utf-8')
+        except UnicodeDecodeError:
+            return pd.read_csv(file_path, encoding='gbk')
+    return pd.read_excel(file_path)
+
+
+def parse_statement_dataframe(df: pd.DataFrame) -> Dict:
+    """识别文档类型（信用卡 / 银行流水）并用对应解析器解析同一个DataFrame"""
+    doc_type = BankDetector().detect_document_type(df.head(20))
+
+    if doc_type == 'credit_card':
+        parser = CreditCardExcelParser()
+    else:
+        parser = BankStatementExcelParser()
+
+    return parser.parse_dataframe(df)
+
+
+def parse_statement_file(batch_id: str, file_path: str, filename: str) -> Dict:
+    """
+    任务处理函数：解析批次中的一个文件
+    解析失败返回 status=error 的结果（格式问题重试无意义），临时文件处理完即删除
+    """
+    try:
+        result = parse_statement_dataframe(read_statement_file(file_path))
+    except Exception as e:
+        result = {
+            'status': 'error',
+            'message': str(e)
+        }
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        batch_dir = os.path.dirname(file_path)
+        if os.path.isdir(batch_dir) and not os.listdir(batch_dir):
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+    result['filename'] = filename
+    # 任务结果以JSON保存：日期 / numpy 类型转为字符串
+    return json.loads(json.dumps(result, ensure_ascii=False, default=str))
+
+
+register_job_handler(JOB_TYPE, 'services.excel_parsers.batch_import:parse_statement_file')
+
+
+def enqueue_excel_batch(upload_dir: str, files: Iterable[Tuple[str, object]]) -> Tuple[str, List[Dict]]:
+    """
+    保存上传的文件并为每个文件入队一个解析任务
+
+    Args:
+        upload_dir: 批次文件的根目录（每个批次一个子目录）
+        files: (原始文件名, 带 save(path) 方法的文件对象)
+
+    Returns:
+        (批次ID, 未入队的文件及原因)
+    """
+    batch_id = uuid.uuid4().hex
+    batch_dir = os.path.join(upload_dir, batch_id)
+    jobs = []
+    rejected = []
+
+    for index, (filename, storage) in enumerate(files):
+        if not filename:
+            continue
+        file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            rejected.append({
+                'filename': filename,
+                'status': 'error',
+                'message': '不支持的文件格式'
+            })
+            continue
+
+        os.makedirs(batch_dir, exist_ok=True)
+        # 同一批次中可能有同名文件：加序号区分
+        file_path = os.path.join(batch_dir, f'{index:04d}{file_ext}')
+        storage.save(file_path)
+        jobs.append({
+            'job_type': JOB_TYPE,
+            'payload': {'batch_id': batch_id, 'file_path': file_path, 'filename': filename},
+            'idempotency_key': f'{_batch_key_prefix(batch_id)}{index:04d}',
+            # 解析是确定性的，失败不重试
+            'max_attempts': 1,
+        })
+
+    job_queue.enqueue_many(jobs)
+    return batch_id, rejected
+
+
+def get_excel_batch_status(batch_id: str) -> Optional[Dict]:
+    """批次进度：各文件任务的状态与已完成文件的解析结果；批次不存在时返回None"""
+    jobs = job_queue.list_by_key_prefix(_batch_key_prefix(batch_id))
+    if not jobs:
+        return None
+
+    files = []
+    for job in jobs:
+        entry = {
+            'filename': job['payload'].get('filename'),
+            'job_id': job['id'],
+            'job_status': job['status'],
+        }
+        if job['status'] == 'succeeded':
+            entry['result'] = job['result']
+        elif job['status'] == 'failed':
+            entry['result'] = {
+                'filename': entry['filename'],
+                'status': 'error',
+                'message': job['last_error']
+            }
+        files.append(entry)
+
+    finished = [f for f in files if f['job_status'] in ('succeeded', 'failed')]
+    success_count = sum(1 for f in finished if f['result'].get('status') == 'success')
+    return {
+        'batch_id': batch_id,
+        'total_files': len(files),
+        'processed': len(finished),
+        'success_count': success_count,
+        'failed_count': len(finished) - success_count,
+        'done': len(finished) == len(files),
+        'files': files,
+    }
+
+
+def _worker_lock_path(queue) -> str:
+    return f'{queue.db_path}.excel-import.lock'
+
+
+def _acquire_worker_lock(queue) -> bool:
+    """非阻塞获取解析Worker的文件锁；已被其他进程持有时返回False"""
+    global _leader_lock_file
+    if _leader_lock_file is not None:
+        return True
+    if fcntl is None:
+        return True
+    lock_file = open(_worker_lock_path(queue), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _leader_lock_file = lock_file
+    return True
+
+
+def _release_worker_lock():
+    global _leader_lock_file
+    lock_file, _leader_lock_file = _leader_lock_file, None
+    if lock_file is not None:
+        lock_file.close()
+
+
+def ensure_excel_import_worker() -> Optional[JobWorker]:
+    """
+    启动（或唤醒）解析Worker：只领取 excel_import.parse 任务，不执行定时任务
+    
+    只有取得Worker锁的Web进程启动Worker（整个部署一个进程池）；其他进程返回None，
+    入队的任务由持锁进程的Worker在下一次轮询（1秒）时领取
+    """
+    global _import_worker
+    with _import_worker_lock:
+        if _import_worker is not None and _import_worker.queue is not job_queue:
+            _import_worker.stop()
+            _import_worker = None
+            _release_worker_lock()
+        if _import_worker is None:
+            if not _acquire_worker_lock(job_queue):
+                return None
+            _import_worker = JobWorker(queue=job_queue, job_types=[JOB_TYPE],
+                                       max_workers=EXCEL_IMPORT_WORKER_PROCESSES, poll_interval=1.0)
+        _import_worker.start()
+    _import_worker.wakeup()
+    return _import_worker
+
+
+def stop_excel_import_worker():
+    global _import_worker
+    with _import_worker_lock:
+        worker, _import_worker = _import_worker, None
+        if worker is not None:
+            worker.stop()
+        _release_worker_lock()
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def iter_batch_events(batch_id: str, timeout: float = EXCEL_BATCH_EVENTS_TIMEOUT,
+                      poll_interval: float = 1.0) -> Iterator[str]:
+    """
+    批次进度SSE事件：每完成一个文件一条 file 事件，全部完成后 done 事件；
+    批次不存在时 error 事件，超过 timeout 仍未完成时 timeout 事件。三种情况都结束流，
+    不会长期占用同步Web Worker
+    
+    不依赖请求上下文：每次轮询由任务队列打开并关闭一个短连接，两次轮询之间不持有数据库连接
+    """
+    sent = set()
+    deadline = time.monotonic() + timeout
+    while True:
+        status = get_excel_batch_status(batch_id)
+        if status is None:
+            yield _sse('error', {'batch_id': batch_id, 'message': '批次不存在'})
+            return
+        for entry in status['files']:
+            if 'result' in entry and entry['job_id'] not in sent:
+                sent.add(entry['job_id'])
+                yield _sse('file', entry)
+        summary = {k: v for k, v in status.items() if k != 'files'}
+        if status['done']:
+            yield _sse('done', summary)
+            return
+        if time.monotonic() >= deadline:
+            yield _sse('timeout', summary)
+            return
+        # 注释行作为心跳：客户端断开时写入失败，生成器随之关闭
+        yield ': keepalive\n\n'
+        time.sleep(poll_interval)
@@ -50,31 +50,28 @@ class CreditCardExcelParser:
                 'message': f'文件解析失败: {e}'
             }
     
+    def parse_dataframe(self, df_full: pd.DataFrame) -> Dict:
+        """
+        解析已读取的信用卡DataFrame（批量导入时文件只读取一次，识别与解析共用）
+        
+        Args:
+            df_full: 整个文件读取得到的DataFrame
+            
+        Returns:
+            标准JSON格式数据
+        """
+        try:
+            return self._parse_dataframe(df_full)
+        except Exception as e:
+            return {
+                'status': 'error',
+                'error': str(e),
+                'message': f'文件解析失败: {e}'
+            }
+    
     def _parse_excel(self, file_path: str) -> Dict:
         """解析Excel文件"""
-        df_full = pd.read_excel(file_path)
-        
-        self.bank_code, confidence = self.detector.detect_from_excel(file_path)
-        
-        if not self.bank_code:
-            self.bank_name = 'Unknown Bank'
-        else:
-            template = self.detector.get_bank_template(self.bank_code)
-            self.bank_name = template['name']
-        
-        account_info = self._extract_card_info(df_full)
-        transactions = self._extract_transactions(df_full)
-        summary = self._generate_summary(transactions, account_info)
-        
-        return {
-            'status': 'success',
-            'document_type': 'credit_card',
-            'bank_detected': self.bank_name,
-            'confidence_score': confidence if self.bank_code else 0.5,
-            'account_info': account_info,
-            'transactions': transactions,
-            'summary': summary
-        }
+        return self._parse_dataframe(pd.read_excel(file_path))
     
     def _parse_csv(self, file_path: str) -> Dict:
         """解析CSV文件"""
@@ -83,7 +80,10 @@ class CreditCardExcelParser:
         except UnicodeDecodeError:
             df_full = pd.read_csv(file_path, encoding='gbk')
         
-        self.bank_code, confidence = self.detector.detect_from_csv(file_path)
+        return self._parse_dataframe(df_full)
+    
+    def _parse_dataframe(self, df_full: pd.DataFrame) -> Dict:
+        self.bank_code, confidence = self.detector.detect_from_dataframe(df_full)
         
         if not self.bank_code:
             self.bank_name = 'Unknown Bank'
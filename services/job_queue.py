@@ -0,0 +1,594 @@
+"""
+持久化任务队列 + 进程池Worker
+- 任务存放在本地SQLite表 jobs 中（默认 db/job_queue.db），进程重启后未完成的任务继续执行
+- 任务状态：pending → running → succeeded / failed（失败按指数退避重试，超过最大次数后停在 failed）
+- idempotency_key 唯一：同一个键只会入队一次（多个进程重复触发定时任务也不会重复执行）；
+  已失败（failed）的任务可以显式重新排队：enqueue(..., requeue_failed=True) 或 requeue_failed(...)
+- JobWorker：调度线程领取任务，交给进程池并行执行（进程数 JOB_WORKER_PROCESSES）
+- PeriodicJob：取代 schedule 循环，按时间生成带幂等键的任务，错过的当天任务在重启后补执行
+
+处理函数以 "模块路径:函数名" 注册，子进程按路径导入执行，参数为任务 payload（JSON）
+"""
+
+import importlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional
+
+JOB_QUEUE_DB_PATH = os.environ.get(
+    'JOB_QUEUE_DB_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db', 'job_queue.db')
+)
+
+# 进程池大小
+JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', str(min(4, os.cpu_count() or 1))))
+
+# 默认最大尝试次数
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+
+# 重试退避基数（秒）：第n次失败后等待 base * 2^(n-1)
+JOB_RETRY_BASE_SECONDS = int(os.environ.get('JOB_RETRY_BASE_SECONDS', '60'))
+
+# running 任务超过该时间没有心跳（Worker每个定时检查周期刷新 locked_at），视为Worker已失效，任务重新入队（秒）
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', '3600'))
+
+# 子进程启动方式：默认 spawn（避免在多线程的Web进程中fork）
+JOB_WORKER_START_METHOD = os.environ.get('JOB_WORKER_START_METHOD', 'spawn')
+
+JOB_STATUSES = ('pending', 'running', 'succeeded', 'failed')
+
+_TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    idempotency_key TEXT UNIQUE,
+    run_at TEXT NOT NULL,
+    locked_by TEXT,
+    locked_at TEXT,
+    started_at TEXT,
+    last_error TEXT,
+    result TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs(status, run_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_job_type ON jobs(job_type);
+'''
+
+
+# failed → pending：重置尝试次数，清除上次的错误与结果
+_REQUEUE_SET = '''
+    status = 'pending', attempts = 0, run_at = ?, last_error = NULL, result = NULL,
+    locked_by = NULL, locked_at = NULL, started_at = NULL, finished_at = NULL, updated_at = ?
+'''
+
+
+def _now() -> str:
+    return datetime.now().strftime(_TS_FORMAT)
+
+
+# ============================================================
+# 处理函数注册表
+# ============================================================
+
+_HANDLERS: Dict[str, str] = {}
+
+
+def register_job_handler(job_type: str, handler_path: str):
+    """注册任务处理函数，handler_path 格式 'package.module:function'"""
+    _HANDLERS[job_type] = handler_path
+
+
+def get_registered_job_types() -> List[str]:
+    return list(_HANDLERS)
+
+
+def _resolve_handler(handler_path: str) -> Callable:
+    module_name, func_name = handler_path.split(':', 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _execute_job(handler_path: str, payload: Dict):
+    """在子进程中执行任务（模块级函数，可被进程池序列化）"""
+    result = _resolve_handler(handler_path)(**payload)
+    # 结果需能写入JSON，无法序列化时保存字符串形式
+    try:
+        json.dumps(result)
+        return result
+    except (TypeError, ValueError):
+        return str(result)
+
+
+# ============================================================
+# 队列存储
+# ============================================================
+
+class JobQueue:
+    """SQLite任务队列；每次操作使用独立的短连接，可在多个进程中同时使用"""
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB_PATH):
+        self.db_path = db_path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        conn.executescript(_SCHEMA)
+                        # 旧版本创建的表补充 started_at（本次执行开始时间，locked_at 会被心跳刷新）
+                        columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+                        if 'started_at' not in columns:
+                            conn.execute('ALTER TABLE jobs ADD COLUMN started_at TEXT')
+                        self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, job_type: str, payload: Optional[Dict] = None, idempotency_key: Optional[str] = None,
+                max_attempts: int = JOB_MAX_ATTEMPTS, run_at: Optional[datetime] = None,
+                requeue_failed: bool = False) -> int:
+        """
+        任务入队，返回任务ID
+        idempotency_key 已存在时不重复入队，返回已有任务的ID；
+        requeue_failed=True 时已失败（failed）的同键任务以新的 payload 重置尝试次数后重新排队
+        """
+        now = _now()
+        run_at_str = run_at.strftime(_TS_FORMAT) if run_at else now
+        payload_json = json.dumps(payload or {}, ensure_ascii=False)
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO jobs
+                    (job_type, payload, status, max_attempts, idempotency_key, run_at, created_at, updated_at)
+                VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)
+            ''', (job_type, payload_json, max_attempts, idempotency_key, run_at_str, now, now))
+            if cursor.rowcount:
+                return cursor.lastrowid
+            if requeue_failed:
+                conn.execute(f'''
+                    UPDATE jobs SET {_REQUEUE_SET}, payload = ?, max_attempts = ?
+                    WHERE idempotency_key = ? AND status = 'failed'
+                ''', (run_at_str, now, payload_json, max_attempts, idempotency_key))
+            row = conn.execute('SELECT id FROM jobs WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+            return row['id']
+
+    def enqueue_many(self, jobs: Iterable[Dict], requeue_failed: bool = False) -> int:
+        """
+        批量入队（单个事务）；每项包含 job_type / payload / idempotency_key，返回新入队数量
+        requeue_failed=True 时已失败的同键任务重新排队，计入返回数量
+        """
+        now = _now()
+        rows = [
+            (job['job_type'], json.dumps(job.get('payload') or {}, ensure_ascii=False),
+             job.get('max_attempts', JOB_MAX_ATTEMPTS), job.get('idempotency_key'), now, now, now)
+            for job in jobs
+        ]
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            before = conn.total_changes
+            conn.executemany('''
+                INSERT OR IGNORE INTO jobs
+                    (job_type, payload, status, max_attempts, idempotency_key, run_at, created_at, updated_at)
+                VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)
+            ''', rows)
+            if requeue_failed:
+                # 刚插入的任务是 pending，不受影响
+                conn.executemany(f'''
+                    UPDATE jobs SET {_REQUEUE_SET}, payload = ?, max_attempts = ?
+                    WHERE idempotency_key = ? AND status = 'failed'
+                ''', [(now, now, payload, max_attempts, key)
+                      for _, payload, max_attempts, key, *_ in rows if key is not None])
+            queued = conn.total_changes - before
+            conn.execute('COMMIT')
+        return queued
+
+    def requeue_failed(self, job_type: Optional[str] = None, key_prefix: Optional[str] = None) -> int:
+        """把已失败的任务（可按类型 / 幂等键前缀筛选）重置尝试次数后重新排队，返回数量"""
+        now = _now()
+        sql = f"UPDATE jobs SET {_REQUEUE_SET} WHERE status = 'failed'"
+        params: list = [now, now]
+        if job_type is not None:
+            sql += ' AND job_type = ?'
+            params.append(job_type)
+        if key_prefix is not None:
+            sql += ' AND idempotency_key >= ? AND idempotency_key < ?'
+            params.extend([key_prefix, key_prefix + '\uffff'])
+        with self._connect() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def claim(self, worker_id: str, limit: int, job_types: Optional[Iterable[str]] = None) -> List[Dict]:
+        """原子领取到期的 pending 任务并标记为 running"""
+        if limit <= 0:
+            return []
+        now = _now()
+        sql = "SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ?"
+        params: list = [now]
+        if job_types is not None:
+            job_types = list(job_types)
+            if not job_types:
+                return []
+            sql += f" AND job_type IN ({','.join('?' * len(job_types))})"
+            params.extend(job_types)
+        sql += ' ORDER BY run_at, id LIMIT ?'
+        params.append(limit)
+
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(sql, params).fetchall()
+                if rows:
+                    conn.executemany('''
+                        UPDATE jobs
+                        SET status = 'running', attempts = attempts + 1,
+                            locked_by = ?, locked_at = ?, started_at = ?, updated_at = ?
+                        WHERE id = ?
+                    ''', [(worker_id, now, now, now, row['id']) for row in rows])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'] or '{}')
+            job['attempts'] += 1
+            job['status'] = 'running'
+            job['started_at'] = now
+            jobs.append(job)
+        return jobs
+
+    def complete(self, job_id: int, result=None):
+        now = _now()
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE jobs
+                SET status = 'succeeded', result = ?, last_error = NULL,
+                    locked_by = NULL, locked_at = NULL, updated_at = ?, finished_at = ?
+                WHERE id = ?
+            ''', (json.dumps(result, ensure_ascii=False) if result is not None else None, now, now, job_id))
+
+    def fail(self, job_id: int, error: str) -> str:
+        """记录失败；未超过最大尝试次数时按指数退避重新排队。返回新的状态"""
+        now = datetime.now()
+        with self._connect() as conn:
+            row = conn.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return 'failed'
+            if row['attempts'] < row['max_attempts']:
+                delay = JOB_RETRY_BASE_SECONDS * (2 ** max(row['attempts'] - 1, 0))
+                status = 'pending'
+                conn.execute('''
+                    UPDATE jobs
+                    SET status = 'pending', last_error = ?, run_at = ?,
+                        locked_by = NULL, locked_at = NULL, updated_at = ?
+                    WHERE id = ?
+                ''', (error, (now + timedelta(seconds=delay)).strftime(_TS_FORMAT), now.strftime(_TS_FORMAT), job_id))
+            else:
+                status = 'failed'
+                conn.execute('''
+                    UPDATE jobs
+                    SET status = 'failed', last_error = ?,
+                        locked_by = NULL, locked_at = NULL, updated_at = ?, finished_at = ?
+                    WHERE id = ?
+                ''', (error, now.strftime(_TS_FORMAT), now.strftime(_TS_FORMAT), job_id))
+        return status
+
+    def heartbeat(self, worker_id: str) -> int:
+        """刷新该Worker正在执行的任务的 locked_at，长时间运行的任务不会被当作锁超时"""
+        now = _now()
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET locked_at = ?, updated_at = ? WHERE status = 'running' AND locked_by = ?",
+                (now, now, worker_id)
+            ).rowcount
+
+    def recover_stale(self, lock_timeout: int = JOB_LOCK_TIMEOUT, dead_workers: Iterable[str] = ()) -> int:
+        """把Worker已失效的 running 任务重新放回 pending（心跳超时，或所属Worker进程已不存在）"""
+        now = datetime.now()
+        cutoff = (now - timedelta(seconds=lock_timeout)).strftime(_TS_FORMAT)
+        dead_workers = list(dead_workers)
+        with self._connect() as conn:
+            sql = "UPDATE jobs SET status = 'pending', locked_by = NULL, locked_at = NULL, updated_at = ? " \
+                  "WHERE status = 'running' AND (locked_at < ?"
+            params: list = [now.strftime(_TS_FORMAT), cutoff]
+            if dead_workers:
+                sql += f" OR locked_by IN ({','.join('?' * len(dead_workers))})"
+                params.extend(dead_workers)
+            sql += ')'
+            return conn.execute(sql, params).rowcount
+
+    def running_workers(self) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT locked_by FROM jobs WHERE status = 'running' AND locked_by IS NOT NULL"
+            ).fetchall()
+        return [row['locked_by'] for row in rows]
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'] or '{}')
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def list_by_key_prefix(self, prefix: str) -> List[Dict]:
+        """幂等键以 prefix 开头的任务（按ID排序），用于查询一组拆分任务的进度"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE idempotency_key >= ? AND idempotency_key < ? ORDER BY id",
+                (prefix, prefix + '\uffff')
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'] or '{}')
+            job['result'] = json.loads(job['result']) if job['result'] else None
+            jobs.append(job)
+        return jobs
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT job_type, status, COUNT(*) AS count
+                FROM jobs GROUP BY job_type, status
+            ''').fetchall()
+        result: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            result.setdefault(row['job_type'], {s: 0 for s in JOB_STATUSES})[row['status']] = row['count']
+        return result
+
+
+# ============================================================
+# 定时任务（取代 schedule 循环）
+# ============================================================
+
+class PeriodicJob:
+    """
+    周期任务定义
+    - at='HH:MM'：每天该时间之后入队一次（可配合 day 指定每月几号）
+    - every_hours=N：每N小时入队一次
+    幂等键包含时间窗口，因此多个进程同时检查、或重启后补检查都只会入队一次
+    """
+
+    def __init__(self, name: str, job_type: str, at: Optional[str] = None, every_hours: Optional[int] = None,
+                 day: Optional[int] = None, payload_fn: Optional[Callable[[datetime], Dict]] = None):
+        if (at is None) == (every_hours is None):
+            raise ValueError('PeriodicJob 需要且只能指定 at 或 every_hours 之一')
+        self.name = name
+        self.job_type = job_type
+        self.at = datetime.strptime(at, '%H:%M').time() if at else None
+        self.every_hours = every_hours
+        self.day = day
+        self.payload_fn = payload_fn
+
+    def due_key(self, now: datetime) -> Optional[str]:
+        """当前时间窗口的幂等键；尚未到时间时返回None"""
+        if self.day is not None and now.day != self.day:
+            return None
+        if self.at is not None:
+            if now.time() < self.at:
+                return None
+            return f"{self.name}:{now:%Y-%m-%d}"
+        window = now.hour // self.every_hours * self.every_hours
+        return f"{self.name}:{now:%Y-%m-%d}T{window:02d}"
+
+    def enqueue_if_due(self, queue: JobQueue, now: Optional[datetime] = None) -> Optional[int]:
+        now = now or datetime.now()
+        key = self.due_key(now)
+        if key is None:
+            return None
+        payload = self.payload_fn(now) if self.payload_fn else {}
+        return queue.enqueue(self.job_type, payload, idempotency_key=key)
+
+
+# ============================================================
+# Worker
+# ============================================================
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _is_dead_local_worker(worker_id: str) -> bool:
+    host, _, pid = worker_id.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+        return False
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+
+
+class JobWorker:
+    """调度线程 + 进程池：领取任务、并行执行、回写结果"""
+
+    def __init__(self, queue: Optional[JobQueue] = None, job_types: Optional[Iterable[str]] = None,
+                 periodic_jobs: Iterable[PeriodicJob] = (), max_workers: int = JOB_WORKER_PROCESSES,
+                 poll_interval: float = 5.0, periodic_interval: float = 60.0):
+        self.queue = queue or JobQueue()
+        self.job_types = list(job_types) if job_types is not None else None
+        self.periodic_jobs = list(periodic_jobs)
+        self.max_workers = max(1, max_workers)
+        self.poll_interval = poll_interval
+        self.periodic_interval = periodic_interval
+        self.worker_id = _worker_id()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 保护 _executor 的替换：进程池回调线程与调度线程都可能在进程池损坏时重建
+        self._executor_lock = threading.Lock()
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_periodic = 0.0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers,
+                                   mp_context=multiprocessing.get_context(JOB_WORKER_START_METHOD))
+
+    def _replace_executor(self, broken: ProcessPoolExecutor):
+        """进程池损坏时重建；多个任务同时报告同一个损坏的进程池只重建一次"""
+        with self._executor_lock:
+            if self._executor is not broken or self._stop.is_set():
+                return
+            self._executor = self._new_executor()
+        # 可能在旧进程池自己的回调线程中调用，不能等待
+        broken.shutdown(wait=False)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        # 上次运行时被中断（进程重启）的任务重新入队
+        dead = [w for w in self.queue.running_workers() if _is_dead_local_worker(w)]
+        recovered = self.queue.recover_stale(dead_workers=dead)
+        if recovered:
+            print(f"♻️ 任务队列：{recovered} 个中断的任务已重新入队")
+        self._stop.clear()
+        with self._executor_lock:
+            self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._run, name='job-worker', daemon=True)
+        self._thread.start()
+        print(f"⏰ 任务队列Worker已启动（{self.worker_id}，进程数 {self.max_workers}）")
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
+
+    def wakeup(self):
+        """有新任务入队时立即派发，不等待下一次轮询"""
+        self._wakeup.set()
+
+    def join(self):
+        """阻塞直到调度线程退出（独立运行Worker进程时使用）"""
+        if self._thread:
+            self._thread.join()
+
+    def _job_types(self) -> List[str]:
+        return self.job_types if self.job_types is not None else get_registered_job_types()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ 任务队列调度错误: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def run_once(self) -> int:
+        """检查定时任务并派发一轮任务，返回派发数量"""
+        if time.monotonic() - self._last_periodic >= self.periodic_interval:
+            self._last_periodic = time.monotonic()
+            for periodic in self.periodic_jobs:
+                try:
+                    periodic.enqueue_if_due(self.queue)
+                except Exception as e:
+                    print(f"❌ 定时任务 {periodic.name} 入队失败: {e}")
+            # 先给本Worker仍在执行的任务续期，只有停止心跳的Worker（或本机已退出的进程）的任务才重新入队
+            self.queue.heartbeat(self.worker_id)
+            dead = [w for w in self.queue.running_workers() if _is_dead_local_worker(w)]
+            self.queue.recover_stale(dead_workers=dead)
+
+        with self._inflight_lock:
+            free = self.max_workers - self._inflight
+        jobs = self.queue.claim(self.worker_id, free, self._job_types())
+        for job in jobs:
+            self._submit(job)
+        return len(jobs)
+
+    def _submit(self, job: Dict):
+        handler_path = _HANDLERS.get(job['job_type'])
+        if handler_path is None:
+            self.queue.fail(job['id'], f"未注册的任务类型: {job['job_type']}")
+            return
+        with self._inflight_lock:
+            self._inflight += 1
+        try:
+            # 持锁提交，不会提交到刚被回调线程替换并关闭的旧进程池
+            with self._executor_lock:
+                executor = self._executor
+                if executor is None:
+                    raise RuntimeError('Worker已停止')
+                future = executor.submit(_execute_job, handler_path, job['payload'])
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._finish(job, error=f"进程池不可用: {e}")
+            if executor is not None:
+                self._replace_executor(executor)
+            return
+        future.add_done_callback(partial(self._on_done, job, executor))
+
+    def _on_done(self, job: Dict, executor: ProcessPoolExecutor, future):
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # 子进程异常退出：重建进程池，任务按失败重试
+            self._replace_executor(executor)
+            self._finish(job, error=f"Worker进程异常退出: {e}")
+            return
+        except Exception as e:
+            self._finish(job, error=f"{type(e).__name__}: {e}")
+            return
+        self._finish(job, result=result)
+
+    def _finish(self, job: Dict, result=None, error: Optional[str] = None):
+        try:
+            if error is None:
+                self.queue.complete(job['id'], result)
+            else:
+                status = self.queue.fail(job['id'], error)
+                print(f"  ❌ 任务 #{job['id']} {job['job_type']} 失败（第{job['attempts']}次，{status}）: {error}")
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+            self._wakeup.set()
+
+
+job_queue = JobQueue()
+
+
+def enqueue_job(job_type: str, payload: Optional[Dict] = None, idempotency_key: Optional[str] = None,
+                max_attempts: int = JOB_MAX_ATTEMPTS, requeue_failed: bool = False) -> int:
+    return job_queue.enqueue(job_type, payload, idempotency_key=idempotency_key, max_attempts=max_attempts,
+                             requeue_failed=requeue_failed)
+
+
+def get_job_queue_stats() -> Dict:
+    return job_queue.stats()
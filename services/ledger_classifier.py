@@ -5,6 +5,8 @@ Ledger Classifier Service
 import sqlite3
 from typing import Tuple, Optional
 
+from services.supplier_matcher import get_supplier_matcher
+
 class LedgerClassifier:
     def __init__(self, db_path='db/smart_loan_manager.db'):
         self.db_path = db_path
@@ -24,6 +26,7 @@ class LedgerClassifier:
         self.supplier_aliases = {}
         for alias, supplier_name in cursor.fetchall():
             self.supplier_aliases[alias] = supplier_name
+        self.supplier_matcher = get_supplier_matcher(list(self.supplier_aliases.items()), case='lower')
         
         # 加载付款人别名（按customer_id分组）
         cursor.execute("""
@@ -57,14 +60,9 @@ class LedgerClassifier:
         
         返回: (是否INFINITE供应商, 供应商标准名称)
         """
-        if not description:
-            return False, None
-        
-        description_lower = description.lower()
-        
-        for alias, supplier_name in self.supplier_aliases.items():
-            if alias in description_lower:
-                return True, supplier_name
+        supplier_name = self.supplier_matcher.match_supplier(description)
+        if supplier_name:
+            return True, supplier_name
         
         return False, None
     
@@ -1,31 +1,160 @@
 """
 Monthly Ledger Engine
 月度账本计算引擎 - 计算客户和INFINITE两条财务线
+
+增量计算：
+- statements / transactions 上的触发器在新增、修改、确认、删除时把 (card_id, 月份) 写入 monthly_ledger_dirty
+- incremental=True 时只从该卡最早的脏月份（或尚未计算的月份）开始重算，
+  上月余额直接读取上月账本行，不再从头滚动计算
+- 重算过程中遇到未标记的月份，若结转余额与该月已存的上月余额一致，则沿用已存结果（不重读交易、不重生成发票）
+
+供应商发票：账本事务内只写入 supplier_invoices 记录，PDF在提交后渲染（渲染期间不持有SQLite写锁）
 """
 import sqlite3
+import threading
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 from services.ledger_classifier import LedgerClassifier
 from services.invoice_generator import SupplierInvoiceGenerator
 
+DIRTY_TABLE = 'monthly_ledger_dirty'
+
+_MONTH_SQL = "substr({date}, 1, 7) || '-01'"
+
+_REQUIRED_COLUMNS = {
+    'statements': {'id', 'card_id', 'statement_date', 'statement_total', 'previous_balance', 'is_confirmed'},
+    'transactions': {'id', 'statement_id', 'description', 'amount', 'transaction_type', 'category'},
+}
+
+
+def _mark_statement_sql(card_id: str, statement_date: str) -> str:
+    month = _MONTH_SQL.format(date=statement_date)
+    return f'''
+        INSERT INTO {DIRTY_TABLE} (card_id, month_start)
+        SELECT {card_id}, {month}
+        WHERE {statement_date} IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM {DIRTY_TABLE} WHERE card_id = {card_id} AND month_start = {month});
+    '''
+
+
+def _mark_transaction_sql(statement_id: str) -> str:
+    month = _MONTH_SQL.format(date='s.statement_date')
+    return f'''
+        INSERT INTO {DIRTY_TABLE} (card_id, month_start)
+        SELECT s.card_id, {month} FROM statements s
+        WHERE s.id = {statement_id} AND s.statement_date IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM {DIRTY_TABLE} d WHERE d.card_id = s.card_id AND d.month_start = {month});
+    '''
+
+
+# 触发器中不使用唯一约束冲突处理：外层语句的 OR REPLACE / OR IGNORE 会覆盖触发器内的冲突策略
+_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS statements_ledger_dirty_ai AFTER INSERT ON statements BEGIN
+        {_mark_statement_sql('new.card_id', 'new.statement_date')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS statements_ledger_dirty_au
+    AFTER UPDATE OF card_id, statement_date, statement_total, previous_balance, is_confirmed ON statements BEGIN
+        {_mark_statement_sql('old.card_id', 'old.statement_date')}
+        {_mark_statement_sql('new.card_id', 'new.statement_date')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS statements_ledger_dirty_ad AFTER DELETE ON statements BEGIN
+        {_mark_statement_sql('old.card_id', 'old.statement_date')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transactions_ledger_dirty_ai AFTER INSERT ON transactions BEGIN
+        {_mark_transaction_sql('new.statement_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transactions_ledger_dirty_au
+    AFTER UPDATE OF statement_id, description, amount, transaction_type, category ON transactions BEGIN
+        {_mark_transaction_sql('old.statement_id')}
+        {_mark_transaction_sql('new.statement_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS transactions_ledger_dirty_ad AFTER DELETE ON transactions BEGIN
+        {_mark_transaction_sql('old.statement_id')}
+    END
+    ''',
+]
+
+_ready = {}
+_lock = threading.Lock()
+
+
+def ensure_ledger_dirty_tracking(conn) -> bool:
+    """
+    创建脏月份表与同步触发器（每个数据库只执行一次）
+    statements / transactions 缺少所需字段时返回False，此时只能全量计算
+    """
+    db_key = conn.execute('PRAGMA database_list').fetchone()[2]
+    ready = _ready.get(db_key)
+    if ready is not None:
+        return ready
+
+    with _lock:
+        if db_key in _ready:
+            return _ready[db_key]
+        for table, columns in _REQUIRED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if not columns <= existing:
+                _ready[db_key] = False
+                return False
+
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                card_id INTEGER,
+                month_start TEXT,
+                marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{DIRTY_TABLE}_card_month
+            ON {DIRTY_TABLE}(card_id, month_start)
+        ''')
+        for trigger in _TRIGGERS:
+            conn.execute(trigger)
+        conn.commit()
+        _ready[db_key] = True
+        return True
+
 
 class MonthlyLedgerEngine:
     def __init__(self, db_path='db/smart_loan_manager.db'):
         self.db_path = db_path
         self.classifier = LedgerClassifier(db_path)
+        conn = sqlite3.connect(db_path)
+        try:
+            ensure_ledger_dirty_tracking(conn)
+        finally:
+            conn.close()
     
-    def calculate_monthly_ledger_for_card(self, card_id: int, recalculate_all: bool = False):
+    def calculate_monthly_ledger_for_card(self, card_id: int, recalculate_all: bool = False,
+                                          incremental: bool = False):
         """
         计算指定信用卡的所有月度账本
         
         Args:
             card_id: 信用卡ID
             recalculate_all: 是否重新计算所有月份（默认只计算新月份）
+            incremental: 只从最早的脏月份 / 未计算月份开始重算（忽略 recalculate_all）
         """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
+            if incremental:
+                # 读取并清除脏标记与重算在同一个写事务中：期间的新修改会在提交后重新标记
+                cursor.execute('BEGIN IMMEDIATE')
+            
             # 获取卡片和客户信息
             cursor.execute("""
                 SELECT c.customer_id, cu.name
@@ -40,16 +169,51 @@ class MonthlyLedgerEngine:
             
             customer_id, customer_name = card_info
             
-            # 获取所有账单（按月份排序）
+            # 存储上月余额和第一个statement标志
+            previous_customer_balance = 0
+            previous_infinite_balance = 0
+            is_first_statement = True
+            dirty_months = set()
+            pending_invoices: List[Dict] = []  # 提交后渲染的发票PDF
+            
+            if incremental:
+                start_date, dirty_months = self._incremental_start(cursor, card_id)
+                if start_date is None:
+                    conn.commit()
+                    print(f"⏭️  Card ID {card_id} 无待重算月份")
+                    return
+                
+                # 上月余额直接读取上一个账单月份的账本行
+                cursor.execute("""
+                    SELECT statement_date FROM statements
+                    WHERE card_id = ? AND statement_date < ?
+                    ORDER BY statement_date DESC
+                    LIMIT 1
+                """, (card_id, start_date))
+                prior = cursor.fetchone()
+                stored = self._stored_ledger(cursor, card_id, prior[0][:7] + '-01') if prior else None
+                if stored:
+                    previous_customer_balance = stored['customer_rolling']
+                    previous_infinite_balance = stored['infinite_rolling']
+                    is_first_statement = False
+                elif prior:
+                    # 上月账本缺失，无法得到结转余额：从第一个账单开始重算
+                    print(f"⚠️  Card ID {card_id} 缺少 {prior[0][:7]} 的账本，从第一个账单开始重算")
+                    start_date = ''
+            else:
+                start_date = ''
+            
+            # 获取账单（按月份排序）
             cursor.execute("""
                 SELECT id, statement_date, statement_total, previous_balance
                 FROM statements
-                WHERE card_id = ?
+                WHERE card_id = ? AND statement_date >= ?
                 ORDER BY statement_date ASC
-            """, (card_id,))
+            """, (card_id, start_date))
             statements = cursor.fetchall()
             
             if not statements:
+                conn.commit()
                 print(f"❌ No statements found for card ID {card_id}")
                 return
             
@@ -58,205 +222,38 @@ class MonthlyLedgerEngine:
             print(f"{'='*80}")
             print(f"共 {len(statements)} 个月的账单\n")
             
-            # 存储上月余额和第一个statement标志
-            previous_customer_balance = 0
-            previous_infinite_balance = 0
-            is_first_statement = True
-            
             for statement_id, statement_date, statement_total, stmt_prev_balance in statements:
                 month_start = statement_date[:7] + '-01'  # YYYY-MM-01
                 
                 # 检查是否已计算过
-                if not recalculate_all:
-                    cursor.execute("""
-                        SELECT id FROM monthly_ledger 
-                        WHERE card_id = ? AND month_start = ?
-                    """, (card_id, month_start))
-                    if cursor.fetchone():
+                if incremental or not recalculate_all:
+                    stored = self._stored_ledger(cursor, card_id, month_start)
+                    if incremental:
+                        # 未标记且结转余额不变的月份，结果与已存账本相同
+                        skip = (
+                            stored is not None and month_start not in dirty_months and (
+                                is_first_statement or (
+                                    abs(stored['customer_previous'] - previous_customer_balance) <= 0.005 and
+                                    abs(stored['infinite_previous'] - previous_infinite_balance) <= 0.005
+                                )
+                            )
+                        )
+                    else:
+                        skip = stored is not None
+                    
+                    if skip:
                         print(f"⏭️  {statement_date[:7]} - 已计算，跳过")
                         # 读取已有的余额
-                        cursor.execute("""
-                            SELECT rolling_balance FROM monthly_ledger 
-                            WHERE card_id = ? AND month_start = ?
-                        """, (card_id, month_start))
-                        result = cursor.fetchone()
-                        if result:
-                            previous_customer_balance = result[0]
-                        
-                        cursor.execute("""
-                            SELECT rolling_balance FROM infinite_monthly_ledger 
-                            WHERE card_id = ? AND month_start = ?
-                        """, (card_id, month_start))
-                        result = cursor.fetchone()
-                        if result:
-                            previous_infinite_balance = result[0]
-                        
+                        previous_customer_balance = stored['customer_rolling']
+                        previous_infinite_balance = stored['infinite_rolling']
                         is_first_statement = False  # 跳过后不再是第一个
                         continue
                 
-                print(f"📅 处理 {statement_date[:7]} (Statement ID: {statement_id})")
-                
-                # 获取该月所有交易（包含category字段和transaction_date）
-                cursor.execute("""
-                    SELECT id, description, amount, transaction_type, category, transaction_date
-                    FROM transactions
-                    WHERE statement_id = ?
-                """, (statement_id,))
-                transactions = cursor.fetchall()
-                
-                # 初始化统计
-                customer_spend = 0
-                customer_payments = 0
-                infinite_spend = 0
-                infinite_payments = 0
-                infinite_supplier_transactions = []  # 用于发票生成
-                
-                # 使用category字段进行分类和累计
-                for txn_id, description, amount, txn_type, category, transaction_date in transactions:
-                    # 使用category字段判断（优先级高于动态分类）
-                    if category == 'owner_expense':
-                        customer_spend += abs(amount)
-                    elif category == 'owner_payment':
-                        customer_payments += abs(amount)
-                    elif category == 'infinite_expense':
-                        infinite_spend += abs(amount)
-                        # 检查是否是INFINITE供应商（用于发票生成）
-                        is_supplier, supplier_name = self.classifier.is_infinite_supplier(description)
-                        if is_supplier:
-                            infinite_supplier_transactions.append({
-                                'transaction_id': txn_id,
-                                'supplier_name': supplier_name,
-                                'amount': abs(amount),
-                                'description': description,
-                                'date': transaction_date  # 保留实际交易日期
-                            })
-                    elif category == 'infinite_payment':
-                        infinite_payments += abs(amount)
-                    else:
-                        # 如果category为空或其他值，回退到旧逻辑
-                        if txn_type == 'purchase':
-                            is_supplier, supplier_name = self.classifier.is_infinite_supplier(description)
-                            if is_supplier:
-                                infinite_spend += abs(amount)
-                                infinite_supplier_transactions.append({
-                                    'transaction_id': txn_id,
-                                    'supplier_name': supplier_name,
-                                    'amount': abs(amount),
-                                    'description': description,
-                                    'date': transaction_date  # 保留实际交易日期
-                                })
-                            else:
-                                customer_spend += abs(amount)
-                        elif txn_type == 'payment':
-                            payment_type = self.classifier.classify_payment(description, customer_id)
-                            if payment_type in ['customer', 'company']:
-                                customer_payments += abs(amount)
-                            else:
-                                infinite_payments += abs(amount)
-                
-                # 计算滚动余额
-                # 第一个statement: 使用stmt_prev_balance作为起点（全部分配给客户，包括负数CR）
-                # 后续statement: 使用上月的rolling_balance作为起点，验证stmt_prev_balance
-                
-                if is_first_statement and abs(stmt_prev_balance) > 0.01:
-                    # 第一个statement: 使用PDF中的Previous Balance作为起点
-                    # 假设全部属于客户（第一个月通常还没有INFINITE业务）
-                    previous_customer_balance = stmt_prev_balance
-                    previous_infinite_balance = 0
-                    bal_type = "CR" if stmt_prev_balance < 0 else "DR"
-                    print(f"  📍 第一个statement，使用Previous Balance: RM {abs(stmt_prev_balance):.2f} {bal_type}（归入客户）")
-                
-                # 计算基于交易的余额
-                calculated_customer_balance = previous_customer_balance + customer_spend - customer_payments
-                calculated_infinite_balance = previous_infinite_balance + infinite_spend - infinite_payments
-                calculated_total = calculated_customer_balance + calculated_infinite_balance
-                
-                # 对于非第一个statement，验证stmt_prev_balance是否匹配上月总余额
-                if not is_first_statement and abs(stmt_prev_balance - (previous_customer_balance + previous_infinite_balance)) > 0.01:
-                    expected_prev = previous_customer_balance + previous_infinite_balance
-                    print(f"  ⚠️ Previous Balance不匹配: PDF={stmt_prev_balance:.2f}, 上月总计={expected_prev:.2f}")
-                
-                # 检查是否与Statement Total匹配，如果不匹配则有未提取的费用/利息
-                missing_fees = statement_total - calculated_total
-                
-                # 如果有差额（费用/利息），归入客户账户
-                if abs(missing_fees) > 0.01:
-                    customer_rolling_balance = calculated_customer_balance + missing_fees
-                    infinite_rolling_balance = calculated_infinite_balance
-                    print(f"  ⚠️ 检测到未提取费用/利息: RM {missing_fees:.2f}（已归入客户账户）")
-                else:
-                    customer_rolling_balance = calculated_customer_balance
-                    infinite_rolling_balance = calculated_infinite_balance
-                
-                # 计算供应商手续费（1% - Miscellaneous Fee）
-                miscellaneous_fee = sum([
-                    self.classifier.calculate_supplier_fee(txn['amount'], txn['supplier_name'])
-                    for txn in infinite_supplier_transactions
-                ])
-                
-                # PDF要求: 1%手续费独立记录，并计入Owner账户
-                customer_rolling_balance += miscellaneous_fee
-                
-                print(f"  客户消费: RM {customer_spend:,.2f}")
-                print(f"  客户付款: RM {customer_payments:,.2f}")
-                print(f"  Miscellaneous Fee (1%): RM {miscellaneous_fee:,.2f} (已计入客户)")
-                print(f"  客户余额: RM {customer_rolling_balance:,.2f}")
-                print(f"  INFINITE消费: RM {infinite_spend:,.2f}")
-                print(f"  INFINITE付款: RM {infinite_payments:,.2f}")
-                print(f"  INFINITE余额: RM {infinite_rolling_balance:,.2f}")
-                
-                # 插入或更新客户月度账本（使用新的OWNER/INFINITE字段 + Miscellaneous Fee）
-                cursor.execute("""
-                    INSERT OR REPLACE INTO monthly_ledger 
-                    (card_id, customer_id, month_start, statement_id, previous_balance, 
-                     customer_spend, customer_payments, rolling_balance,
-                     owner_expenses, owner_payments, infinite_expenses, infinite_payments,
-                     owner_balance, infinite_balance, miscellaneous_fee, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    card_id, customer_id, month_start, statement_id,
-                    previous_customer_balance, customer_spend, customer_payments,
-                    customer_rolling_balance,
-                    customer_spend, customer_payments, infinite_spend, infinite_payments,
-                    customer_rolling_balance, infinite_rolling_balance, miscellaneous_fee, datetime.now()
-                ))
-                
-                # 插入或更新INFINITE月度账本（注：手续费已转移到Owner账户）
-                cursor.execute("""
-                    INSERT OR REPLACE INTO infinite_monthly_ledger 
-                    (card_id, customer_id, month_start, statement_id, previous_balance,
-                     infinite_spend, supplier_fee, infinite_payments, rolling_balance, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    card_id, customer_id, month_start, statement_id,
-                    previous_infinite_balance, infinite_spend, miscellaneous_fee,
-                    infinite_payments, infinite_rolling_balance, datetime.now()
-                ))
-                
-                # 如果有INFINITE供应商交易，生成发票记录
-                if infinite_supplier_transactions:
-                    # 获取或创建对应的monthly_statement_id
-                    year_month = month_start[:7]  # 2025-05-01 -> 2025-05
-                    cursor.execute("""
-                        SELECT id FROM monthly_statements
-                        WHERE customer_id = ? AND statement_month = ?
-                    """, (customer_id, year_month))
-                    ms_row = cursor.fetchone()
-                    
-                    if ms_row:
-                        monthly_statement_id = ms_row[0]
-                        # 交易已包含实际的transaction_date，无需覆盖
-                        
-                        self._generate_supplier_invoices(
-                            cursor, customer_id, monthly_statement_id, 
-                            month_start, infinite_supplier_transactions
-                        )
-                    else:
-                        print(f"   ⚠️  找不到对应的monthly_statement (customer_id={customer_id}, month={year_month})，跳过发票生成")
-                
-                # 更新上月余额
-                previous_customer_balance = customer_rolling_balance
-                previous_infinite_balance = infinite_rolling_balance
+                previous_customer_balance, previous_infinite_balance = self._calculate_statement(
+                    cursor, card_id, customer_id, statement_id, statement_date, statement_total,
+                    stmt_prev_balance, previous_customer_balance, previous_infinite_balance,
+                    is_first_statement, pending_invoices
+                )
                 
                 # 标记已处理第一个statement
                 is_first_statement = False
@@ -266,21 +263,245 @@ class MonthlyLedgerEngine:
             
         except Exception as e:
             conn.rollback()
+            pending_invoices = []
             print(f"❌ Error: {e}")
             import traceback
             traceback.print_exc()
         finally:
             conn.close()
+        
+        if pending_invoices:
+            self._render_supplier_invoices(pending_invoices)
+    
+    def _incremental_start(self, cursor, card_id: int) -> Tuple[Optional[str], set]:
+        """
+        增量重算的起始日期：最早的脏月份与最早的未计算账单中较早者，并清除该卡的脏标记
+        
+        Returns:
+            (起始日期 YYYY-MM-DD 或 None, 脏月份集合)
+        """
+        cursor.execute(f'SELECT DISTINCT month_start FROM {DIRTY_TABLE} WHERE card_id = ?', (card_id,))
+        dirty_months = {row[0] for row in cursor.fetchall()}
+        cursor.execute(f'DELETE FROM {DIRTY_TABLE} WHERE card_id = ?', (card_id,))
+        
+        # 缺少任一账本行的账单也需要计算
+        cursor.execute(f"""
+            SELECT MIN(s.statement_date)
+            FROM statements s
+            LEFT JOIN monthly_ledger ml
+                ON ml.card_id = s.card_id AND ml.month_start = {_MONTH_SQL.format(date='s.statement_date')}
+            LEFT JOIN infinite_monthly_ledger iml
+                ON iml.card_id = s.card_id AND iml.month_start = {_MONTH_SQL.format(date='s.statement_date')}
+            WHERE s.card_id = ? AND (ml.id IS NULL OR iml.id IS NULL)
+        """, (card_id,))
+        uncalculated = cursor.fetchone()[0]
+        
+        candidates = [month for month in dirty_months if month]
+        if uncalculated:
+            candidates.append(uncalculated[:7] + '-01')
+        return (min(candidates) if candidates else None), dirty_months
+    
+    def _stored_ledger(self, cursor, card_id: int, month_start: str) -> Optional[Dict]:
+        """已存的两条账本行；任一缺失时返回None"""
+        cursor.execute("""
+            SELECT ml.previous_balance, ml.rolling_balance, iml.previous_balance, iml.rolling_balance
+            FROM monthly_ledger ml
+            JOIN infinite_monthly_ledger iml
+                ON iml.card_id = ml.card_id AND iml.month_start = ml.month_start
+            WHERE ml.card_id = ? AND ml.month_start = ?
+        """, (card_id, month_start))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return {
+            'customer_previous': row[0] or 0,
+            'customer_rolling': row[1] or 0,
+            'infinite_previous': row[2] or 0,
+            'infinite_rolling': row[3] or 0,
+        }
+    
+    def _calculate_statement(self, cursor, card_id: int, customer_id: int, statement_id: int,
+                             statement_date: str, statement_total: float, stmt_prev_balance: float,
+                             previous_customer_balance: float, previous_infinite_balance: float,
+                             is_first_statement: bool, pending_invoices: List[Dict]) -> Tuple[float, float]:
+        """
+        计算一个账单月份并写入两条账本（及供应商发票记录，待渲染的PDF追加到 pending_invoices）
+        
+        Returns:
+            (客户滚动余额, INFINITE滚动余额)，作为下个月的上月余额
+        """
+        month_start = statement_date[:7] + '-01'  # YYYY-MM-01
+        print(f"📅 处理 {statement_date[:7]} (Statement ID: {statement_id})")
+        
+        # 获取该月所有交易（包含category字段和transaction_date）
+        cursor.execute("""
+            SELECT id, description, amount, transaction_type, category, transaction_date
+            FROM transactions
+            WHERE statement_id = ?
+        """, (statement_id,))
+        transactions = cursor.fetchall()
+        
+        # 初始化统计
+        customer_spend = 0
+        customer_payments = 0
+        infinite_spend = 0
+        infinite_payments = 0
+        infinite_supplier_transactions = []  # 用于发票生成
+        
+        # 使用category字段进行分类和累计
+        for txn_id, description, amount, txn_type, category, transaction_date in transactions:
+            # 使用category字段判断（优先级高于动态分类）
+            if category == 'owner_expense':
+                customer_spend += abs(amount)
+            elif category == 'owner_payment':
+                customer_payments += abs(amount)
+            elif category == 'infinite_expense':
+                infinite_spend += abs(amount)
+                # 检查是否是INFINITE供应商（用于发票生成）
+                is_supplier, supplier_name = self.classifier.is_infinite_supplier(description)
+                if is_supplier:
+                    infinite_supplier_transactions.append({
+                        'transaction_id': txn_id,
+                        'supplier_name': supplier_name,
+                        'amount': abs(amount),
+                        'description': description,
+                        'date': transaction_date  # 保留实际交易日期
+                    })
+            elif category == 'infinite_payment':
+                infinite_payments += abs(amount)
+            else:
+                # 如果category为空或其他值，回退到旧逻辑
+                if txn_type == 'purchase':
+                    is_supplier, supplier_name = self.classifier.is_infinite_supplier(description)
+                    if is_supplier:
+                        infinite_spend += abs(amount)
+                        infinite_supplier_transactions.append({
+                            'transaction_id': txn_id,
+                            'supplier_name': supplier_name,
+                            'amount': abs(amount),
+                            'description': description,
+                            'date': transaction_date  # 保留实际交易日期
+                        })
+                    else:
+                        customer_spend += abs(amount)
+                elif txn_type == 'payment':
+                    payment_type = self.classifier.classify_payment(description, customer_id)
+                    if payment_type in ['customer', 'company']:
+                        customer_payments += abs(amount)
+                    else:
+                        infinite_payments += abs(amount)
+        
+        # 计算滚动余额
+        # 第一个statement: 使用stmt_prev_balance作为起点（全部分配给客户，包括负数CR）
+        # 后续statement: 使用上月的rolling_balance作为起点，验证stmt_prev_balance
+        
+        if is_first_statement and abs(stmt_prev_balance) > 0.01:
+            # 第一个statement: 使用PDF中的Previous Balance作为起点
+            # 假设全部属于客户（第一个月通常还没有INFINITE业务）
+            previous_customer_balance = stmt_prev_balance
+            previous_infinite_balance = 0
+            bal_type = "CR" if stmt_prev_balance < 0 else "DR"
+            print(f"  📍 第一个statement，使用Previous Balance: RM {abs(stmt_prev_balance):.2f} {bal_type}（归入客户）")
+        
+        # 计算基于交易的余额
+        calculated_customer_balance = previous_customer_balance + customer_spend - customer_payments
+        calculated_infinite_balance = previous_infinite_balance + infinite_spend - infinite_payments
+        calculated_total = calculated_customer_balance + calculated_infinite_balance
+        
+        # 对于非第一个statement，验证stmt_prev_balance是否匹配上月总余额
+        if not is_first_statement and abs(stmt_prev_balance - (previous_customer_balance + previous_infinite_balance)) > 0.01:
+            expected_prev = previous_customer_balance + previous_infinite_balance
+            print(f"  ⚠️ Previous Balance不匹配: PDF={stmt_prev_balance:.2f}, 上月总计={expected_prev:.2f}")
+        
+        # 检查是否与Statement Total匹配，如果不匹配则有未提取的费用/利息
+        missing_fees = statement_total - calculated_total
+        
+        # 如果有差额（费用/利息），归入客户账户
+        if abs(missing_fees) > 0.01:
+            customer_rolling_balance = calculated_customer_balance + missing_fees
+            infinite_rolling_balance = calculated_infinite_balance
+            print(f"  ⚠️ 检测到未提取费用/利息: RM {missing_fees:.2f}（已归入客户账户）")
+        else:
+            customer_rolling_balance = calculated_customer_balance
+            infinite_rolling_balance = calculated_infinite_balance
+        
+        # 计算供应商手续费（1% - Miscellaneous Fee）
+        miscellaneous_fee = sum([
+            self.classifier.calculate_supplier_fee(txn['amount'], txn['supplier_name'])
+            for txn in infinite_supplier_transactions
+        ])
+        
+        # PDF要求: 1%手续费独立记录，并计入Owner账户
+        customer_rolling_balance += miscellaneous_fee
+        
+        print(f"  客户消费: RM {customer_spend:,.2f}")
+        print(f"  客户付款: RM {customer_payments:,.2f}")
+        print(f"  Miscellaneous Fee (1%): RM {miscellaneous_fee:,.2f} (已计入客户)")
+        print(f"  客户余额: RM {customer_rolling_balance:,.2f}")
+        print(f"  INFINITE消费: RM {infinite_spend:,.2f}")
+        print(f"  INFINITE付款: RM {infinite_payments:,.2f}")
+        print(f"  INFINITE余额: RM {infinite_rolling_balance:,.2f}")
+        
+        # 插入或更新客户月度账本（使用新的OWNER/INFINITE字段 + Miscellaneous Fee）
+        cursor.execute("""
+            INSERT OR REPLACE INTO monthly_ledger 
+            (card_id, customer_id, month_start, statement_id, previous_balance, 
+             customer_spend, customer_payments, rolling_balance,
+             owner_expenses, owner_payments, infinite_expenses, infinite_payments,
+             owner_balance, infinite_balance, miscellaneous_fee, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            card_id, customer_id, month_start, statement_id,
+            previous_customer_balance, customer_spend, customer_payments,
+            customer_rolling_balance,
+            customer_spend, customer_payments, infinite_spend, infinite_payments,
+            customer_rolling_balance, infinite_rolling_balance, miscellaneous_fee, datetime.now()
+        ))
+        
+        # 插入或更新INFINITE月度账本（注：手续费已转移到Owner账户）
+        cursor.execute("""
+            INSERT OR REPLACE INTO infinite_monthly_ledger 
+            (card_id, customer_id, month_start, statement_id, previous_balance,
+             infinite_spend, supplier_fee, infinite_payments, rolling_balance, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            card_id, customer_id, month_start, statement_id,
+            previous_infinite_balance, infinite_spend, miscellaneous_fee,
+            infinite_payments, infinite_rolling_balance, datetime.now()
+        ))
+        
+        # 如果有INFINITE供应商交易，生成发票记录
+        if infinite_supplier_transactions:
+            # 获取或创建对应的monthly_statement_id
+            year_month = month_start[:7]  # 2025-05-01 -> 2025-05
+            cursor.execute("""
+                SELECT id FROM monthly_statements
+                WHERE customer_id = ? AND statement_month = ?
+            """, (customer_id, year_month))
+            ms_row = cursor.fetchone()
+            
+            if ms_row:
+                monthly_statement_id = ms_row[0]
+                # 交易已包含实际的transaction_date，无需覆盖
+                
+                pending_invoices.extend(self._generate_supplier_invoices(
+                    cursor, customer_id, monthly_statement_id, 
+                    month_start, infinite_supplier_transactions
+                ))
+            else:
+                print(f"   ⚠️  找不到对应的monthly_statement (customer_id={customer_id}, month={year_month})，跳过发票生成")
+        
+        return customer_rolling_balance, infinite_rolling_balance
     
     def _generate_supplier_invoices(self, cursor, customer_id: int, monthly_statement_id: int, 
-                                   month_start: str, transactions: List[Dict]):
-        """生成供应商发票记录和PDF文件"""
+                                   month_start: str, transactions: List[Dict]) -> List[Dict]:
+        """写入供应商发票记录，返回待渲染的PDF参数（由 _render_supplier_invoices 在提交后渲染）"""
         # 获取客户信息
         cursor.execute('SELECT name, customer_code FROM customers WHERE id = ?', (customer_id,))
         customer_row = cursor.fetchone()
         if not customer_row:
             print(f"   ⚠️  客户ID {customer_id} 不存在，跳过发票生成")
-            return
+            return []
         
         customer_name = customer_row[0]
         customer_code = customer_row[1]
@@ -298,8 +519,7 @@ class MonthlyLedgerEngine:
                 date_supplier_groups[group_key] = []
             date_supplier_groups[group_key].append(txn)
         
-        # 初始化PDF生成器
-        invoice_generator = SupplierInvoiceGenerator()
+        invoices = []
         
         # 为每个日期的供应商交易生成独立发票
         for (transaction_date, supplier_name), txns in date_supplier_groups.items():
@@ -330,39 +550,57 @@ class MonthlyLedgerEngine:
                     'supplier_fee': self.classifier.calculate_supplier_fee(t['amount'], supplier_name)
                 })
             
-            # 生成PDF（使用实际交易日期）
-            try:
-                pdf_path = invoice_generator.generate_invoice(
-                    supplier_name=supplier_name,
-                    transactions=txn_list,
-                    customer_name=customer_name,
-                    customer_code=customer_code,
-                    statement_date=transaction_date,  # 使用实际交易日期
-                    invoice_number=invoice_number
-                )
-                print(f"      ✅ PDF已生成: {transaction_date} {supplier_name} - {pdf_path}")
-            except Exception as e:
-                print(f"      ⚠️  PDF生成失败: {supplier_name} - {e}")
-                pdf_path = None
+            # PDF在提交后生成（使用实际交易日期）
+            invoices.append({
+                'supplier_name': supplier_name,
+                'transactions': txn_list,
+                'customer_name': customer_name,
+                'customer_code': customer_code,
+                'statement_date': transaction_date,
+                'invoice_number': invoice_number,
+            })
             
             if existing:
-                # 更新
+                # 更新（pdf_path 在PDF重新生成后更新）
                 cursor.execute("""
                     UPDATE supplier_invoices 
-                    SET total_amount = ?, supplier_fee = ?, invoice_date = ?, pdf_path = ?
+                    SET total_amount = ?, supplier_fee = ?, invoice_date = ?
                     WHERE invoice_number = ?
-                """, (total_amount, supplier_fee, transaction_date, pdf_path, invoice_number))
+                """, (total_amount, supplier_fee, transaction_date, invoice_number))
             else:
                 # 插入（使用monthly_statement_id，实际交易日期）
                 cursor.execute("""
                     INSERT INTO supplier_invoices 
                     (customer_id, monthly_statement_id, supplier_name, invoice_number, 
-                     total_amount, supplier_fee, invoice_date, pdf_path)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                     total_amount, supplier_fee, invoice_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 """, (customer_id, monthly_statement_id, supplier_name, invoice_number,
-                      total_amount, supplier_fee, transaction_date, pdf_path))
+                      total_amount, supplier_fee, transaction_date))
+        
+        return invoices
     
-    def calculate_all_cards_for_customer(self, customer_id: int, recalculate_all: bool = False):
+    def _render_supplier_invoices(self, invoices: List[Dict]):
+        """账本事务提交后渲染发票PDF，再用一个短事务写回 pdf_path"""
+        invoice_generator = SupplierInvoiceGenerator()
+        pdf_paths = []
+        for invoice in invoices:
+            try:
+                pdf_path = invoice_generator.generate_invoice(**invoice)
+                print(f"      ✅ PDF已生成: {invoice['statement_date']} {invoice['supplier_name']} - {pdf_path}")
+            except Exception as e:
+                print(f"      ⚠️  PDF生成失败: {invoice['supplier_name']} - {e}")
+                pdf_path = None
+            pdf_paths.append((pdf_path, invoice['invoice_number']))
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.executemany('UPDATE supplier_invoices SET pdf_path = ? WHERE invoice_number = ?', pdf_paths)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def calculate_all_cards_for_customer(self, customer_id: int, recalculate_all: bool = False,
+                                         incremental: bool = False):
         """计算客户所有信用卡的月度账本"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -383,7 +621,28 @@ class MonthlyLedgerEngine:
         
         for card_id, bank_name, last4 in cards:
             print(f"\n📇 处理: {bank_name} (*{last4})")
-            self.calculate_monthly_ledger_for_card(card_id, recalculate_all)
+            self.calculate_monthly_ledger_for_card(card_id, recalculate_all, incremental)
+    
+    def calculate_dirty_ledgers(self) -> int:
+        """
+        增量重算所有有脏标记的信用卡
+        
+        Returns:
+            处理的信用卡数量
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if not ensure_ledger_dirty_tracking(conn):
+                return 0
+            card_ids = [row[0] for row in conn.execute(
+                f'SELECT DISTINCT card_id FROM {DIRTY_TABLE} ORDER BY card_id'
+            ).fetchall()]
+        finally:
+            conn.close()
+        
+        for card_id in card_ids:
+            self.calculate_monthly_ledger_for_card(card_id, incremental=True)
+        return len(card_ids)
     
     def get_monthly_summary(self, customer_id: int, month_start: Optional[str] = None):
         """获取客户的月度汇总"""
@@ -5,13 +5,12 @@
 """
 
 import os
+import time
 from datetime import datetime, timedelta
-from db.database import get_db, log_audit
+from db.database import get_db, log_audit, month_date_range
 from report.galaxy_report_generator import GalaxyMonthlyReportGenerator
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from services.job_queue import enqueue_job
+from email_service.outbox import EmailOutbox, OutboxWorker
 
 # 导入统一配色系统
 from config.colors import COLORS
@@ -25,176 +24,226 @@ class MonthlyReportScheduler:
         self.admin_email = os.environ.get('ADMIN_EMAIL', '')
         self.admin_password = os.environ.get('ADMIN_PASSWORD', '')
     
-    def generate_all_customer_reports(self):
+    def enqueue_report_generation(self, year=None, month=None, requeue_failed=False):
         """
-        每月30号执行：为所有客户生成上月的月度报表
-        """
-        today = datetime.now()
+        手动触发批量生成（默认上个月）：入队 monthly_report.fan_out，与每月30号的定时任务走同一条路径
         
-        # 计算上个月的年月
-        if today.month == 1:
-            target_year = today.year - 1
-            target_month = 12
-        else:
-            target_year = today.year
-            target_month = today.month - 1
+        每个客户拆分为独立的 monthly_report.generate 任务，由任务队列的进程池执行，失败自动重试；
+        同一客户同一月份的生成任务按幂等键只入队一次，requeue_failed=True 时已失败的客户重新生成。
+        每个客户的状态与耗时见 scheduled_jobs.monthly_report_generation_summary
+        """
+        if year is None or month is None:
+            today = datetime.now()
+            year, month = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
         
-        print(f"🌌 开始生成所有客户的月度报表：{target_year}-{target_month}")
+        job_id = enqueue_job('monthly_report.fan_out',
+                             {'year': year, 'month': month, 'requeue_failed': requeue_failed})
+        print(f"🌌 月度报表批量生成已入队：{year}-{month}（任务 #{job_id}）")
+        return {'job_id': job_id, 'year': year, 'month': month}
+    
+    def find_customers_with_statements(self, year, month):
+        """该月有账单数据的客户（单次日期范围查询）"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.id, c.name, c.email
+                FROM customers c
+                WHERE c.id IN (
+                    SELECT cc.customer_id
+                    FROM statements s
+                    JOIN credit_cards cc ON s.card_id = cc.id
+                    WHERE s.statement_date >= ? AND s.statement_date < ?
+                )
+                ORDER BY c.id
+            ''', month_date_range(year, month))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def generate_customer_report(self, customer_id, year, month, customer_name=None):
+        """
+        为单个客户生成月度报表（任务队列中的单客户任务 monthly_report.generate）
         
+        Returns:
+            'generated' / 'skipped'（该月无账单数据）/ 'failed'
+        """
         with get_db() as conn:
             cursor = conn.cursor()
             
-            # 获取所有客户
-            cursor.execute('SELECT id, name, email FROM customers')
-            customers = cursor.fetchall()
-            
-            success_count = 0
-            fail_count = 0
+            if customer_name is None:
+                cursor.execute('SELECT name FROM customers WHERE id = ?', (customer_id,))
+                row = cursor.fetchone()
+                customer_name = row['name'] if row else str(customer_id)
             
-            for customer in customers:
-                try:
-                    # 检查该客户该月是否有账单数据
-                    cursor.execute('''
-                        SELECT COUNT(*) as count
-                        FROM statements s
-                        JOIN credit_cards c ON s.card_id = c.id
-                        WHERE c.customer_id = ?
-                        AND strftime('%Y', s.statement_date) = ?
-                        AND strftime('%m', s.statement_date) = ?
-                    ''', (customer['id'], str(target_year), f"{target_month:02d}"))
-                    
-                    result = cursor.fetchone()
-                    if result and result['count'] > 0:
-                        # 生成报表
-                        pdf_path = self.report_generator.generate_customer_monthly_report_galaxy(
-                            customer['id'], 
-                            target_year, 
-                            target_month
-                        )
-                        
-                        if pdf_path:
-                            success_count += 1
-                            print(f"  ✅ {customer['name']} - 报表生成成功")
-                            log_audit('monthly_report_auto_generated', customer['id'], 
-                                    f'自动生成{target_year}-{target_month}月度报表')
-                        else:
-                            fail_count += 1
-                            print(f"  ⚠️ {customer['name']} - 报表生成失败")
-                    else:
-                        print(f"  ⏭️ {customer['name']} - 该月无账单数据")
-                
-                except Exception as e:
-                    fail_count += 1
-                    print(f"  ❌ {customer['name']} - 错误: {str(e)}")
-            
-            print(f"\n📊 报表生成完成！成功: {success_count}, 失败: {fail_count}")
-            
-            # 记录系统日志
-            log_audit('batch_report_generation', 0, 
-                     f'{target_year}-{target_month}月度报表批量生成: 成功{success_count}, 失败{fail_count}')
+            # 检查该客户该月是否有账单数据
+            cursor.execute('''
+                SELECT COUNT(*) as count
+                FROM statements s
+                JOIN credit_cards c ON s.card_id = c.id
+                WHERE c.customer_id = ?
+                AND s.statement_date >= ? AND s.statement_date < ?
+            ''', (customer_id, *month_date_range(year, month)))
+            result = cursor.fetchone()
         
-        return {
-            'success': success_count,
-            'failed': fail_count,
-            'year': target_year,
-            'month': target_month
-        }
+        if not result or result['count'] == 0:
+            print(f"  ⏭️ {customer_name} - 该月无账单数据")
+            return 'skipped'
+        
+        # 生成报表
+        pdf_path = self.report_generator.generate_customer_monthly_report_galaxy(customer_id, year, month)
+        
+        if pdf_path:
+            print(f"  ✅ {customer_name} - 报表生成成功")
+            log_audit('monthly_report_auto_generated', customer_id, 
+                    f'自动生成{year}-{month}月度报表')
+            return 'generated'
+        
+        print(f"  ⚠️ {customer_name} - 报表生成失败")
+        return 'failed'
     
-    def send_reports_to_all_customers(self):
+    def send_customer_report(self, report_id):
         """
-        每月1号执行：发送上月报表给所有客户
+        发送单份月度报表邮件（写入发件箱后立即投递；已发送过的报表不会重复发送，任务重试安全）
+        
+        Returns:
+            'sent' / 'queued'（临时失败，发件箱稍后重试）/ 'already_sent' / 'no_email' / 'failed' / 'not_found'
         """
-        today = datetime.now()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT mr.*, c.name as customer_name, c.email
+                FROM monthly_reports mr
+                JOIN customers c ON mr.customer_id = c.id
+                WHERE mr.id = ?
+            ''', (report_id,))
+            report = cursor.fetchone()
         
-        # 计算上个月的年月
-        if today.month == 1:
-            target_year = today.year - 1
-            target_month = 12
-        else:
-            target_year = today.year
-            target_month = today.month - 1
+        if not report or not report['pdf_path']:
+            return 'not_found'
+        if report['email_sent']:
+            return 'already_sent'
+        if not report['email'] or '@' not in report['email']:
+            print(f"  ⚠️ {report['customer_name']} - 无有效邮箱")
+            return 'no_email'
+        if not self._email_configured():
+            return 'failed'
+        
+        outbox = EmailOutbox()
+        message_id = self.queue_report_email(report, outbox)
+        OutboxWorker(outbox, concurrency=1).deliver([message_id])
+        
+        status = outbox.get(message_id)['status']
+        if status == 'sent':
+            print(f"  ✅ {report['customer_name']} ({report['email']}) - 邮件发送成功")
+            return 'sent'
+        if status == 'pending':
+            print(f"  ⏳ {report['customer_name']} - 邮件发送暂时失败，发件箱稍后重试")
+            return 'queued'
+        print(f"  ❌ {report['customer_name']} - 邮件发送失败")
+        return 'failed'
+    
+    def send_reports_to_all_customers(self, target_year=None, target_month=None):
+        """
+        每月1号执行：发送上月报表给所有客户
+        所有邮件先写入发件箱，再由多个SMTP会话并发投递（每个会话只握手、登录一次）
+        """
+        if target_year is None or target_month is None:
+            today = datetime.now()
+            
+            # 计算上个月的年月
+            if today.month == 1:
+                target_year = today.year - 1
+                target_month = 12
+            else:
+                target_year = today.year
+                target_month = today.month - 1
         
         print(f"📧 开始发送月度报表邮件：{target_year}-{target_month}")
+        started = time.perf_counter()
         
         with get_db() as conn:
             cursor = conn.cursor()
             
-            # 获取该月所有生成的报表
+            # 获取该月所有生成、尚未发送的报表
             cursor.execute('''
                 SELECT mr.*, c.name as customer_name, c.email
                 FROM monthly_reports mr
                 JOIN customers c ON mr.customer_id = c.id
                 WHERE mr.report_year = ? AND mr.report_month = ?
                 AND mr.pdf_path IS NOT NULL
+                AND COALESCE(mr.email_sent, 0) = 0
             ''', (target_year, target_month))
             
             reports = cursor.fetchall()
-            
-            sent_count = 0
-            fail_count = 0
-            
+        
+        no_email_count = 0
+        message_ids = []
+        if reports and self._email_configured():
+            outbox = EmailOutbox()
             for report in reports:
-                try:
-                    if report['email'] and '@' in report['email']:
-                        # 发送邮件
-                        success = self._send_report_email(
-                            customer_name=report['customer_name'],
-                            customer_email=report['email'],
-                            pdf_path=report['pdf_path'],
-                            year=target_year,
-                            month=target_month
-                        )
-                        
-                        if success:
-                            sent_count += 1
-                            print(f"  ✅ {report['customer_name']} ({report['email']}) - 邮件发送成功")
-                            
-                            # 更新发送状态
-                            cursor.execute('''
-                                UPDATE monthly_reports 
-                                SET email_sent = 1, email_sent_date = ?
-                                WHERE id = ?
-                            ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), report['id']))
-                            
-                            log_audit('monthly_report_sent', report['customer_id'], 
-                                    f'{target_year}-{target_month}月度报表已发送至{report["email"]}')
-                        else:
-                            fail_count += 1
-                            print(f"  ❌ {report['customer_name']} - 邮件发送失败")
-                    else:
-                        print(f"  ⚠️ {report['customer_name']} - 无有效邮箱")
-                        fail_count += 1
-                
-                except Exception as e:
-                    fail_count += 1
-                    print(f"  ❌ {report['customer_name']} - 错误: {str(e)}")
-            
-            conn.commit()
+                if report['email'] and '@' in report['email']:
+                    message_ids.append(self.queue_report_email(report, outbox))
+                else:
+                    print(f"  ⚠️ {report['customer_name']} - 无有效邮箱")
+                    no_email_count += 1
             
-            print(f"\n📧 邮件发送完成！成功: {sent_count}, 失败: {fail_count}")
-            
-            # 记录系统日志
-            log_audit('batch_report_email_sent', 0, 
-                     f'{target_year}-{target_month}月度报表批量发送: 成功{sent_count}, 失败{fail_count}')
+            OutboxWorker(outbox).deliver(message_ids)
+            statuses = list(outbox.statuses(message_ids).values())
+        else:
+            statuses = ['failed'] * len(reports)
+        
+        sent_count = statuses.count('sent')
+        retry_count = statuses.count('pending')
+        fail_count = len(statuses) - sent_count - retry_count + no_email_count
+        elapsed = time.perf_counter() - started
+        
+        print(f"\n📧 邮件发送完成！成功: {sent_count}, 稍后重试: {retry_count}, 失败: {fail_count}, 耗时: {elapsed:.1f}s")
+        
+        # 记录系统日志
+        log_audit('batch_report_email_sent', 0, 
+                 f'{target_year}-{target_month}月度报表批量发送: 成功{sent_count}, 失败{fail_count}')
         
         return {
             'sent': sent_count,
+            'retrying': retry_count,
             'failed': fail_count,
             'year': target_year,
-            'month': target_month
+            'month': target_month,
+            'elapsed_seconds': round(elapsed, 3)
         }
     
-    def _send_report_email(self, customer_name, customer_email, pdf_path, year, month):
-        """发送月度报表邮件"""
-        try:
-            # 创建邮件
-            msg = MIMEMultipart()
-            msg['From'] = self.admin_email
-            msg['To'] = customer_email
-            msg['Subject'] = f'🌌 您的{year}年{month}月信用卡月度报表 - Infinite GZ Financial'
-            
-            # 邮件正文（HTML格式） - 使用统一的粉色系配色
-            html_body = f"""
+    def _email_configured(self):
+        if self.admin_email and self.admin_password:
+            return True
+        print("  ⚠️ 邮件配置未设置（需要ADMIN_EMAIL和ADMIN_PASSWORD环境变量）")
+        return False
+    
+    def queue_report_email(self, report, outbox=None):
+        """
+        月度报表邮件写入发件箱（每份报表只入队一次），返回邮件ID
+        再次发送时使用客户当前的邮箱；之前已失败的邮件重新排队（报表发送状态未更新的都可以重发）
+        发送成功后由发件箱回调 mark_report_email_sent 更新报表的发送状态
+        """
+        year, month = report['report_year'], report['report_month']
+        return (outbox or EmailOutbox()).enqueue(
+            to_email=report['email'],
+            from_email=self.admin_email,
+            subject=f'🌌 您的{year}年{month}月信用卡月度报表 - Infinite GZ Financial',
+            body_html=self._report_email_html(report['customer_name'], year, month),
+            attachments=[{
+                'path': report['pdf_path'],
+                'filename': f"{report['customer_name']}_{year}_{month}_月度报表.pdf",
+                'subtype': 'pdf',
+            }],
+            customer_id=report['customer_id'],
+            email_type='monthly_report',
+            ref_id=report['id'],
+            on_sent='services.monthly_report_scheduler:mark_report_email_sent',
+            idempotency_key=f"monthly_report:{report['id']}",
+            requeue_failed=True
+        )
+    
+    def _report_email_html(self, customer_name, year, month):
+        """月度报表邮件正文（HTML格式） - 使用统一的粉色系配色"""
+        return f"""
             <html>
             <body style="font-family: Arial, sans-serif; background: linear-gradient(135deg, {COLORS.core.hot_pink} 0%, {COLORS.core.dark_purple} 100%); padding: 40px;">
                 <div style="max-width: 600px; margin: 0 auto; background: #FFFFFF; border-radius: 16px; overflow: hidden; box-shadow: 0 8px 20px rgba(0,0,0,0.2);">
@@ -245,31 +294,6 @@ class MonthlyReportScheduler:
             </body>
             </html>
             """
-            
-            msg.attach(MIMEText(html_body, 'html'))
-            
-            # 附加PDF文件
-            if os.path.exists(pdf_path):
-                with open(pdf_path, 'rb') as f:
-                    pdf_attachment = MIMEApplication(f.read(), _subtype='pdf')
-                    pdf_attachment.add_header('Content-Disposition', 'attachment', 
-                                            filename=f'{customer_name}_{year}_{month}_月度报表.pdf')
-                    msg.attach(pdf_attachment)
-            
-            # 发送邮件
-            if self.admin_email and self.admin_password:
-                with smtplib.SMTP('smtp.gmail.com', 587) as server:
-                    server.starttls()
-                    server.login(self.admin_email, self.admin_password)
-                    server.send_message(msg)
-                return True
-            else:
-                print("  ⚠️ 邮件配置未设置（需要ADMIN_EMAIL和ADMIN_PASSWORD环境变量）")
-                return False
-        
-        except Exception as e:
-            print(f"  ❌ 发送邮件失败: {str(e)}")
-            return False
     
     def test_report_generation(self, customer_id=None):
         """测试报表生成功能"""
@@ -285,13 +309,34 @@ class MonthlyReportScheduler:
             return pdf_path is not None
         else:
             # 测试所有客户
-            return self.generate_all_customer_reports()
+            return self.enqueue_report_generation()
     
     def test_email_sending(self):
         """测试邮件发送功能"""
         return self.send_reports_to_all_customers()
 
 
+def mark_report_email_sent(report_id):
+    """发件箱回调：月度报表邮件发送成功后更新发送状态"""
+    with get_db() as conn:
+        conn.execute('''
+            UPDATE monthly_reports 
+            SET email_sent = 1, email_sent_date = ?
+            WHERE id = ?
+        ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), report_id))
+        report = conn.execute('''
+            SELECT mr.customer_id, mr.report_year, mr.report_month, c.email
+            FROM monthly_reports mr
+            JOIN customers c ON mr.customer_id = c.id
+            WHERE mr.id = ?
+        ''', (report_id,)).fetchone()
+        conn.commit()
+    
+    if report:
+        log_audit('monthly_report_sent', report['customer_id'], 
+                f'{report["report_year"]}-{report["report_month"]}月度报表已发送至{report["email"]}')
+
+
 # 更新monthly_reports表结构（添加邮件发送字段）
 def init_monthly_reports_email_fields():
     """初始化月度报表邮件字段"""
@@ -317,5 +362,17 @@ def init_monthly_reports_email_fields():
         conn.commit()
 
 
+def init_monthly_report_indexes():
+    """月结预查询按 statement_date 范围过滤，需要日期索引"""
+    with get_db() as conn:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='statements'"
+        ).fetchone()
+        if exists:
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_statements_statement_date ON statements(statement_date)')
+            conn.commit()
+
+
 # 初始化表字段
 init_monthly_reports_email_fields()
+init_monthly_report_indexes()
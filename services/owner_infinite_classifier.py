@@ -9,6 +9,8 @@ OWNER vs INFINITE Classification Service
 import sqlite3
 from typing import Dict, Tuple, Optional, List
 
+from services.supplier_matcher import get_supplier_matcher
+
 class OwnerInfiniteClassifier:
     """
     核心分类引擎：区分 OWNER 和 INFINITE 的消费与付款
@@ -33,6 +35,8 @@ class OwnerInfiniteClassifier:
         self.db_path = db_path
         self._load_supplier_config()
         self._load_customer_aliases()
+        # 供应商名单编译为一个匹配器（相同名单的分类器实例共享，结果按描述记忆）
+        self.supplier_matcher = get_supplier_matcher(self.infinite_suppliers, case='lower')
     
     def _load_supplier_config(self):
         """从数据库加载供应商配置（可配置）"""
@@ -138,19 +142,17 @@ class OwnerInfiniteClassifier:
                 'should_split_fee': False
             }
         
-        description_lower = description.lower()
-        
         # 检查是否匹配供应商名单
-        for supplier in self.infinite_suppliers:
-            if supplier in description_lower:
-                supplier_fee = abs(amount) * self.SUPPLIER_FEE_RATE
-                return {
-                    'expense_type': 'infinite',
-                    'is_supplier': True,
-                    'supplier_name': supplier,
-                    'supplier_fee': round(supplier_fee, 2),
-                    'should_split_fee': True  # 需要拆分手续费
-                }
+        supplier = self.supplier_matcher.match_supplier(description)
+        if supplier:
+            supplier_fee = abs(amount) * self.SUPPLIER_FEE_RATE
+            return {
+                'expense_type': 'infinite',
+                'is_supplier': True,
+                'supplier_name': supplier,
+                'supplier_fee': round(supplier_fee, 2),
+                'should_split_fee': True  # 需要拆分手续费
+            }
         
         # 未匹配供应商 = OWNER Expenses
         return {
@@ -346,20 +348,11 @@ class OwnerInfiniteClassifier:
     
     def _is_supplier_txn(self, description: str) -> bool:
         """检查是否为Supplier交易"""
-        if not description:
-            return False
-        desc_lower = description.lower()
-        return any(s in desc_lower for s in self.infinite_suppliers)
+        return self.supplier_matcher.match(description) is not None
     
     def _find_supplier_name(self, description: str) -> str:
         """从描述中提取Supplier名称"""
-        if not description:
-            return None
-        desc_lower = description.lower()
-        for supplier in self.infinite_suppliers:
-            if supplier in desc_lower:
-                return supplier
-        return None
+        return self.supplier_matcher.match_supplier(description)
     
     def classify_payment(self, description: str, customer_id: int, customer_name: str = None) -> Dict:
         """
@@ -566,6 +559,9 @@ class OwnerInfiniteClassifier:
         
         transactions = cursor.fetchall()
         
+        # 整张账单的描述先批量匹配一次（相同描述只匹配一次）
+        self.supplier_matcher.match_many(txn['description'] for txn in transactions)
+        
         # 分类统计
         classified_count = 0
         owner_expenses = 0.0
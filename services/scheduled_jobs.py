@@ -0,0 +1,224 @@
+"""
+定时任务与任务处理函数（运行在 services.job_queue 的进程池中）
+- 月度报表：每月30号拆分为每个客户一个生成任务；每月1号所有报表邮件写入发件箱并批量投递；
+  每个客户任务记录生成状态与耗时，monthly_report_generation_summary 汇总为耗时报告
+- 发件箱：每小时投递到期（退避重试）的邮件
+- 还款提醒：每天09:00 + 每6小时
+- AI财务日报：每天08:00生成，08:10邮件推送
+- 信用卡推荐：每天03:00为全部客户批量重算
+- 月度账本：每小时增量重算有脏标记（账单/交易新增、修改、确认）的信用卡
+
+处理函数均为模块级函数，参数来自任务payload（JSON），子进程按 "模块:函数" 路径导入执行
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, Iterable
+
+from services.job_queue import JobQueue, PeriodicJob, _TS_FORMAT, job_queue, register_job_handler
+
+_scheduler = None
+
+
+def _get_report_scheduler():
+    # 子进程中按需创建（避免每个任务都重新初始化报表生成器）
+    global _scheduler
+    if _scheduler is None:
+        from services.monthly_report_scheduler import MonthlyReportScheduler
+        _scheduler = MonthlyReportScheduler()
+    return _scheduler
+
+
+def previous_month(now: datetime):
+    if now.month == 1:
+        return now.year - 1, 12
+    return now.year, now.month - 1
+
+
+def _previous_month_payload(now: datetime):
+    year, month = previous_month(now)
+    return {'year': year, 'month': month}
+
+
+# ============================================================
+# 月度报表
+# ============================================================
+
+def customer_report_key_prefix(year, month) -> str:
+    """该月所有客户报表任务的幂等键前缀（按月份在前，便于按月查询进度与耗时）"""
+    return f'monthly_report.customer:{year}-{month:02d}:'
+
+
+def enqueue_customer_reports(customer_ids: Iterable[int], year, month, requeue_failed=False,
+                             queue: JobQueue = job_queue) -> int:
+    """每个客户一个 monthly_report.generate 任务；requeue_failed=True 时已失败的客户重新生成"""
+    prefix = customer_report_key_prefix(year, month)
+    return queue.enqueue_many(({
+        'job_type': 'monthly_report.generate',
+        'payload': {'customer_id': customer_id, 'year': year, 'month': month},
+        'idempotency_key': f'{prefix}{customer_id}',
+    } for customer_id in customer_ids), requeue_failed=requeue_failed)
+
+
+def fan_out_monthly_reports(year, month, requeue_failed=False):
+    """为该月有账单数据的每个客户入队一个报表生成任务（已生成 / 进行中的客户不重复入队）"""
+    customer_ids = [c['id'] for c in _get_report_scheduler().find_customers_with_statements(year, month)]
+
+    queued = enqueue_customer_reports(customer_ids, year, month, requeue_failed=requeue_failed)
+    print(f"🌌 {year}-{month} 月度报表：{queued} 个客户任务已入队")
+    return {'customers': len(customer_ids), 'queued': queued}
+
+
+def generate_customer_monthly_report(customer_id, year, month):
+    """返回 {'status': 'generated' / 'skipped', 'seconds': 耗时}，保存在任务结果中供耗时报告使用"""
+    started = time.perf_counter()
+    status = _get_report_scheduler().generate_customer_report(customer_id, year, month)
+    seconds = round(time.perf_counter() - started, 3)
+    if status == 'failed':
+        raise RuntimeError(f'客户 {customer_id} 的 {year}-{month} 月度报表生成失败（{seconds:.1f}s）')
+    return {'status': status, 'seconds': seconds}
+
+
+def _elapsed(start, end):
+    if not start or not end:
+        return None
+    return (datetime.strptime(end, _TS_FORMAT) - datetime.strptime(start, _TS_FORMAT)).total_seconds()
+
+
+def monthly_report_generation_summary(year, month, queue: JobQueue = job_queue) -> Dict:
+    """
+    该月报表生成的耗时报告（来自每个客户的任务记录）
+    - 状态：generated / skipped / failed / pending / running
+    - 单客户耗时：成功的任务取处理函数记录的耗时，失败或进行中的任务按开始 / 结束时间计算
+    - timings 按耗时降序，elapsed_seconds 为最早开始到最晚结束
+    """
+    jobs = queue.list_by_key_prefix(customer_report_key_prefix(year, month))
+    names = _customer_names([job['payload']['customer_id'] for job in jobs])
+    now = datetime.now().strftime(_TS_FORMAT)
+
+    counts = {status: 0 for status in ('generated', 'skipped', 'failed', 'pending', 'running')}
+    timings = []
+    for job in jobs:
+        result = job['result'] if isinstance(job['result'], dict) else {}
+        status = result.get('status', 'generated') if job['status'] == 'succeeded' else job['status']
+        counts[status] = counts.get(status, 0) + 1
+        seconds = result.get('seconds')
+        if seconds is None:
+            seconds = _elapsed(job['started_at'], job['finished_at'] or (now if status == 'running' else None))
+        customer_id = job['payload']['customer_id']
+        timings.append({
+            'customer_id': customer_id,
+            'customer_name': names.get(customer_id, str(customer_id)),
+            'status': status,
+            'seconds': seconds,
+            'attempts': job['attempts'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at'],
+            'error': job['last_error'] if status == 'failed' else None,
+        })
+    timings.sort(key=lambda t: (t['seconds'] is None, -(t['seconds'] or 0)))
+
+    started = [job['started_at'] for job in jobs if job['started_at']]
+    finished = [job['finished_at'] for job in jobs if job['finished_at']]
+    return {
+        'year': year,
+        'month': month,
+        'customers': len(jobs),
+        'counts': counts,
+        'elapsed_seconds': _elapsed(min(started), max(finished)) if started and finished else None,
+        'timings': timings,
+    }
+
+
+def _customer_names(customer_ids) -> Dict[int, str]:
+    if not customer_ids:
+        return {}
+    from db.database import get_db
+    with get_db() as conn:
+        rows = conn.execute(
+            f"SELECT id, name FROM customers WHERE id IN ({','.join('?' * len(customer_ids))})",
+            customer_ids
+        ).fetchall()
+    return {row['id']: row['name'] for row in rows}
+
+
+def fan_out_monthly_report_emails(year, month):
+    """该月每份未发送的报表写入发件箱，并用复用的SMTP会话并发投递（临时失败的邮件由 email_outbox.deliver 重试）"""
+    return _get_report_scheduler().send_reports_to_all_customers(year, month)
+
+
+def send_customer_monthly_report(report_id):
+    status = _get_report_scheduler().send_customer_report(report_id)
+    if status == 'failed':
+        raise RuntimeError(f'月度报表 {report_id} 邮件发送失败')
+    return status
+
+
+def deliver_email_outbox():
+    """投递发件箱中到期的邮件（包括退避后重试的邮件）"""
+    from email_service.outbox import deliver_outbox
+    return deliver_outbox()
+
+
+# ============================================================
+# 还款提醒 / AI日报
+# ============================================================
+
+def check_reminders():
+    from validate.reminder_service import check_and_send_reminders
+    check_and_send_reminders()
+
+
+def generate_ai_daily_report():
+    from accounting_app.tasks.ai_daily_report import generate_daily_report
+    generate_daily_report()
+
+
+def send_ai_daily_report_email():
+    from accounting_app.tasks.email_notifier import send_ai_report_email
+    send_ai_report_email()
+
+
+def refresh_card_recommendations(top_n=5):
+    """全部客户的信用卡推荐一次批量计算并保存"""
+    from db.database import DB_PATH
+    from modules.recommendations.card_recommendation_engine import CardRecommendationEngine
+    summary = CardRecommendationEngine(DB_PATH).refresh_saved_recommendations(top_n=top_n)
+    print(f"💳 信用卡推荐已刷新：{summary['customers']} 个客户，{summary['recommendations']} 条推荐")
+    return summary
+
+
+def recalculate_dirty_ledgers():
+    from db.database import DB_PATH
+    from services.monthly_ledger_engine import MonthlyLedgerEngine
+    return {'cards': MonthlyLedgerEngine(DB_PATH).calculate_dirty_ledgers()}
+
+
+register_job_handler('monthly_report.fan_out', 'services.scheduled_jobs:fan_out_monthly_reports')
+register_job_handler('monthly_report.generate', 'services.scheduled_jobs:generate_customer_monthly_report')
+register_job_handler('monthly_report.send_fan_out', 'services.scheduled_jobs:fan_out_monthly_report_emails')
+register_job_handler('monthly_report.send', 'services.scheduled_jobs:send_customer_monthly_report')
+register_job_handler('reminders.check', 'services.scheduled_jobs:check_reminders')
+register_job_handler('ai_daily_report.generate', 'services.scheduled_jobs:generate_ai_daily_report')
+register_job_handler('ai_daily_report.email', 'services.scheduled_jobs:send_ai_daily_report_email')
+register_job_handler('card_recommendations.refresh', 'services.scheduled_jobs:refresh_card_recommendations')
+register_job_handler('monthly_ledger.recalculate_dirty', 'services.scheduled_jobs:recalculate_dirty_ledgers')
+register_job_handler('email_outbox.deliver', 'services.scheduled_jobs:deliver_email_outbox')
+
+
+# 原 schedule 循环中的计划，改为带幂等键入队
+PERIODIC_JOBS = [
+    PeriodicJob('reminders.daily', 'reminders.check', at='09:00'),
+    PeriodicJob('reminders.6h', 'reminders.check', every_hours=6),
+    # 每月30号10:00生成上月报表，每月1号09:00发送
+    PeriodicJob('monthly_report.generate', 'monthly_report.fan_out', at='10:00', day=30,
+                payload_fn=_previous_month_payload),
+    PeriodicJob('monthly_report.send', 'monthly_report.send_fan_out', at='09:00', day=1,
+                payload_fn=_previous_month_payload),
+    # AI日报与 accounting_app 调度器使用相同的幂等键，两边同时运行也只执行一次
+    PeriodicJob('ai_daily_report.generate', 'ai_daily_report.generate', at='08:00'),
+    PeriodicJob('ai_daily_report.email', 'ai_daily_report.email', at='08:10'),
+    PeriodicJob('card_recommendations.refresh', 'card_recommendations.refresh', at='03:00'),
+    PeriodicJob('monthly_ledger.dirty', 'monthly_ledger.recalculate_dirty', every_hours=1),
+    PeriodicJob('email_outbox.retry', 'email_outbox.deliver', every_hours=1),
+]
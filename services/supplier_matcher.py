@@ -0,0 +1,218 @@
+"""
+供应商名称匹配器 - Compiled Supplier Matcher
+供 TransactionClassifier / OwnerInfiniteClassifier / LedgerClassifier 共享
+
+- 精确匹配：所有供应商名称（或别名）编译为一个正则（前瞻重叠匹配），一次扫描找出优先级最高的命中
+- 模糊匹配：三元组（trigram）索引筛选候选，再用长度上界 / quick_ratio 剪枝，最后才计算 SequenceMatcher
+- 规范化包含匹配：去掉 '-', '_', ' ' 后双向包含
+- 按规范化商家名称记忆结果；match_many 对整张账单去重后批量匹配
+
+匹配语义与原来逐个供应商循环一致：按供应商列表顺序，第一个满足条件的供应商胜出
+"""
+
+import re
+import threading
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# 每个匹配器最多缓存的商家名称数量
+MATCH_CACHE_SIZE = 50000
+
+_NORMALIZE_RE = re.compile(r'[-_ ]')
+
+
+def normalize_compact(text: str) -> str:
+    """去掉 '-', '_', ' '（例如 '7-ELEVEN' → '7ELEVEN'）"""
+    return _NORMALIZE_RE.sub('', text)
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _combined_regex(patterns: Sequence[str]) -> Optional['re.Pattern']:
+    """
+    一个正则覆盖所有模式：(?=(p0|p1|...)) 在每个位置返回优先级最高的命中，
+    取所有位置中的最小优先级即为原循环的结果
+    """
+    alternatives = [re.escape(p) for p in patterns if p]
+    if not alternatives:
+        return None
+    return re.compile('(?=(' + '|'.join(alternatives) + '))')
+
+
+class SupplierMatcher:
+    """
+    编译后的供应商匹配器
+
+    Args:
+        patterns: 按优先级排列的供应商名称，或 (匹配模式, 标准名称) 元组（别名表）
+        fuzzy_threshold: SequenceMatcher 相似度阈值；None 表示不做模糊匹配
+        compact_containment: 是否启用去除分隔符后的双向包含匹配
+        case: 'upper' / 'lower'，模式与商家名称统一转换的大小写
+    """
+
+    def __init__(self, patterns: Sequence[Union[str, Tuple[str, str]]],
+                 fuzzy_threshold: Optional[float] = None,
+                 compact_containment: bool = False,
+                 case: str = 'upper'):
+        self._fold = str.upper if case == 'upper' else str.lower
+        self.entries: List[Tuple[str, str]] = [
+            (p, p) if isinstance(p, str) else (p[0], p[1]) for p in patterns
+        ]
+        self.keys = [self._fold(pattern) for pattern, _ in self.entries]
+        self.fuzzy_threshold = fuzzy_threshold
+        self.compact_containment = compact_containment
+
+        # 1. 精确（包含）匹配
+        self._priority: Dict[str, int] = {}
+        for i, key in enumerate(self.keys):
+            self._priority.setdefault(key, i)
+        self._regex = _combined_regex(self.keys)
+        # 空模式包含于任何字符串
+        self._empty_priority = next((i for i, key in enumerate(self.keys) if not key), None)
+
+        # 2. 模糊匹配：trigram → 供应商下标
+        self._fuzzy_keys = [key.strip() for key in self.keys]
+        self._trigram_index: Dict[str, List[int]] = {}
+        self._short_keys: List[int] = []
+        if fuzzy_threshold is not None:
+            for i, key in enumerate(self._fuzzy_keys):
+                grams = _trigrams(key)
+                if not grams:
+                    self._short_keys.append(i)
+                for gram in grams:
+                    self._trigram_index.setdefault(gram, []).append(i)
+
+        # 3. 规范化包含匹配
+        self._compact_keys = [normalize_compact(key) for key in self.keys]
+        self._compact_priority: Dict[str, int] = {}
+        for i, key in enumerate(self._compact_keys):
+            self._compact_priority.setdefault(key, i)
+        self._compact_regex = _combined_regex(self._compact_keys)
+        self._compact_empty = next((i for i, key in enumerate(self._compact_keys) if not key), None)
+
+        self._cache: Dict[str, Optional[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------
+    # 单个阶段
+    # ------------------------------------------------------------
+
+    def _first_contained(self, regex, priority: Dict[str, int], empty: Optional[int], text: str) -> Optional[int]:
+        best = empty
+        if regex is not None:
+            for m in regex.finditer(text):
+                idx = priority[m.group(1)]
+                if best is None or idx < best:
+                    best = idx
+                    if best == 0:
+                        break
+        return best
+
+    def _exact(self, key: str) -> Optional[int]:
+        return self._first_contained(self._regex, self._priority, self._empty_priority, key)
+
+    def _fuzzy(self, key: str) -> Optional[int]:
+        threshold = self.fuzzy_threshold
+        candidates = set(self._short_keys)
+        for gram in _trigrams(key):
+            candidates.update(self._trigram_index.get(gram, ()))
+        if not candidates:
+            return None
+
+        key_len = len(key)
+        for i in sorted(candidates):
+            supplier = self._fuzzy_keys[i]
+            total = key_len + len(supplier)
+            # 相似度上界 2*min(a,b)/(a+b) 达不到阈值时无需计算
+            if not total or 2.0 * min(key_len, len(supplier)) / total < threshold:
+                continue
+            matcher = SequenceMatcher(None, key, supplier)
+            if matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold:
+                return i
+        return None
+
+    def _compact(self, key: str) -> Optional[int]:
+        compact = normalize_compact(key)
+        # 供应商包含于商家名称
+        best = self._first_contained(self._compact_regex, self._compact_priority, self._compact_empty, compact)
+        # 商家名称包含于供应商
+        for i, supplier in enumerate(self._compact_keys):
+            if best is not None and i >= best:
+                break
+            if compact in supplier:
+                best = i
+                break
+        return best
+
+    # ------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------
+
+    def _match_key(self, key: str) -> Optional[Tuple[str, str]]:
+        for stage, finder, enabled in (
+            ('exact', self._exact, True),
+            ('fuzzy', self._fuzzy, self.fuzzy_threshold is not None),
+            ('compact', self._compact, self.compact_containment),
+        ):
+            if not enabled:
+                continue
+            idx = finder(key)
+            if idx is not None:
+                return self.entries[idx][1], stage
+        return None
+
+    def match(self, merchant_name: Optional[str]) -> Optional[Tuple[str, str]]:
+        """
+        Returns:
+            (标准供应商名称, 命中阶段 'exact'/'fuzzy'/'compact')，未命中返回 None
+        """
+        if not merchant_name:
+            return None
+        key = self._fold(merchant_name).strip()
+        cached = self._cache.get(key, False)
+        if cached is not False:
+            self.hits += 1
+            return cached
+
+        result = self._match_key(key)
+        with self._lock:
+            self.misses += 1
+            if len(self._cache) >= MATCH_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = result
+        return result
+
+    def match_supplier(self, merchant_name: Optional[str]) -> Optional[str]:
+        result = self.match(merchant_name)
+        return result[0] if result else None
+
+    def match_many(self, merchant_names: Iterable[Optional[str]]) -> List[Optional[Tuple[str, str]]]:
+        """批量匹配（整张账单）：相同商家名称只匹配一次"""
+        names = list(merchant_names)
+        unique = {name: self.match(name) for name in set(names)}
+        return [unique[name] for name in names]
+
+    def stats(self) -> Dict:
+        return {'patterns': len(self.keys), 'cached': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+_matchers: Dict[tuple, SupplierMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def get_supplier_matcher(patterns: Sequence[Union[str, Tuple[str, str]]], fuzzy_threshold: Optional[float] = None,
+                         compact_containment: bool = False, case: str = 'upper') -> SupplierMatcher:
+    """按供应商/别名配置共享编译后的匹配器（同一配置只编译一次，记忆结果跨分类器实例复用）"""
+    key = (tuple(p if isinstance(p, str) else tuple(p) for p in patterns), fuzzy_threshold, compact_containment, case)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        with _matchers_lock:
+            matcher = _matchers.get(key)
+            if matcher is None:
+                matcher = SupplierMatcher(patterns, fuzzy_threshold, compact_containment, case)
+                _matchers[key] = matcher
+    return matcher
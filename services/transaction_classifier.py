@@ -13,6 +13,8 @@ import sqlite3
 from typing import Dict, List, Optional, Tuple
 from difflib import SequenceMatcher
 
+from services.supplier_matcher import get_supplier_matcher
+
 
 class TransactionClassifier:
     """智能交易分类器 - Infinite GZ Module 4"""
@@ -57,6 +59,13 @@ class TransactionClassifier:
         # 模糊匹配阈值（98%相似度）
         self.similarity_threshold = 0.98
         
+        # 编译后的供应商匹配器（同一供应商配置在进程内只编译一次）
+        self.supplier_matcher = get_supplier_matcher(
+            self.suppliers,
+            fuzzy_threshold=self.similarity_threshold,
+            compact_containment=True
+        )
+        
         # 付款关键词
         self.payment_keywords = [
             'PAYMENT', 'BAYARAN', 'DIRECT DEBIT', 'AUTO DEBIT',
@@ -90,30 +99,14 @@ class TransactionClassifier:
         Returns:
             (是否匹配, 匹配的供应商名称)
         """
-        if not merchant_name:
-            return False, None
-        
-        merchant_upper = merchant_name.upper().strip()
-        
         # 1. 精确匹配（包含关系）
-        for supplier in self.suppliers:
-            if supplier.upper() in merchant_upper:
-                return True, supplier
-        
-        # 2. 模糊匹配（80%相似度）
-        for supplier in self.suppliers:
-            similarity = self._calculate_similarity(merchant_name, supplier)
-            if similarity >= self.similarity_threshold:
-                return True, supplier
-        
+        # 2. 模糊匹配（相似度阈值，trigram索引筛选候选）
         # 3. 特殊处理：处理商家名称变体
-        # 例如: "7-ELEVEN" vs "7SL", "DINAS" vs "Dinas Raub"
-        merchant_normalized = merchant_upper.replace('-', '').replace('_', '').replace(' ', '')
-        for supplier in self.suppliers:
-            supplier_normalized = supplier.upper().replace('-', '').replace('_', '').replace(' ', '')
-            if supplier_normalized in merchant_normalized or merchant_normalized in supplier_normalized:
-                return True, supplier
-        
+        #    例如: "7-ELEVEN" vs "7SL", "DINAS" vs "Dinas Raub"
+        # 结果按商家名称记忆，同一商家重复出现时不再计算
+        matched = self.supplier_matcher.match_supplier(merchant_name)
+        if matched:
+            return True, matched
         return False, None
     
     def classify_expense(self, merchant_name: str) -> Dict:
@@ -286,6 +279,13 @@ class TransactionClassifier:
         }
         errors = []
         
+        # 先对整批商家名称去重匹配一次，逐笔分类时直接命中缓存
+        self.supplier_matcher.match_many(
+            txn.get('merchant_name') or txn.get('description', '')
+            for txn in transactions
+            if (txn.get('transaction_type') or 'expense').lower() in ['expense', 'purchase', 'debit']
+        )
+        
         for txn in transactions:
             try:
                 result = self.classify_single_transaction(
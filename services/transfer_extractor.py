@@ -83,15 +83,16 @@ class TransferExtractor:
             
             params = [customer_id]
             
+            # 日期范围按规范日期 txn_date（YYYY-MM-DD）过滤，transaction_date 为原文格式
             if start_date:
-                query += " AND st.transaction_date >= ?"
+                query += " AND st.txn_date >= ?"
                 params.append(start_date)
             
             if end_date:
-                query += " AND st.transaction_date <= ?"
+                query += " AND st.txn_date <= ?"
                 params.append(end_date)
             
-            query += " ORDER BY st.transaction_date ASC"
+            query += " ORDER BY st.txn_date ASC, st.id ASC"
             
             cursor.execute(query, params)
             transactions = cursor.fetchall()
@@ -6,12 +6,51 @@ VBA JSON数据处理服务
 import sys
 sys.path.insert(0, '.')
 
-from db.database import get_db, log_audit
+from db import database
+from db.database import get_db
+from services.card_timeline import invalidate_card_timeline
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# SQLite 单条语句的参数上限为999，IN 查询按此分块
+_IN_CHUNK_SIZE = 500
+
+# 兼容旧架构的statement记录挂在这张卡下（transactions.statement_id 必填时使用）
+_COMPAT_STATEMENT_CARD_ID = 1
+
+# 表结构缓存：(数据库路径, 表名) → {列名: 是否NOT NULL}
+_schema_cache: Dict[Tuple[str, str], Dict[str, bool]] = {}
+
+
+def _table_columns(cursor, table: str) -> Dict[str, bool]:
+    """表的列（每个进程每个表只执行一次 PRAGMA table_info）；表不存在时返回空字典且不缓存"""
+    key = (database.DB_PATH, table)
+    columns = _schema_cache.get(key)
+    if columns is None:
+        columns = {col[1]: col[3] == 1 for col in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+        if not columns:
+            return columns
+        _schema_cache[key] = columns
+    return columns
+
+
+def invalidate_schema_cache():
+    """表结构变更（迁移）后清空缓存"""
+    _schema_cache.clear()
+
+
+def _chunks(values: List, size: int = _IN_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _placeholders(values) -> str:
+    return ','.join('?' * len(values))
+
 
 class VBAJSONProcessor:
     """VBA JSON数据处理器"""
@@ -27,7 +66,7 @@ class VBAJSONProcessor:
             json_data: VBA解析后的JSON对象
             user_id: 当前用户ID（可选）
             filename: 原始文件名（用于记录）
-            
+        
         Returns:
             dict: 处理结果 {
                 'success': bool,
@@ -36,419 +75,439 @@ class VBAJSONProcessor:
                 'transaction_count': int
             }
         """
-        doc_type = json_data.get('document_type')
+        return self.process_batch([(filename, json_data)], user_id)['results'][0]
+    
+    def process_batch(self, documents, user_id=None):
+        """
+        批量处理多个VBA JSON文件，在一个事务中入库
         
-        if doc_type == 'credit_card':
-            return self._process_credit_card(json_data, user_id, filename)
-        elif doc_type == 'bank_statement':
-            return self._process_bank_statement(json_data, user_id, filename)
-        else:
-            return {
-                'success': False,
-                'message': f'不支持的document_type: {doc_type}'
+        - 客户 / 信用卡 / 月度账单 / 卡片关联按批次集合查询，缺失的批量插入
+        - 所有文件的交易明细一次 executemany 写入
+        - 写入失败则整批回滚；单个文件的数据格式错误只影响该文件
+        
+        Args:
+            documents: [(filename, json_data), ...]
+            user_id: 当前用户ID（可选）
+        
+        Returns:
+            dict: {
+                'success': bool,
+                'message': str,
+                'results': 每个文件的处理结果（顺序同 documents，格式同 process_json）,
+                'transaction_count': int,
+                'elapsed_seconds': float,
+                'rows_per_second': float
             }
-    
-    def _process_credit_card(self, json_data, user_id, filename):
-        """处理信用卡账单JSON"""
-        try:
-            account_info = json_data.get('account_info', {})
-            transactions = json_data.get('transactions', [])
-            summary = json_data.get('summary', {})
-            
-            # 提取关键信息
-            owner_name = account_info.get('owner_name', 'Unknown')
-            bank_name = account_info.get('bank', 'Unknown')
-            card_last_4 = account_info.get('card_last_4', '0000')
-            card_type = account_info.get('card_type', 'Unknown')
-            statement_date = account_info.get('statement_date', '')
-            card_limit = float(account_info.get('card_limit', 0))
-            previous_balance = float(account_info.get('previous_balance', 0))
-            closing_balance = float(account_info.get('closing_balance', 0))
-            
-            # 计算statement_month (YYYY-MM格式)
-            statement_month = self._parse_statement_month(statement_date)
-            
-            with get_db() as conn:
-                cursor = conn.cursor()
-                
-                # 1. 查找或创建客户
-                customer_id = self._find_or_create_customer(cursor, owner_name)
-                
-                # 2. 查找或创建信用卡
-                card_id = self._find_or_create_credit_card(
-                    cursor, customer_id, bank_name, card_last_4, 
-                    card_type, card_limit
-                )
-                
-                # 3. 创建或更新月度账单
-                monthly_statement_id = self._find_or_create_monthly_statement(
-                    cursor, customer_id, bank_name, statement_month,
-                    statement_date, previous_balance, closing_balance
-                )
-                
-                # 4. 关联卡片到月度账单
-                self._link_card_to_monthly_statement(
-                    cursor, monthly_statement_id, card_id, card_last_4,
-                    card_type, previous_balance, closing_balance, card_limit
-                )
-                
-                # 5. 插入交易明细
-                transaction_count = self._insert_transactions(
-                    cursor, monthly_statement_id, transactions
-                )
-                
-                # 6. 更新月度账单统计
-                self._update_monthly_statement_stats(
-                    cursor, monthly_statement_id, transaction_count, summary
-                )
-                
-                conn.commit()
-                
-                # 记录审计日志
-                if user_id:
-                    log_audit(
-                        user_id, 
-                        'VBA_JSON_UPLOAD', 
-                        'monthly_statement', 
-                        monthly_statement_id,
-                        f'VBA上传信用卡账单: {bank_name} - {statement_month} ({filename})',
-                        None
-                    )
-                
-                logger.info(f"✅ 信用卡账单入库成功: {bank_name} {statement_month}, {transaction_count}笔交易")
-                
-                return {
-                    'success': True,
-                    'message': '信用卡账单入库成功',
-                    'statement_id': monthly_statement_id,
-                    'transaction_count': transaction_count,
-                    'bank': bank_name,
-                    'month': statement_month
+        """
+        started = time.perf_counter()
+        results: List[Optional[Dict]] = [None] * len(documents)
+        prepared = []
+        
+        for index, (filename, json_data) in enumerate(documents):
+            try:
+                doc = self._prepare_document(json_data)
+            except Exception as e:
+                logger.error(f"VBA JSON解析失败 ({filename}): {e}")
+                results[index] = {'success': False, 'message': f'入库失败: {str(e)}'}
+                continue
+            if doc is None:
+                results[index] = {
+                    'success': False,
+                    'message': f"不支持的document_type: {json_data.get('document_type')}"
                 }
+                continue
+            doc['index'] = index
+            doc['filename'] = filename
+            prepared.append(doc)
+        
+        transaction_count = 0
+        if prepared:
+            try:
+                with get_db() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        transaction_count = self._write_documents(cursor, prepared, user_id)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        # 回滚可能撤销了本事务中新建的表
+                        invalidate_schema_cache()
+                        raise
+            except Exception as e:
+                logger.error(f"VBA JSON批量入库失败: {e}")
+                for doc in prepared:
+                    results[doc['index']] = {'success': False, 'message': f'入库失败: {str(e)}'}
+                prepared = []
         
-        except Exception as e:
-            logger.error(f"信用卡账单入库失败: {e}")
-            return {
-                'success': False,
-                'message': f'入库失败: {str(e)}'
+        # 提交后清除受影响信用卡的12个月时间线缓存
+        card_ids = self._timeline_card_ids(prepared)
+        if card_ids:
+            invalidate_card_timeline(card_ids)
+        
+        for doc in prepared:
+            kind = self._document_label(doc)
+            logger.info(f"✅ {kind}入库成功: {doc['bank_name']} {doc['statement_month']}, "
+                        f"{doc['transaction_count']}笔交易")
+            results[doc['index']] = {
+                'success': True,
+                'message': f'{kind}入库成功',
+                'statement_id': doc['monthly_statement_id'],
+                'transaction_count': doc['transaction_count'],
+                'bank': doc['bank_name'],
+                'month': doc['statement_month']
             }
+        
+        elapsed = time.perf_counter() - started
+        rows_per_second = round(transaction_count / elapsed, 1) if elapsed > 0 else 0.0
+        succeeded = sum(1 for r in results if r['success'])
+        if transaction_count:
+            logger.info(f"VBA JSON批量入库: {succeeded}/{len(documents)} 个文件, "
+                        f"{transaction_count}笔交易, {elapsed:.3f}s ({rows_per_second} rows/s)")
+        
+        return {
+            'success': succeeded == len(documents),
+            'message': f'{succeeded}/{len(documents)} 个文件入库成功',
+            'results': results,
+            'transaction_count': transaction_count,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': rows_per_second
+        }
     
-    def _process_bank_statement(self, json_data, user_id, filename):
-        """处理银行流水JSON"""
-        try:
-            account_info = json_data.get('account_info', {})
-            transactions = json_data.get('transactions', [])
-            summary = json_data.get('summary', {})
-            
-            # 提取关键信息
-            account_holder = account_info.get('account_holder', 'Unknown')
-            bank_name = json_data.get('bank_detected', account_info.get('bank', 'Unknown'))
-            account_number = account_info.get('account_number', 'N/A')
-            account_type = account_info.get('account_type', 'Unknown')
-            statement_date = account_info.get('statement_date', '')
-            opening_balance = float(account_info.get('opening_balance', 0))
-            closing_balance = float(account_info.get('closing_balance', 0))
-            
-            # 计算statement_month
-            statement_month = self._parse_statement_month(statement_date)
-            
-            with get_db() as conn:
-                cursor = conn.cursor()
-                
-                # 1. 查找或创建客户
-                customer_id = self._find_or_create_customer(cursor, account_holder)
-                
-                # 2. 创建或更新月度账单（银行流水也使用monthly_statements）
-                monthly_statement_id = self._find_or_create_monthly_statement(
-                    cursor, customer_id, bank_name, statement_month,
-                    statement_date, opening_balance, closing_balance
-                )
-                
-                # 3. 插入交易明细
-                transaction_count = self._insert_transactions(
-                    cursor, monthly_statement_id, transactions
-                )
-                
-                # 4. 更新月度账单统计
-                self._update_monthly_statement_stats(
-                    cursor, monthly_statement_id, transaction_count, summary
-                )
-                
-                conn.commit()
-                
-                # 记录审计日志
-                if user_id:
-                    log_audit(
-                        user_id,
-                        'VBA_JSON_UPLOAD',
-                        'monthly_statement',
-                        monthly_statement_id,
-                        f'VBA上传银行流水: {bank_name} - {statement_month} ({filename})',
-                        None
-                    )
-                
-                logger.info(f"✅ 银行流水入库成功: {bank_name} {statement_month}, {transaction_count}笔交易")
-                
-                return {
-                    'success': True,
-                    'message': '银行流水入库成功',
-                    'statement_id': monthly_statement_id,
-                    'transaction_count': transaction_count,
-                    'bank': bank_name,
-                    'month': statement_month
-                }
+    @staticmethod
+    def _timeline_card_ids(docs):
+        """本批次写入了账单或交易的信用卡ID（含兼容statement所属的卡）"""
+        card_ids = {doc['card_id'] for doc in docs if doc.get('card_id') is not None}
+        if any(doc.get('compat_statement_id') for doc in docs):
+            card_ids.add(_COMPAT_STATEMENT_CARD_ID)
+        return card_ids
+    
+    @staticmethod
+    def _document_label(doc):
+        return '信用卡账单' if doc['document_type'] == 'credit_card' else '银行流水'
+    
+    def _prepare_document(self, json_data):
+        """提取一个JSON文件的入库字段；document_type 不支持时返回None"""
+        doc_type = json_data.get('document_type')
+        account_info = json_data.get('account_info', {})
         
-        except Exception as e:
-            logger.error(f"银行流水入库失败: {e}")
-            return {
-                'success': False,
-                'message': f'入库失败: {str(e)}'
+        if doc_type == 'credit_card':
+            doc = {
+                'owner_name': account_info.get('owner_name', 'Unknown'),
+                'bank_name': account_info.get('bank', 'Unknown'),
+                'card_last_4': account_info.get('card_last_4', '0000'),
+                'card_type': account_info.get('card_type', 'Unknown'),
+                'statement_date': account_info.get('statement_date', ''),
+                'card_limit': float(account_info.get('card_limit', 0)),
+                'previous_balance': float(account_info.get('previous_balance', 0)),
+                'closing_balance': float(account_info.get('closing_balance', 0)),
             }
+        elif doc_type == 'bank_statement':
+            doc = {
+                'owner_name': account_info.get('account_holder', 'Unknown'),
+                'bank_name': json_data.get('bank_detected', account_info.get('bank', 'Unknown')),
+                'statement_date': account_info.get('statement_date', ''),
+                'previous_balance': float(account_info.get('opening_balance', 0)),
+                'closing_balance': float(account_info.get('closing_balance', 0)),
+            }
+        else:
+            return None
+        
+        doc['document_type'] = doc_type
+        doc['statement_month'] = self._parse_statement_month(doc['statement_date'])
+        doc['transactions'] = [self._prepare_transaction(txn) for txn in json_data.get('transactions', [])]
+        return doc
     
-    def _find_or_create_customer(self, cursor, name):
-        """查找或创建客户"""
-        # 先尝试查找现有客户
-        cursor.execute(
-            "SELECT id FROM customers WHERE name = ? COLLATE NOCASE LIMIT 1",
-            (name,)
-        )
-        row = cursor.fetchone()
+    def _prepare_transaction(self, txn):
+        """交易明细 → (transaction_date, description, amount, category)"""
+        # 信用卡: amount, dr, cr
+        # 银行流水: debit, credit
+        debit = float(txn.get('dr', txn.get('debit', 0)))
+        credit = float(txn.get('cr', txn.get('credit', 0)))
+        amount = float(txn.get('amount', debit if debit > 0 else credit))
         
-        if row:
-            return row[0]
+        category = txn.get('category', 'Uncategorized')
+        sub_category = txn.get('sub_category', '')
+        return (txn.get('date', ''), txn.get('description', ''), amount, f"{category} - {sub_category}")
+    
+    def _write_documents(self, cursor, docs, user_id):
+        """在当前事务中写入一批已解析的文件，返回写入的交易笔数"""
+        now = datetime.now()
         
-        # 创建新客户
-        email = f"{name.lower().replace(' ', '_')}@vba.upload"
-        cursor.execute(
-            """INSERT INTO customers (name, email, phone, created_at) 
-               VALUES (?, ?, ?, ?)""",
-            (name, email, 'N/A', datetime.now())
-        )
-        return cursor.lastrowid
+        # 1. 查找或创建客户
+        customer_ids = self._resolve_customers(cursor, [doc['owner_name'] for doc in docs], now)
+        for doc in docs:
+            doc['customer_id'] = customer_ids[doc['owner_name'].lower()]
+        
+        # 2. 查找或创建信用卡（仅信用卡账单）
+        card_docs = [doc for doc in docs if doc['document_type'] == 'credit_card']
+        if card_docs:
+            card_ids = self._resolve_credit_cards(cursor, card_docs, now)
+            for doc in card_docs:
+                doc['card_id'] = card_ids[(doc['customer_id'], doc['bank_name'], doc['card_last_4'])]
+        
+        # 3. 创建或更新月度账单
+        statement_ids = self._resolve_monthly_statements(cursor, docs, now)
+        for doc in docs:
+            doc['monthly_statement_id'] = statement_ids[
+                (doc['customer_id'], doc['bank_name'], doc['statement_month'])
+            ]
+        
+        # 4. 关联卡片到月度账单
+        if card_docs:
+            self._link_cards_to_monthly_statements(cursor, card_docs, now)
+        
+        # 5. 插入交易明细
+        transaction_count = self._insert_transactions(cursor, docs, now)
+        
+        # 6. 更新月度账单统计
+        self._update_monthly_statement_stats(cursor, docs, now)
+        
+        # 7. 审计日志（与数据在同一事务中提交）
+        if user_id:
+            cursor.executemany(
+                """INSERT INTO audit_logs
+                   (user_id, action_type, entity_type, entity_id, description, ip_address)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(user_id, 'VBA_JSON_UPLOAD', 'monthly_statement', doc['monthly_statement_id'],
+                  f"VBA上传{self._document_label(doc)}: {doc['bank_name']} - {doc['statement_month']} "
+                  f"({doc['filename']})", None)
+                 for doc in docs]
+            )
+        
+        return transaction_count
     
-    def _find_or_create_credit_card(self, cursor, customer_id, bank_name, 
-                                    card_last_4, card_type, card_limit):
-        """查找或创建信用卡"""
-        # 先查找现有卡片
-        cursor.execute(
-            """SELECT id FROM credit_cards 
-               WHERE customer_id = ? AND bank_name = ? AND card_number_last4 = ?
-               LIMIT 1""",
-            (customer_id, bank_name, card_last_4)
-        )
-        row = cursor.fetchone()
+    def _select_customers(self, cursor, names):
+        found = {}
+        for chunk in _chunks(names):
+            cursor.execute(
+                f"""SELECT id, name FROM customers
+                    WHERE name COLLATE NOCASE IN ({_placeholders(chunk)})
+                    ORDER BY id""",
+                chunk
+            )
+            for row in cursor.fetchall():
+                found.setdefault(row[1].lower(), row[0])
+        return found
+    
+    def _resolve_customers(self, cursor, names, now):
+        """按名称（不区分大小写）批量查找客户，缺失的批量创建；返回 小写名称 → 客户ID"""
+        unique = {}
+        for name in names:
+            unique.setdefault(name.lower(), name)
         
-        if row:
-            # 更新信用额度
+        found = self._select_customers(cursor, list(unique.values()))
+        missing = [name for key, name in unique.items() if key not in found]
+        if missing:
+            cursor.executemany(
+                """INSERT INTO customers (name, email, phone, created_at)
+                   VALUES (?, ?, ?, ?)""",
+                [(name, f"{name.lower().replace(' ', '_')}@vba.upload", 'N/A', now) for name in missing]
+            )
+            found.update(self._select_customers(cursor, missing))
+        return found
+    
+    def _select_credit_cards(self, cursor, customer_ids):
+        found = {}
+        for chunk in _chunks(customer_ids):
             cursor.execute(
-                """UPDATE credit_cards 
+                f"""SELECT id, customer_id, bank_name, card_number_last4 FROM credit_cards
+                    WHERE customer_id IN ({_placeholders(chunk)})
+                    ORDER BY id""",
+                chunk
+            )
+            for row in cursor.fetchall():
+                found.setdefault((row[1], row[2], row[3]), row[0])
+        return found
+    
+    def _resolve_credit_cards(self, cursor, docs, now):
+        """批量查找或创建信用卡；已存在的卡更新额度与卡类型（同一张卡以批次中最后一个文件为准）"""
+        latest = {}
+        for doc in docs:
+            latest[(doc['customer_id'], doc['bank_name'], doc['card_last_4'])] = doc
+        
+        found = self._select_credit_cards(cursor, list({key[0] for key in latest}))
+        existing = [key for key in latest if key in found]
+        missing = [key for key in latest if key not in found]
+        
+        if existing:
+            cursor.executemany(
+                """UPDATE credit_cards
                    SET credit_limit = ?, card_type = ?
                    WHERE id = ?""",
-                (card_limit, card_type, row[0])
+                [(latest[key]['card_limit'], latest[key]['card_type'], found[key]) for key in existing]
             )
-            return row[0]
-        
-        # 创建新卡片
-        cursor.execute(
-            """INSERT INTO credit_cards 
-               (customer_id, bank_name, card_number_last4, card_type, credit_limit, created_at)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (customer_id, bank_name, card_last_4, card_type, card_limit, datetime.now())
-        )
-        return cursor.lastrowid
+        if missing:
+            cursor.executemany(
+                """INSERT INTO credit_cards
+                   (customer_id, bank_name, card_number_last4, card_type, credit_limit, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(key[0], key[1], key[2], latest[key]['card_type'], latest[key]['card_limit'], now)
+                 for key in missing]
+            )
+            found = {**self._select_credit_cards(cursor, list({key[0] for key in missing})), **found}
+        return found
     
-    def _find_or_create_monthly_statement(self, cursor, customer_id, bank_name,
-                                          statement_month, statement_date,
-                                          previous_balance, closing_balance):
-        """查找或创建月度账单"""
-        # 确保monthly_statements表存在
-        cursor.execute(
-            """SELECT name FROM sqlite_master 
-               WHERE type='table' AND name='monthly_statements'"""
-        )
-        if not cursor.fetchone():
-            # 表不存在，创建它
+    def _select_monthly_statements(self, cursor, customer_ids):
+        found = {}
+        for chunk in _chunks(customer_ids):
+            cursor.execute(
+                f"""SELECT id, customer_id, bank_name, statement_month FROM monthly_statements
+                    WHERE customer_id IN ({_placeholders(chunk)})
+                    ORDER BY id""",
+                chunk
+            )
+            for row in cursor.fetchall():
+                found.setdefault((row[1], row[2], row[3]), row[0])
+        return found
+    
+    def _resolve_monthly_statements(self, cursor, docs, now):
+        """批量查找或创建月度账单；已存在的更新余额（同一账单以批次中最后一个文件为准）"""
+        if not _table_columns(cursor, 'monthly_statements'):
+            # 表不存在，创建它（并缓存新表的结构）
             self._create_monthly_statements_table(cursor)
+            _table_columns(cursor, 'monthly_statements')
         
-        # 查找现有月度账单
-        cursor.execute(
-            """SELECT id FROM monthly_statements
-               WHERE customer_id = ? AND bank_name = ? AND statement_month = ?
-               LIMIT 1""",
-            (customer_id, bank_name, statement_month)
-        )
-        row = cursor.fetchone()
+        latest = {}
+        for doc in docs:
+            latest[(doc['customer_id'], doc['bank_name'], doc['statement_month'])] = doc
         
-        if row:
-            # 更新余额
-            cursor.execute(
+        found = self._select_monthly_statements(cursor, list({key[0] for key in latest}))
+        existing = [key for key in latest if key in found]
+        missing = [key for key in latest if key not in found]
+        
+        if existing:
+            cursor.executemany(
                 """UPDATE monthly_statements
-                   SET previous_balance_total = ?, 
+                   SET previous_balance_total = ?,
                        closing_balance_total = ?,
                        period_end_date = ?,
                        updated_at = ?
                    WHERE id = ?""",
-                (previous_balance, closing_balance, statement_date, datetime.now(), row[0])
+                [(latest[key]['previous_balance'], latest[key]['closing_balance'],
+                  latest[key]['statement_date'], now, found[key]) for key in existing]
             )
-            return row[0]
-        
-        # 创建新月度账单
-        cursor.execute(
-            """INSERT INTO monthly_statements
-               (customer_id, bank_name, statement_month, period_end_date,
-                previous_balance_total, closing_balance_total, 
-                created_at, updated_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (customer_id, bank_name, statement_month, statement_date,
-             previous_balance, closing_balance, datetime.now(), datetime.now())
-        )
-        return cursor.lastrowid
+        if missing:
+            cursor.executemany(
+                """INSERT INTO monthly_statements
+                   (customer_id, bank_name, statement_month, period_end_date,
+                    previous_balance_total, closing_balance_total,
+                    created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(key[0], key[1], key[2], latest[key]['statement_date'],
+                  latest[key]['previous_balance'], latest[key]['closing_balance'], now, now)
+                 for key in missing]
+            )
+            found = {**self._select_monthly_statements(cursor, list({key[0] for key in missing})), **found}
+        return found
     
-    def _link_card_to_monthly_statement(self, cursor, monthly_statement_id, card_id,
-                                       card_last_4, card_type, previous_balance,
-                                       closing_balance, credit_limit):
-        """关联卡片到月度账单"""
-        # 确保monthly_statement_cards表存在
-        cursor.execute(
-            """SELECT name FROM sqlite_master 
-               WHERE type='table' AND name='monthly_statement_cards'"""
-        )
-        if not cursor.fetchone():
+    def _link_cards_to_monthly_statements(self, cursor, docs, now):
+        """批量关联卡片到月度账单（已关联的更新余额与额度）"""
+        if not _table_columns(cursor, 'monthly_statement_cards'):
             self._create_monthly_statement_cards_table(cursor)
+            _table_columns(cursor, 'monthly_statement_cards')
         
-        # 检查是否已存在
-        cursor.execute(
-            """SELECT id FROM monthly_statement_cards
-               WHERE monthly_statement_id = ? AND card_id = ?
-               LIMIT 1""",
-            (monthly_statement_id, card_id)
-        )
-        row = cursor.fetchone()
+        latest = {}
+        for doc in docs:
+            latest[(doc['monthly_statement_id'], doc['card_id'])] = doc
         
-        if row:
-            # 更新
+        found = {}
+        for chunk in _chunks(list({key[0] for key in latest})):
             cursor.execute(
+                f"""SELECT id, monthly_statement_id, card_id FROM monthly_statement_cards
+                    WHERE monthly_statement_id IN ({_placeholders(chunk)})
+                    ORDER BY id""",
+                chunk
+            )
+            for row in cursor.fetchall():
+                found.setdefault((row[1], row[2]), row[0])
+        
+        updates = [(latest[key]['previous_balance'], latest[key]['closing_balance'],
+                    latest[key]['card_limit'], found[key])
+                   for key in latest if key in found]
+        inserts = [(key[0], key[1], latest[key]['card_last_4'], latest[key]['card_type'],
+                    latest[key]['previous_balance'], latest[key]['closing_balance'],
+                    latest[key]['card_limit'], now)
+                   for key in latest if key not in found]
+        if updates:
+            cursor.executemany(
                 """UPDATE monthly_statement_cards
                    SET previous_balance = ?, closing_balance = ?, credit_limit = ?
                    WHERE id = ?""",
-                (previous_balance, closing_balance, credit_limit, row[0])
+                updates
             )
-        else:
-            # 插入
-            cursor.execute(
+        if inserts:
+            cursor.executemany(
                 """INSERT INTO monthly_statement_cards
                    (monthly_statement_id, card_id, card_last4, card_type,
                     previous_balance, closing_balance, credit_limit, created_at)
                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (monthly_statement_id, card_id, card_last_4, card_type,
-                 previous_balance, closing_balance, credit_limit, datetime.now())
+                inserts
             )
     
-    def _insert_transactions(self, cursor, monthly_statement_id, transactions):
-        """插入交易明细"""
-        count = 0
+    def _create_compat_statement(self, cursor, now):
+        """创建一个兼容旧架构的statement记录（transactions.statement_id 必填时使用）"""
+        cursor.execute(
+            """INSERT INTO statements
+               (card_id, statement_date, statement_total, file_path, created_at)
+               VALUES (?, ?, ?, ?, ?)""",
+            (_COMPAT_STATEMENT_CARD_ID, now.strftime('%Y-%m-%d'), 0.0, 'VBA_UPLOAD', now)
+        )
+        return cursor.lastrowid
+    
+    def _insert_transactions(self, cursor, docs, now):
+        """所有文件的交易明细一次 executemany 写入"""
+        columns = _table_columns(cursor, 'transactions')
+        has_monthly_statement_id = 'monthly_statement_id' in columns
+        statement_id_not_null = columns.get('statement_id', False)
         
-        # 检查表结构
-        cursor.execute("PRAGMA table_info(transactions)")
-        columns = {col[1]: col for col in cursor.fetchall()}
+        if has_monthly_statement_id and statement_id_not_null:
+            # 新架构但statement_id为NOT NULL：同时插入兼容statement_id和monthly_statement_id
+            key_columns = 'statement_id, monthly_statement_id'
+        elif has_monthly_statement_id:
+            key_columns = 'monthly_statement_id'
+        else:
+            # 旧架构：只有statement_id
+            key_columns = 'statement_id'
         
-        has_monthly_statement_id = 'monthly_statement_id' in columns
-        has_statement_id = 'statement_id' in columns
-        statement_id_not_null = False
-        
-        if has_statement_id:
-            # 检查statement_id是否NOT NULL
-            for col in cursor.execute("PRAGMA table_info(transactions)").fetchall():
-                if col[1] == 'statement_id' and col[3] == 1:  # col[3] is notnull flag
-                    statement_id_not_null = True
-                    break
-        
-        # 如果statement_id是NOT NULL但我们要用monthly_statement_id，需要创建临时statement
-        temp_statement_id = None
-        if statement_id_not_null and has_monthly_statement_id:
-            # 创建一个临时statement记录作为兼容
-            cursor.execute(
-                """INSERT INTO statements 
-                   (card_id, statement_date, statement_total, file_path, created_at)
-                   VALUES (?, ?, ?, ?, ?)""",
-                (1, datetime.now().strftime('%Y-%m-%d'), 0.0, 'VBA_UPLOAD', datetime.now())
-            )
-            temp_statement_id = cursor.lastrowid
-        
-        for txn in transactions:
-            # 提取交易数据
-            txn_date = txn.get('date', '')
-            description = txn.get('description', '')
-            
-            # 信用卡: amount, dr, cr
-            # 银行流水: debit, credit
-            debit = float(txn.get('dr', txn.get('debit', 0)))
-            credit = float(txn.get('cr', txn.get('credit', 0)))
-            amount = float(txn.get('amount', debit if debit > 0 else credit))
-            
-            category = txn.get('category', 'Uncategorized')
-            sub_category = txn.get('sub_category', '')
-            
-            # 构建SQL
-            if has_monthly_statement_id:
-                # 新架构：同时插入statement_id和monthly_statement_id
-                if temp_statement_id:
-                    cursor.execute(
-                        """INSERT INTO transactions
-                           (statement_id, monthly_statement_id, transaction_date, description, 
-                            amount, category, created_at)
-                           VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                        (temp_statement_id, monthly_statement_id, txn_date, description, amount, 
-                         f"{category} - {sub_category}", datetime.now())
-                    )
-                else:
-                    cursor.execute(
-                        """INSERT INTO transactions
-                           (monthly_statement_id, transaction_date, description, 
-                            amount, category, created_at)
-                           VALUES (?, ?, ?, ?, ?, ?)""",
-                        (monthly_statement_id, txn_date, description, amount, 
-                         f"{category} - {sub_category}", datetime.now())
-                    )
+        rows = []
+        for doc in docs:
+            doc['transaction_count'] = len(doc['transactions'])
+            if has_monthly_statement_id and statement_id_not_null:
+                doc['compat_statement_id'] = self._create_compat_statement(cursor, now)
+                keys = (doc['compat_statement_id'], doc['monthly_statement_id'])
+            elif has_monthly_statement_id:
+                keys = (doc['monthly_statement_id'],)
+            elif doc['transactions']:
+                doc['compat_statement_id'] = self._create_compat_statement(cursor, now)
+                keys = (doc['compat_statement_id'],)
             else:
-                # 旧架构：只有statement_id
-                if not temp_statement_id:
-                    # 创建临时statement
-                    cursor.execute(
-                        """INSERT INTO statements 
-                           (card_id, statement_date, statement_total, file_path, created_at)
-                           VALUES (?, ?, ?, ?, ?)""",
-                        (1, datetime.now().strftime('%Y-%m-%d'), 0.0, 'VBA_UPLOAD', datetime.now())
-                    )
-                    temp_statement_id = cursor.lastrowid
-                
-                cursor.execute(
-                    """INSERT INTO transactions
-                       (statement_id, transaction_date, description, 
-                        amount, category, created_at)
-                       VALUES (?, ?, ?, ?, ?, ?)""",
-                    (temp_statement_id, txn_date, description, amount,
-                     f"{category} - {sub_category}", datetime.now())
-                )
-            
-            count += 1
-        
-        return count
+                continue
+            rows.extend((*keys, *txn, now) for txn in doc['transactions'])
+        
+        if not rows:
+            return 0
+        
+        cursor.executemany(
+            f"""INSERT INTO transactions
+                ({key_columns}, transaction_date, description, amount, category, created_at)
+                VALUES ({_placeholders(rows[0])})""",
+            rows
+        )
+        return len(rows)
     
-    def _update_monthly_statement_stats(self, cursor, monthly_statement_id, 
-                                       transaction_count, summary):
-        """更新月度账单统计"""
+    def _update_monthly_statement_stats(self, cursor, docs, now):
+        """更新月度账单统计（同一账单以批次中最后一个文件的交易笔数为准）"""
         # 检查表是否存在transaction_count字段
-        cursor.execute("PRAGMA table_info(monthly_statements)")
-        columns = [col[1] for col in cursor.fetchall()]
+        if 'transaction_count' not in _table_columns(cursor, 'monthly_statements'):
+            return
         
-        if 'transaction_count' in columns:
-            cursor.execute(
-                """UPDATE monthly_statements
-                   SET transaction_count = ?, updated_at = ?
-                   WHERE id = ?""",
-                (transaction_count, datetime.now(), monthly_statement_id)
-            )
+        counts = {doc['monthly_statement_id']: doc['transaction_count'] for doc in docs}
+        cursor.executemany(
+            """UPDATE monthly_statements
+               SET transaction_count = ?, updated_at = ?
+               WHERE id = ?""",
+            [(count, now, statement_id) for statement_id, count in counts.items()]
+        )
     
     def _parse_statement_month(self, statement_date):
         """
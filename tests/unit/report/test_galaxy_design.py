@@ -0,0 +1,65 @@
+"""
+银河主题设计系统单元测试
+测试预计算星点与原逐页随机生成结果一致，以及月份日期范围
+"""
+import random
+
+from db.database import month_date_range
+from report.galaxy_design import GalaxyDesign
+
+
+class RecordingCanvas:
+    """记录 circle 调用的最小画布"""
+
+    def __init__(self):
+        self.circles = []
+        self.fill = None
+
+    def setFillColorRGB(self, r, g, b, alpha=None):
+        self.fill = (r, g, b, alpha)
+
+    def circle(self, x, y, size, fill=1, stroke=0):
+        self.circles.append((x, y, size, self.fill))
+
+
+class TestGalaxyStarField:
+    """测试星点背景缓存"""
+
+    def test_star_field_matches_seeded_sequence(self):
+        design = GalaxyDesign()
+        canvas = RecordingCanvas()
+        design._draw_galaxy_stars(canvas)
+
+        rng = random.Random(42)
+        expected = []
+        for count, lo, hi, olo, ohi, grey in ((150, 0.5, 1.5, 0.3, 0.8, 0.94), (300, 0.2, 0.6, 0.2, 0.5, 0.88)):
+            for _ in range(count):
+                x = rng.uniform(0, design.page_width)
+                y = rng.uniform(0, design.page_height)
+                size = rng.uniform(lo, hi)
+                opacity = rng.uniform(olo, ohi)
+                expected.append((x, y, size, (grey, grey, grey, opacity)))
+
+        assert canvas.circles == expected
+
+    def test_star_field_computed_once(self):
+        design = GalaxyDesign()
+        first = design._get_star_field(design.page_width, design.page_height)
+        assert GalaxyDesign()._get_star_field(design.page_width, design.page_height) is first
+
+    def test_does_not_reseed_global_random(self):
+        random.seed(7)
+        expected = random.random()
+        random.seed(7)
+        GalaxyDesign()._draw_galaxy_stars(RecordingCanvas())
+        assert random.random() == expected
+
+
+class TestMonthDateRange:
+    """测试月份日期范围"""
+
+    def test_regular_month(self):
+        assert month_date_range(2025, 10) == ('2025-10-01', '2025-11-01')
+
+    def test_december_rolls_over(self):
+        assert month_date_range(2025, 12) == ('2025-12-01', '2026-01-01')
@@ -0,0 +1,169 @@
+"""
+Unit tests for FTS5 transaction search
+Covers startup index creation (LIKE fallback before it), trigger sync including statement / card moves,
+prefix matching, BM25 ordering, customer isolation, keyset pagination and snapshotted ranked pages
+"""
+import pytest
+
+import db.database as database
+from search import fts_index
+from search.search_service import SearchService
+
+SCHEMA = '''
+CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE credit_cards (id INTEGER PRIMARY KEY, customer_id INTEGER, bank_name TEXT, card_number_last4 TEXT);
+CREATE TABLE statements (id INTEGER PRIMARY KEY, card_id INTEGER, statement_date TEXT, is_confirmed INTEGER);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, statement_id INTEGER, transaction_date TEXT,
+    description TEXT, notes TEXT, amount REAL, category TEXT
+);
+CREATE TABLE tags (id INTEGER PRIMARY KEY, customer_id INTEGER, tag_name TEXT);
+CREATE TABLE transaction_tags (id INTEGER PRIMARY KEY, transaction_id INTEGER, tag_id INTEGER);
+INSERT INTO customers VALUES (1, 'Alice'), (2, 'Bob');
+INSERT INTO credit_cards VALUES (10, 1, 'Maybank', '1234'), (20, 2, 'CIMB', '5678');
+INSERT INTO statements VALUES (100, 10, '2025-09-30', 1), (200, 20, '2025-09-30', 1);
+'''
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'search.db')
+    monkeypatch.setattr(database, 'DB_PATH', db_path)
+    monkeypatch.setattr(fts_index, '_ready', {})
+    with database.get_db() as conn:
+        conn.executescript(SCHEMA)
+        # rows inserted before the index exists are backfilled
+        conn.execute("INSERT INTO transactions (statement_id, transaction_date, description, notes, amount) "
+                     "VALUES (100, '2025-09-01', 'GRAB FOOD KL', 'lunch', 25)")
+        conn.commit()
+        # application startup step
+        assert fts_index.ensure_fts_index(conn)
+    yield SearchService()
+    database.close_pool()
+
+
+def add_transaction(statement_id, date, description, notes=''):
+    with database.get_db() as conn:
+        cursor = conn.execute(
+            "INSERT INTO transactions (statement_id, transaction_date, description, notes, amount) VALUES (?, ?, ?, ?, 10)",
+            (statement_id, date, description, notes))
+        conn.commit()
+        return cursor.lastrowid
+
+
+class TestFtsSearch:
+    """FTS5-backed search_transactions"""
+
+    def test_backfill_and_prefix_match(self, service):
+        results = service.search_transactions(1, 'gra')
+        assert [r['description'] for r in results] == ['GRAB FOOD KL']
+
+    def test_search_never_builds_the_index(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'fresh.db'))
+        monkeypatch.setattr(fts_index, '_ready', {})
+        try:
+            with database.get_db() as conn:
+                conn.executescript(SCHEMA)
+            add_transaction(100, '2025-09-01', 'GRAB FOOD KL')
+
+            # before the startup step runs, searches use LIKE and leave the schema alone
+            assert [r['description'] for r in SearchService().search_transactions(1, 'grab')] == ['GRAB FOOD KL']
+            with database.get_db() as conn:
+                assert not fts_index.fts_index_ready(conn)
+                assert fts_index.ensure_fts_index(conn)
+            assert 'search_score' in SearchService().search_transactions(1, 'gra')[0]
+        finally:
+            database.close_pool()
+
+    def test_triggers_keep_index_in_sync(self, service):
+        txn_id = add_transaction(100, '2025-09-02', 'SHELL PETROL')
+        assert [r['id'] for r in service.search_transactions(1, 'shell')] == [txn_id]
+
+        with database.get_db() as conn:
+            conn.execute("UPDATE transactions SET notes = 'fleet car' WHERE id = ?", (txn_id,))
+            conn.execute("INSERT INTO tags VALUES (1, 1, 'reimbursable')")
+            conn.execute("INSERT INTO transaction_tags (transaction_id, tag_id) VALUES (?, 1)", (txn_id,))
+            conn.commit()
+        assert [r['id'] for r in service.search_transactions(1, 'fleet')] == [txn_id]
+        tagged = service.search_transactions(1, 'reimb')
+        assert [r['id'] for r in tagged] == [txn_id] and tagged[0]['tags'] == 'reimbursable'
+
+        with database.get_db() as conn:
+            conn.execute('DELETE FROM transactions WHERE id = ?', (txn_id,))
+            conn.commit()
+        assert service.search_transactions(1, 'shell') == []
+
+    def test_results_limited_to_customer(self, service):
+        add_transaction(200, '2025-09-03', 'GRAB CAR')
+        assert [r['description'] for r in service.search_transactions(1, 'grab')] == ['GRAB FOOD KL']
+
+    def test_customer_key_follows_statement_and_card_moves(self, service):
+        with database.get_db() as conn:
+            conn.execute("INSERT INTO credit_cards VALUES (30, 1, 'RHB', '9999')")
+            conn.execute("INSERT INTO statements VALUES (300, 30, '2025-09-30', 1)")
+            conn.commit()
+        txn_id = add_transaction(300, '2025-09-05', 'PETRONAS')
+
+        # statement re-assigned to Bob's card
+        with database.get_db() as conn:
+            conn.execute('UPDATE statements SET card_id = 20 WHERE id = 300')
+            conn.commit()
+        assert service.search_transactions(1, 'petronas') == []
+        assert [r['id'] for r in service.search_transactions(2, 'petronas')] == [txn_id]
+
+        # Bob's card moved back to Alice
+        with database.get_db() as conn:
+            conn.execute('UPDATE credit_cards SET customer_id = 1 WHERE id = 20')
+            conn.commit()
+        assert [r['id'] for r in service.search_transactions(1, 'petronas')] == [txn_id]
+        assert service.search_transactions(2, 'petronas') == []
+
+    def test_bm25_ranks_description_hits_first(self, service):
+        notes_hit = add_transaction(100, '2025-09-04', 'TOUCH N GO', notes='grab reload')
+        results = service.search_transactions(1, 'grab')
+        assert results[0]['description'] == 'GRAB FOOD KL'
+        assert results[-1]['id'] == notes_hit
+
+    def test_query_syntax_is_escaped(self, service):
+        assert service.search_transactions(1, 'grab" OR "x') == []
+        assert len(service.search_transactions(1, 'grab* ^food:(')) == 1
+
+
+class TestKeysetPagination:
+    """Keyset pagination for search results"""
+
+    @pytest.mark.parametrize('query', ['', 'shop'])
+    def test_pages_cover_all_rows_once(self, service, query):
+        ids = {add_transaction(100, f'2025-09-{day:02d}', f'SHOP {day}') for day in range(1, 8)}
+        seen, cursor = [], None
+        while True:
+            page = service.search_transactions_page(1, query, cursor=cursor, page_size=3)
+            seen.extend(r['id'] for r in page['results'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        assert len(seen) == len(set(seen))
+        assert ids <= set(seen)
+
+    def test_ranked_pages_follow_first_page_ordering(self, service):
+        for day in range(1, 8):
+            add_transaction(100, f'2025-09-{day:02d}', f'SHOP {day}', notes='shop' * (day % 3))
+        first = service.search_transactions_page(1, 'shop', page_size=3)
+        with database.get_db() as conn:
+            expected = [row[0] for row in conn.execute(
+                f"SELECT rowid FROM {fts_index.FTS_TABLE} WHERE {fts_index.FTS_TABLE} MATCH ? "
+                f"ORDER BY bm25({fts_index.FTS_TABLE}, {', '.join(map(str, fts_index.BM25_WEIGHTS))}), rowid",
+                (fts_index.build_match_expression(1, 'shop'),))]
+
+        # new matches change BM25 statistics (and every score) between pages
+        add_transaction(100, '2025-09-20', 'SHOP SHOP SHOP')
+        add_transaction(100, '2025-09-21', 'SHOP')
+        seen, cursor = [r['id'] for r in first['results']], first['next_cursor']
+        while cursor:
+            page = service.search_transactions_page(1, 'shop', cursor=cursor, page_size=3)
+            seen.extend(r['id'] for r in page['results'])
+            cursor = page['next_cursor']
+        assert seen == expected
+
+        # a snapshot only serves the customer it was taken for
+        assert service.search_transactions_page(2, 'shop', cursor=first['next_cursor'])['results'] == []
@@ -0,0 +1,128 @@
+"""
+本地SMTP测试服务器（不访问网络，不支持TLS）
+记录连接数、登录次数与收到的邮件；可指定拒绝的收件人和每个连接最多接收的邮件数，
+用于测试发件箱的会话复用、断线重连与重试
+
+    with LocalSMTPServer() as server:
+        SMTPSession('127.0.0.1', server.port, 'user', 'pw', starttls=False).send(msg)
+        server.messages  # [(mail_from, [rcpt, ...], data)]
+"""
+
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        server: 'LocalSMTPServer' = self.server
+        with server.state_lock:
+            server.connections += 1
+        self.reply('220 localhost ESMTP stub')
+        mail_from, rcpts, accepted = None, [], 0
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250-localhost')
+                self.reply('250-8BITMIME')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif verb == 'AUTH':
+                with server.state_lock:
+                    server.logins += 1
+                if server.reject_auth:
+                    self.reply('535 Authentication credentials invalid')
+                else:
+                    self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                mail_from, rcpts = command[10:].strip('<> '), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command[8:].strip('<> ')
+                code = server.refuse.get(address)
+                if code:
+                    self.reply(f'{code} Recipient refused')
+                else:
+                    rcpts.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b'.\r\n', b'.\n', b''):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                if server.delay:
+                    time.sleep(server.delay)
+                with server.state_lock:
+                    server.messages.append((mail_from, rcpts, b''.join(lines)))
+                self.reply('250 OK queued')
+                accepted += 1
+                if server.max_messages_per_connection and accepted >= server.max_messages_per_connection:
+                    # 模拟服务器主动断开连接
+                    return
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """本地SMTP测试服务器（监听 127.0.0.1 随机端口，后台线程运行）"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, refuse: Optional[Dict[str, int]] = None, max_messages_per_connection: int = 0,
+                 delay: float = 0.0, reject_auth: bool = False):
+        """
+        Args:
+            refuse: {收件人地址: SMTP响应代码}，例如 {'bad@example.com': 550}
+            max_messages_per_connection: 每个连接接收该数量的邮件后断开（0为不限制）
+            delay: 每封邮件DATA阶段的处理时间（秒）
+            reject_auth: 拒绝所有登录（535）
+        """
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.refuse = dict(refuse or {})
+        self.max_messages_per_connection = max_messages_per_connection
+        self.delay = delay
+        self.reject_auth = reject_auth
+        self.state_lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.messages: List[Tuple[str, List[str], bytes]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='smtp-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
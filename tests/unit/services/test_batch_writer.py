@@ -0,0 +1,131 @@
+"""
+BatchWriter 后台批量写入单元测试
+测试按数量 / 时间阈值成批写入、队列满时同步写入、整批失败逐条重试、关闭时写完队列，
+以及 db.database.log_audit 经队列写入 audit_logs
+"""
+import threading
+import time
+
+import pytest
+
+import db.database as database
+from services.batch_writer import BatchWriter
+
+
+class Recorder:
+    """记录每次 write_batch 的批次；gate 未打开时阻塞写入"""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, records):
+        self.gate.wait(5)
+        if self.fail_on is not None and self.fail_on in records:
+            raise ValueError('bad record')
+        self.batches.append(list(records))
+
+    @property
+    def records(self):
+        return [r for batch in self.batches for r in batch]
+
+
+@pytest.fixture
+def writers():
+    created = []
+
+    def make(write_batch, **kwargs):
+        writer = BatchWriter('test', write_batch, **kwargs)
+        created.append(writer)
+        return writer
+
+    yield make
+    for writer in created:
+        writer.close()
+
+
+class TestBatchWriter:
+    """后台批量写入"""
+
+    def test_batches_by_size_and_time(self, writers):
+        recorder = Recorder()
+        writer = writers(recorder, batch_size=3, flush_interval=0.2)
+        recorder.gate.clear()
+        for i in range(7):
+            writer.submit(i)
+        recorder.gate.set()
+
+        assert writer.flush(5)
+        assert recorder.records == list(range(7))
+        assert all(len(batch) <= 3 for batch in recorder.batches)
+        assert len(recorder.batches) < 7
+
+        started = time.monotonic()
+        writer.submit('late')
+        assert writer.flush(5)
+        # 不足一批时等待 flush_interval 后写入
+        assert time.monotonic() - started >= 0.15
+        stats = writer.stats()
+        assert stats['written'] == 8 and stats['queue_depth'] == 0 and stats['batches'] == len(recorder.batches)
+
+    def test_full_queue_falls_back_to_synchronous_write(self, writers):
+        recorder = Recorder()
+        writer = writers(recorder, max_queue=2, batch_size=1, flush_interval=0.01)
+        recorder.gate.clear()
+        writer.submit('a')
+        time.sleep(0.1)  # 'a' 已被后台线程取走并阻塞在写入中
+        writer.submit('b')
+        writer.submit('c')
+
+        # 队列已满：调用线程同步写入（被 gate 阻塞直到打开）
+        sync = threading.Thread(target=writer.submit, args=('d',))
+        sync.start()
+        recorder.gate.set()
+        sync.join(5)
+
+        assert writer.flush(5)
+        assert sorted(recorder.records) == ['a', 'b', 'c', 'd']
+        assert writer.stats()['sync_writes'] == 1
+
+    def test_failed_batch_is_retried_per_record(self, writers):
+        recorder = Recorder(fail_on='bad')
+        writer = writers(recorder, batch_size=10, flush_interval=0.05)
+        recorder.gate.clear()
+        for record in ('x', 'bad', 'y'):
+            writer.submit(record)
+        recorder.gate.set()
+
+        assert writer.flush(5)
+        assert recorder.records == ['x', 'y']
+        assert writer.stats()['failed'] == 1
+
+    def test_close_writes_remaining_records(self, writers):
+        recorder = Recorder()
+        writer = writers(recorder, batch_size=1000, flush_interval=60)
+        for i in range(50):
+            writer.submit(i)
+        writer.close()
+
+        assert recorder.records == list(range(50))
+        assert writer.stats()['pending'] == 0
+
+
+def test_log_audit_is_written_in_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'audit.db'))
+    with database.get_db() as conn:
+        conn.execute('CREATE TABLE audit_logs (id INTEGER PRIMARY KEY, user_id INTEGER, action_type TEXT, '
+                     'entity_type TEXT, entity_id INTEGER, description TEXT, ip_address TEXT)')
+        conn.commit()
+    try:
+        for i in range(5):
+            database.log_audit(1, 'TEST', 'statement', i, f'event {i}')
+        assert database.flush_audit_log(5)
+
+        with database.get_db() as conn:
+            rows = conn.execute('SELECT entity_id FROM audit_logs ORDER BY id').fetchall()
+        assert [row[0] for row in rows] == [0, 1, 2, 3, 4]
+        assert database.get_audit_log_stats()[0]['written'] == 5
+    finally:
+        database.close_pool()
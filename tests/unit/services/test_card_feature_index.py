@@ -0,0 +1,170 @@
+"""
+信用卡产品特征索引单元测试
+测试向量化评分、特征缓存与目录版本变化时重建、整个客户群批量推荐、保存的推荐被读取与过期
+（产品目录变化、客户账单 / 交易变化）
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from modules.recommendations import card_feature_index
+from modules.recommendations.benefit_calculator import BenefitCalculator
+from modules.recommendations.card_feature_index import get_card_feature_index
+from modules.recommendations.card_recommendation_engine import CardRecommendationEngine
+
+SCHEMA = '''
+CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, monthly_income REAL);
+CREATE TABLE credit_cards (id INTEGER PRIMARY KEY, customer_id INTEGER);
+CREATE TABLE statements (id INTEGER PRIMARY KEY, card_id INTEGER);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY, statement_id INTEGER, transaction_date TEXT, amount REAL, category TEXT
+);
+CREATE TABLE credit_card_products (
+    id INTEGER PRIMARY KEY, bank_name TEXT, card_name TEXT, benefits TEXT, usage_tips TEXT,
+    is_active INTEGER DEFAULT 1
+);
+INSERT INTO credit_card_products (id, bank_name, card_name, benefits, usage_tips) VALUES
+    (1, 'Maybank', 'Maybank Platinum', '5% cashback dining, lounge access, travel insurance', 'Use for restaurant'),
+    (2, 'CIMB', 'CIMB Classic', '终身免年费 1% 返现 超市 grocery', NULL),
+    (3, 'HSBC', 'HSBC Gold', 'RM200 annual fee, points rewards, online 8% cashback', 'ecommerce'),
+    (4, 'RHB', 'RHB Basic', NULL, NULL);
+INSERT INTO customers (id, name) VALUES (1, 'Alice'), (2, 'Bob'), (3, 'Carol');
+INSERT INTO credit_cards (id, customer_id) VALUES (10, 1), (20, 2);
+INSERT INTO statements (id, card_id) VALUES (100, 10), (200, 20);
+'''
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'cards.db')
+    recent = (datetime.now() - timedelta(days=10)).strftime('%Y-%m-%d')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        'INSERT INTO transactions (statement_id, transaction_date, amount, category) VALUES (?, ?, ?, ?)',
+        [(100, recent, 3000, 'Food & Dining'), (100, recent, 1200, 'Travel'),
+         (200, recent, 40000, 'Groceries'), (200, recent, 30000, 'Online Shopping')]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def execute(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+class TestCardFeatureIndex:
+    """特征索引与向量化推荐"""
+
+    def test_scores_match_text_scoring(self, db_path):
+        recs = CardRecommendationEngine(db_path).recommend_cards(1, top_n=4)
+
+        # 与逐卡文本匹配评分的结果一致（含同分时按产品目录顺序）
+        assert [(r['card_id'], r['score']) for r in recs] == [(4, 48.0), (1, 46.0), (2, 44.0), (3, 34.0)]
+        assert recs[1]['score_breakdown'] == {
+            'cashback_match': 50.0, 'annual_fee': 50.0, 'benefits': 40.0, 'eligibility': 40.0
+        }
+        # 无福利描述的卡：返现匹配与福利均为默认30分
+        assert recs[0]['score_breakdown']['cashback_match'] == 30.0
+
+    def test_index_is_cached_until_catalogue_changes(self, db_path):
+        first = get_card_feature_index(db_path)
+        assert get_card_feature_index(db_path) is first
+
+        execute(db_path, "UPDATE credit_card_products SET is_active = 0 WHERE id = 2")
+
+        rebuilt = get_card_feature_index(db_path)
+        assert rebuilt is not first
+        assert rebuilt.card_ids == [1, 3, 4]
+        # 未启用的卡不在索引中，收益计算回退为直接解析
+        benefits = BenefitCalculator(db_path).calculate_card_benefits(2, 1)
+        assert benefits['annual_fee'] == 0 and benefits['card_name'] == 'CIMB Classic'
+
+    def test_same_length_edit_rebuilds_index(self, db_path):
+        first = get_card_feature_index(db_path)
+        assert first.features_for(3)['annual_fee'] == 200
+
+        # 文本长度、数量、ID都不变的修改也会递增目录版本
+        execute(db_path, "UPDATE credit_card_products SET benefits = replace(benefits, 'RM200', 'RM500') WHERE id = 3")
+        rebuilt = get_card_feature_index(db_path)
+        assert rebuilt.version == first.version + 1
+        assert rebuilt.features_for(3)['annual_fee'] == 500
+
+    def test_batch_matches_per_customer(self, db_path):
+        engine = CardRecommendationEngine(db_path)
+        batch = engine.recommend_for_customers([1, 2, 3], top_n=3)
+
+        assert batch == {c: engine.recommend_cards(c, top_n=3) for c in (1, 2, 3)}
+        assert list(engine.recommend_for_customers(top_n=1)) == [1, 2]
+
+    def test_refresh_saves_whole_book(self, db_path, monkeypatch):
+        builds = []
+        original = card_feature_index.CardFeatureIndex
+        monkeypatch.setattr(card_feature_index, 'CardFeatureIndex',
+                            lambda *args: builds.append(1) or original(*args))
+
+        engine = CardRecommendationEngine(db_path)
+        assert engine.refresh_saved_recommendations(top_n=2) == {'customers': 2, 'recommendations': 4}
+        assert engine.refresh_saved_recommendations([1], top_n=1) == {'customers': 1, 'recommendations': 1}
+        assert len(builds) == 1
+
+        rows = execute(db_path, 'SELECT customer_id, rank FROM customer_card_recommendations '
+                                'ORDER BY customer_id, rank')
+        assert rows == [(1, 1), (2, 1), (2, 2)]
+
+    def test_recommend_cards_serves_saved_rows(self, db_path, monkeypatch):
+        engine = CardRecommendationEngine(db_path)
+        live = engine.recommend_cards(1, top_n=3)
+        engine.refresh_saved_recommendations(top_n=3)
+
+        monkeypatch.setattr(engine.analyzer, 'get_spending_profile',
+                            lambda customer_id: pytest.fail('saved recommendations should be used'))
+        assert engine.recommend_cards(1, top_n=3) == live
+        assert engine.recommend_cards(1, top_n=2) == live[:2]
+        monkeypatch.undo()
+
+        # 保存的条数不足、产品目录变化后实时计算
+        assert engine.get_saved_recommendations(1, top_n=4) is None
+        execute(db_path, "UPDATE credit_card_products SET usage_tips = 'Use for dining' WHERE id = 1")
+        assert engine.get_saved_recommendations(1, top_n=3) is None
+        assert engine.recommend_cards(1, top_n=3)[0]['card_id'] == live[0]['card_id']
+
+    def test_saved_rows_expire_when_customer_data_changes(self, db_path):
+        engine = CardRecommendationEngine(db_path)
+        engine.refresh_saved_recommendations(top_n=1)
+        assert engine.get_saved_recommendations(1, top_n=1) is not None
+
+        # 其他客户的新交易不影响
+        recent = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        execute(db_path, 'INSERT INTO transactions (statement_id, transaction_date, amount, category) '
+                         "VALUES (200, ?, 10, 'Travel')", (recent,))
+        assert engine.get_saved_recommendations(1, top_n=1) is not None
+        assert engine.get_saved_recommendations(2, top_n=1) is None
+
+        # 修改金额、新账单都会使保存的结果失效
+        engine.refresh_saved_recommendations(top_n=1)
+        execute(db_path, 'UPDATE transactions SET amount = 50000 WHERE statement_id = 100 AND amount = 1200')
+        assert engine.get_saved_recommendations(1, top_n=1) is None
+        assert engine.recommend_cards(1, top_n=1) == engine.recommend_for_customers([1], top_n=1)[1]
+
+        engine.refresh_saved_recommendations([1], top_n=1)
+        assert engine.get_saved_recommendations(1, top_n=1) is not None
+        execute(db_path, 'INSERT INTO statements (id, card_id) VALUES (101, 10)')
+        assert engine.get_saved_recommendations(1, top_n=1) is None
+
+    def test_whole_book_refresh_drops_customers_without_spending(self, db_path):
+        engine = CardRecommendationEngine(db_path)
+        engine.refresh_saved_recommendations(top_n=1)
+        execute(db_path, 'DELETE FROM transactions WHERE statement_id = 200')
+
+        assert engine.refresh_saved_recommendations(top_n=1) == {'customers': 1, 'recommendations': 1}
+        assert execute(db_path, 'SELECT customer_id FROM customer_card_recommendations') == [(1,)]
+        assert engine.get_saved_recommendations(2, top_n=1) is None
@@ -0,0 +1,116 @@
+"""
+Unit tests for the batched card timeline service
+Covers grouped loading, month mapping, per-card caching and invalidation
+"""
+from datetime import datetime
+
+import pytest
+
+import db.database as database
+from services import card_timeline
+from services.card_timeline import (
+    get_cards_12month_timelines, invalidate_card_timeline, invalidate_statement_timeline,
+    timeline_coverage_percentage,
+)
+
+TODAY = datetime(2025, 9, 30)
+
+SCHEMA = '''
+CREATE TABLE statements (
+    id INTEGER PRIMARY KEY, card_id INTEGER, statement_date TEXT, statement_total REAL, is_confirmed INTEGER
+);
+CREATE TABLE transactions (id INTEGER PRIMARY KEY, statement_id INTEGER, amount REAL);
+INSERT INTO statements VALUES
+    (1, 10, '2025-09-15', 300, 1), (2, 10, '2025-09-28', 50, 0), (3, 10, '2025-08-15', NULL, 1),
+    (4, 10, '2024-09-15', 999, 1), (5, 10, NULL, 1, 1), (6, 20, '2025-01-05', 80, 0);
+INSERT INTO transactions VALUES (1, 1, 10), (2, 1, 20), (3, 3, 5), (4, 6, 80);
+'''
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'timeline.db'))
+    with database.get_db() as conn:
+        conn.executescript(SCHEMA)
+        conn.commit()
+    invalidate_card_timeline()
+    yield
+    invalidate_card_timeline()
+    database.close_pool()
+
+
+def by_month(timeline):
+    return {m['month_key']: m for m in timeline}
+
+
+TRANSACTION_CONTROL = ('BEGIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+
+def count_queries(fn):
+    statements = []
+    with database.get_db() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            result = fn()
+        finally:
+            conn.set_trace_callback(None)
+    # 嵌套 get_db() 的 BEGIN / SAVEPOINT / RELEASE 不计入查询数
+    return result, len([sql for sql in statements if not sql.startswith(TRANSACTION_CONTROL)])
+
+
+class TestCardTimeline:
+    """get_cards_12month_timelines"""
+
+    def test_window_and_mapping(self, db):
+        timelines = get_cards_12month_timelines([10, 20, 30], today=TODAY)
+        months = by_month(timelines[10])
+        assert [m['month_key'] for m in timelines[10]][0] == '2024-10'
+        assert [m['month_key'] for m in timelines[10]][-1] == '2025-09'
+        # two statements in September: the earlier one (processed last, newest first) wins
+        assert months['2025-09']['statement_id'] == 1
+        assert months['2025-09']['transaction_count'] == 2
+        assert months['2025-09']['is_confirmed'] is True
+        assert months['2025-08']['total_amount'] == 0.0
+        assert months['2025-08']['transaction_count'] == 1
+        assert timeline_coverage_percentage(timelines[10]) == pytest.approx(2 / 12 * 100)
+        assert by_month(timelines[20])['2025-01']['transaction_count'] == 1
+        assert not any(m['has_statement'] for m in timelines[30])
+
+    def test_one_query_for_many_cards(self, db):
+        _, queries = count_queries(lambda: get_cards_12month_timelines([10, 20, 30], today=TODAY))
+        assert queries == 1
+
+    def test_cached_until_invalidated(self, db):
+        get_cards_12month_timelines([10, 20], today=TODAY)
+        _, queries = count_queries(lambda: get_cards_12month_timelines([10, 20], today=TODAY))
+        assert queries == 0
+
+        with database.get_db() as conn:
+            conn.execute("INSERT INTO statements VALUES (7, 20, '2025-09-10', 10, 0)")
+            conn.commit()
+        assert not by_month(get_cards_12month_timelines([20], today=TODAY)[20])['2025-09']['has_statement']
+
+        invalidate_card_timeline([20])
+        timelines, queries = count_queries(lambda: get_cards_12month_timelines([10, 20], today=TODAY))
+        assert queries == 1
+        assert by_month(timelines[20])['2025-09']['statement_id'] == 7
+
+    def test_invalidate_by_statement(self, db):
+        get_cards_12month_timelines([10], today=TODAY)
+        with database.get_db() as conn:
+            conn.execute("UPDATE statements SET is_confirmed = 1 WHERE id = 2")
+            conn.commit()
+        invalidate_statement_timeline(2)
+        assert by_month(get_cards_12month_timelines([10], today=TODAY)[10])['2025-09']['statement_id'] == 1
+        _, queries = count_queries(lambda: get_cards_12month_timelines([10], today=TODAY))
+        assert queries == 0
+
+    def test_ttl_expiry(self, db, monkeypatch):
+        get_cards_12month_timelines([10], today=TODAY)
+        monkeypatch.setattr(card_timeline, 'CARD_TIMELINE_CACHE_TTL', 0)
+        _, queries = count_queries(lambda: get_cards_12month_timelines([10], today=TODAY))
+        assert queries == 1
+
+    def test_returned_timelines_are_copies(self, db):
+        get_cards_12month_timelines([10], today=TODAY)[10][0]['has_statement'] = True
+        assert not get_cards_12month_timelines([10], today=TODAY)[10][0]['has_statement']
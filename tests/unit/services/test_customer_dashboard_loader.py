@@ -0,0 +1,130 @@
+"""
+Unit tests for the customer dashboard loader
+The batched context must match the per-card helpers and use a fixed number of queries
+"""
+from datetime import datetime
+
+import pytest
+
+import db.database as database
+from services.card_timeline import get_card_12month_timeline, get_month_coverage_percentage, invalidate_card_timeline
+from services.customer_dashboard_loader import load_customer_dashboard
+
+SCHEMA = '''
+CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE credit_cards (id INTEGER PRIMARY KEY, customer_id INTEGER, bank_name TEXT, card_number_last4 TEXT);
+CREATE TABLE statements (
+    id INTEGER PRIMARY KEY, card_id INTEGER, statement_date TEXT, statement_total REAL, is_confirmed INTEGER
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY, statement_id INTEGER, transaction_date TEXT, description TEXT, amount REAL
+);
+CREATE TABLE monthly_ledger (
+    id INTEGER PRIMARY KEY, card_id INTEGER, customer_id INTEGER, month_start TEXT, statement_id INTEGER,
+    previous_balance REAL, customer_spend REAL, customer_payments REAL, rolling_balance REAL
+);
+CREATE TABLE infinite_monthly_ledger (
+    id INTEGER PRIMARY KEY, card_id INTEGER, customer_id INTEGER, month_start TEXT, statement_id INTEGER,
+    previous_balance REAL, infinite_spend REAL, supplier_fee REAL, infinite_payments REAL, rolling_balance REAL
+);
+CREATE TABLE savings_transactions (
+    id INTEGER PRIMARY KEY, transaction_date TEXT, description TEXT, amount REAL, customer_name_tag TEXT,
+    txn_date TEXT, txn_month TEXT
+);
+INSERT INTO customers VALUES (1, 'Alice'), (2, 'Bob');
+INSERT INTO credit_cards VALUES (10, 1, 'Maybank', '1234'), (11, 1, 'CIMB', '5678'), (20, 2, 'HSBC', '0000');
+INSERT INTO statements VALUES
+    (100, 10, '2025-08-15', 500, 1), (101, 10, '2025-09-15', 300, 1), (102, 10, '2025-09-28', 50, 0),
+    (110, 11, '2025-09-20', 800, 0), (111, 11, NULL, 10, 1), (200, 20, '2025-09-15', 999, 1);
+INSERT INTO transactions VALUES
+    (1, 100, '2025-08-02', 'GRAB', 20), (2, 100, '2025-08-01', 'SHELL', 80), (3, 101, '2025-09-03', 'AEON', 300),
+    (4, 102, '2025-09-27', 'TNG', 50), (5, 110, '2025-09-10', 'LAZADA', 800), (6, 111, '2025-07-01', 'FEE', 10),
+    (7, 200, '2025-09-01', 'OTHER', 999);
+INSERT INTO monthly_ledger VALUES
+    (1, 10, 1, '2025-08-01', 100, 0, 500, 0, 500), (2, 10, 1, '2025-09-01', 101, 500, 300, 100, 700),
+    (3, 11, 1, '2025-09-01', 110, 0, 800, 0, 800);
+INSERT INTO infinite_monthly_ledger VALUES (1, 10, 1, '2025-09-01', 101, 10, 20, 0.2, 5, 25.2);
+INSERT INTO savings_transactions VALUES
+    (1, '05-09-2025', 'TRANSFER TO CARD', 100, 'Alice', '2025-09-05', '2025-09'),
+    (2, '06 SEP 2025', '转账', 50, 'Alice', '2025-09-06', '2025-09'),
+    (3, '06-08-2025', 'TRANSFER TO CARD', 70, 'Alice', '2025-08-06', '2025-08'),
+    (4, '07-09-2025', 'TRANSFER', 1, 'Bob', '2025-09-07', '2025-09');
+'''
+
+
+def queries(statements):
+    # 嵌套 get_db() 的 BEGIN / SAVEPOINT / RELEASE 不计入查询数
+    return [sql for sql in statements if not sql.startswith(('BEGIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK'))]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'dashboard.db'))
+    with database.get_db() as conn:
+        conn.executescript(SCHEMA)
+        conn.commit()
+    invalidate_card_timeline()
+    yield
+    invalidate_card_timeline()
+    database.close_pool()
+
+
+class TestCustomerDashboardLoader:
+    """load_customer_dashboard"""
+
+    def test_missing_customer(self, db):
+        assert load_customer_dashboard(999) is None
+
+    def test_matches_per_card_helpers(self, db):
+        context = load_customer_dashboard(1)
+        cards = database.get_customer_cards(1)
+
+        statements = [s for card in cards for s in database.get_card_statements(card['id'])]
+        assert context['statements'] == statements
+
+        transactions = [t for s in statements if s['is_confirmed']
+                        for t in database.get_statement_transactions(s['id'])]
+        assert context['transactions'] == transactions
+        assert context['total_spending'] == sum(t['amount'] for t in transactions)
+
+        for card, loaded in zip(cards, context['cards']):
+            assert loaded['timeline'] == get_card_12month_timeline(card['id'])
+            assert loaded['coverage_percentage'] == get_month_coverage_percentage(card['id'])
+
+    def test_latest_ledgers_and_transfers(self, db):
+        ledgers = load_customer_dashboard(1)['monthly_ledgers']
+        # card 11 has no INFINITE ledger for its latest month
+        assert len(ledgers) == 1
+        ledger = ledgers[0]
+        assert ledger['card']['id'] == 10
+        assert ledger['month'] == '2025-09'
+        assert ledger['customer'] == {
+            'previous_balance': 500, 'total_spend': 300, 'total_payments': 100, 'rolling_balance': 700
+        }
+        assert ledger['infinite']['supplier_fee'] == 0.2
+        assert ledger['infinite']['transfers'] == 150
+
+    def test_timeline_window(self, db):
+        context = load_customer_dashboard(1, today=datetime(2025, 9, 30))
+        timeline = {m['month_key']: m for m in context['cards'][0]['timeline']}
+        # two September statements: the earlier one (processed last in DESC order) wins
+        assert timeline['2025-09']['statement_id'] == 101
+        assert timeline['2025-09']['transaction_count'] == 1
+        assert timeline['2025-08']['transaction_count'] == 2
+        assert context['cards'][0]['coverage_percentage'] == pytest.approx(2 / 12 * 100)
+
+    def test_fixed_query_count(self, db):
+        statements = []
+        with database.get_db() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                load_customer_dashboard(1)
+                baseline = len(queries(statements))
+                for i in range(10):
+                    conn.execute("INSERT INTO credit_cards VALUES (?, 1, 'RHB', '9999')", (30 + i,))
+                    conn.execute("INSERT INTO statements VALUES (?, ?, '2025-09-01', 1, 1)", (300 + i, 30 + i))
+                statements.clear()
+                load_customer_dashboard(1)
+            finally:
+                conn.set_trace_callback(None)
+        assert len(queries(statements)) == baseline
@@ -0,0 +1,106 @@
+"""
+db.database 连接池单元测试
+测试嵌套 get_db() 共享连接、失败或未 commit 的嵌套作用域回滚到保存点（不被后续 commit 一并提交）、
+作用域内已 commit 后失败的处理，以及最外层退出时回滚未提交的写入
+"""
+import pytest
+
+import db.database as database
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'pool.db')
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    with database.get_db() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+        conn.commit()
+    yield path
+    database.close_pool()
+
+
+def insert(value, fail=False, commit=False):
+    with database.get_db() as conn:
+        conn.execute('INSERT INTO items (id) VALUES (?)', (value,))
+        if commit:
+            conn.commit()
+        if fail:
+            raise ValueError('helper failed')
+
+
+def rows():
+    with database.get_db() as conn:
+        return [r[0] for r in conn.execute('SELECT id FROM items ORDER BY id')]
+
+
+class TestNestedScopes:
+    """请求作用域内的嵌套 get_db()"""
+
+    def test_failed_helper_rolled_back_before_later_commit(self, db_path):
+        scope = database.begin_request_scope()
+        try:
+            with pytest.raises(ValueError):
+                insert(1, fail=True)
+            insert(2, commit=True)
+        finally:
+            database.end_request_scope(scope)
+
+        assert rows() == [2]
+        assert database.get_pool_stats()['shared'] >= 2
+
+    def test_uncommitted_helper_discarded_before_later_commit(self, db_path):
+        scope = database.begin_request_scope()
+        try:
+            insert(1)
+            with database.get_db() as conn:
+                conn.execute('INSERT INTO items (id) VALUES (2)')
+                insert(3)
+                conn.commit()
+        finally:
+            database.end_request_scope(scope)
+
+        assert rows() == [2]
+
+    def test_failed_helper_under_outer_commit(self, db_path):
+        with database.get_db() as conn:
+            conn.execute('INSERT INTO items (id) VALUES (1)')
+            with pytest.raises(ValueError):
+                with database.get_db() as inner:
+                    inner.execute('INSERT INTO items (id) VALUES (2)')
+                    insert(3, fail=True)
+            insert(4, commit=True)
+
+        assert rows() == [1, 4]
+
+    def test_failure_after_inner_commit_keeps_committed_rows(self, db_path):
+        scope = database.begin_request_scope()
+        try:
+            with pytest.raises(ValueError):
+                with database.get_db() as conn:
+                    conn.execute('INSERT INTO items (id) VALUES (1)')
+                    conn.commit()
+                    conn.execute('INSERT INTO items (id) VALUES (2)')
+                    raise ValueError('helper failed')
+            insert(3, commit=True)
+        finally:
+            database.end_request_scope(scope)
+
+        assert rows() == [1, 3]
+
+    def test_outer_writes_survive_inner_failure(self, db_path):
+        with database.get_db() as conn:
+            conn.execute('INSERT INTO items (id) VALUES (1)')
+            with pytest.raises(ValueError):
+                insert(2, fail=True)
+            conn.commit()
+
+        assert rows() == [1]
+
+    def test_uncommitted_writes_rolled_back_on_outer_exit(self, db_path):
+        scope = database.begin_request_scope()
+        insert(1)
+        database.end_request_scope(scope)
+
+        assert rows() == []
+        with database.get_db() as conn:
+            assert not conn.in_transaction
@@ -0,0 +1,153 @@
+"""
+邮件发件箱单元测试（使用本地SMTP测试服务器，不访问网络）
+测试会话复用（每个发送线程只连接、登录一次）、断线重连、永久拒绝与退避重试、
+认证失败不计入尝试次数、幂等入队与失败邮件重新发送、发送成功回调以及并发投递
+"""
+import time
+
+import pytest
+
+from email_service import outbox as outbox_module
+from email_service.outbox import EmailOutbox, OutboxWorker
+from email_service.smtp_pool import SMTPSession
+from smtp_stub import LocalSMTPServer
+
+sent_refs = []
+
+
+def record_sent(ref_id):
+    sent_refs.append(ref_id)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return EmailOutbox(str(tmp_path / 'outbox.db'))
+
+
+def worker_for(server, outbox, **kwargs):
+    return OutboxWorker(outbox, lambda: SMTPSession('127.0.0.1', server.port, 'admin@example.com', 'secret',
+                                                    starttls=False), **kwargs)
+
+
+def enqueue(outbox, count, **kwargs):
+    return [outbox.enqueue(f'user{i}@example.com', f'报表 {i}', f'<p>{i}</p>', **kwargs) for i in range(count)]
+
+
+class TestSMTPSession:
+    """持久SMTP会话"""
+
+    def test_reuses_connection_and_reconnects_after_disconnect(self, outbox):
+        with LocalSMTPServer(max_messages_per_connection=3) as server:
+            ids = enqueue(outbox, 5)
+            totals = worker_for(server, outbox, concurrency=1).deliver()
+
+        assert totals == {'sent': 5, 'retrying': 0, 'failed': 0}
+        # 服务器每3封邮件断开一次：5封邮件只需2次连接和登录
+        assert server.connections == 2 and server.logins == 2
+        assert sorted(rcpts[0] for _, rcpts, _ in server.messages) == [f'user{i}@example.com' for i in range(5)]
+        assert set(outbox.statuses(ids).values()) == {'sent'}
+
+
+class TestEmailOutbox:
+    """发件箱存储与投递"""
+
+    def test_idempotency_key_enqueues_once(self, outbox):
+        first = outbox.enqueue('a@example.com', 's', 'b', idempotency_key='monthly_report:1')
+        second = outbox.enqueue('a@example.com', 's', 'b', idempotency_key='monthly_report:1')
+        assert first == second
+        assert outbox.stats() == {'general': {'pending': 1, 'sending': 0, 'sent': 0, 'failed': 0}}
+
+    def test_requeue_failed_refreshes_recipient(self, outbox):
+        with LocalSMTPServer(refuse={'old@example.com': 550}) as server:
+            message_id = outbox.enqueue('old@example.com', 's', 'b', idempotency_key='monthly_report:1')
+            worker_for(server, outbox).deliver([message_id])
+            assert outbox.get(message_id)['status'] == 'failed'
+
+            # 未显式重新发送：保持失败状态
+            assert outbox.enqueue('new@example.com', 's', 'b', idempotency_key='monthly_report:1') == message_id
+            assert outbox.get(message_id)['status'] == 'failed'
+
+            outbox.enqueue('new@example.com', 's', 'b', idempotency_key='monthly_report:1', requeue_failed=True)
+            requeued = outbox.get(message_id)
+            assert (requeued['status'], requeued['attempts'], requeued['to_email']) == ('pending', 0, 'new@example.com')
+            worker_for(server, outbox).deliver([message_id])
+
+        assert outbox.get(message_id)['status'] == 'sent'
+        assert server.messages[-1][1] == ['new@example.com']
+        # 已发送的邮件不会被重新排队
+        outbox.enqueue('x@example.com', 's', 'b', idempotency_key='monthly_report:1', requeue_failed=True)
+        assert outbox.get(message_id)['to_email'] == 'new@example.com'
+
+    def test_auth_failure_not_counted_as_attempt(self, outbox):
+        ids = enqueue(outbox, 3, max_attempts=1)
+        with LocalSMTPServer(reject_auth=True) as server:
+            totals = worker_for(server, outbox, concurrency=1).deliver()
+
+        assert totals == {'sent': 0, 'retrying': 1, 'failed': 0}
+        messages = [outbox.get(i) for i in ids]
+        assert {(m['status'], m['attempts']) for m in messages} == {('pending', 0)}
+        assert 'SMTPAuthenticationError' in messages[0]['last_error']
+
+        with LocalSMTPServer() as server:
+            assert worker_for(server, outbox).deliver() == {'sent': 3, 'retrying': 0, 'failed': 0}
+
+    def test_permanent_refusal_fails_without_retry(self, outbox):
+        with LocalSMTPServer(refuse={'user0@example.com': 550, 'user1@example.com': 451}) as server:
+            bad, busy, good = enqueue(outbox, 3)
+            totals = worker_for(server, outbox, concurrency=1).deliver()
+
+        assert totals == {'sent': 1, 'retrying': 1, 'failed': 1}
+        assert outbox.get(bad)['status'] == 'failed' and '550' in outbox.get(bad)['last_error']
+        retry = outbox.get(busy)
+        assert retry['status'] == 'pending' and retry['attempts'] == 1
+        # 退避期间不会被领取
+        assert retry['next_attempt_at'] > outbox_module._now()
+        assert outbox.get(good)['status'] == 'sent'
+        # 一次连接投递了全部3封
+        assert server.connections == 1
+
+    def test_retry_until_max_attempts(self, outbox):
+        message_id = outbox.enqueue('a@example.com', 's', 'b', max_attempts=2)
+        outbox.claim('w1', 1)
+        assert outbox.mark_failed(message_id, 'timeout') == 'pending'
+        assert outbox.claim('w1', 1) == []
+
+        with outbox._connect() as conn:
+            conn.execute("UPDATE email_outbox SET next_attempt_at = '2000-01-01 00:00:00'")
+        assert len(outbox.claim('w1', 1)) == 1
+        assert outbox.mark_failed(message_id, 'timeout') == 'failed'
+
+    def test_connection_refused_is_retried(self, outbox):
+        message_id = outbox.enqueue('a@example.com', 's', 'b')
+        server = LocalSMTPServer()
+        port = server.port
+        server.server_close()
+
+        worker = OutboxWorker(outbox, lambda: SMTPSession('127.0.0.1', port, starttls=False, timeout=2))
+        assert worker.deliver() == {'sent': 0, 'retrying': 1, 'failed': 0}
+        assert outbox.get(message_id)['status'] == 'pending'
+
+    def test_on_sent_hook_and_attachment(self, outbox, tmp_path):
+        sent_refs.clear()
+        pdf = tmp_path / 'report.pdf'
+        pdf.write_bytes(b'%PDF-1.4 test')
+        message_id = outbox.enqueue('a@example.com', '月度报表', '<p>hi</p>', ref_id=42,
+                                    attachments=[{'path': str(pdf), 'filename': 'r.pdf', 'subtype': 'pdf'}],
+                                    on_sent=f'{__name__}:record_sent')
+        with LocalSMTPServer() as server:
+            worker_for(server, outbox).deliver([message_id])
+
+        assert sent_refs == [42]
+        assert b'filename="r.pdf"' in server.messages[0][2]
+
+    def test_concurrent_sessions_bound_connections(self, outbox):
+        with LocalSMTPServer(delay=0.05) as server:
+            enqueue(outbox, 12)
+            started = time.monotonic()
+            totals = worker_for(server, outbox, concurrency=3, batch_size=2).deliver()
+            elapsed = time.monotonic() - started
+
+        assert totals['sent'] == 12
+        assert server.connections == 3 and len(server.messages) == 12
+        # 3个会话并发：明显快于逐封串行（12 × 0.05s）
+        assert elapsed < 0.5
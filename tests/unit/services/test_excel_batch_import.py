@@ -0,0 +1,171 @@
+"""
+Excel/CSV 批量导入单元测试
+测试单次读取、按文件入队、进程池并行解析、批次进度汇总、
+没有调度Worker时按需启动解析Worker（多个Web进程只有持锁进程启动），以及SSE进度流的结束条件
+"""
+import fcntl
+import shutil
+import time
+
+import pandas as pd
+import pytest
+
+from services.excel_parsers import batch_import
+from services.excel_parsers.batch_import import (
+    enqueue_excel_batch, ensure_excel_import_worker, get_excel_batch_status, iter_batch_events,
+    parse_statement_file, stop_excel_import_worker,
+)
+from services.job_queue import JobQueue, JobWorker
+
+CREDIT_CARD_CSV = (
+    'Statement,Value\n'
+    'CREDIT CARD,MAYBANK VISA\n'
+    'CARD LIMIT,10000\n'
+    'MINIMUM PAYMENT,50\n'
+)
+
+BANK_STATEMENT_CSV = (
+    'Date,Description,Withdrawal,Deposit,Balance\n'
+    'ACCOUNT NUMBER,MAYBANK SAVINGS ACCOUNT,,,\n'
+    '01/09/2025,OPENING BALANCE,,,1000.00\n'
+    '02/09/2025,SALARY,,500.00,1500.00\n'
+)
+
+
+class FakeUpload:
+    """模拟 werkzeug FileStorage：只需 save(path)"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def save(self, path):
+        shutil.copyfile(self.source, path)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    monkeypatch.setattr(batch_import, 'job_queue', queue)
+    return queue
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    sources = tmp_path / 'sources'
+    sources.mkdir()
+    (sources / 'card.csv').write_text(CREDIT_CARD_CSV)
+    (sources / 'bank.csv').write_text(BANK_STATEMENT_CSV)
+    (sources / 'notes.txt').write_text('ignored')
+    return [
+        ('card.csv', FakeUpload(sources / 'card.csv')),
+        ('bank.csv', FakeUpload(sources / 'bank.csv')),
+        ('card.csv', FakeUpload(sources / 'card.csv')),
+        ('notes.txt', FakeUpload(sources / 'notes.txt')),
+    ]
+
+
+class TestExcelBatchImport:
+    """批量导入"""
+
+    def test_file_is_read_once(self, tmp_path, monkeypatch):
+        path = tmp_path / 'card.csv'
+        path.write_text(CREDIT_CARD_CSV)
+        reads = []
+        original = pd.read_csv
+
+        def counting_read_csv(*args, **kwargs):
+            reads.append(kwargs.get('nrows'))
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(pd, 'read_csv', counting_read_csv)
+        result = parse_statement_file('b1', str(path), 'card.csv')
+
+        assert reads == [None]
+        assert result['document_type'] == 'credit_card'
+        assert result['filename'] == 'card.csv'
+        assert not path.exists()
+
+    def test_enqueue_returns_batch_immediately(self, tmp_path, queue, uploads):
+        batch_id, rejected = enqueue_excel_batch(str(tmp_path / 'batches'), uploads)
+
+        assert [r['filename'] for r in rejected] == ['notes.txt']
+        status = get_excel_batch_status(batch_id)
+        assert status['total_files'] == 3
+        assert status['processed'] == 0 and not status['done']
+        assert [f['filename'] for f in status['files']] == ['card.csv', 'bank.csv', 'card.csv']
+        assert get_excel_batch_status('missing') is None
+
+    def test_worker_parses_batch_in_process_pool(self, tmp_path, queue, uploads):
+        batch_id, _ = enqueue_excel_batch(str(tmp_path / 'batches'), uploads)
+
+        worker = JobWorker(queue=queue, job_types=[batch_import.JOB_TYPE], max_workers=2)
+        worker._executor = worker._new_executor()
+        try:
+            deadline = time.time() + 60
+            while time.time() < deadline:
+                worker.run_once()
+                if get_excel_batch_status(batch_id)['done']:
+                    break
+                time.sleep(0.1)
+        finally:
+            worker.stop()
+
+        status = get_excel_batch_status(batch_id)
+        assert status['done'] and status['processed'] == 3
+        doc_types = [f['result'].get('document_type') for f in status['files']]
+        assert doc_types == ['credit_card', 'bank_statement', 'credit_card']
+        # 临时文件与批次目录已清理
+        assert not (tmp_path / 'batches' / batch_id).exists()
+
+    def test_on_demand_worker_processes_batch(self, tmp_path, queue, uploads):
+        batch_id, _ = enqueue_excel_batch(str(tmp_path / 'batches'), uploads)
+        try:
+            worker = ensure_excel_import_worker()
+            # 再次调用复用同一个Worker
+            assert ensure_excel_import_worker() is worker
+            assert worker.job_types == [batch_import.JOB_TYPE] and worker.periodic_jobs == []
+            deadline = time.time() + 60
+            while time.time() < deadline and not get_excel_batch_status(batch_id)['done']:
+                time.sleep(0.1)
+        finally:
+            stop_excel_import_worker()
+
+        assert get_excel_batch_status(batch_id)['processed'] == 3
+
+    def test_only_lock_holder_starts_worker(self, queue):
+        # 另一个Web进程已持有Worker锁
+        other_process = open(batch_import._worker_lock_path(queue), 'a')
+        fcntl.flock(other_process, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        try:
+            assert ensure_excel_import_worker() is None
+            assert batch_import._import_worker is None
+        finally:
+            other_process.close()
+
+        # 持锁进程退出后由本进程接管
+        try:
+            assert ensure_excel_import_worker() is not None
+            contender = open(batch_import._worker_lock_path(queue), 'a')
+            with pytest.raises(OSError):
+                fcntl.flock(contender, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            contender.close()
+        finally:
+            stop_excel_import_worker()
+        assert batch_import._leader_lock_file is None
+
+    def test_event_stream_ends(self, tmp_path, queue, uploads):
+        batch_id, _ = enqueue_excel_batch(str(tmp_path / 'batches'), uploads)
+
+        # 未完成：超时后以 timeout 事件结束，不会无限循环
+        events = list(iter_batch_events(batch_id, timeout=0.2, poll_interval=0.05))
+        assert events[-1].startswith('event: timeout')
+        assert ': keepalive\n\n' in events
+
+        # 全部完成：推送每个文件后以 done 事件结束
+        for job in queue.claim('w1', 10):
+            queue.complete(job['id'], {'status': 'success', 'filename': job['payload']['filename']})
+        events = list(iter_batch_events(batch_id, timeout=10, poll_interval=0.05))
+        assert [e.split('\n')[0] for e in events] == ['event: file'] * 3 + ['event: done']
+        assert '"success_count": 3' in events[-1]
+
+        assert list(iter_batch_events('missing'))[0].startswith('event: error')
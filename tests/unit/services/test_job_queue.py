@@ -0,0 +1,212 @@
+"""
+持久化任务队列单元测试
+测试幂等入队、原子领取、失败重试、已失败的幂等任务显式重新排队、中断恢复（心跳续期的长任务不重复执行）、定时任务幂等键、
+进程池执行与进程池损坏后重建
+"""
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from services.job_queue import JobQueue, JobWorker, PeriodicJob, register_job_handler
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'))
+
+
+class TestJobQueue:
+    """测试任务队列存储"""
+
+    def test_idempotency_key_enqueues_once(self, queue):
+        first = queue.enqueue('report', {'customer_id': 1}, idempotency_key='report:1:2025-10')
+        second = queue.enqueue('report', {'customer_id': 1}, idempotency_key='report:1:2025-10')
+        assert first == second
+        assert queue.stats()['report']['pending'] == 1
+
+    def test_enqueue_many_skips_existing_keys(self, queue):
+        queue.enqueue('report', {'customer_id': 1}, idempotency_key='k1')
+        inserted = queue.enqueue_many([
+            {'job_type': 'report', 'payload': {'customer_id': 1}, 'idempotency_key': 'k1'},
+            {'job_type': 'report', 'payload': {'customer_id': 2}, 'idempotency_key': 'k2'},
+        ])
+        assert inserted == 1
+
+    def test_claim_marks_running_and_is_exclusive(self, queue):
+        for i in range(3):
+            queue.enqueue('report', {'customer_id': i})
+        first = queue.claim('w1', 2)
+        second = queue.claim('w2', 5)
+        assert len(first) == 2 and len(second) == 1
+        assert {job['id'] for job in first}.isdisjoint(job['id'] for job in second)
+        assert first[0]['status'] == 'running' and first[0]['attempts'] == 1
+
+    def test_claim_filters_job_types(self, queue):
+        queue.enqueue('report', {})
+        queue.enqueue('email', {})
+        jobs = queue.claim('w1', 10, job_types=['email'])
+        assert [job['job_type'] for job in jobs] == ['email']
+
+    def test_failed_job_retries_until_max_attempts(self, queue):
+        job_id = queue.enqueue('report', {}, max_attempts=2)
+        queue.claim('w1', 1)
+        assert queue.fail(job_id, 'boom') == 'pending'
+        # 退避期间不会被领取
+        assert queue.claim('w1', 1) == []
+        assert queue.get(job_id)['last_error'] == 'boom'
+
+        with queue._connect() as conn:
+            conn.execute("UPDATE jobs SET run_at = '2000-01-01 00:00:00' WHERE id = ?", (job_id,))
+        queue.claim('w1', 1)
+        assert queue.fail(job_id, 'boom again') == 'failed'
+
+    def test_failed_keyed_job_can_be_requeued(self, queue):
+        job_id = queue.enqueue('report', {'customer_id': 1}, idempotency_key='report:1', max_attempts=1)
+        queue.claim('w1', 1)
+        assert queue.fail(job_id, 'boom') == 'failed'
+
+        # 默认仍按幂等键去重，不会重新执行
+        assert queue.enqueue('report', {'customer_id': 1}, idempotency_key='report:1') == job_id
+        assert queue.get(job_id)['status'] == 'failed'
+
+        assert queue.enqueue('report', {'customer_id': 1, 'force': True}, idempotency_key='report:1',
+                             requeue_failed=True) == job_id
+        job = queue.get(job_id)
+        assert (job['status'], job['attempts'], job['last_error']) == ('pending', 0, None)
+        assert job['payload'] == {'customer_id': 1, 'force': True}
+        assert [j['id'] for j in queue.claim('w1', 1)] == [job_id]
+        queue.complete(job_id, 'ok')
+
+        # 已成功的任务不会被重新排队
+        queue.enqueue('report', {}, idempotency_key='report:1', requeue_failed=True)
+        assert queue.get(job_id)['status'] == 'succeeded'
+
+    def test_enqueue_many_and_bulk_requeue_failed(self, queue):
+        ids = [queue.enqueue('report', {'customer_id': i}, idempotency_key=f'report:2025-10:{i}', max_attempts=1)
+               for i in range(3)]
+        other = queue.enqueue('email', {}, idempotency_key='email:1', max_attempts=1)
+        queue.claim('w1', 10)
+        for job_id in ids[:2] + [other]:
+            queue.fail(job_id, 'boom')
+        queue.complete(ids[2])
+
+        jobs = [{'job_type': 'report', 'payload': {'customer_id': i}, 'idempotency_key': f'report:2025-10:{i}'}
+                for i in range(4)]
+        assert queue.enqueue_many(jobs) == 1
+        assert queue.enqueue_many(jobs, requeue_failed=True) == 2
+        assert [queue.get(i)['status'] for i in ids] == ['pending', 'pending', 'succeeded']
+
+        assert queue.requeue_failed(job_type='report') == 0
+        assert queue.requeue_failed(key_prefix='email:') == 1
+        assert queue.get(other)['status'] == 'pending'
+
+    def test_recover_jobs_of_dead_worker(self, queue):
+        job_id = queue.enqueue('report', {})
+        queue.claim('host:999999', 1)
+        assert queue.recover_stale(dead_workers=['host:999999']) == 1
+        assert queue.get(job_id)['status'] == 'pending'
+
+    def test_heartbeat_keeps_long_running_job_locked(self, queue):
+        live_id = queue.enqueue('report', {})
+        stale_id = queue.enqueue('report', {})
+        queue.claim('w1', 1)
+        queue.claim('w2', 1)
+        with queue._connect() as conn:
+            conn.execute("UPDATE jobs SET locked_at = '2000-01-01 00:00:00'")
+
+        assert queue.heartbeat('w1') == 1
+        assert queue.recover_stale(lock_timeout=3600) == 1
+        assert queue.get(live_id)['status'] == 'running'
+        assert queue.get(stale_id)['status'] == 'pending'
+
+
+class TestPeriodicJob:
+    """测试定时任务幂等键"""
+
+    def test_daily_job_due_after_time(self):
+        job = PeriodicJob('daily', 'report', at='08:00')
+        assert job.due_key(datetime(2025, 10, 1, 7, 59)) is None
+        assert job.due_key(datetime(2025, 10, 1, 8, 0)) == 'daily:2025-10-01'
+        assert job.due_key(datetime(2025, 10, 1, 23, 0)) == 'daily:2025-10-01'
+
+    def test_monthly_job_only_on_day(self):
+        job = PeriodicJob('monthly', 'report', at='10:00', day=30)
+        assert job.due_key(datetime(2025, 10, 29, 11, 0)) is None
+        assert job.due_key(datetime(2025, 10, 30, 11, 0)) == 'monthly:2025-10-30'
+
+    def test_interval_job_window(self):
+        job = PeriodicJob('every6', 'reminders', every_hours=6)
+        assert job.due_key(datetime(2025, 10, 1, 7, 30)) == 'every6:2025-10-01T06'
+        assert job.due_key(datetime(2025, 10, 1, 11, 59)) == 'every6:2025-10-01T06'
+
+    def test_enqueue_if_due_is_idempotent(self, queue):
+        job = PeriodicJob('daily', 'report', at='08:00')
+        now = datetime(2025, 10, 1, 9, 0)
+        assert job.enqueue_if_due(queue, now) == job.enqueue_if_due(queue, now)
+        assert queue.stats()['report']['pending'] == 1
+
+
+class TestJobWorker:
+    """测试进程池执行任务并回写结果"""
+
+    def test_worker_runs_jobs_in_process_pool(self, queue):
+        register_job_handler('test.dumps', 'json:dumps')
+        register_job_handler('test.loads', 'json:loads')
+        ok_id = queue.enqueue('test.dumps', {'obj': [1, 2]})
+        bad_id = queue.enqueue('test.loads', {'s': 'not json'}, max_attempts=1)
+
+        worker = JobWorker(queue=queue, job_types=['test.dumps', 'test.loads'], max_workers=2)
+        worker._executor = worker._new_executor()
+        try:
+            assert worker.run_once() == 2
+            deadline = time.time() + 60
+            while time.time() < deadline:
+                if queue.get(ok_id)['status'] != 'running' and queue.get(bad_id)['status'] != 'running':
+                    break
+                time.sleep(0.1)
+        finally:
+            worker.stop()
+
+        assert queue.get(ok_id)['status'] == 'succeeded'
+        assert queue.get(ok_id)['result'] == '[1, 2]'
+        assert queue.get(bad_id)['status'] == 'failed'
+        assert 'JSONDecodeError' in queue.get(bad_id)['last_error']
+
+    def test_periodic_recovery_skips_jobs_of_live_worker(self, queue):
+        job_id = queue.enqueue('report', {})
+        worker = JobWorker(queue=queue, job_types=['other'])
+        queue.claim(worker.worker_id, 1)
+        with queue._connect() as conn:
+            conn.execute("UPDATE jobs SET locked_at = '2000-01-01 00:00:00'")
+
+        worker.run_once()
+        assert queue.get(job_id)['status'] == 'running'
+        assert queue.get(job_id)['attempts'] == 1
+
+    def wait_finished(self, queue, job_id):
+        deadline = time.time() + 60
+        while time.time() < deadline and queue.get(job_id)['status'] == 'running':
+            time.sleep(0.1)
+        return queue.get(job_id)
+
+    def test_broken_pool_is_replaced_and_shut_down(self, queue):
+        register_job_handler('test.exit', 'os:_exit')
+        register_job_handler('test.dumps', 'json:dumps')
+        crash_id = queue.enqueue('test.exit', {'status': 1}, max_attempts=1)
+
+        worker = JobWorker(queue=queue, job_types=['test.exit', 'test.dumps'], max_workers=1)
+        worker._executor = broken = worker._new_executor()
+        try:
+            worker.run_once()
+            job = self.wait_finished(queue, crash_id)
+            assert job['status'] == 'failed' and 'Worker进程异常退出' in job['last_error']
+            assert worker._executor is not broken and broken._shutdown_thread
+
+            # 新进程池继续执行后续任务
+            ok_id = queue.enqueue('test.dumps', {'obj': os.getpid()})
+            assert worker.run_once() == 1
+            assert self.wait_finished(queue, ok_id)['status'] == 'succeeded'
+        finally:
+            worker.stop()
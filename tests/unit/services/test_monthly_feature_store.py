@@ -0,0 +1,211 @@
+"""
+客户月度特征表单元测试
+测试首次建表全量计算、按账单月份汇总信用卡消费（交易日期格式不统一）、
+触发器标记脏客户后的增量重算、矩阵右对齐与窗口截断、
+向量化统计，以及组合健康评分与逐个客户评分结果一致
+"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+from accounting_app.services.health_engine import HealthEngine
+from accounting_app.services.predict_engine import PredictEngine
+from accounting_app.services.trend_engine import TrendEngine
+from analytics import vectorized_metrics as vm
+from analytics import monthly_feature_store as feature_store
+from analytics.monthly_feature_store import (
+    DIRTY_TABLE, ensure_feature_store, load_monthly_features, month_key, refresh_dirty_features,
+)
+
+SCHEMA = '''
+    CREATE TABLE monthly_statements (
+        id INTEGER PRIMARY KEY, customer_id INTEGER, bank_name TEXT, statement_month TEXT,
+        previous_balance_total REAL, closing_balance_total REAL,
+        owner_expenses REAL, owner_payments REAL, gz_expenses REAL, gz_payments REAL
+    );
+    CREATE TABLE credit_cards (id INTEGER PRIMARY KEY, customer_id INTEGER, credit_limit REAL);
+    CREATE TABLE statements (
+        id INTEGER PRIMARY KEY, card_id INTEGER, statement_date TEXT, is_confirmed INTEGER DEFAULT 0
+    );
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY, statement_id INTEGER, transaction_date TEXT, amount REAL
+    );
+'''
+
+
+def add_statement(conn, customer_id, bank, month, closing, expenses, payments, previous=0):
+    conn.execute('''
+        INSERT INTO monthly_statements
+        (customer_id, bank_name, statement_month, previous_balance_total, closing_balance_total,
+         owner_expenses, owner_payments, gz_expenses, gz_payments)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0)
+    ''', (customer_id, bank, month, previous, closing, expenses, payments))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'features.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    for i, month in enumerate(['2025-01', '2025-02', '2025-03', '2025-04']):
+        add_statement(conn, 1, 'MAYBANK', month, 1000 + 100 * i, 500 + 50 * i, 400)
+        add_statement(conn, 1, 'CIMB', month, 200, 100, 100)
+    add_statement(conn, 2, 'MAYBANK', '2025-03', 3000, 800, 100)
+    add_statement(conn, 2, 'MAYBANK', '2025-04', 3500, 900, 100)
+    conn.executescript('''
+        INSERT INTO credit_cards VALUES (10, 1, 5000), (11, 2, 4000), (12, 2, 1000);
+        INSERT INTO statements VALUES
+            (100, 10, '2025-03-28', 1), (102, 10, '2025-04-28', 1), (101, 11, '2025-04-28', 0);
+        INSERT INTO transactions VALUES
+            (1, 100, '05 MAR 25', 120), (2, 100, '20/03', 30), (3, 102, '2025-04-02', 60),
+            (4, 101, '10 APR', 999);
+    ''')
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    ensure_feature_store(conn)
+    yield conn
+    conn.close()
+
+
+class TestFeatureStore:
+    """特征表的构建与增量维护"""
+
+    def test_initial_build_sums_banks_per_month(self, conn):
+        rows = conn.execute('''
+            SELECT customer_id, month, expenses, closing_balance, statement_count, card_spend
+            FROM customer_monthly_features ORDER BY customer_id, month
+        ''').fetchall()
+        assert [tuple(row) for row in rows] == [
+            (1, '2025-01', 600, 1200, 2, 0), (1, '2025-02', 650, 1300, 2, 0),
+            (1, '2025-03', 700, 1400, 2, 150), (1, '2025-04', 750, 1500, 2, 60),
+            (2, '2025-03', 800, 3000, 1, 0), (2, '2025-04', 900, 3500, 1, 0),
+        ]
+
+    def test_card_spend_ignores_transaction_date_format(self, conn):
+        months = [row[0] for row in conn.execute('SELECT DISTINCT month FROM customer_monthly_features')]
+        assert all(len(m) == 7 and m[4] == '-' for m in months)
+
+        # 账单日期不是 YYYY-MM-DD 的数据不计入；修改账单日期后按新月份重算
+        conn.execute("INSERT INTO statements VALUES (103, 10, '28 MAY', 1)")
+        conn.execute("INSERT INTO transactions VALUES (6, 103, '01 MAY', 40)")
+        conn.commit()
+        refresh_dirty_features(conn)
+        assert conn.execute("SELECT COUNT(*) FROM customer_monthly_features WHERE month NOT LIKE '2025-%'"
+                            ).fetchone()[0] == 0
+
+        conn.execute("UPDATE statements SET statement_date = '2025-05-28' WHERE id = 103")
+        conn.commit()
+        refresh_dirty_features(conn)
+        assert conn.execute("SELECT card_spend FROM customer_monthly_features WHERE customer_id = 1 "
+                            "AND month = '2025-05'").fetchone()[0] == 40
+
+    def test_rebuilds_store_with_legacy_months(self, db_path, conn):
+        conn.execute("INSERT INTO customer_monthly_features (customer_id, month, card_spend) VALUES (1, '30 APR', 5)")
+        conn.commit()
+        feature_store._ready.clear()
+        ensure_feature_store(conn)
+        assert conn.execute("SELECT COUNT(*) FROM customer_monthly_features WHERE month = '30 APR'"
+                            ).fetchone()[0] == 0
+
+    def test_triggers_mark_only_changed_customers(self, conn):
+        add_statement(conn, 2, 'CIMB', '2025-04', 500, 100, 50)
+        conn.commit()
+        assert [row[0] for row in conn.execute(f'SELECT customer_id FROM {DIRTY_TABLE}')] == [2]
+
+        assert refresh_dirty_features(conn) == 1
+        assert tuple(conn.execute('''
+            SELECT closing_balance, statement_count FROM customer_monthly_features
+            WHERE customer_id = 2 AND month = '2025-04'
+        ''').fetchone()) == (4000, 2)
+        assert refresh_dirty_features(conn) == 0
+
+    def test_confirming_statement_adds_card_spend(self, conn):
+        # 未确认账单的交易不计入
+        conn.execute("INSERT INTO transactions VALUES (5, 101, '2025-04-11', 1)")
+        conn.commit()
+        assert conn.execute(f'SELECT COUNT(*) FROM {DIRTY_TABLE}').fetchone()[0] == 0
+
+        conn.execute('UPDATE statements SET is_confirmed = 1 WHERE id = 101')
+        conn.commit()
+        features = load_monthly_features(conn, [2], require='card_spend')
+        assert features.history(2) == [{
+            'month': '2025-04', 'expenses': 900.0, 'payments': 100.0, 'closing_balance': 3500.0,
+            'previous_balance': 0.0, 'card_spend': 1000.0,
+        }]
+
+
+class TestFeatureMatrix:
+    """load_monthly_features 矩阵"""
+
+    def test_right_aligned_and_truncated(self, conn):
+        features = load_monthly_features(conn, window=3)
+        assert features.customer_ids.tolist() == [1, 2]
+        assert features.months.tolist() == [['2025-02', '2025-03', '2025-04'], ['', '2025-03', '2025-04']]
+        assert features.counts.tolist() == [3, 2]
+        np.testing.assert_array_equal(features.closing_balance, [[1300, 1400, 1500], [np.nan, 3000, 3500]])
+
+    def test_month_range_and_missing_customer(self, conn):
+        features = load_monthly_features(conn, [1, 3], window=6, since_month='2025-02', until_month='2025-03')
+        assert features.customer_ids.tolist() == [1]
+        assert features.history(1)[0]['month'] == '2025-02'
+        assert features.history(3) == []
+
+        empty = load_monthly_features(conn, [])
+        assert empty.customer_ids.size == 0 and empty.expenses.shape == (0, 12)
+
+    def test_month_key(self):
+        from datetime import date
+        assert month_key(0, date(2025, 3, 15)) == '2025-03'
+        assert month_key(6, date(2025, 3, 15)) == '2024-09'
+
+
+class TestVectorizedMetrics:
+    """向量化统计"""
+
+    values = np.array([[np.nan, 100.0, 110.0, 130.0], [np.nan, np.nan, 50.0, 40.0], [np.nan] * 4])
+
+    def test_row_statistics(self):
+        np.testing.assert_allclose(vm.row_mean(self.values), [340 / 3, 45, 0])
+        np.testing.assert_allclose(vm.row_variance(self.values[:2]), [np.var([100, 110, 130]), 25])
+        np.testing.assert_allclose(vm.first_valid(self.values[:2]), [100, 50])
+        np.testing.assert_allclose(vm.change_pct(self.values[:2]), [30, -20])
+        assert vm.trend_labels(np.array([30, -20, 2])).tolist() == ['上升', '下降', '稳定']
+
+    def test_recent_slope_needs_n_months(self):
+        np.testing.assert_allclose(vm.recent_slope(self.values), [10, 0, 0])
+
+
+class TestEngines:
+    """趋势 / 预测 / 健康评分引擎读取特征表"""
+
+    @staticmethod
+    def engine(cls, db_path):
+        engine = cls()
+        engine.db_path = db_path
+        return engine
+
+    def test_portfolio_matches_single_customer(self, db_path):
+        engine = self.engine(HealthEngine, db_path)
+        portfolio = engine.calculate_portfolio_health_scores()
+        assert sorted(portfolio) == [1, 2]
+        for customer_id, score in portfolio.items():
+            assert engine.calculate_health_score(customer_id) == score
+        assert engine.calculate_health_score(99)['grade'] == '无数据'
+
+    def test_trends_and_prediction(self, db_path):
+        trends = self.engine(TrendEngine, db_path).get_trends(1)
+        assert trends['labels'] == ['2025-01', '2025-02', '2025-03', '2025-04']
+        assert trends['balances'] == [1200, 1300, 1400, 1500]
+        assert trends['trend_analysis']['balance_trend'] == '上升'
+
+        prediction = self.engine(PredictEngine, db_path).predict_next_3_months(1)
+        assert [p['statement_month'] for p in prediction['predictions']] == ['2025-05', '2025-06', '2025-07']
+        assert prediction['summary']['trend_value'] == 33.33
@@ -0,0 +1,188 @@
+"""
+MonthlyLedgerEngine 增量计算单元测试
+测试触发器脏标记、从最早脏月份开始重算、上月余额读取已存账本以及结转余额不变时沿用已存结果，
+上月账本缺失时从头重算，以及供应商发票PDF在账本事务提交后渲染
+"""
+import sqlite3
+
+import pytest
+
+import services.monthly_ledger_engine as monthly_ledger_engine
+from services.monthly_ledger_engine import DIRTY_TABLE, MonthlyLedgerEngine
+
+SCHEMA = '''
+CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, customer_code TEXT);
+CREATE TABLE credit_cards (id INTEGER PRIMARY KEY, customer_id INTEGER, bank_name TEXT, card_number_last4 TEXT);
+CREATE TABLE statements (
+    id INTEGER PRIMARY KEY, card_id INTEGER, statement_date TEXT, statement_total REAL,
+    previous_balance REAL, is_confirmed INTEGER DEFAULT 0
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY, statement_id INTEGER, transaction_date TEXT, description TEXT, amount REAL,
+    transaction_type TEXT, category TEXT
+);
+CREATE TABLE monthly_ledger (
+    id INTEGER PRIMARY KEY, card_id INTEGER, customer_id INTEGER, month_start TEXT, statement_id INTEGER,
+    previous_balance REAL, customer_spend REAL, customer_payments REAL, rolling_balance REAL,
+    owner_expenses REAL, owner_payments REAL, infinite_expenses REAL, infinite_payments REAL,
+    owner_balance REAL, infinite_balance REAL, miscellaneous_fee REAL, updated_at TIMESTAMP,
+    UNIQUE(card_id, month_start)
+);
+CREATE TABLE infinite_monthly_ledger (
+    id INTEGER PRIMARY KEY, card_id INTEGER, customer_id INTEGER, month_start TEXT, statement_id INTEGER,
+    previous_balance REAL, infinite_spend REAL, supplier_fee REAL, infinite_payments REAL,
+    rolling_balance REAL, updated_at TIMESTAMP, UNIQUE(card_id, month_start)
+);
+CREATE TABLE monthly_statements (id INTEGER PRIMARY KEY, customer_id INTEGER, statement_month TEXT);
+CREATE TABLE supplier_fee_config (id INTEGER PRIMARY KEY, supplier_name TEXT, fee_percentage REAL, is_active INTEGER);
+CREATE TABLE supplier_invoices (
+    id INTEGER PRIMARY KEY, customer_id INTEGER, monthly_statement_id INTEGER, supplier_name TEXT,
+    invoice_number TEXT UNIQUE, total_amount REAL, supplier_fee REAL, invoice_date TEXT, pdf_path TEXT
+);
+CREATE TABLE supplier_aliases (id INTEGER PRIMARY KEY, supplier_name TEXT, alias TEXT, is_active INTEGER);
+CREATE TABLE payer_aliases (id INTEGER PRIMARY KEY, customer_id INTEGER, payer_type TEXT, alias TEXT, is_active INTEGER);
+CREATE TABLE transfer_recipient_aliases (
+    id INTEGER PRIMARY KEY, customer_id INTEGER, recipient_name TEXT, alias TEXT, is_active INTEGER
+);
+INSERT INTO customers VALUES (1, 'Alice', 'C001');
+INSERT INTO credit_cards VALUES (10, 1, 'Maybank', '1234');
+'''
+
+STATEMENTS = [
+    # (id, date, total, previous_balance, [(amount, category)])
+    (100, '2025-07-15', 300, 0, [(300, 'owner_expense')]),
+    (101, '2025-08-15', 450, 300, [(200, 'owner_expense'), (50, 'owner_payment')]),
+    (102, '2025-09-15', 550, 450, [(100, 'infinite_expense')]),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'ledger.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.commit()
+    conn.close()
+
+    # 先安装触发器，再写入账单与交易
+    engine = MonthlyLedgerEngine(path)
+    conn = sqlite3.connect(path)
+    for statement_id, date, total, previous, txns in STATEMENTS:
+        conn.execute('INSERT INTO statements (id, card_id, statement_date, statement_total, previous_balance) '
+                     'VALUES (?, 10, ?, ?, ?)', (statement_id, date, total, previous))
+        conn.executemany(
+            'INSERT INTO transactions (statement_id, transaction_date, description, amount, category) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(statement_id, date, f'TXN {i}', amount, category) for i, (amount, category) in enumerate(txns)]
+        )
+    conn.commit()
+    conn.close()
+    engine.calculate_dirty_ledgers()
+    return path
+
+
+def execute(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(sql, params).fetchall()
+    conn.commit()
+    conn.close()
+    return rows
+
+
+def ledger(path):
+    return execute(path, '''
+        SELECT ml.month_start, ml.previous_balance, ml.rolling_balance, iml.rolling_balance, ml.updated_at
+        FROM monthly_ledger ml JOIN infinite_monthly_ledger iml
+            ON iml.card_id = ml.card_id AND iml.month_start = ml.month_start
+        ORDER BY ml.month_start
+    ''')
+
+
+def stamp(path):
+    """把 updated_at 置为固定值，用于判断哪些月份被重算"""
+    execute(path, "UPDATE monthly_ledger SET updated_at = 'kept'")
+
+
+class TestMonthlyLedgerIncremental:
+    """增量月度账本"""
+
+    def test_dirty_markers_drive_initial_calculation(self, db_path):
+        assert [row[:4] for row in ledger(db_path)] == [
+            ('2025-07-01', 0, 300, 0), ('2025-08-01', 300, 450, 0), ('2025-09-01', 450, 450, 100),
+        ]
+        assert execute(db_path, f'SELECT COUNT(*) FROM {DIRTY_TABLE}') == [(0,)]
+
+    def test_edit_recomputes_from_changed_month_forward(self, db_path):
+        stamp(db_path)
+        execute(db_path, 'UPDATE transactions SET amount = 250 WHERE statement_id = 101 AND amount = 200')
+        execute(db_path, 'UPDATE statements SET statement_total = 500 WHERE id = 101')
+        assert execute(db_path, f'SELECT card_id, month_start FROM {DIRTY_TABLE}') == [(10, '2025-08-01')]
+
+        assert MonthlyLedgerEngine(db_path).calculate_dirty_ledgers() == 1
+
+        rows = ledger(db_path)
+        assert rows[0][4] == 'kept'
+        assert [row[4] == 'kept' for row in rows[1:]] == [False, False]
+
+        incremental = [row[:4] for row in rows]
+        MonthlyLedgerEngine(db_path).calculate_monthly_ledger_for_card(10, recalculate_all=True)
+        assert incremental == [row[:4] for row in ledger(db_path)]
+
+    def test_unchanged_carry_forward_stops_cascade(self, db_path):
+        stamp(db_path)
+        execute(db_path, "UPDATE transactions SET description = 'RENAMED' WHERE statement_id = 101")
+        execute(db_path, 'UPDATE statements SET is_confirmed = 1 WHERE id = 101')
+
+        MonthlyLedgerEngine(db_path).calculate_dirty_ledgers()
+
+        assert [row[4] == 'kept' for row in ledger(db_path)] == [True, False, True]
+
+    def test_no_dirty_months_is_a_no_op(self, db_path):
+        stamp(db_path)
+        engine = MonthlyLedgerEngine(db_path)
+        assert engine.calculate_dirty_ledgers() == 0
+        engine.calculate_monthly_ledger_for_card(10, incremental=True)
+        assert all(row[4] == 'kept' for row in ledger(db_path))
+
+    def test_missing_prior_ledger_recomputes_from_first_statement(self, db_path):
+        execute(db_path, "DELETE FROM infinite_monthly_ledger WHERE month_start = '2025-07-01'")
+        engine = MonthlyLedgerEngine(db_path)
+        # 模拟起始月份之前的账本缺失（正常情况下缺失月份本身会成为起始月份）
+        engine._incremental_start = lambda cursor, card_id: ('2025-08-01', {'2025-08-01'})
+
+        engine.calculate_monthly_ledger_for_card(10, incremental=True)
+
+        assert [row[:4] for row in ledger(db_path)] == [
+            ('2025-07-01', 0, 300, 0), ('2025-08-01', 300, 450, 0), ('2025-09-01', 450, 450, 100),
+        ]
+
+
+class TestSupplierInvoices:
+    """供应商发票"""
+
+    def test_pdf_is_rendered_after_ledger_commit(self, db_path, monkeypatch):
+        rendered = []
+
+        class LockCheckingGenerator:
+            def generate_invoice(self, invoice_number, **kwargs):
+                # 账本事务已提交：其他连接可以立即取得写锁
+                conn = sqlite3.connect(db_path, timeout=0)
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.rollback()
+                finally:
+                    conn.close()
+                rendered.append(invoice_number)
+                return f'/invoices/{invoice_number}.pdf'
+
+        monkeypatch.setattr(monthly_ledger_engine, 'SupplierInvoiceGenerator', LockCheckingGenerator)
+        execute(db_path, "INSERT INTO supplier_aliases (supplier_name, alias, is_active) VALUES ('7SL', '7sl', 1)")
+        execute(db_path, "INSERT INTO monthly_statements (id, customer_id, statement_month) VALUES (1, 1, '2025-09')")
+        execute(db_path, "UPDATE transactions SET description = '7SL TECH' WHERE statement_id = 102")
+
+        MonthlyLedgerEngine(db_path).calculate_dirty_ledgers()
+
+        assert rendered == ['INF-20250915-7SL']
+        assert execute(db_path, 'SELECT invoice_number, total_amount, pdf_path FROM supplier_invoices') == [
+            ('INF-20250915-7SL', 100, '/invoices/INF-20250915-7SL.pdf'),
+        ]
@@ -0,0 +1,84 @@
+"""
+月度报表任务单元测试
+测试按月份的客户任务幂等键、重新触发时失败客户重新排队，以及每个客户的状态与耗时汇总
+"""
+import pytest
+
+import db.database as database
+from services.job_queue import JobQueue
+from services.scheduled_jobs import enqueue_customer_reports, monthly_report_generation_summary
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'))
+
+
+@pytest.fixture(autouse=True)
+def customers_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'app.db'))
+    with database.get_db() as conn:
+        conn.execute('CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.executemany('INSERT INTO customers (id, name) VALUES (?, ?)',
+                         [(1, 'Alice'), (2, 'Bob'), (3, 'Carol')])
+        conn.commit()
+    yield
+    database.close_pool()
+
+
+def fail_permanently(queue, job_id, error):
+    """已用完重试次数的失败"""
+    with queue._connect() as conn:
+        conn.execute('UPDATE jobs SET attempts = max_attempts WHERE id = ?', (job_id,))
+    assert queue.fail(job_id, error) == 'failed'
+
+
+def run_all(queue, outcomes):
+    """按 outcomes[customer_id] 完成（结果 dict）或最终失败（异常信息）已领取的任务"""
+    for job in queue.claim('w1', 10):
+        outcome = outcomes[job['payload']['customer_id']]
+        if isinstance(outcome, dict):
+            queue.complete(job['id'], outcome)
+        else:
+            fail_permanently(queue, job['id'], outcome)
+
+
+class TestMonthlyReportJobs:
+    """客户报表任务与耗时报告"""
+
+    def test_keys_are_per_month_and_rerun_requeues_failed(self, queue):
+        assert enqueue_customer_reports([1, 2], 2025, 10, queue=queue) == 2
+        assert enqueue_customer_reports([1, 2], 2025, 9, queue=queue) == 2
+        assert enqueue_customer_reports([1, 2], 2025, 10, queue=queue) == 0
+
+        for job in queue.claim('w1', 10):
+            if job['payload'] == {'customer_id': 2, 'year': 2025, 'month': 10}:
+                fail_permanently(queue, job['id'], 'PDF render error')
+            else:
+                queue.complete(job['id'], {'status': 'generated', 'seconds': 1.0})
+
+        # 手动重新触发：只有失败的客户重新排队
+        assert enqueue_customer_reports([1, 2], 2025, 10, queue=queue, requeue_failed=True) == 1
+        assert [job['payload']['customer_id'] for job in queue.claim('w1', 10)] == [2]
+
+    def test_summary_reports_status_and_duration_per_customer(self, queue):
+        enqueue_customer_reports([1, 2, 3], 2025, 10, queue=queue)
+        run_all(queue, {
+            1: {'status': 'generated', 'seconds': 2.5},
+            2: {'status': 'skipped', 'seconds': 0.1},
+            3: 'PDF render error',
+        })
+
+        summary = monthly_report_generation_summary(2025, 10, queue=queue)
+        assert summary['customers'] == 3
+        assert summary['counts']['generated'] == 1
+        assert summary['counts']['skipped'] == 1
+        assert summary['counts']['failed'] == 1
+        assert [t['customer_name'] for t in summary['timings']][0] == 'Alice'
+        assert summary['timings'][0]['seconds'] == 2.5
+        failed = next(t for t in summary['timings'] if t['status'] == 'failed')
+        assert (failed['customer_name'], failed['error']) == ('Carol', 'PDF render error')
+        assert failed['finished_at'] is not None
+        assert all(t['started_at'] for t in summary['timings'])
+        assert summary['elapsed_seconds'] is not None
+        assert monthly_report_generation_summary(2025, 11, queue=queue)['customers'] == 0
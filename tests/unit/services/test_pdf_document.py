@@ -0,0 +1,144 @@
+"""
+PDF文档缓存单元测试
+测试按内容哈希命中缓存、LRU淘汰、文件内容变化后哈希记忆不返回旧结果，
+表格在首次请求时才一次性提取，以及缓存命中后原上传路径被删除时仍能提取表格
+"""
+import os
+
+import pytest
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+import ingest.pdf_document as pdf_document
+from ingest.pdf_document import clear_pdf_cache, file_content_hash, get_pdf_cache_stats, open_cached_pdf
+
+
+def write_pdf(path, pages):
+    """每页一段文本；值为 (text, rows) 时在文本下方加一个带边框的表格"""
+    styles = getSampleStyleSheet()
+    story = []
+    for i, page in enumerate(pages):
+        text, rows = page if isinstance(page, tuple) else (page, None)
+        if i:
+            story.append(PageBreak())
+        story.append(Paragraph(text, styles['Normal']))
+        if rows:
+            table = Table(rows)
+            table.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 0.5, 'black')]))
+            story.append(table)
+    SimpleDocTemplate(str(path), pagesize=A4).build(story)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_pdf_cache()
+    pdf_document._stats.update(hits=0, misses=0)
+    yield
+    clear_pdf_cache()
+
+
+@pytest.fixture
+def pdfplumber_opens(monkeypatch):
+    """记录 pdfplumber.open 的调用次数（仍打开真实文件）"""
+    opened = []
+    real_open = pdf_document.pdfplumber.open
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(pdf_document.pdfplumber, 'open', counting_open)
+    return opened
+
+
+class TestOpenCachedPdf:
+    """按内容哈希缓存的PDF文档"""
+
+    def test_same_content_is_parsed_once(self, tmp_path, pdfplumber_opens):
+        first = write_pdf(tmp_path / 'a.pdf', ['Statement Date 30/09/2025', 'Page two'])
+        with open_cached_pdf(first) as pdf:
+            assert [p.page_number for p in pdf.pages] == [1, 2]
+            assert 'Statement Date 30/09/2025' in pdf.page_text(0)
+            assert pdf.page_text(5) == ''
+
+        # 同样内容的另一个文件命中缓存
+        copy = tmp_path / 'copy.pdf'
+        copy.write_bytes(open(first, 'rb').read())
+        assert open_cached_pdf(str(copy)) is open_cached_pdf(first)
+        assert len(pdfplumber_opens) == 1
+        assert get_pdf_cache_stats() == {
+            'hits': 2, 'misses': 1, 'size': 1, 'max_size': pdf_document.PDF_DOCUMENT_CACHE_SIZE,
+        }
+
+    def test_lru_evicts_least_recently_used(self, tmp_path, monkeypatch, pdfplumber_opens):
+        monkeypatch.setattr(pdf_document, 'PDF_DOCUMENT_CACHE_SIZE', 2)
+        a, b, c = (write_pdf(tmp_path / f'{name}.pdf', [f'Document {name}']) for name in 'abc')
+
+        doc_a = open_cached_pdf(a)
+        open_cached_pdf(b)
+        assert open_cached_pdf(a) is doc_a  # a 成为最近使用
+        open_cached_pdf(c)                  # 淘汰 b
+
+        assert list(pdf_document._cache) == [file_content_hash(a), file_content_hash(c)]
+        assert open_cached_pdf(a) is doc_a
+        assert len(pdfplumber_opens) == 3
+
+        assert 'Document b' in open_cached_pdf(b).full_text
+        assert len(pdfplumber_opens) == 4
+        assert get_pdf_cache_stats()['size'] == 2
+
+    def test_changed_content_is_not_served_from_hash_memo(self, tmp_path):
+        path = tmp_path / 'upload.pdf'
+        write_pdf(path, ['Old balance 100.00'])
+        old = open_cached_pdf(str(path))
+        old_mtime = os.stat(path).st_mtime_ns
+
+        # 同一路径被新上传覆盖（mtime 明确推后，避免文件系统时间精度导致相同）
+        write_pdf(path, ['New balance 250.00 after the statement was replaced'])
+        os.utime(path, ns=(old_mtime + 10 ** 9, old_mtime + 10 ** 9))
+
+        new = open_cached_pdf(str(path))
+        assert new is not old
+        assert new.content_hash != old.content_hash
+        assert 'New balance 250.00' in new.full_text
+        # 未变化的文件仍命中哈希记忆
+        assert file_content_hash(str(path)) == new.content_hash
+        assert len(pdf_document._hash_memo) == 2
+
+    def test_tables_are_extracted_lazily_once(self, tmp_path, pdfplumber_opens):
+        path = write_pdf(tmp_path / 'tables.pdf', [
+            'No tables here',
+            ('Transactions', [['Date', 'Amount'], ['01/09', '10.00'], ['02/09', '20.00']]),
+        ])
+        pdf = open_cached_pdf(path)
+        assert pdf._tables is None
+        assert len(pdfplumber_opens) == 1
+
+        tables = pdf.pages[1].extract_tables()
+        assert tables == [[['Date', 'Amount'], ['01/09', '10.00'], ['02/09', '20.00']]]
+        assert pdf.pages[0].extract_tables() == []
+        assert pdf.page_tables(9) == []
+        # 所有页面的表格在第一次请求时一起提取
+        assert len(pdfplumber_opens) == 2
+        assert open_cached_pdf(path).pages[1].extract_tables() == tables
+        assert len(pdfplumber_opens) == 2
+        # 表格提取后释放缓存的文件内容
+        assert pdf._content is None
+
+    def test_tables_after_first_upload_path_is_deleted(self, tmp_path):
+        rows = [['Date', 'Amount'], ['01/09', '10.00']]
+        first = write_pdf(tmp_path / 'upload_1.pdf', [('Statement', rows)])
+        second = tmp_path / 'upload_2.pdf'
+        second.write_bytes(open(first, 'rb').read())
+
+        open_cached_pdf(first)
+        pdf = open_cached_pdf(str(second))
+        assert get_pdf_cache_stats()['hits'] == 1
+
+        # 第一次上传的临时文件已删除，第二个路径也被另一份文件覆盖
+        os.remove(first)
+        write_pdf(second, [('Other statement', [['X', 'Y'], ['1', '2']])])
+
+        assert pdf.pages[0].extract_tables() == [rows]
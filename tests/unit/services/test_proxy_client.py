@@ -0,0 +1,157 @@
+"""
+Flask -> FastAPI 代理客户端单元测试（本地真实HTTP服务器）
+测试连接复用、按路由的跳转指标（含 5xx / 连接错误）、不保存上游 Cookie、
+请求体流式转发（有 Content-Length / 分块上传读到 EOF），以及响应流式返回后关闭上游连接
+"""
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from flask import Flask
+
+from utils.proxy_client import ProxyClient
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/fail':
+            self._reply(500, {'error': 'boom'})
+        elif self.path == '/cookie':
+            self._reply(200, {}, {'Set-Cookie': 'session=tenant-a; Path=/'})
+        elif self.path == '/download':
+            self._reply(200, {'rows': list(range(1000))}, {'Content-Disposition': 'attachment; filename=r.json'})
+        else:
+            self._reply(200, {'client_port': self.client_address[1]})
+
+    def do_POST(self):
+        body = self._read_body()
+        self._reply(200, {
+            'body': body.decode(),
+            'content_length': self.headers.get('Content-Length'),
+            'transfer_encoding': self.headers.get('Transfer-Encoding'),
+            'content_type': self.headers.get('Content-Type'),
+            'query': self.path.partition('?')[2],
+        })
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), UpstreamHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(upstream):
+    client = ProxyClient(base_url=upstream, pool_size=2)
+    yield client
+    client.session.close()
+
+
+class TestProxyClient:
+    """共享连接池与跳转指标"""
+
+    def test_keep_alive_reuses_connection(self, client):
+        ports = {client.get('/ping').json()['client_port'] for _ in range(3)}
+        assert len(ports) == 1
+
+    def test_metrics_by_route(self, client):
+        client.get('/ping', route='files')
+        client.get('/fail', route='files')
+        client.get('/ping', route='auth.login')
+
+        metrics = client.metrics.snapshot()
+        assert metrics['files']['requests'] == 2
+        assert metrics['files']['errors'] == 1
+        assert metrics['files']['status_codes'] == {'200': 1, '500': 1}
+        assert metrics['files']['bytes_sent'] > 0
+        assert metrics['auth.login']['requests'] == 1
+
+    def test_connection_error_is_recorded(self):
+        client = ProxyClient(base_url='http://127.0.0.1:9')
+        with pytest.raises(requests.ConnectionError):
+            client.get('/ping', route='cognee')
+        assert client.metrics.snapshot()['cognee']['errors'] == 1
+        assert client.metrics.snapshot()['cognee']['status_codes'] == {}
+
+    def test_upstream_cookies_are_not_shared(self, client):
+        response = client.get('/cookie')
+        assert response.cookies.get('session') == 'tenant-a'
+        assert len(client.session.cookies) == 0
+
+
+class TestStreaming:
+    """请求体 / 响应体流式转发"""
+
+    def forward(self, client, body, **environ):
+        app = Flask(__name__)
+        with app.test_request_context('/upload?company_id=1', method='POST', input_stream=io.BytesIO(body),
+                                      content_type='multipart/form-data; boundary=xyz', **environ):
+            response = client.forward_request_body('/upload', route='files.smart-upload')
+            try:
+                return response.json()
+            finally:
+                response.close()
+
+    def test_forward_with_content_length(self, client):
+        body = b'--xyz\r\n' + b'a' * 200000 + b'\r\n--xyz--\r\n'
+        echoed = self.forward(client, body, content_length=len(body))
+
+        assert echoed['body'] == body.decode()
+        assert echoed['content_length'] == str(len(body))
+        assert echoed['transfer_encoding'] is None
+        assert echoed['content_type'] == 'multipart/form-data; boundary=xyz'
+        assert echoed['query'] == 'company_id=1'
+
+    def test_chunked_upload_is_read_to_eof(self, client):
+        body = b'--xyz\r\n' + b'b' * 150000 + b'\r\n--xyz--\r\n'
+        # WSGI服务器已解码分块请求体（wsgi.input_terminated），Content-Length 未知
+        echoed = self.forward(client, body, headers={'Transfer-Encoding': 'chunked'},
+                              environ_overrides={'wsgi.input_terminated': True})
+
+        assert echoed['body'] == body.decode()
+        assert echoed['transfer_encoding'] == 'chunked'
+        assert echoed['content_length'] is None
+
+    def test_stream_response_closes_upstream(self, client):
+        upstream_response = client.get('/download', route='files.download', stream=True)
+        response = client.stream_response(upstream_response, route='files.download')
+
+        assert response.headers['Content-Disposition'] == 'attachment; filename=r.json'
+        body = b''.join(response.response)
+        assert json.loads(body)['rows'][-1] == 999
+        assert upstream_response.raw.closed
+        assert client.metrics.snapshot()['files.download.stream']['bytes_sent'] == len(body)
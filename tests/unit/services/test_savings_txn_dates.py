@@ -0,0 +1,110 @@
+"""
+储蓄交易规范日期单元测试
+测试混合格式日期规范化、已有数据回填（可重复执行）、导入脚本直接 INSERT 时由触发器补齐，
+以及组合索引被日期范围查询使用
+"""
+import sqlite3
+
+import pytest
+
+from db.migrations_savings_txn_dates import ensure_savings_txn_dates
+from ingest.savings_parser import add_canonical_dates, normalize_savings_date
+
+
+DATE_CASES = [
+    ('05-09-2025', '2025-09-05'),
+    ('07 SEP 2025', '2025-09-07'),
+    ('5 Sept 2025', '2025-09-05'),
+    ('26/08/2025', '2025-08-26'),
+    ('2025-09-05 10:00:00', '2025-09-05'),
+    ('01/02/25', '2025-02-01'),
+    ('3-Oct-99', '1999-10-03'),
+    ('31-02-2025', None),
+    ('05-13-2025', None),
+    ('07 XYZ 2025', None),
+    ('', None),
+]
+
+
+@pytest.mark.parametrize('raw, expected', DATE_CASES)
+def test_normalize_savings_date(raw, expected):
+    assert normalize_savings_date(raw) == expected
+
+
+def test_add_canonical_dates_reads_either_date_key():
+    transactions = add_canonical_dates([{'date': '05-09-2025'}, {'transaction_date': '2025-10-01'}, {'date': '??'}])
+    assert [(t['txn_date'], t['txn_month']) for t in transactions] == [
+        ('2025-09-05', '2025-09'), ('2025-10-01', '2025-10'), (None, None),
+    ]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript('''
+        CREATE TABLE savings_transactions (
+            id INTEGER PRIMARY KEY, savings_statement_id INTEGER, transaction_date TEXT, description TEXT,
+            amount REAL, customer_name_tag TEXT
+        );
+        INSERT INTO savings_transactions VALUES
+            (1, 1, '05-09-2025', 'TRANSFER', 100, 'Alice'),
+            (2, 1, '07 SEP 2025', 'TRANSFER', 50, 'Alice'),
+            (3, 2, '2025-10-01', 'TRANSFER', 70, 'Bob'),
+            (4, 2, 'garbage', 'TRANSFER', 1, 'Bob');
+    ''')
+    yield conn
+    conn.close()
+
+
+class TestSavingsTxnDatesMigration:
+    """ensure_savings_txn_dates"""
+
+    def test_backfill_is_idempotent(self, conn):
+        assert ensure_savings_txn_dates(conn) == 3
+        assert conn.execute('SELECT id, txn_date, txn_month FROM savings_transactions ORDER BY id').fetchall() == [
+            (1, '2025-09-05', '2025-09'), (2, '2025-09-07', '2025-09'), (3, '2025-10-01', '2025-10'), (4, None, None),
+        ]
+
+        conn.execute("UPDATE savings_transactions SET txn_date = NULL, txn_month = NULL WHERE id = 3")
+        assert ensure_savings_txn_dates(conn) == 1
+        assert ensure_savings_txn_dates(conn) == 0
+        assert conn.execute('SELECT txn_date FROM savings_transactions WHERE id = 3').fetchone() == ('2025-10-01',)
+
+    @pytest.mark.parametrize('raw, expected', DATE_CASES)
+    def test_trigger_fills_raw_inserts_like_the_parser(self, conn, raw, expected):
+        ensure_savings_txn_dates(conn)
+
+        # scripts/* 导入脚本不写 txn_date / txn_month
+        conn.execute('INSERT INTO savings_transactions (id, transaction_date) VALUES (10, ?)', (raw,))
+        assert conn.execute('SELECT txn_date, txn_month FROM savings_transactions WHERE id = 10').fetchone() == (
+            expected, expected[:7] if expected else None)
+
+    def test_trigger_keeps_explicit_values_and_follows_date_edits(self, conn):
+        ensure_savings_txn_dates(conn)
+        ensure_savings_txn_dates(conn)
+
+        conn.execute('''INSERT INTO savings_transactions (id, transaction_date, txn_date, txn_month)
+                        VALUES (10, '05-09-2025', '2025-09-06', '2025-09')''')
+        assert conn.execute('SELECT txn_date FROM savings_transactions WHERE id = 10').fetchone() == ('2025-09-06',)
+
+        conn.execute("UPDATE savings_transactions SET transaction_date = '01 DEC 2025' WHERE id = 10")
+        assert conn.execute('SELECT txn_date, txn_month FROM savings_transactions WHERE id = 10').fetchone() == (
+            '2025-12-01', '2025-12')
+
+    def test_missing_table_is_a_no_op(self):
+        assert ensure_savings_txn_dates(sqlite3.connect(':memory:')) == 0
+
+    def test_date_range_uses_composite_indexes(self, conn):
+        ensure_savings_txn_dates(conn)
+
+        plan = ' '.join(row[-1] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT SUM(amount) FROM savings_transactions
+            WHERE customer_name_tag = ? AND txn_date >= ? AND txn_date <= ?
+        ''', ('Alice', '2025-09-01', '2025-09-31')))
+        assert 'idx_savings_transactions_tag_txn_date' in plan
+
+        plan = ' '.join(row[-1] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT * FROM savings_transactions
+            WHERE savings_statement_id = ? ORDER BY txn_date
+        ''', (1,)))
+        assert 'idx_savings_transactions_statement_txn_date' in plan and 'TEMP B-TREE' not in plan
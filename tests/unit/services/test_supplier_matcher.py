@@ -0,0 +1,87 @@
+"""
+供应商匹配器单元测试
+测试编译后的匹配器与原逐个供应商循环结果一致，以及记忆与批量接口
+"""
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from services.supplier_matcher import SupplierMatcher, get_supplier_matcher
+from services.transaction_classifier import TransactionClassifier
+
+SUPPLIERS = ['7SL', 'Dinas Raub', 'SYC Hainan', 'Ai Smart Tech', 'HUAWEI', 'Pasar Raya', 'Puchong Herbs']
+
+
+def legacy_fuzzy_match(suppliers, merchant_name, threshold=0.98):
+    """TransactionClassifier._is_supplier_fuzzy_match 的原始三段循环"""
+    if not merchant_name:
+        return None
+    merchant_upper = merchant_name.upper().strip()
+    for supplier in suppliers:
+        if supplier.upper() in merchant_upper:
+            return supplier
+    for supplier in suppliers:
+        if SequenceMatcher(None, merchant_upper, supplier.upper().strip()).ratio() >= threshold:
+            return supplier
+    merchant_normalized = merchant_upper.replace('-', '').replace('_', '').replace(' ', '')
+    for supplier in suppliers:
+        supplier_normalized = supplier.upper().replace('-', '').replace('_', '').replace(' ', '')
+        if supplier_normalized in merchant_normalized or merchant_normalized in supplier_normalized:
+            return supplier
+    return None
+
+
+class TestSupplierMatcher:
+    """测试编译后的供应商匹配器"""
+
+    @pytest.mark.parametrize('merchant', [
+        '7SL TECH SDN BHD', 'HUAWEI TECHNOLOGY', 'GRAB FOOD DELIVERY', 'PASAR-RAYA KL',
+        'puchong_herbs', 'HUA', '-', '  dinas raub  ', 'SYC HAINAN 7SL', 'AI SMART TECH', '',
+    ])
+    def test_matches_legacy_loops(self, merchant):
+        matcher = SupplierMatcher(SUPPLIERS, fuzzy_threshold=0.98, compact_containment=True)
+        assert matcher.match_supplier(merchant) == legacy_fuzzy_match(SUPPLIERS, merchant)
+
+    def test_matches_legacy_loops_random(self):
+        rng = random.Random(7)
+        suppliers = ['ABCD', 'BCDEFGHIJKLMNOPQRSTUVWXYZABCDEFGH', 'XY', 'CD EF', 'QRS-TUV']
+        matcher = SupplierMatcher(suppliers, fuzzy_threshold=0.9, compact_containment=True)
+        alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ -_'
+        for _ in range(2000):
+            merchant = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            if rng.random() < 0.2:
+                merchant = suppliers[1][:-1] + rng.choice('AZ')
+            assert matcher.match_supplier(merchant) == legacy_fuzzy_match(suppliers, merchant, 0.9), merchant
+
+    def test_priority_follows_list_order(self):
+        matcher = SupplierMatcher(['huawei cloud', 'huawei'], case='lower')
+        assert matcher.match_supplier('HUAWEI CLOUD SERVICES') == 'huawei cloud'
+        matcher = SupplierMatcher(['huawei', 'huawei cloud'], case='lower')
+        assert matcher.match_supplier('HUAWEI CLOUD SERVICES') == 'huawei'
+
+    def test_aliases_return_canonical_name(self):
+        matcher = SupplierMatcher([('7-eleven', '7SL'), ('syc', 'SYC Hainan')], case='lower')
+        assert matcher.match('7-ELEVEN PUCHONG') == ('7SL', 'exact')
+
+    def test_results_memoized_and_batched(self):
+        matcher = SupplierMatcher(SUPPLIERS, fuzzy_threshold=0.98, compact_containment=True)
+        results = matcher.match_many(['HUAWEI STORE', 'GRAB', 'HUAWEI STORE', 'huawei store '])
+        assert [r[0] if r else None for r in results] == ['HUAWEI', None, 'HUAWEI', 'HUAWEI']
+        assert matcher.stats()['misses'] == 2
+
+    def test_shared_matcher_per_configuration(self):
+        assert get_supplier_matcher(SUPPLIERS, 0.98, True) is get_supplier_matcher(list(SUPPLIERS), 0.98, True)
+
+
+class TestTransactionClassifierBatch:
+    """测试分类器批量接口使用共享匹配器"""
+
+    def test_batch_classification(self):
+        classifier = TransactionClassifier(customer_name='CHANG CHOON CHOW')
+        result = classifier.batch_classify_transactions([
+            {'id': 1, 'transaction_type': 'expense', 'description': '7SL PURCHASE', 'merchant_name': '7SL'},
+            {'id': 2, 'transaction_type': 'expense', 'description': 'GRAB FOOD', 'merchant_name': 'GRAB'},
+            {'id': 3, 'transaction_type': 'payment', 'description': 'PAYMENT', 'payer_info': 'INFINITE GZ SDN BHD'},
+        ])
+        assert [r['category'] for r in result['results']] == ["GZ's Expenses", "Owner's Expenses", "GZ's Payment"]
@@ -0,0 +1,179 @@
+"""
+VBAJSONProcessor 批量入库单元测试
+测试集合查询解析客户/卡片/月度账单、单事务写入、表结构缓存、整批回滚与提交后清除卡片时间线缓存
+"""
+import pytest
+
+import db.database as database
+from services import vba_json_processor
+from services.vba_json_processor import VBAJSONProcessor
+
+SCHEMA = '''
+CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, email TEXT, phone TEXT, created_at TIMESTAMP);
+CREATE TABLE credit_cards (
+    id INTEGER PRIMARY KEY, customer_id INTEGER, bank_name TEXT, card_number_last4 TEXT,
+    card_type TEXT, credit_limit REAL, created_at TIMESTAMP
+);
+CREATE TABLE statements (
+    id INTEGER PRIMARY KEY, card_id INTEGER, statement_date TEXT, statement_total REAL,
+    file_path TEXT, created_at TIMESTAMP
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY, statement_id INTEGER, monthly_statement_id INTEGER, transaction_date TEXT,
+    description TEXT, amount REAL, category TEXT, created_at TIMESTAMP
+);
+CREATE TABLE audit_logs (
+    id INTEGER PRIMARY KEY, user_id INTEGER, action_type TEXT, entity_type TEXT, entity_id INTEGER,
+    description TEXT, ip_address TEXT
+);
+INSERT INTO customers (id, name) VALUES (1, 'Alice Tan');
+INSERT INTO credit_cards (id, customer_id, bank_name, card_number_last4, card_type, credit_limit)
+    VALUES (5, 1, 'Maybank', '1234', 'VISA', 1000);
+'''
+
+
+def credit_card(owner, last4, date, limit, n_transactions):
+    return {
+        'status': 'success',
+        'document_type': 'credit_card',
+        'account_info': {
+            'owner_name': owner, 'bank': 'Maybank', 'card_last_4': last4, 'card_type': 'VISA',
+            'statement_date': date, 'card_limit': limit, 'previous_balance': 100, 'closing_balance': 200,
+        },
+        'transactions': [
+            {'date': date, 'description': f'TXN {i}', 'dr': 10 + i, 'category': 'Shopping'}
+            for i in range(n_transactions)
+        ],
+    }
+
+
+def bank_statement(holder, date):
+    return {
+        'status': 'success',
+        'document_type': 'bank_statement',
+        'bank_detected': 'CIMB Bank',
+        'account_info': {'account_holder': holder, 'statement_date': date,
+                         'opening_balance': 50, 'closing_balance': 80},
+        'transactions': [{'date': date, 'description': 'SALARY', 'credit': 30}],
+    }
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'vba.db'))
+    with database.get_db() as conn:
+        conn.executescript(SCHEMA)
+        conn.commit()
+    vba_json_processor.invalidate_schema_cache()
+    yield
+    vba_json_processor.invalidate_schema_cache()
+    database.close_pool()
+
+
+def query(sql, params=()):
+    with database.get_db() as conn:
+        return [tuple(row) for row in conn.execute(sql, params).fetchall()]
+
+
+class TestVBAJSONProcessorBatch:
+    """process_batch"""
+
+    def test_batch_resolves_entities_and_writes_transactions(self, db):
+        batch = VBAJSONProcessor().process_batch([
+            ('a.json', credit_card('alice tan', '1234', '15-09-2025', 5000, 3)),
+            ('b.json', credit_card('Bob Lee', '9999', '15-09-2025', 2000, 2)),
+            ('c.json', bank_statement('Bob Lee', '30-09-2025')),
+            ('d.json', credit_card('Alice Tan', '1234', '15-10-2025', 6000, 1)),
+        ], user_id=7)
+
+        assert batch['success'] and batch['transaction_count'] == 7
+        assert batch['rows_per_second'] > 0
+        assert [r['month'] for r in batch['results']] == ['2025-09', '2025-09', '2025-09', '2025-10']
+
+        # 客户按名称不区分大小写复用；新客户只创建一次
+        assert query('SELECT id, name FROM customers ORDER BY id') == [(1, 'Alice Tan'), (2, 'Bob Lee')]
+        # 已存在的卡更新为批次中最后一个文件的额度
+        assert query('SELECT id, credit_limit FROM credit_cards ORDER BY id') == [(5, 6000.0), (6, 2000.0)]
+        assert query('SELECT customer_id, bank_name, statement_month, transaction_count '
+                     'FROM monthly_statements ORDER BY id') == [
+            (1, 'Maybank', '2025-09', 3), (2, 'Maybank', '2025-09', 2),
+            (2, 'CIMB Bank', '2025-09', 1), (1, 'Maybank', '2025-10', 1),
+        ]
+        assert query('SELECT COUNT(*) FROM monthly_statement_cards') == [(3,)]
+        assert query('SELECT COUNT(*) FROM transactions WHERE statement_id IS NULL') == [(7,)]
+        assert query('SELECT amount, category FROM transactions WHERE monthly_statement_id = 3') == [
+            (30.0, 'Uncategorized - ')
+        ]
+        assert query('SELECT COUNT(*) FROM audit_logs WHERE action_type = ?', ('VBA_JSON_UPLOAD',)) == [(4,)]
+
+    def test_reimport_updates_existing_monthly_statement(self, db):
+        processor = VBAJSONProcessor()
+        first = processor.process_json(credit_card('Alice Tan', '1234', '15-09-2025', 5000, 2), filename='a.json')
+        second = processor.process_json(credit_card('Alice Tan', '1234', '15-09-2025', 5000, 4), filename='a.json')
+
+        assert first['statement_id'] == second['statement_id']
+        assert query('SELECT transaction_count FROM monthly_statements') == [(4,)]
+        assert query('SELECT COUNT(*) FROM monthly_statement_cards') == [(1,)]
+
+    def test_schema_is_inspected_once_per_process(self, db):
+        processor = VBAJSONProcessor()
+        processor.process_json(credit_card('Alice Tan', '1234', '15-09-2025', 5000, 1))
+
+        statements = []
+        with database.get_db() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                processor.process_json(credit_card('Alice Tan', '1234', '15-10-2025', 5000, 1))
+            finally:
+                conn.set_trace_callback(None)
+        assert not [sql for sql in statements if 'PRAGMA table_info' in sql]
+
+    def test_invalid_document_fails_alone_and_db_error_rolls_back_batch(self, db):
+        processor = VBAJSONProcessor()
+        bad_amount = credit_card('Carol', '1111', '15-09-2025', 'not a number', 1)
+        batch = processor.process_batch([
+            ('ok.json', credit_card('Carol', '1111', '15-09-2025', 100, 1)),
+            ('bad.json', bad_amount),
+            ('other.json', {'document_type': 'receipt'}),
+        ])
+        assert [r['success'] for r in batch['results']] == [True, False, False]
+
+        with database.get_db() as conn:
+            conn.execute('DROP TABLE audit_logs')
+            conn.commit()
+        batch = processor.process_batch([
+            ('d.json', credit_card('Dave', '2222', '15-09-2025', 100, 2)),
+        ], user_id=1)
+        assert not batch['results'][0]['success']
+        assert query("SELECT COUNT(*) FROM customers WHERE name = 'Dave'") == [(0,)]
+
+    def test_committed_cards_invalidate_timeline_cache(self, db, monkeypatch):
+        invalidated = []
+        monkeypatch.setattr(vba_json_processor, 'invalidate_card_timeline', invalidated.append)
+        processor = VBAJSONProcessor()
+        processor.process_batch([
+            ('a.json', credit_card('Alice Tan', '1234', '15-09-2025', 5000, 1)),
+            ('b.json', bank_statement('Alice Tan', '30-09-2025')),
+        ])
+        assert invalidated == [{5}]
+
+        # transactions.statement_id 必填的旧架构：兼容statement挂在卡1下，一并清除
+        with database.get_db() as conn:
+            conn.executescript('''
+                DROP TABLE transactions;
+                CREATE TABLE transactions (
+                    id INTEGER PRIMARY KEY, statement_id INTEGER NOT NULL, transaction_date TEXT,
+                    description TEXT, amount REAL, category TEXT, created_at TIMESTAMP
+                );
+            ''')
+        vba_json_processor.invalidate_schema_cache()
+        processor.process_json(credit_card('Bob Lee', '9999', '15-09-2025', 100, 1))
+        assert invalidated[1] == {6, 1}
+        assert query('SELECT card_id, file_path FROM statements') == [(1, 'VBA_UPLOAD')]
+
+        # 整批回滚时不清除
+        with database.get_db() as conn:
+            conn.execute('DROP TABLE audit_logs')
+            conn.commit()
+        processor.process_batch([('d.json', credit_card('Dave', '2222', '15-09-2025', 100, 2))], user_id=1)
+        assert len(invalidated) == 2
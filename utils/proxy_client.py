@@ -0,0 +1,186 @@
+"""
+Flask -> FastAPI 代理HTTP客户端
+
+- 进程内共享 requests.Session + 连接池（keep-alive），避免每次代理请求重新建立TCP连接
+- 按路由配置超时（connect, read）
+- 上传请求体、下载响应体均为流式转发，不在内存中整体缓冲
+  （没有 Content-Length 的分块上传读到 EOF，以 chunked 编码转发）
+- 代理跳转指标：请求数、错误数、累计耗时、转发字节数
+"""
+import os
+import threading
+import time
+import logging
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import Response, request as flask_request
+
+logger = logging.getLogger(__name__)
+
+FASTAPI_BASE_URL = os.environ.get('FASTAPI_BASE_URL', 'http://localhost:8000')
+
+# 连接池大小（每个gunicorn worker）
+PROXY_POOL_SIZE = int(os.environ.get('PROXY_POOL_SIZE', '20'))
+
+# 流式转发块大小
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 按路由的超时配置：(connect_timeout, read_timeout)
+ROUTE_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    'default': (3.0, 30.0),
+    'files': (3.0, 60.0),
+    'files.download': (3.0, 300.0),
+    'files.smart-upload': (3.0, 300.0),
+    'unified-files': (3.0, 60.0),
+    'auth.login': (3.0, 5.0),
+    'parsers-metrics': (3.0, 5.0),
+    'ai-assistant': (3.0, 30.0),
+    'cognee': (3.0, 30.0),
+}
+
+# 流式转发时透传的响应头（不包含 Connection / Transfer-Encoding 等逐跳头）
+_PASSTHROUGH_HEADERS = ('Content-Type', 'Content-Disposition', 'Content-Length', 'Cache-Control', 'ETag', 'Last-Modified')
+
+
+class ProxyMetrics:
+    """代理跳转指标（按路由聚合）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict] = {}
+
+    def record(self, route: str, elapsed: float, status_code: Optional[int], error: bool = False, bytes_sent: int = 0):
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                'requests': 0, 'errors': 0, 'total_seconds': 0.0,
+                'max_seconds': 0.0, 'bytes_sent': 0, 'status_codes': {},
+            })
+            stats['requests'] += 1
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+            stats['bytes_sent'] += bytes_sent
+            if error:
+                stats['errors'] += 1
+            if status_code is not None:
+                key = str(status_code)
+                stats['status_codes'][key] = stats['status_codes'].get(key, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            result = {}
+            for route, stats in self._routes.items():
+                avg = stats['total_seconds'] / stats['requests'] if stats['requests'] else 0.0
+                result[route] = {
+                    **stats,
+                    'status_codes': dict(stats['status_codes']),
+                    'avg_ms': round(avg * 1000, 2),
+                    'max_ms': round(stats['max_seconds'] * 1000, 2),
+                }
+            return result
+
+
+def _iter_request_body(stream) -> Iterator[bytes]:
+    """长度未知的请求体（Transfer-Encoding: chunked）：按块读到EOF，requests以chunked编码转发"""
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+class _RequestBodyStream:
+    """把Flask请求体包装成带长度的文件对象，requests按块读取并保留Content-Length"""
+
+    def __init__(self, stream, length: int):
+        self._stream = stream
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size if size and size > 0 else STREAM_CHUNK_SIZE)
+
+
+class ProxyClient:
+    """共享的keep-alive HTTP客户端"""
+
+    def __init__(self, base_url: str = FASTAPI_BASE_URL, pool_size: int = PROXY_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.metrics = ProxyMetrics()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # 共享Session绝不能保存上游Set-Cookie（否则不同用户/租户之间会串cookie）
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method: str, path: str, route: str = 'default', stream: bool = False, **kwargs) -> requests.Response:
+        """发送请求并记录指标；stream=True 时调用方负责关闭响应"""
+        kwargs.setdefault('timeout', ROUTE_TIMEOUTS.get(route, ROUTE_TIMEOUTS['default']))
+        url = path if path.startswith('http') else self.url(path)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, stream=stream, **kwargs)
+        except requests.RequestException:
+            self.metrics.record(route, time.perf_counter() - started, None, error=True)
+            raise
+        bytes_sent = 0 if stream else len(response.content)
+        self.metrics.record(route, time.perf_counter() - started, response.status_code,
+                            error=response.status_code >= 500, bytes_sent=bytes_sent)
+        return response
+
+    def get(self, path: str, route: str = 'default', **kwargs) -> requests.Response:
+        return self.request('GET', path, route=route, **kwargs)
+
+    def post(self, path: str, route: str = 'default', **kwargs) -> requests.Response:
+        return self.request('POST', path, route=route, **kwargs)
+
+    def forward_request_body(self, path: str, route: str = 'default', **kwargs) -> requests.Response:
+        """
+        原样流式转发当前Flask请求体（保留multipart边界），不读取 request.files
+        调用前不能访问 request.files / request.form，否则请求体已被消费
+        """
+        headers = kwargs.pop('headers', {}) or {}
+        headers['Content-Type'] = flask_request.content_type
+        if flask_request.content_length is None:
+            body = _iter_request_body(flask_request.stream)
+        else:
+            body = _RequestBodyStream(flask_request.stream, flask_request.content_length)
+        return self.request(flask_request.method, path, route=route, data=body,
+                            headers=headers, params=flask_request.args, stream=True, **kwargs)
+
+    def stream_response(self, response: requests.Response, route: str = 'default') -> Response:
+        """把上游响应以流的方式返回给浏览器，完成后关闭上游连接（连接归还连接池）"""
+        started = time.perf_counter()
+
+        def generate() -> Iterator[bytes]:
+            sent = 0
+            try:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    if chunk:
+                        sent += len(chunk)
+                        yield chunk
+            finally:
+                response.close()
+                self.metrics.record(f"{route}.stream", time.perf_counter() - started, None, bytes_sent=sent)
+
+        headers = {name: response.headers[name] for name in _PASSTHROUGH_HEADERS if name in response.headers}
+        # 上游压缩过的响应由requests解压后转发，此时长度不再准确
+        if 'Content-Encoding' in response.headers:
+            headers.pop('Content-Length', None)
+        headers.setdefault('Content-Type', 'application/json')
+        return Response(generate(), status=response.status_code, headers=headers, direct_passthrough=True)
+
+
+proxy_client = ProxyClient()
+
+
+def get_proxy_metrics() -> Dict:
+    return proxy_client.metrics.snapshot()